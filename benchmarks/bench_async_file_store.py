@@ -0,0 +1,85 @@
+# benchmarks/bench_async_file_store.py
+"""
+Пропускная способность AsyncJsonFileStore при конкурентных запросах:
+CONCURRENCY задач одновременно выполняют store_challenge + consume_challenge
+с реальной записью base_model.
+
+Два режима: локальный диск (на машине с одним CPU упирается в GIL) и диск
+с искусственной задержкой SIMULATED_LATENCY_SECONDS на запись и на consume
+(медленный или сетевой диск) - здесь видно, сериализуются ли операции
+с разными challenge_id.
+
+Запуск из корня репозитория: PYTHONPATH=. python benchmarks/bench_async_file_store.py
+"""
+import asyncio
+import contextlib
+import logging
+import os
+import tempfile
+import time
+
+from shape_captcha_lib.logic_core import CaptchaLogicCore
+from shape_captcha_lib.stores import json_file_store
+from shape_captcha_lib.stores.json_file_store import AsyncJsonFileStore
+
+ROUND_TRIPS_PER_TASK = 50
+CONCURRENCY_LEVELS = (1, 16, 64)
+SIMULATED_LATENCY_SECONDS = 0.002
+
+
+def _record():
+    logic_core = CaptchaLogicCore(model_name="base_model")
+    with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+        _, drawn_shapes, target_type = logic_core.render_challenge(seed=1)
+    return logic_core.build_stored_challenge(target_type, drawn_shapes)
+
+
+def _with_latency(func):
+    def slow_func(*args):
+        time.sleep(SIMULATED_LATENCY_SECONDS)
+        return func(*args)
+    return slow_func
+
+
+@contextlib.contextmanager
+def _simulated_latency():
+    originals = json_file_store._write_challenge_file, json_file_store._claim_and_read
+    json_file_store._write_challenge_file = _with_latency(originals[0])
+    json_file_store._claim_and_read = _with_latency(originals[1])
+    try:
+        yield
+    finally:
+        json_file_store._write_challenge_file, json_file_store._claim_and_read = originals
+
+
+async def _worker(store, worker_id, record):
+    for i in range(ROUND_TRIPS_PER_TASK):
+        challenge_id = f"w{worker_id}-{i}"
+        await store.store_challenge(challenge_id, record, 300)
+        assert await store.consume_challenge(challenge_id) is not None
+
+
+async def bench(record, concurrency) -> float:
+    with tempfile.TemporaryDirectory() as directory:
+        store = AsyncJsonFileStore(directory)
+        started = time.perf_counter()
+        await asyncio.gather(*(_worker(store, worker_id, record) for worker_id in range(concurrency)))
+        elapsed = time.perf_counter() - started
+        await store.close()
+    return concurrency * ROUND_TRIPS_PER_TASK / elapsed
+
+
+def main() -> None:
+    logging.disable(logging.CRITICAL)
+    record = _record()
+    for mode, context in (("local disk", contextlib.nullcontext), (
+            f"{SIMULATED_LATENCY_SECONDS * 1000:.0f} ms simulated I/O latency", _simulated_latency)):
+        with context():
+            rates = [asyncio.run(bench(record, concurrency)) for concurrency in CONCURRENCY_LEVELS]
+        print(f"{mode}: " + "   ".join(
+            f"{concurrency:>3} tasks {rate:6.0f} store+consume/s" for concurrency, rate in zip(CONCURRENCY_LEVELS, rates)
+        ))
+
+
+if __name__ == "__main__":
+    main()
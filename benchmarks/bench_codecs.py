@@ -0,0 +1,57 @@
+# benchmarks/bench_codecs.py
+"""
+Размер записи CAPTCHA и время encode/decode для кодеков хранилищ (stores/codecs.py):
+то, что уходит в Redis или файл на каждый вызов. Записи all_drawn_shapes
+(verify_engine по умолчанию) моделей base_model и td_model.
+
+Запуск из корня репозитория: PYTHONPATH=. python benchmarks/bench_codecs.py
+"""
+import contextlib
+import logging
+import os
+import time
+from typing import Any, Dict, List
+
+from shape_captcha_lib.logic_core import CaptchaLogicCore
+from shape_captcha_lib.stores.codecs import get_challenge_codec
+
+NUM_RECORDS = 50
+REPEATS = 20
+CODEC_NAMES = ("json", "compact-json", "binary", "json+zlib", "compact-json+zlib", "binary+zlib")
+
+
+def _records(model_name: str) -> List[Dict[str, Any]]:
+    logic_core = CaptchaLogicCore(model_name=model_name)
+    records = []
+    for seed in range(NUM_RECORDS):
+        _, drawn_shapes, target_type = logic_core.render_challenge(seed=seed)
+        records.append(logic_core.build_stored_challenge(target_type, drawn_shapes))
+    return records
+
+
+def _per_record_us(func, items) -> float:
+    started = time.perf_counter()
+    for _ in range(REPEATS):
+        for item in items:
+            func(item)
+    return (time.perf_counter() - started) / (REPEATS * len(items)) * 1e6
+
+
+def main() -> None:
+    logging.disable(logging.CRITICAL)
+    for model_name in ("base_model", "td_model"):
+        with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+            records = _records(model_name)
+        print(f"{model_name} (all_drawn_shapes records):")
+        for codec_name in CODEC_NAMES:
+            codec = get_challenge_codec(codec_name)
+            payloads = [codec.encode(record) for record in records]
+            average_size = sum(len(payload) for payload in payloads) / len(payloads)
+            print(
+                f"  {codec_name:<18} {average_size:7.0f} B   encode {_per_record_us(codec.encode, records):6.1f} us"
+                f"   decode {_per_record_us(codec.decode, payloads):6.1f} us"
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,66 @@
+# benchmarks/bench_downsample.py
+"""
+Сравнение способов уменьшения увеличенного холста (downsample_mode): скорость и качество.
+Качество - PSNR относительно LANCZOS (эталон текущего поведения).
+
+Запуск из корня репозитория: PYTHONPATH=. python benchmarks/bench_downsample.py
+"""
+import math
+import random
+import timeit
+
+from PIL import Image, ImageChops
+
+from shape_captcha_lib.image_generator import (
+    DEFAULT_CAPTCHA_HEIGHT,
+    DEFAULT_CAPTCHA_WIDTH,
+    DEFAULT_UPSCALE_FACTOR,
+    DOWNSAMPLE_MODES,
+    _downsample,
+    generate_captcha_image,
+)
+from shape_captcha_lib.registry import get_model_colors, get_model_shape_types
+
+FINAL_SIZE = (DEFAULT_CAPTCHA_WIDTH, DEFAULT_CAPTCHA_HEIGHT)
+REPEATS = 50
+
+
+def render_upscaled_canvas() -> Image.Image:
+    """Рисует фигуры на увеличенном холсте, как generate_captcha_image до уменьшения."""
+    random.seed(42)
+    model_name = "td_model"
+    width, height = FINAL_SIZE[0] * DEFAULT_UPSCALE_FACTOR, FINAL_SIZE[1] * DEFAULT_UPSCALE_FACTOR
+    image, _ = generate_captcha_image(
+        model_name=model_name,
+        model_shape_types=get_model_shape_types(model_name),
+        model_available_colors=get_model_colors(model_name),
+        final_width=width,
+        final_height=height,
+        upscale_factor=1,
+        target_min_final_shape_dim=30 * DEFAULT_UPSCALE_FACTOR,
+        target_max_final_shape_dim=50 * DEFAULT_UPSCALE_FACTOR,
+        add_point_noise=True,
+    )
+    return image
+
+
+def psnr(reference: Image.Image, candidate: Image.Image) -> float:
+    histogram = ImageChops.difference(reference, candidate).histogram()
+    squared_error = sum(count * (value % 256) ** 2 for value, count in enumerate(histogram))
+    mse = squared_error / (reference.width * reference.height * len(reference.getbands()))
+    return float("inf") if mse == 0 else 10 * math.log10(255 ** 2 / mse)
+
+
+def main() -> None:
+    canvas = render_upscaled_canvas()
+    reference = _downsample(canvas, FINAL_SIZE, DEFAULT_UPSCALE_FACTOR, "lanczos")
+    for mode in DOWNSAMPLE_MODES:
+        seconds = timeit.timeit(
+            lambda: _downsample(canvas, FINAL_SIZE, DEFAULT_UPSCALE_FACTOR, mode), number=REPEATS
+        ) / REPEATS
+        result = _downsample(canvas, FINAL_SIZE, DEFAULT_UPSCALE_FACTOR, mode)
+        print(f"{mode:<10} {seconds * 1000:8.3f} ms/image   PSNR vs lanczos: {psnr(reference, result):6.2f} dB")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,46 @@
+# benchmarks/bench_encoding.py
+"""
+Сравнение кодирования изображения CAPTCHA: настройки Pillow по умолчанию
+и профили encode_image ("fast", "small") для PNG/WebP/JPEG.
+
+Запуск из корня репозитория: PYTHONPATH=. python benchmarks/bench_encoding.py
+"""
+import io
+import random
+import timeit
+
+from shape_captcha_lib.image_generator import generate_captcha_image
+from shape_captcha_lib.registry import get_model_colors, get_model_shape_types
+from shape_captcha_lib.utils.image_encoding import ENCODE_PROFILES, IMAGE_OUTPUT_FORMATS, encode_image
+
+REPEATS = 30
+
+
+def pillow_default(image, output_format):
+    buffer = io.BytesIO()
+    image.save(buffer, format=output_format.upper())
+    return buffer.getvalue()
+
+
+def main() -> None:
+    random.seed(42)
+    model_name = "base_model"
+    image, _ = generate_captcha_image(
+        model_name=model_name,
+        model_shape_types=get_model_shape_types(model_name),
+        model_available_colors=get_model_colors(model_name),
+        add_watermark_text=True,
+        add_noise_lines=True,
+        add_point_noise=True,
+    )
+    for output_format in IMAGE_OUTPUT_FORMATS:
+        variants = [("pillow default", lambda: pillow_default(image, output_format))]
+        for profile in ENCODE_PROFILES:
+            variants.append((profile, lambda profile=profile: encode_image(image, output_format, {"profile": profile})))
+        for name, func in variants:
+            seconds = timeit.timeit(func, number=REPEATS) / REPEATS
+            print(f"{output_format:<5} {name:<15} {seconds * 1000:8.2f} ms   {len(func()) / 1024:7.1f} KiB")
+
+
+if __name__ == "__main__":
+    main()
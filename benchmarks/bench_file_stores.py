@@ -0,0 +1,70 @@
+# benchmarks/bench_file_stores.py
+"""
+Файловые хранилища: SyncJsonFileStore (файл на вызов), SyncLogStore
+(журнал сегментов) и SyncSqliteStore (WAL, с пакетной фиксацией и без). Цикл store_challenge + consume_challenge с реальной записью
+base_model и число записей каталога (файлов и жестких ссылок) при NUM_LIVE живых вызовах.
+
+Запуск из корня репозитория: PYTHONPATH=. python benchmarks/bench_file_stores.py
+"""
+import contextlib
+import logging
+import os
+import tempfile
+import time
+
+from shape_captcha_lib.logic_core import CaptchaLogicCore
+from shape_captcha_lib.stores.json_file_store import SyncJsonFileStore
+from shape_captcha_lib.stores.log_store import SyncLogStore
+from shape_captcha_lib.stores.sqlite_store import SyncSqliteStore
+
+NUM_ROUND_TRIPS = 5_000
+NUM_LIVE = 20_000
+
+
+def _record():
+    logic_core = CaptchaLogicCore(model_name="base_model")
+    with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+        _, drawn_shapes, target_type = logic_core.render_challenge(seed=1)
+    return logic_core.build_stored_challenge(target_type, drawn_shapes)
+
+
+def _count_files(path: str) -> int:
+    return sum(len(file_names) for _, _, file_names in os.walk(path))
+
+
+def bench(name, store_factory, record) -> None:
+    with tempfile.TemporaryDirectory() as directory:
+        store = store_factory(directory)
+        started = time.perf_counter()
+        for i in range(NUM_ROUND_TRIPS):
+            store.store_challenge(f"rt{i}", record, 300)
+            store.consume_challenge(f"rt{i}")
+        round_trip_us = (time.perf_counter() - started) / NUM_ROUND_TRIPS * 1e6
+
+        started = time.perf_counter()
+        for i in range(NUM_LIVE):
+            store.store_challenge(f"live{i}", record, 300)
+        store_us = (time.perf_counter() - started) / NUM_LIVE * 1e6
+        print(
+            f"  {name:<32} store+consume {round_trip_us:7.1f} us   store {store_us:7.1f} us   "
+            f"{_count_files(directory):>6} directory entries for {NUM_LIVE} live challenges"
+        )
+        store.close()
+
+
+def main() -> None:
+    logging.disable(logging.CRITICAL)
+    record = _record()
+    print("base_model record:")
+    bench("SyncJsonFileStore", SyncJsonFileStore, record)
+    bench("SyncLogStore (json)", SyncLogStore, record)
+    bench("SyncLogStore (binary)", lambda directory: SyncLogStore(directory, codec="binary"), record)
+    bench("SyncSqliteStore (json)", lambda directory: SyncSqliteStore(os.path.join(directory, "c.sqlite3")), record)
+    bench("SyncSqliteStore (binary)", lambda directory: SyncSqliteStore(
+        os.path.join(directory, "c.sqlite3"), codec="binary"), record)
+    bench("SyncSqliteStore (binary, batch)", lambda directory: SyncSqliteStore(
+        os.path.join(directory, "c.sqlite3"), codec="binary", commit_interval_seconds=0.05), record)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,78 @@
+# benchmarks/bench_memory_store.py
+"""
+Память SyncInMemoryStore на живые записи all_drawn_shapes: записи как словари
+(по умолчанию) против упакованных (compact_records=True). Каждая запись - отдельная
+копия (как после генерации), память считается tracemalloc на MEASURED_CHALLENGES
+записях и пересчитывается на 100k (словари на 100k td_model не помещаются в 6 ГБ
+вместе с накладными расходами tracemalloc; рост линейный).
+Дополнительно - время store_challenge + consume_challenge на запись.
+
+Запуск из корня репозитория: PYTHONPATH=. python benchmarks/bench_memory_store.py
+"""
+import contextlib
+import gc
+import json
+import logging
+import os
+import time
+import tracemalloc
+from typing import List
+
+from shape_captcha_lib.logic_core import CaptchaLogicCore
+from shape_captcha_lib.stores import SyncInMemoryStore
+
+MEASURED_CHALLENGES = 20_000
+REPORTED_CHALLENGES = 100_000
+NUM_TEMPLATES = 50
+
+
+def _record_templates(model_name: str) -> List[str]:
+    logic_core = CaptchaLogicCore(model_name=model_name)
+    templates = []
+    for seed in range(NUM_TEMPLATES):
+        _, drawn_shapes, target_type = logic_core.render_challenge(seed=seed)
+        templates.append(json.dumps(logic_core.build_stored_challenge(target_type, drawn_shapes)))
+    return templates
+
+
+def _resident_bytes(templates: List[str], compact_records: bool) -> int:
+    gc.collect()
+    tracemalloc.start()
+    store = SyncInMemoryStore(compact_records=compact_records)
+    for i in range(MEASURED_CHALLENGES):
+        store.store_challenge(f"challenge-{i}", json.loads(templates[i % len(templates)]), 300)
+    gc.collect()
+    resident, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del store
+    return resident
+
+
+def _round_trip_us(templates: List[str], compact_records: bool) -> float:
+    store = SyncInMemoryStore(compact_records=compact_records)
+    records = [json.loads(template) for template in templates]
+    started = time.perf_counter()
+    for i in range(10_000):
+        store.store_challenge("challenge", records[i % len(records)], 300)
+        store.consume_challenge("challenge")
+    return (time.perf_counter() - started) / 10_000 * 1e6
+
+
+def main() -> None:
+    logging.disable(logging.CRITICAL)
+    for model_name in ("base_model", "td_model"):
+        with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+            templates = _record_templates(model_name)
+        print(f"{model_name}, per {REPORTED_CHALLENGES} live challenges:")
+        for compact_records in (False, True):
+            per_challenge = _resident_bytes(templates, compact_records) / MEASURED_CHALLENGES
+            label = "compact records" if compact_records else "dict records"
+            print(
+                f"  {label:<16} {per_challenge * REPORTED_CHALLENGES / 2**20:8.1f} MiB, "
+                f"{per_challenge:8.0f} B/challenge, "
+                f"store+consume {_round_trip_us(templates, compact_records):6.1f} us"
+            )
+
+
+if __name__ == "__main__":
+    main()
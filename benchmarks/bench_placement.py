@@ -0,0 +1,73 @@
+# benchmarks/bench_placement.py
+"""
+Сравнение размещения прямоугольных bbox'ов: случайные попытки с линейной проверкой
+коллизий (старый подход) и выбор центров по сетке занятости (OccupancyGrid).
+
+Запуск из корня репозитория: PYTHONPATH=. python benchmarks/bench_placement.py
+"""
+import random
+import time
+
+from shape_captcha_lib.placement import OccupancyGrid, bboxes_overlap
+
+ATTEMPTS_PER_SHAPE = 300
+MIN_DISTANCE = 3
+HALF_SIZE_RANGE = (30, 70)
+REPEATS = 20
+CONFIGS = ((1200, 750, 10), (1200, 750, 40), (750, 480, 10), (750, 480, 20), (600, 390, 14))
+
+
+def _random_bbox_at_origin():
+    half_w = random.randint(*HALF_SIZE_RANGE)
+    half_h = random.randint(*HALF_SIZE_RANGE)
+    return [-half_w, -half_h, half_w, half_h]
+
+
+def legacy_place(width: int, height: int, num_shapes: int) -> int:
+    placed = []
+    for _ in range(num_shapes):
+        for _ in range(ATTEMPTS_PER_SHAPE):
+            bbox0 = _random_bbox_at_origin()
+            min_cx, max_cx = MIN_DISTANCE - bbox0[0], width - bbox0[2] - MIN_DISTANCE
+            min_cy, max_cy = MIN_DISTANCE - bbox0[1], height - bbox0[3] - MIN_DISTANCE
+            cx, cy = random.randint(min_cx, max_cx), random.randint(min_cy, max_cy)
+            bbox = [bbox0[0] + cx, bbox0[1] + cy, bbox0[2] + cx, bbox0[3] + cy]
+            if not any(bboxes_overlap(bbox, other, MIN_DISTANCE) for other in placed):
+                placed.append(bbox)
+                break
+    return len(placed)
+
+
+def grid_place(width: int, height: int, num_shapes: int) -> int:
+    grid = OccupancyGrid(width, height, min_distance=MIN_DISTANCE)
+    for _ in range(num_shapes):
+        for _ in range(ATTEMPTS_PER_SHAPE):
+            bbox0 = _random_bbox_at_origin()
+            center = grid.sample_center(
+                bbox0,
+                MIN_DISTANCE - bbox0[0], width - bbox0[2] - MIN_DISTANCE,
+                MIN_DISTANCE - bbox0[1], height - bbox0[3] - MIN_DISTANCE
+            )
+            if center is None:
+                continue
+            cx, cy = center
+            bbox = [bbox0[0] + cx, bbox0[1] + cy, bbox0[2] + cx, bbox0[3] + cy]
+            if grid.fits(bbox):
+                grid.mark(bbox)
+                break
+    return len(grid.placed_bboxes)
+
+
+def main() -> None:
+    for width, height, num_shapes in CONFIGS:
+        for name, func in (("random retries (legacy)", legacy_place), ("occupancy grid", grid_place)):
+            random.seed(0)
+            started = time.perf_counter()
+            placed = sum(func(width, height, num_shapes) for _ in range(REPEATS))
+            elapsed = (time.perf_counter() - started) / REPEATS
+            print(f"{width}x{height} n={num_shapes:<3} {name:<24} {elapsed * 1000:8.2f} ms   "
+                  f"placed {placed / REPEATS:5.1f}/{num_shapes}")
+
+
+if __name__ == "__main__":
+    main()
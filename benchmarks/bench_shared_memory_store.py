@@ -0,0 +1,92 @@
+# benchmarks/bench_shared_memory_store.py
+"""
+SyncSharedMemoryStore против хранилищ, доступных нескольким воркерам хоста
+(SyncSqliteStore, SyncLogStore), и SyncInMemoryStore (один процесс) как нижней границы.
+Цикл store_challenge + consume_challenge с реальной записью base_model, затем
+пропускная способность при NUM_PROCESSES процессах, работающих с одним файлом.
+
+Запуск из корня репозитория: PYTHONPATH=. python benchmarks/bench_shared_memory_store.py
+"""
+import contextlib
+import logging
+import multiprocessing
+import os
+import tempfile
+import time
+
+from shape_captcha_lib.logic_core import CaptchaLogicCore
+from shape_captcha_lib.stores.log_store import SyncLogStore
+from shape_captcha_lib.stores.memory_store import SyncInMemoryStore
+from shape_captcha_lib.stores.shared_memory_store import SyncSharedMemoryStore
+from shape_captcha_lib.stores.sqlite_store import SyncSqliteStore
+
+NUM_ROUND_TRIPS = 5_000
+NUM_PROCESSES = (1, 2, 4)
+
+
+def _record():
+    logic_core = CaptchaLogicCore(model_name="base_model")
+    with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+        _, drawn_shapes, target_type = logic_core.render_challenge(seed=1)
+    return logic_core.build_stored_challenge(target_type, drawn_shapes)
+
+
+def _round_trips(store, record, prefix: str) -> float:
+    started = time.perf_counter()
+    for i in range(NUM_ROUND_TRIPS):
+        store.store_challenge(f"{prefix}{i}", record, 300)
+        assert store.consume_challenge(f"{prefix}{i}") is not None
+    return time.perf_counter() - started
+
+
+def bench(name, store_factory, record) -> None:
+    with tempfile.TemporaryDirectory() as directory:
+        store = store_factory(directory)
+        elapsed = _round_trips(store, record, "rt")
+        store.close()
+    print(f"  {name:<34} store+consume {elapsed / NUM_ROUND_TRIPS * 1e6:7.1f} us")
+
+
+def _worker(path, record, worker_id, barrier):
+    logging.disable(logging.CRITICAL)
+    store = SyncSharedMemoryStore(path)
+    barrier.wait()
+    _round_trips(store, record, f"w{worker_id}-")
+    store.close()
+
+
+def bench_processes(record, num_processes: int) -> float:
+    context = multiprocessing.get_context("fork")
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "captcha.shm")
+        SyncSharedMemoryStore(path).close()
+        barrier = context.Barrier(num_processes + 1)
+        workers = [context.Process(target=_worker, args=(path, record, worker_id, barrier))
+                   for worker_id in range(num_processes)]
+        for worker in workers:
+            worker.start()
+        barrier.wait()
+        started = time.perf_counter()
+        for worker in workers:
+            worker.join()
+        elapsed = time.perf_counter() - started
+    return num_processes * NUM_ROUND_TRIPS / elapsed
+
+
+def main() -> None:
+    logging.disable(logging.CRITICAL)
+    record = _record()
+    print(f"base_model record, {os.cpu_count()} CPU:")
+    bench("SyncInMemoryStore (compact)", lambda directory: SyncInMemoryStore(compact_records=True), record)
+    bench("SyncSharedMemoryStore (binary)", lambda directory: SyncSharedMemoryStore(
+        os.path.join(directory, "captcha.shm")), record)
+    bench("SyncSqliteStore (binary)", lambda directory: SyncSqliteStore(
+        os.path.join(directory, "captcha.sqlite3"), codec="binary"), record)
+    bench("SyncLogStore (binary)", lambda directory: SyncLogStore(directory, codec="binary"), record)
+    print("SyncSharedMemoryStore, processes sharing one file:")
+    for num_processes in NUM_PROCESSES:
+        print(f"  {num_processes} processes {bench_processes(record, num_processes):7.0f} store+consume/s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,124 @@
+# benchmarks/bench_verify.py
+"""
+Пропускная способность проверки клика (verify_solution) для разных способов:
+пересоздание фигур без префильтра (старый подход), пересоздание с префильтром по bbox,
+примитивы hit_test с префильтром и карта меток (verify_engine="hit_map").
+
+Вторая часть - синтетические списки из большого числа фигур: линейный префильтр
+по bbox против сеточного индекса, строящегося при каждой проверке.
+
+Запуск из корня репозитория: PYTHONPATH=. python benchmarks/bench_verify.py
+"""
+import contextlib
+import logging
+import os
+import random
+import time
+from typing import List
+
+from shape_captcha_lib.logic_core import CaptchaLogicCore
+
+NUM_CHALLENGES = 20
+CLICKS_PER_CHALLENGE = 200
+GRID_CELL_SIZE = 256
+SYNTHETIC_SIZES = (10, 50, 200, 1000)
+
+
+def legacy_verify(logic_core, click_x, click_y, target_type, drawn_shapes):
+    # Старый цикл: каждая фигура пересоздается, bbox не используется
+    for shape_data in reversed(drawn_shapes):
+        if logic_core._is_point_inside_stored_shape(
+            shape_data, click_x * logic_core.upscale_factor, click_y * logic_core.upscale_factor
+        ):
+            return shape_data["shape_type"] == target_type
+    return False
+
+
+def _clicks(logic_core, rng):
+    return [
+        (rng.randrange(logic_core.image_width), rng.randrange(logic_core.image_height))
+        for _ in range(CLICKS_PER_CHALLENGE)
+    ]
+
+
+def _rate(func, cases) -> float:
+    started = time.perf_counter()
+    for args in cases:
+        func(*args)
+    return len(cases) / (time.perf_counter() - started)
+
+
+def bench_models() -> List[str]:
+    lines = []
+    for model_name in ("base_model", "td_model"):
+        logic_core = CaptchaLogicCore(model_name=model_name, verify_engine="hit_map")
+        rng = random.Random(7)
+        full_cases, legacy_cases, hit_map_cases = [], [], []
+        for seed in range(NUM_CHALLENGES):
+            _, drawn_shapes, target_type = logic_core.render_challenge(seed=seed)
+            legacy_shapes = [{k: v for k, v in shape.items() if k != "hit_test"} for shape in drawn_shapes]
+            record = logic_core.build_stored_challenge(target_type, drawn_shapes)
+            for click_x, click_y in _clicks(logic_core, rng):
+                full_cases.append((click_x, click_y, target_type, drawn_shapes))
+                legacy_cases.append((click_x, click_y, target_type, legacy_shapes))
+                hit_map_cases.append((record, click_x, click_y))
+
+        results = (
+            ("re-instantiate, no bbox prefilter",
+             _rate(lambda *args: legacy_verify(logic_core, *args), legacy_cases)),
+            ("re-instantiate + bbox prefilter", _rate(logic_core.verify_solution, legacy_cases)),
+            ("hit_test + bbox prefilter", _rate(logic_core.verify_solution, full_cases)),
+            ("hit_map lookup", _rate(logic_core.verify_hit_map_record, hit_map_cases)),
+        )
+        lines.append(f"{model_name} ({logic_core.num_shapes_on_image_config} shapes requested):")
+        lines.extend(f"  {name:<36} {rate:10.0f} verifies/s" for name, rate in results)
+    return lines
+
+
+def _synthetic_bboxes(num_shapes, rng):
+    bboxes = []
+    for _ in range(num_shapes):
+        x, y, size = rng.uniform(0, 3000), rng.uniform(0, 2000), rng.uniform(60, 150)
+        bboxes.append([x, y, x + size, y + size])
+    return bboxes
+
+
+def linear_candidates(bboxes, x, y):
+    return [i for i in range(len(bboxes) - 1, -1, -1)
+            if bboxes[i][0] <= x <= bboxes[i][2] and bboxes[i][1] <= y <= bboxes[i][3]]
+
+
+def grid_candidates(bboxes, x, y):
+    # Индекс строится на каждую проверку: запись CAPTCHA читается из хранилища заново
+    index = {}
+    for i, bbox in enumerate(bboxes):
+        for cell_x in range(int(bbox[0] // GRID_CELL_SIZE), int(bbox[2] // GRID_CELL_SIZE) + 1):
+            for cell_y in range(int(bbox[1] // GRID_CELL_SIZE), int(bbox[3] // GRID_CELL_SIZE) + 1):
+                index.setdefault((cell_x, cell_y), []).append(i)
+    return [i for i in reversed(index.get((int(x // GRID_CELL_SIZE), int(y // GRID_CELL_SIZE)), []))
+            if bboxes[i][0] <= x <= bboxes[i][2] and bboxes[i][1] <= y <= bboxes[i][3]]
+
+
+def bench_synthetic() -> List[str]:
+    rng = random.Random(11)
+    lines = ["synthetic bbox lists (candidate lookup only):"]
+    for num_shapes in SYNTHETIC_SIZES:
+        bboxes = _synthetic_bboxes(num_shapes, rng)
+        cases = [(bboxes, rng.uniform(0, 3000), rng.uniform(0, 2000)) for _ in range(500)]
+        lines.append(
+            f"  {num_shapes:>5} shapes: linear {_rate(linear_candidates, cases):10.0f}/s   "
+            f"grid built per call {_rate(grid_candidates, cases):10.0f}/s"
+        )
+    return lines
+
+
+def main() -> None:
+    logging.disable(logging.CRITICAL)
+    # RhombusShape.is_point_inside печатает отладочный вывод - глушим его на время замеров
+    with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+        lines = bench_models() + bench_synthetic()
+    print("\n".join(lines))
+
+
+if __name__ == "__main__":
+    main()
@@ -10,7 +10,6 @@ import redis.asyncio as redis
 from PIL.Image import Image as PILImage 
 
 from .image_generator import (
-    generate_captcha_image,
     DEFAULT_CAPTCHA_WIDTH,
     DEFAULT_CAPTCHA_HEIGHT,
     DEFAULT_UPSCALE_FACTOR,
@@ -18,6 +17,7 @@ from .image_generator import (
 )
 from .utils import geometry_utils 
 from .registry import get_model_shape_types, get_shape_class 
+from .services.render_executor import AbstractRenderExecutor, InlineRenderExecutor
 
 logger = logging.getLogger(__name__)
 DEFAULT_CAPTCHA_TTL_SECONDS = 300
@@ -31,9 +31,12 @@ class CaptchaChallengeService:
         captcha_image_width: int = DEFAULT_CAPTCHA_WIDTH,
         captcha_image_height: int = DEFAULT_CAPTCHA_HEIGHT,
         captcha_upscale_factor: int = DEFAULT_UPSCALE_FACTOR,
-        num_shapes_on_image: int = NUM_SHAPES_TO_DRAW
+        num_shapes_on_image: int = NUM_SHAPES_TO_DRAW,
+        render_executor: Optional[AbstractRenderExecutor] = None
     ):
         self.redis_client = redis_client
+        # Исполнитель генерации (пул потоков/процессов). По умолчанию генерация идет прямо в event loop.
+        self.render_executor = render_executor or InlineRenderExecutor()
         self.captcha_ttl = captcha_ttl_seconds
         self.image_width = captcha_image_width
         self.image_height = captcha_image_height
@@ -104,7 +107,7 @@ class CaptchaChallengeService:
         
         logger.info(f"For model '{self.model_name}', attempting to generate image with {actual_num_shapes_to_draw} shapes.")
         
-        image_object, drawn_shapes_info_list = generate_captcha_image(
+        image_object, drawn_shapes_info_list = await self.render_executor.generate(dict(
             model_name=self.model_name,
             model_shape_types=self.current_model_shape_types,
             model_available_colors=self.current_model_colors,
@@ -112,7 +115,7 @@ class CaptchaChallengeService:
             final_height=self.image_height,
             num_shapes=actual_num_shapes_to_draw, 
             upscale_factor=self.upscale_factor,
-        )
+        ))
         
         if not drawn_shapes_info_list:
             logger.error(f"Failed to generate any shapes for the CAPTCHA challenge with model '{self.model_name}'.")
@@ -173,6 +176,7 @@ class CaptchaChallengeService:
                     f"Target type from challenge: '{target_shape_type_from_challenge}'")
 
         clicked_correct_shape = False
+        hit_this_shape = False
         # Итерируем в обратном порядке, чтобы сначала проверять фигуры "сверху" (последние нарисованные)
         for shape_data_dict in reversed(all_drawn_shapes_data):
             shape_type_on_image = shape_data_dict.get("shape_type")
@@ -183,226 +187,34 @@ class CaptchaChallengeService:
                 logger.warning(f"Skipping shape with missing data in verify_solution: {shape_data_dict}")
                 continue
             
+            # Префильтр по bbox: фигура не может содержать клик вне своего bbox
+            bbox = shape_data_dict.get("bbox_upscaled")
+            if bbox is not None and not (
+                bbox[0] <= upscaled_click_x <= bbox[2] and bbox[1] <= upscaled_click_y <= bbox[3]
+            ):
+                continue
+
             hit_this_shape = False
+            hit_test_primitives = shape_data_dict.get("hit_test")
             try:
-                ShapeClass = get_shape_class(self.model_name, shape_type_on_image)
-                if ShapeClass:
+                ShapeClass = get_shape_class(self.model_name, shape_type_on_image) if hit_test_primitives is None else None
+                if hit_test_primitives is not None:
+                    # Примитивы кликабельной области сохранены при генерации - фигуру пересоздавать не нужно
+                    hit_this_shape = geometry_utils.is_point_in_hit_test(
+                        upscaled_click_x, upscaled_click_y, hit_test_primitives
+                    )
+                elif ShapeClass:
                     logger.debug(f"Using ShapeClass '{ShapeClass.__name__}' for verification of type '{shape_type_on_image}'.")
-                    try: 
-                        # Общие аргументы для __init__ большинства фигур
-                        init_args_common = {
-                            "color_name_or_rgb": color_from_storage,
-                            "rotation_angle_rad": params_from_storage.get("rotation_rad", 0.0)
-                            # cx_upscaled и cy_upscaled будут добавлены ниже
-                        }
-                        specific_size_params = {} 
-                        params_are_valid = True # Инициализируем флаг для каждой фигуры
-
-                        # 1. Обработка фигур со специфичными именами ключей для координат центра
-                        if shape_type_on_image == "cylinder":
-                            init_args_common["cx_upscaled"] = params_from_storage.get("cx_top")
-                            init_args_common["cy_upscaled"] = params_from_storage.get("cy_top")
-                            if not (isinstance(init_args_common["cx_upscaled"], (int, float)) and isinstance(init_args_common["cy_upscaled"], (int, float))):
-                                logger.warning(f"Missing 'cx_top' or 'cy_top' for cylinder {shape_data_dict}.")
-                                params_are_valid = False
-                            if params_are_valid:
-                                required_keys = ["radius", "height", "perspective_factor_ellipse"]
-                                if all(k in params_from_storage for k in required_keys):
-                                    for k in required_keys: specific_size_params[k] = params_from_storage[k]
-                                    opt_keys = ["top_brightness_factor", "side_gradient_start_factor", "side_gradient_end_factor"]
-                                    for k_opt in opt_keys:
-                                        if k_opt in params_from_storage: specific_size_params[k_opt] = params_from_storage[k_opt]
-                                else: params_are_valid = False; logger.warning(f"Missing dimensions for cylinder {shape_data_dict}.")
-                        
-                        elif shape_type_on_image == "cone":
-                            init_args_common["cx_upscaled"] = params_from_storage.get("cx_base")
-                            init_args_common["cy_upscaled"] = params_from_storage.get("cy_base")
-                            if not (isinstance(init_args_common["cx_upscaled"], (int, float)) and isinstance(init_args_common["cy_upscaled"], (int, float))):
-                                logger.warning(f"Missing 'cx_base' or 'cy_base' for cone {shape_data_dict}.")
-                                params_are_valid = False
-                            if params_are_valid:
-                                required_keys = ["base_radius", "height", "perspective_factor_base"]
-                                if all(k in params_from_storage for k in required_keys):
-                                    for k in required_keys: specific_size_params[k] = params_from_storage[k]
-                                    opt_keys = ["side_gradient_start_factor", "side_gradient_end_factor"]
-                                    for k_opt in opt_keys:
-                                        if k_opt in params_from_storage: specific_size_params[k_opt] = params_from_storage[k_opt]
-                                else: params_are_valid = False; logger.warning(f"Missing dimensions for cone {shape_data_dict}.")
-
-                        elif shape_type_on_image == "pyramid":
-                            init_args_common["cx_upscaled"] = params_from_storage.get("cx_base")
-                            init_args_common["cy_upscaled"] = params_from_storage.get("cy_base")
-                            if not (isinstance(init_args_common["cx_upscaled"], (int, float)) and isinstance(init_args_common["cy_upscaled"], (int, float))):
-                                logger.warning(f"Missing 'cx_base' or 'cy_base' for pyramid {shape_data_dict}.")
-                                params_are_valid = False
-                            if params_are_valid: 
-                                required_keys = ["base_side", "height", "depth_factor_base"]
-                                if all(k in params_from_storage for k in required_keys):
-                                    for k in required_keys: specific_size_params[k] = params_from_storage[k]
-                                    opt_keys = ["face_brightness_factors", "base_brightness_factor"]
-                                    for k_opt in opt_keys:
-                                        if k_opt in params_from_storage: specific_size_params[k_opt] = params_from_storage[k_opt]
-                                else:
-                                    logger.warning(f"Missing one of {required_keys} for pyramid {shape_data_dict}.")
-                                    params_are_valid = False
-                        
-                        # 2. Фигуры, использующие стандартные 'cx', 'cy'
-                        else: 
-                            init_args_common["cx_upscaled"] = params_from_storage.get("cx")
-                            init_args_common["cy_upscaled"] = params_from_storage.get("cy")
-                            if not (isinstance(init_args_common["cx_upscaled"], (int, float)) and isinstance(init_args_common["cy_upscaled"], (int, float))):
-                                logger.warning(f"Missing 'cx' or 'cy' for {shape_type_on_image} {shape_data_dict}.")
-                                params_are_valid = False
-                            
-                            if params_are_valid: # Только если общие cx/cy в порядке
-                                if shape_type_on_image == "circle" or shape_type_on_image == "sphere":
-                                    if "r" in params_from_storage: specific_size_params["radius"] = params_from_storage["r"]
-                                    else: params_are_valid = False; logger.warning(f"Missing 'r' for {shape_type_on_image} {shape_data_dict}.")
-                                elif shape_type_on_image == "square":
-                                    if "side" in params_from_storage: specific_size_params["side"] = params_from_storage["side"]
-                                    else: params_are_valid = False; logger.warning(f"Missing 'side' for square {shape_data_dict}.")
-                                elif shape_type_on_image == "rectangle": 
-                                    if "width" in params_from_storage and "height" in params_from_storage:
-                                        specific_size_params["width"] = params_from_storage["width"]
-                                        specific_size_params["height"] = params_from_storage["height"]
-                                    else: params_are_valid = False; logger.warning(f"Missing 'width' or 'height' for rectangle {shape_data_dict}.")
-                                elif shape_type_on_image == "equilateral_triangle":
-                                    if "side_length" in params_from_storage: specific_size_params["side_length"] = params_from_storage["side_length"]
-                                    else: params_are_valid = False; logger.warning(f"Missing 'side_length' for equilateral_triangle {shape_data_dict}.")
-                                elif shape_type_on_image == "pentagon" or shape_type_on_image == "hexagon":
-                                    if "radius" in params_from_storage: specific_size_params["radius"] = params_from_storage["radius"]
-                                    else: params_are_valid = False; logger.warning(f"Missing 'radius' for {shape_type_on_image} {shape_data_dict}.")
-                                elif shape_type_on_image == "star5":
-                                    if "outer_radius" in params_from_storage and "inner_radius" in params_from_storage:
-                                        specific_size_params["outer_radius"] = params_from_storage["outer_radius"]
-                                        specific_size_params["inner_radius"] = params_from_storage["inner_radius"]
-                                    else: params_are_valid = False; logger.warning(f"Missing radii for star5 {shape_data_dict}.")
-                                elif shape_type_on_image == "rhombus":
-                                    if "d1" in params_from_storage and "d2" in params_from_storage:
-                                        specific_size_params["d1"] = params_from_storage["d1"]
-                                        specific_size_params["d2"] = params_from_storage["d2"]
-                                    else: params_are_valid = False; logger.warning(f"Missing d1/d2 for rhombus {shape_data_dict}.")
-                                elif shape_type_on_image == "trapezoid":
-                                    if "height" in params_from_storage and "bottom_width" in params_from_storage and "top_width" in params_from_storage:
-                                        specific_size_params["height"] = params_from_storage["height"]
-                                        specific_size_params["bottom_width"] = params_from_storage["bottom_width"]
-                                        specific_size_params["top_width"] = params_from_storage["top_width"]
-                                    else: params_are_valid = False; logger.warning(f"Missing dimensions for trapezoid {shape_data_dict}.")
-                                elif shape_type_on_image == "cross":
-                                    if "size" in params_from_storage and "thickness" in params_from_storage:
-                                        specific_size_params["size"] = params_from_storage["size"]
-                                        specific_size_params["thickness"] = params_from_storage["thickness"]
-                                    else: params_are_valid = False; logger.warning(f"Missing size/thickness for cross {shape_data_dict}.")
-                                elif shape_type_on_image == "cube": 
-                                    if "side" in params_from_storage and "depth_factor" in params_from_storage:
-                                        specific_size_params["side"] = params_from_storage["side"]
-                                        specific_size_params["depth_factor"] = params_from_storage["depth_factor"]
-                                        bf_keys = ["top_face_brightness_factor", "side_face_brightness_factor"]
-                                        for k_bf in bf_keys:
-                                            if k_bf in params_from_storage: specific_size_params[k_bf] = params_from_storage[k_bf]
-                                    else: params_are_valid = False; logger.warning(f"Missing params for cube {shape_data_dict}.")
-                                elif shape_type_on_image == "cuboid": # Добавлен Cuboid
-                                    if "width" in params_from_storage and "height" in params_from_storage and "depth" in params_from_storage:
-                                        specific_size_params["width"] = params_from_storage["width"]
-                                        specific_size_params["height"] = params_from_storage["height"]
-                                        specific_size_params["depth"] = params_from_storage["depth"]
-                                        opt_keys = ["depth_factor_visual", "top_face_brightness_factor", "side_face_brightness_factor"]
-                                        for k_opt in opt_keys:
-                                            if k_opt in params_from_storage: specific_size_params[k_opt] = params_from_storage[k_opt]
-                                    else: params_are_valid = False; logger.warning(f"Missing dimensions for cuboid {shape_data_dict}.")
-
-                                elif shape_type_on_image == "octahedron":
-                                    # cx_upscaled и cy_upscaled уже должны быть установлены в init_args_common
-                                    # из params_from_storage.get("cx") и params_from_storage.get("cy")
-                                    # в родительском блоке 'else'.
-                                    # Проверяем наличие специфичных размеров.
-                                    required_keys = ["size"] # Основной параметр для OctahedronShape
-                                    if all(k in params_from_storage for k in required_keys):
-                                        for k in required_keys:
-                                            specific_size_params[k] = params_from_storage[k]
-                                        # Опциональные параметры
-                                        optional_keys = ["tilt_angle_rad", "perspective_factor_z", "brightness_factors"]
-                                        for k_opt in optional_keys:
-                                            if k_opt in params_from_storage:
-                                                specific_size_params[k_opt] = params_from_storage[k_opt]
-                                    else:
-                                        logger.warning(f"Missing 'size' for octahedron {shape_data_dict}.")
-                                        params_are_valid = False # Используйте имя вашего флага валидности
-
-                                elif shape_type_on_image == "torus": # <--- ОБНОВЛЕННЫЙ БЛОК
-                                    # cx_upscaled и cy_upscaled берутся из общих params_from_storage.get("cx"), .get("cy")
-                                    # в родительском блоке 'else' (Torus использует стандартные cx/cy)
-                                    if not (isinstance(init_args_common.get("cx_upscaled"), (int, float)) and \
-                                            isinstance(init_args_common.get("cy_upscaled"), (int, float))):
-                                        logger.warning(f"Missing 'cx' or 'cy' for torus {shape_data_dict}.")
-                                        params_are_valid = False # Используйте имя вашего флага валидности
-                                    if params_are_valid:
-                                        # perspective_factor больше не нужен для __init__
-                                        required_keys = ["outer_radius", "tube_radius"] 
-                                        if all(k in params_from_storage for k in required_keys):
-                                            for k in required_keys: specific_size_params[k] = params_from_storage[k]
-                                            # Опциональные факторы яркости
-                                            opt_keys = ["highlight_factor", "shadow_factor"] 
-                                            for k_opt in opt_keys:
-                                                if k_opt in params_from_storage: specific_size_params[k_opt] = params_from_storage[k_opt]
-                                        else:
-                                            logger.warning(f"Missing one of {required_keys} for torus {shape_data_dict}.")
-                                            params_are_valid = False
-
-                                elif shape_type_on_image == "cross_3d": # <--- НОВЫЙ БЛОК
-                                    # cx_upscaled и cy_upscaled берутся из общих params_from_storage.get("cx"), .get("cy")
-                                    # в родительском блоке 'else' (если cross_3d не требует особых имен для cx/cy)
-                                    if not (isinstance(init_args_common.get("cx_upscaled"), (int, float)) and \
-                                        isinstance(init_args_common.get("cy_upscaled"), (int, float))):
-                                        logger.warning(f"Missing 'cx' or 'cy' for cross_3d {shape_data_dict}.")
-                                        params_are_valid = False
-
-                                    if params_are_valid:
-                                        required_keys = ["arm_length", "arm_thickness", "depth_factor"]
-                                        if all(k in params_from_storage for k in required_keys):
-                                            for k in required_keys: specific_size_params[k] = params_from_storage[k]
-                                            opt_keys = ["top_face_brightness_factor", "side_face_brightness_factor"]
-                                            for k_opt in opt_keys:
-                                                if k_opt in params_from_storage: specific_size_params[k_opt] = params_from_storage[k_opt]
-                                        else:
-                                            logger.warning(f"Missing one of {required_keys} for cross_3d {shape_data_dict}.")
-                                            params_are_valid = False
-
-                                elif shape_type_on_image == "star5_3d": # <--- НОВЫЙ БЛОК
-                                    # cx_upscaled и cy_upscaled уже должны быть установлены из params_from_storage.get("cx") и .get("cy")
-                                    if params_are_valid: # Проверяем, что cx/cy были успешно извлечены ранее
-                                        required_keys = ["outer_radius", "inner_radius", "depth_factor"]
-                                        if all(k in params_from_storage for k in required_keys):
-                                            for k in required_keys: specific_size_params[k] = params_from_storage[k]
-                                            opt_keys = ["top_face_brightness_factor", "side_face_brightness_factor"]
-                                            for k_opt in opt_keys:
-                                                if k_opt in params_from_storage: specific_size_params[k_opt] = params_from_storage[k_opt]
-                                        else:
-                                            logger.warning(f"Missing one of {required_keys} for star5_3d {shape_data_dict}.")
-                                            params_are_valid = False
-
-                                # TODO: Добавьте сюда elif для других реализованных классов td_model
-                                else: 
-                                    logger.warning(f"ShapeClass '{ShapeClass.__name__}' type '{shape_type_on_image}' (uses std cx/cy) "
-                                                   "has no specific size param extraction logic in verify_solution.")
-                                    params_are_valid = False 
-                        
-                        if not params_are_valid:
-                            logger.info(f"Skipping shape {shape_type_on_image} due to missing/invalid parameters after specific handling.")
-                            continue 
-                        
-                        final_init_args = {**init_args_common, **specific_size_params}
-                        
-                        shape_instance = ShapeClass(**final_init_args)
+                    try:
+                        # from_storage переводит ключи старого формата (cx/cy, r, cx_top, cx_base...)
+                        # в аргументы конструктора; загрузчик подготовлен в registry.discover_shapes()
+                        shape_instance = ShapeClass.from_storage(params_from_storage, color_from_storage)
                         hit_this_shape = shape_instance.is_point_inside(upscaled_click_x, upscaled_click_y)
-                    
-                    except KeyError as e_key:
-                        logger.error(f"KeyError during shape re-instantiation for {shape_type_on_image}: {e_key}. Params: {params_from_storage}", exc_info=True)
-                    except TypeError as e_type:
-                         logger.error(f"TypeError during shape re-instantiation for {shape_type_on_image}: {e_type}. Args: {final_init_args if 'final_init_args' in locals() else init_args_common if 'init_args_common' in locals() else 'unknown'}", exc_info=True)
+                    except (TypeError, ValueError) as e_params:
+                        logger.warning(f"Skipping shape {shape_type_on_image} due to missing/invalid parameters: {e_params}. Params: {params_from_storage}")
                     except Exception as e_inst:
                         logger.error(f"Failed to re-instantiate or check shape {shape_type_on_image}: {e_inst}", exc_info=True)
-                
+
                 # --- Старая логика для фигур, которые ЕЩЕ не классы, или если ShapeClass не был найден ---
                 elif shape_type_on_image == "sphere" and not ShapeClass: # Это условие теперь маловероятно, т.к. Sphere - класс
                     if all(k in params_from_storage for k in ["cx", "cy", "r"]):
@@ -0,0 +1,173 @@
+# shape_captcha_lib/hit_map.py
+import base64
+import binascii
+import math
+import struct
+import zlib
+from typing import Any, Dict, List, Optional, Sequence
+import logging
+
+from PIL import Image, ImageDraw
+
+logger = logging.getLogger(__name__)
+
+# Во сколько раз карта меньше финального изображения. При 4 запись base_model занимает
+# ~540 символов (полная запись all_drawn_shapes - ~3.2 КБ), а расхождение с точной
+# геометрией - ~0.4% случайных кликов, все у границ фигур; точнее - меньший масштаб
+DEFAULT_HIT_MAP_SCALE = 4
+MAX_HIT_MAP_SHAPES = 255 # Метка хранится в одном байте, 0 - фон
+
+HIT_MAP_BAND_ROWS = 32 # Строк карты в одной независимо сжатой полосе
+
+# Заголовок: ширина, высота, масштаб карты, строк в полосе; далее концы сжатых полос (uint32) и сами полосы
+_HEADER = struct.Struct(">HHBB")
+
+
+def render_hit_map(
+    drawn_shapes: Sequence[Dict[str, Any]],
+    final_width: int,
+    final_height: int,
+    upscale_factor: int,
+    scale: int = DEFAULT_HIT_MAP_SCALE
+) -> Optional[Image.Image]:
+    """
+    Рисует карту меток (режим "L"): пиксель содержит номер (с 1) верхней фигуры
+    в этой точке, 0 - фон. Фигуры рисуются в порядке отрисовки по их примитивам
+    hit_test, поэтому перекрытия учитываются так же, как на изображении.
+
+    Returns:
+        Карта размером (final_width // scale, final_height // scale) или None,
+        если у какой-то фигуры нет примитивов hit_test или фигур слишком много.
+    """
+    if len(drawn_shapes) > MAX_HIT_MAP_SHAPES:
+        logger.warning(f"Hit map supports at most {MAX_HIT_MAP_SHAPES} shapes, got {len(drawn_shapes)}.")
+        return None
+    if scale <= 0:
+        raise ValueError("Hit map scale must be positive")
+
+    # Координаты карты: точка (x, y) карты соответствует клику (x * scale, y * scale)
+    # на финальном изображении, т.е. точке (x * scale * upscale_factor, ...) на увеличенном холсте
+    factor = float(upscale_factor * scale)
+    label_map = Image.new("L", (max(1, final_width // scale), max(1, final_height // scale)), 0)
+    draw = ImageDraw.Draw(label_map)
+
+    for label, shape_data in enumerate(drawn_shapes, start=1):
+        primitives = shape_data.get("hit_test")
+        if not primitives:
+            logger.debug(f"Shape '{shape_data.get('shape_type')}' has no hit-test primitives; hit map not available.")
+            return None
+        # Примитивы одной фигуры рисуются одной меткой (объединение); более поздние фигуры перекрывают ранние
+        for primitive in primitives:
+            _draw_primitive(label_map, draw, primitive, label, factor)
+    return label_map
+
+
+def _draw_primitive(label_map: Image.Image, draw: ImageDraw.ImageDraw, primitive: List[Any], label: int, factor: float) -> None:
+    """Рисует примитив (см. geometry_utils.is_point_in_hit_test) меткой label."""
+    kind = primitive[0]
+    if kind == "polygon":
+        points = [value / factor for value in primitive[1:]]
+        if len(points) >= 6:
+            draw.polygon(points, fill=label)
+    elif kind == "circle":
+        _, cx, cy, r = primitive
+        if r > 0:
+            draw.ellipse(_ellipse_box(cx, cy, r, r, factor), fill=label)
+    elif kind == "ellipse":
+        cx, cy, rx, ry = primitive[1:5]
+        if rx <= 0 or ry <= 0:
+            return
+        if len(primitive) < 6:
+            draw.ellipse(_ellipse_box(cx, cy, rx, ry, factor), fill=label)
+            return
+        # Эллипс, обрезанный сверху по y_min: рисуем маску и стираем строки с y * factor < y_min
+        mask = Image.new("1", label_map.size, 0)
+        mask_draw = ImageDraw.Draw(mask)
+        mask_draw.ellipse(_ellipse_box(cx, cy, rx, ry, factor), fill=1)
+        clip_rows = math.ceil(primitive[5] / factor)
+        if clip_rows > 0:
+            mask_draw.rectangle((0, 0, label_map.width, clip_rows - 1), fill=0)
+        label_map.paste(label, (0, 0, label_map.width, label_map.height), mask)
+    elif kind == "annulus":
+        _, cx, cy, r_outer, r_inner = primitive
+        if r_outer <= 0:
+            return
+        # Отверстие должно оставить видимым то, что под кольцом, поэтому рисуем через маску
+        mask = Image.new("1", label_map.size, 0)
+        mask_draw = ImageDraw.Draw(mask)
+        mask_draw.ellipse(_ellipse_box(cx, cy, r_outer, r_outer, factor), fill=1)
+        if r_inner > 0:
+            mask_draw.ellipse(_ellipse_box(cx, cy, r_inner, r_inner, factor), fill=0)
+        label_map.paste(label, (0, 0, label_map.width, label_map.height), mask)
+    else:
+        raise ValueError(f"Unknown hit-test primitive '{kind}'")
+
+
+def _ellipse_box(cx: float, cy: float, rx: float, ry: float, factor: float) -> List[float]:
+    return [(cx - rx) / factor, (cy - ry) / factor, (cx + rx) / factor, (cy + ry) / factor]
+
+
+def encode_hit_map(
+    label_map: Image.Image,
+    scale: int = DEFAULT_HIT_MAP_SCALE,
+    band_rows: int = HIT_MAP_BAND_ROWS
+) -> str:
+    """
+    Сжимает карту меток в ASCII-строку (base64) для хранилища.
+    Карта сжимается полосами по band_rows строк (zlib), чтобы при проверке
+    декодировать и распаковывать только одну полосу, а не всю карту.
+    Число строк в полосе пишется в заголовок, поэтому его можно менять без порчи сохраненных карт.
+    """
+    width, height = label_map.size
+    raw = label_map.tobytes()
+    if not 0 < band_rows <= 255:
+        raise ValueError("Hit map band_rows must be between 1 and 255")
+    band_bytes = width * band_rows
+    bands = [zlib.compress(raw[offset:offset + band_bytes], 9) for offset in range(0, len(raw), band_bytes)]
+    band_ends = []
+    band_end = 0
+    for band in bands:
+        band_end += len(band)
+        band_ends.append(band_end)
+    header = _HEADER.pack(width, height, scale, band_rows) + struct.pack(f">{len(bands)}I", *band_ends)
+    return base64.b64encode(header + b"".join(bands)).decode("ascii")
+
+
+def _b64_slice(encoded: str, start: int, end: int) -> bytes:
+    """Декодирует байты [start, end) base64-строки, не декодируя ее целиком (группы по 3 байта = 4 символа)."""
+    first_group = start // 3
+    decoded = base64.b64decode(encoded[first_group * 4:-(-end // 3) * 4])
+    return decoded[start - first_group * 3:end - first_group * 3]
+
+
+def lookup_hit_map(encoded_hit_map: str, click_x: int, click_y: int) -> Optional[int]:
+    """
+    Возвращает индекс фигуры (с 0) под кликом в координатах финального изображения,
+    -1 для фона или None, если карта повреждена.
+    """
+    try:
+        width, height, scale, band_rows = _HEADER.unpack(_b64_slice(encoded_hit_map, 0, _HEADER.size))
+        if scale <= 0 or width <= 0 or band_rows <= 0:
+            return None
+        map_x, map_y = click_x // scale, click_y // scale
+        if not (0 <= map_x < width and 0 <= map_y < height):
+            return -1
+
+        num_bands = -(-height // band_rows)
+        data_start = _HEADER.size + 4 * num_bands
+        band_index, row_in_band = divmod(map_y, band_rows)
+        # Границы полосы: конец предыдущей и конец текущей
+        bounds_start = _HEADER.size + 4 * (band_index - 1) if band_index else _HEADER.size
+        bounds = _b64_slice(encoded_hit_map, bounds_start, _HEADER.size + 4 * (band_index + 1))
+        band_start, band_end = struct.unpack(">II", bounds) if band_index else (0, struct.unpack(">I", bounds)[0])
+
+        # Распаковываем полосу только до нужного байта
+        needed = row_in_band * width + map_x + 1
+        band = zlib.decompressobj().decompress(
+            _b64_slice(encoded_hit_map, data_start + band_start, data_start + band_end), needed
+        )
+    except (binascii.Error, ValueError, struct.error, zlib.error):
+        return None
+    if len(band) != needed:
+        return None
+    return band[-1] - 1
@@ -1,5 +1,5 @@
 # shape_captcha_lib/image_generator.py
-from PIL import Image, ImageDraw, ImageFont
+from PIL import Image, ImageChops, ImageDraw
 import random
 import math
 from typing import List, Dict, Any, Tuple, Union, Optional
@@ -8,8 +8,9 @@ import string
 import os
 # Импорты из вашего пакета
 from . import registry # Для доступа к get_shape_class
+from .placement import OccupancyGrid
 from .shapes.abc import ShapeDrawingDetails # Для аннотации возвращаемого типа
-from .utils import color_utils
+from .utils import color_utils, font_utils
 
 logger = logging.getLogger(__name__)
 
@@ -22,8 +23,20 @@ DEFAULT_UPSCALE_FACTOR = 3
 TARGET_MIN_FINAL_SHAPE_DIM = 30 # Минимальный "основной" размер фигуры на финальном изображении
 TARGET_MAX_FINAL_SHAPE_DIM = 50 # Максимальный "основной" размер
 
+# Версия алгоритма раскладки. Увеличивается при любом изменении, после которого
+# одно и то же зерно дает другую раскладку (записи только с зерном становятся недействительны).
+LAYOUT_ALGORITHM_VERSION = 1
+
 MAX_PLACEMENT_ATTEMPTS_PER_SHAPE = 300
 MAX_SIZE_REDUCTION_ATTEMPTS = 4
+# Сколько раз подряд сетка занятости может не найти места (при разных поворотах), прежде чем уменьшать размер
+MAX_NO_FIT_ATTEMPTS_PER_SIZE = 8
+
+# Способы уменьшения увеличенного холста до финального размера:
+# "lanczos" - лучшее сглаживание, самый медленный; "reduce" - усреднение блоков
+# upscale_factor x upscale_factor (Image.reduce), самый быстрый; "bilinear" - промежуточный.
+DOWNSAMPLE_MODES = ("lanczos", "reduce", "bilinear")
+DEFAULT_DOWNSAMPLE_MODE = "lanczos"
 
 LIGHT_BACKGROUND_COLORS: List[Union[str, Tuple[int, int, int]]] = [
     (248, 249, 250), (250, 250, 250), (240, 248, 255), (250, 250, 210),
@@ -95,19 +108,87 @@ def _get_default_font_path():
 
 DEFAULT_FONT_PATH = _get_default_font_path()
 
-DEFAULT_FONT_PATH = _get_default_font_path()
-
-def _check_overlap(bbox1: List[float], bbox2: List[float], min_distance: int) -> bool:
-    # bbox теперь List[float] из ShapeDrawingDetails
-    if not bbox1 or not bbox2 or len(bbox1) != 4 or len(bbox2) != 4:
-        logger.warning(f"Invalid bbox provided to _check_overlap: bbox1={bbox1}, bbox2={bbox2}")
-        return True
-    b1_x1, b1_y1, b1_x2, b1_y2 = bbox1
-    b2_x1, b2_y1, b2_x2, b2_y2 = bbox2
-    return not (
-        b1_x2 + min_distance < b2_x1 or b1_x1 - min_distance > b2_x2 or
-        b1_y2 + min_distance < b2_y1 or b1_y1 - min_distance > b2_y2
+def _downsample(image: Image.Image, final_size: Tuple[int, int], upscale_factor: int, downsample_mode: str) -> Image.Image:
+    """Уменьшает увеличенный холст до финального размера выбранным способом."""
+    if downsample_mode == "reduce":
+        if image.size == (final_size[0] * upscale_factor, final_size[1] * upscale_factor):
+            # Целочисленный коэффициент: усреднение блоков без ядра свертки
+            return image.reduce(upscale_factor)
+        return image.resize(final_size, Image.Resampling.BOX)
+    if downsample_mode == "bilinear":
+        return image.resize(final_size, Image.Resampling.BILINEAR)
+    return image.resize(final_size, Image.Resampling.LANCZOS)
+
+def _apply_point_noise(image: Image.Image, density: float, rng: Any = random) -> None:
+    """
+    Накладывает серый точечный шум на изображение (in-place).
+    Маска и значения шума строятся целыми буферами и накладываются одним paste,
+    вместо вызова putpixel для каждого пикселя.
+    """
+    num_pixels = image.width * image.height
+    # Пиксель попадает в маску, если 16-битное случайное число меньше порога: плотность задается
+    # с шагом 1/65536. Число читается как пара байтов "LA" (младший, старший), и сравнение
+    # value < threshold раскладывается на high < t_high или (high == t_high и low < t_low)
+    threshold = max(0, min(65536, round(density * 65536)))
+    threshold_high, threshold_low = divmod(threshold, 256)
+    low_bytes, high_bytes = Image.frombytes("LA", image.size, rng.randbytes(2 * num_pixels)).split()
+    noise_mask = ImageChops.lighter(
+        high_bytes.point([255 if value < threshold_high else 0 for value in range(256)]),
+        ImageChops.multiply(
+            high_bytes.point([255 if value == threshold_high else 0 for value in range(256)]),
+            low_bytes.point([255 if value < threshold_low else 0 for value in range(256)])
+        )
     )
+    # Шум - оттенки серого, как и раньше
+    noise_values = Image.frombytes("L", image.size, rng.randbytes(num_pixels))
+    image.paste(Image.merge("RGB", (noise_values, noise_values, noise_values)), (0, 0), noise_mask)
+
+def _draw_watermark_text(overlay: Image.Image, text: Optional[str], num_lines: int, rng: Any = random) -> None:
+    """
+    Накладывает повернутые полупрозрачные строки водяного знака на RGBA-слой помех.
+    Шрифт и повернутые маски строк берутся из кэшей font_utils, поэтому текст
+    не растеризуется и не поворачивается заново на каждую CAPTCHA.
+    """
+    font_size = int(overlay.height * DEFAULT_WATERMARK_FONT_SIZE_RATIO)
+    word_bank = None
+
+    for _ in range(num_lines):
+        text_to_draw = text
+        if not text_to_draw: # Берем случайный текст из заранее сгенерированного набора
+            word_bank = word_bank or font_utils.get_watermark_word_bank(WATERMARK_CANDIDATE_CHARS)
+            text_to_draw = rng.choice(word_bank)
+
+        angle = rng.choice(font_utils.WATERMARK_ANGLE_BUCKETS)
+        text_mask = font_utils.get_rotated_text_mask(
+            DEFAULT_FONT_PATH, font_size, text_to_draw, angle, DEFAULT_WATERMARK_OPACITY
+        )
+        if text_mask is None:
+            continue
+
+        base_wm_color_val = rng.randint(100, 180) # Оттенки серого для водяного знака
+        text_sprite = Image.new('RGBA', text_mask.size, (base_wm_color_val, base_wm_color_val, base_wm_color_val, 0))
+        text_sprite.putalpha(text_mask)
+
+        pos_x = rng.randint(0, max(0, overlay.width - text_sprite.width))
+        pos_y = rng.randint(0, max(0, overlay.height - text_sprite.height))
+
+        # Текст может не поместиться в слой целиком: обрезаем до видимой части
+        visible_width = min(text_sprite.width, overlay.width - pos_x)
+        visible_height = min(text_sprite.height, overlay.height - pos_y)
+        overlay.alpha_composite(text_sprite, dest=(pos_x, pos_y), source=(0, 0, visible_width, visible_height))
+
+def _draw_noise_lines(overlay: Image.Image, num_lines: int, rng: Any = random) -> None:
+    """Рисует полупрозрачные шумовые линии на RGBA-слое помех."""
+    overlay_draw = ImageDraw.Draw(overlay)
+    for _ in range(num_lines):
+        x1, y1 = rng.randint(0, overlay.width), rng.randint(0, overlay.height)
+        x2, y2 = rng.randint(0, overlay.width), rng.randint(0, overlay.height)
+
+        # Цвет линий - можно сделать темнее/светлее фона или случайным
+        line_base_color_val = rng.randint(120, 200)
+        line_color_rgb = (line_base_color_val, line_base_color_val, line_base_color_val)
+        line_color_rgba = line_color_rgb + (DEFAULT_NOISE_LINE_OPACITY,)
+        overlay_draw.line([(x1, y1), (x2, y2)], fill=line_color_rgba, width=1)
 
 def generate_captcha_image(
     model_name: str, # Имя модели для получения классов фигур
@@ -129,8 +210,23 @@ def generate_captcha_image(
     add_noise_lines: bool = False,
     num_noise_lines: int = 10,
     add_point_noise: bool = False,
-    point_noise_density: float = 0.02
-) -> Tuple[Image.Image, List[Dict[str, Any]]]: # Возвращаем список словарей (из model_dump())
+    point_noise_density: float = 0.02,
+    downsample_mode: str = DEFAULT_DOWNSAMPLE_MODE,
+    # --- Детерминированная генерация ---
+    rng: Optional[random.Random] = None, # Источник случайности; random.Random(seed) дает воспроизводимый результат
+    layout_only: bool = False # Только раскладка фигур, без отрисовки (изображение не создается, возвращается None)
+) -> Tuple[Optional[Image.Image], List[Dict[str, Any]]]: # Возвращаем список словарей (из model_dump())
+    """
+    Генерирует изображение CAPTCHA и список нарисованных фигур.
+
+    При одинаковом зерне rng и одинаковой конфигурации раскладка фигур
+    (drawn_shapes) совпадает и при layout_only=True: отрисовка и помехи
+    используют случайность только после размещения всех фигур.
+    """
+    rng = rng or random
+
+    if downsample_mode not in DOWNSAMPLE_MODES:
+        raise ValueError(f"Unknown downsample_mode '{downsample_mode}'. Expected one of: {', '.join(DOWNSAMPLE_MODES)}.")
 
     actual_num_shapes_to_draw = min(num_shapes, len(model_shape_types))
     if actual_num_shapes_to_draw <= 0:
@@ -153,19 +249,24 @@ def generate_captcha_image(
     scaled_min_distance = min_distance_final * upscale_factor
     outline_width_upscaled = max(1, 1 * upscale_factor)
 
-    background_color_choice = random.choice(LIGHT_BACKGROUND_COLORS)
+    background_color_choice = rng.choice(LIGHT_BACKGROUND_COLORS)
     actual_background_rgb = color_utils.get_rgb_color(background_color_choice)
     if actual_background_rgb is None: # На случай, если в LIGHT_BACKGROUND_COLORS ошибка
         actual_background_rgb = (255, 255, 255)
         
-    image = Image.new("RGB", (upscaled_width, upscaled_height), color=actual_background_rgb)
-    draw = ImageDraw.Draw(image)
+    if layout_only:
+        image, draw = None, None
+    else:
+        image = Image.new("RGB", (upscaled_width, upscaled_height), color=actual_background_rgb)
+        draw = ImageDraw.Draw(image)
     
     # Список для хранения информации о нарисованных фигурах (объекты ShapeDrawingDetails, конвертированные в dict)
     drawn_shapes_info_list: List[Dict[str, Any]] = []
+    # Сетка занятости: центры выбираются только там, где фигура помещается
+    placement_grid = OccupancyGrid(upscaled_width, upscaled_height, min_distance=scaled_min_distance, rng=rng)
 
-    selected_shape_types = random.sample(model_shape_types, actual_num_shapes_to_draw)
-    selected_colors = random.sample(model_available_colors, actual_num_shapes_to_draw)
+    selected_shape_types = rng.sample(model_shape_types, actual_num_shapes_to_draw)
+    selected_colors = rng.sample(model_available_colors, actual_num_shapes_to_draw)
 
     # Рассчитываем абсолютные размеры для передачи в generate_size_params
     min_primary_size_upscaled = target_min_final_shape_dim * upscale_factor
@@ -221,13 +322,15 @@ def generate_captcha_image(
                     max_primary_size_upscaled=current_max_primary_size, # Текущий максимум с учетом уменьшения
                     min_secondary_size_upscaled=min_secondary_size_upscaled,
                     max_secondary_size_upscaled=current_max_secondary_size,
-                    model_specific_constraints=None # TODO: Передавать, если нужно
+                    model_specific_constraints=None, # TODO: Передавать, если нужно
+                    rng=rng
                 )
             except Exception as e_size_param:
                 logger.error(f"Error generating size params for {shape_type}: {e_size_param}", exc_info=True)
                 continue # К следующей попытке уменьшения или к следующей фигуре
 
             placement_attempts_for_current_size = MAX_PLACEMENT_ATTEMPTS_PER_SHAPE // MAX_SIZE_REDUCTION_ATTEMPTS
+            no_fit_attempts = 0
             for placement_attempt in range(placement_attempts_for_current_size):
                 # Устанавливаем rotation_rad.
                 if shape_type in ["circle", "ellipse", "sphere", "cone", "cylinder", "pyramid", "octahedron", "torus"]: # <--- ДОБАВЛЕН "octahedron"
@@ -240,31 +343,22 @@ def generate_captcha_image(
                     # Это можно обеспечить в OctahedronShape.generate_size_params,
                     # сделав возвращаемый им tilt_angle_rad неслучайным.
                 elif shape_type in ["cube", "cuboid", "cross_3d", "star5_3d"]: 
-                     rotation_rad = math.pi / random.choice([12, 16, 20, 24, 28, 32]) * random.choice([-1,1]) # Уменьшенные углы
+                     rotation_rad = math.pi / rng.choice([12, 16, 20, 24, 28, 32]) * rng.choice([-1,1]) # Уменьшенные углы
                 else: 
-                    rotation_rad = random.uniform(0, 2 * math.pi)
+                    rotation_rad = rng.uniform(0, 2 * math.pi)
 
-                # Для получения bbox для проверки коллизий, создаем "пробный" экземпляр
-                # или используем статический метод, если бы он был.
-                # Создание экземпляра проще для начала.
+                # Bbox относительно (0,0) фигуры считается аналитически, без пробного экземпляра
                 try:
-                    preview_shape_instance = shape_class(
-                        cx_upscaled=0, cy_upscaled=0, # Положение не важно для bbox относительно начала координат
-                        color_name_or_rgb=fill_color_selected, # Цвет не важен для bbox
-                        rotation_angle_rad=rotation_rad,
-                        **size_params
-                    )
-                    preview_details = preview_shape_instance.get_draw_details()
-                    bbox_at_origin = preview_details.bbox_upscaled # Это bbox относительно (0,0) фигуры
-                except Exception as e_preview:
-                    logger.error(f"Error creating preview instance or getting details for {shape_type}: {e_preview}", exc_info=True)
+                    bbox_at_origin = shape_class.bbox_at_origin(size_params, rotation_rad)
+                except Exception as e_bbox:
+                    logger.error(f"Error calculating bounding box for {shape_type}: {e_bbox}", exc_info=True)
                     break # К следующей попытке уменьшения размера
 
                 shape_w_upscaled = bbox_at_origin[2] - bbox_at_origin[0]
                 shape_h_upscaled = bbox_at_origin[3] - bbox_at_origin[1]
 
                 if shape_w_upscaled <= 0 or shape_h_upscaled <= 0:
-                    logger.debug(f"Shape {shape_type} has zero or negative width/height from preview. Skipping placement attempt.")
+                    logger.debug(f"Shape {shape_type} has zero or negative width/height. Skipping placement attempt.")
                     continue
 
                 # Определяем допустимые границы для центра фигуры (cx, cy)
@@ -288,8 +382,17 @@ def generate_captcha_image(
                                  f"min_cx:{min_cx_for_shape}, max_cx:{max_cx_for_shape}. Size attempt {size_reduction_attempt + 1}.")
                     break # Прерываем попытки размещения для текущего размера, переходим к уменьшению
 
-                target_cx_upscaled = random.randint(int(min_cx_for_shape), int(max_cx_for_shape))
-                target_cy_upscaled = random.randint(int(min_cy_for_shape), int(max_cy_for_shape))
+                sampled_center = placement_grid.sample_center(
+                    bbox_at_origin, min_cx_for_shape, max_cx_for_shape, min_cy_for_shape, max_cy_for_shape
+                )
+                if sampled_center is None:
+                    # Для этого поворота свободного места нет; другой поворот может дать другой bbox
+                    no_fit_attempts += 1
+                    if no_fit_attempts >= MAX_NO_FIT_ATTEMPTS_PER_SIZE:
+                        logger.debug(f"No free space for shape {shape_type} at size attempt {size_reduction_attempt + 1}.")
+                        break
+                    continue
+                target_cx_upscaled, target_cy_upscaled = sampled_center
                 
                 # Рассчитываем bbox фигуры на холсте
                 prospective_bbox_on_canvas = [
@@ -297,12 +400,7 @@ def generate_captcha_image(
                     bbox_at_origin[2] + target_cx_upscaled, bbox_at_origin[3] + target_cy_upscaled
                 ]
 
-                has_collision = False
-                for placed_shape_dict in drawn_shapes_info_list:
-                    if _check_overlap(prospective_bbox_on_canvas, placed_shape_dict["bbox_upscaled"], scaled_min_distance):
-                        has_collision = True; break
-                
-                if not has_collision:
+                if placement_grid.fits(prospective_bbox_on_canvas):
                     actual_fill_rgb = color_utils.get_rgb_color(fill_color_selected)
                     if actual_fill_rgb is None: actual_fill_rgb = (128, 128, 128) # Default
 
@@ -313,17 +411,21 @@ def generate_captcha_image(
                         rotation_angle_rad=rotation_rad,
                         **size_params
                     )
-                    final_shape_instance.draw(
-                        draw_context=draw,
-                        fill_color_rgb_actual=actual_fill_rgb,
-                        outline_width_upscaled=outline_width_upscaled,
-                        brightness_factor_for_outline=brightness_factor_for_outline,
-                        background_color_rgb_actual=actual_background_rgb
-                    )
+                    if draw is not None:
+                        final_shape_instance.draw(
+                            draw_context=draw,
+                            fill_color_rgb_actual=actual_fill_rgb,
+                            outline_width_upscaled=outline_width_upscaled,
+                            brightness_factor_for_outline=brightness_factor_for_outline,
+                            background_color_rgb_actual=actual_background_rgb
+                        )
                     
                     # Сохраняем информацию о нарисованной фигуре
                     shape_details_for_storage = final_shape_instance.get_draw_details()
+                    # Примитивы кликабельной области: проверка клика без пересоздания фигуры
+                    shape_details_for_storage.hit_test = final_shape_instance.get_hit_test_primitives()
                     drawn_shapes_info_list.append(shape_details_for_storage.model_dump())
+                    placement_grid.mark(prospective_bbox_on_canvas)
                     
                     current_shape_placed = True
                     logger.info(f"Placed {len(drawn_shapes_info_list)}/{actual_num_shapes_to_draw}: {shape_type} at ({target_cx_upscaled},{target_cy_upscaled})")
@@ -343,122 +445,29 @@ def generate_captcha_image(
     else:
         logger.info(f"Successfully placed all {len(drawn_shapes_info_list)} shapes for model '{model_name}'.")
 
+    if layout_only:
+        return None, drawn_shapes_info_list
+
     # === НАЧАЛО: Добавление шума и водяных знаков ===
-    # Это делается ПОСЛЕ отрисовки основных фигур, но ДО финального resize
-
-    if add_watermark_text:
-        font_size = int(upscaled_height * DEFAULT_WATERMARK_FONT_SIZE_RATIO)
-        try:
-            # Если DEFAULT_FONT_PATH is None, ImageFont.truetype пытается загрузить шрифт по умолчанию.
-            # Это может вызвать различные ошибки, если подходящий шрифт не найден в системе.
-            if DEFAULT_FONT_PATH:
-                font = ImageFont.truetype(DEFAULT_FONT_PATH, font_size)
-            else:
-                # Пытаемся загрузить шрифт по умолчанию Pillow, если наш путь None
-                # Это должно либо сработать, либо вызвать ошибку, которую мы поймаем
-                font = ImageFont.truetype(None, font_size) 
-        except Exception as e_font: # Ловим более широкий спектр исключений
-            logger.warning(
-                f"Failed to load font (path: {DEFAULT_FONT_PATH}, size: {font_size}): {e_font}. "
-                "Falling back to ImageFont.load_default()."
-            )
-            try:
-                font = ImageFont.load_default() # Это очень базовый, не масштабируемый растровый шрифт
-            except IOError as e_load_default:
-                logger.error(f"Critical: ImageFont.load_default() also failed: {e_load_default}. Watermarks will be disabled.")
-                # В этом крайнем случае, если даже load_default не сработал,
-                # нужно либо не рисовать текст, либо перехватывать ошибку выше.
-                # Для простоты, можно установить add_watermark_text = False здесь, если font не удалось загрузить.
-                # Но лучше, чтобы image_generator всегда возвращал изображение, если это возможно.
-                # Пока оставим так, что font будет базовым.
-                # Если и это не сработает, ошибка возникнет при font.getbbox или draw.textsize
-                # и будет перехвачена общим Exception в сервисе.
-                # Для большей надежности, можно сделать так:
-                # if add_watermark_text:
-                #    try: ... font = ...
-                #    except: font = None; logger.error(...)
-                # if font and add_watermark_text: # тогда рисовать текст только если font есть
-                pass # Позволим коду ниже работать с font = ImageFont.load_default()
-
-        for _ in range(num_watermark_lines):
-            text_to_draw = watermark_text
-            if not text_to_draw: # Генерируем случайный текст, если не задан
-                text_len = random.randint(6, 10)
-                text_to_draw = ''.join(random.choices(WATERMARK_CANDIDATE_CHARS, k=text_len))
-            
-            # Получаем реальный цвет фона для определения контрастного цвета водяного знака
-            # Или используем фиксированный серый цвет
-            # base_wm_color = color_utils.get_contrasting_outline_color(actual_background_rgb, dark_factor=1.3, light_factor=0.7)
-            base_wm_color_val = random.randint(100, 180) # Оттенки серого для водяного знака
-            wm_color_rgb = (base_wm_color_val, base_wm_color_val, base_wm_color_val)
-            
-            # Добавляем альфа-канал для полупрозрачности
-            wm_color_rgba = wm_color_rgb + (DEFAULT_WATERMARK_OPACITY,)
+    # Точечный шум накладывается на увеличенный холст ДО финального resize,
+    # водяные знаки и шумовые линии - одним общим слоем уже на финальном разрешении.
+    # Порядок слоев поэтому обратный прежнему: раньше точки шума рисовались поверх
+    # водяных знаков и линий, теперь линии и водяные знаки лежат поверх точечного шума.
 
-            # Создаем временное изображение для текста с альфа-каналом
-            # чтобы можно было повернуть текст, а затем наложить его
-            try:
-                # Pillow < 10.0.0 ImageDraw.textbbox, >= 10.0.0 font.getbbox
-                if hasattr(font, 'getbbox'):
-                    text_bbox = font.getbbox(text_to_draw) # (left, top, right, bottom)
-                    text_width = text_bbox[2] - text_bbox[0]
-                    text_height = text_bbox[3] - text_bbox[1]
-                    text_offset_y = text_bbox[1] # Важно для корректного позиционирования
-                else: # Fallback для старых версий Pillow
-                    text_width, text_height = draw.textsize(text_to_draw, font=font) # type: ignore
-                    text_offset_y = 0
-
-            except Exception as e_textsize:
-                logger.warning(f"Could not get text dimensions for watermark: {e_textsize}")
-                text_width, text_height = font_size * len(text_to_draw) // 2, font_size
-                text_offset_y = 0
-
-            if text_width <= 0 or text_height <=0: continue
-
-            text_img = Image.new('RGBA', (text_width, text_height), (0,0,0,0))
-            text_draw = ImageDraw.Draw(text_img)
-            text_draw.text((0, -text_offset_y), text_to_draw, font=font, fill=wm_color_rgba) # Рисуем на (0,0) временного изображения
-
-            angle = random.randint(-25, 25)
-            rotated_text_img = text_img.rotate(angle, expand=True, resample=Image.Resampling.BICUBIC)
-            
-            pos_x = random.randint(0, max(0, upscaled_width - rotated_text_img.width))
-            pos_y = random.randint(0, max(0, upscaled_height - rotated_text_img.height))
-            
-            image.paste(rotated_text_img, (pos_x, pos_y), rotated_text_img) # Наложение с учетом альфа-канала
+    if add_point_noise and point_noise_density > 0:
+        _apply_point_noise(image, point_noise_density, rng)
 
-    if add_noise_lines:
-        for _ in range(num_noise_lines):
-            x1, y1 = random.randint(0, upscaled_width), random.randint(0, upscaled_height)
-            x2, y2 = random.randint(0, upscaled_width), random.randint(0, upscaled_height)
-            
-            # Цвет линий - можно сделать темнее/светлее фона или случайным
-            line_base_color_val = random.randint(120, 200)
-            line_color_rgb = (line_base_color_val, line_base_color_val, line_base_color_val)
-            line_color_rgba = line_color_rgb + (DEFAULT_NOISE_LINE_OPACITY,)
-            
-            # Для рисования с альфа-каналом на RGB изображении, нужно создать временный слой
-            overlay = Image.new('RGBA', image.size, (255,255,255,0)) # Прозрачный слой
-            draw_overlay = ImageDraw.Draw(overlay)
-            draw_overlay.line([(x1, y1), (x2, y2)], fill=line_color_rgba, width=int(1 * upscale_factor))
-            image = Image.alpha_composite(image.convert('RGBA'), overlay).convert('RGB')
-            # После каждой линии пересоздаем draw, если нужно рисовать дальше на image напрямую
-            draw = ImageDraw.Draw(image)
+    final_image = _downsample(image, (final_width, final_height), upscale_factor, downsample_mode)
 
+    if add_watermark_text or add_noise_lines:
+        # Один прозрачный слой на все помехи: композитинг выполняется один раз, а не на каждую линию
+        overlay = Image.new('RGBA', final_image.size, (255, 255, 255, 0))
+        if add_watermark_text:
+            _draw_watermark_text(overlay, watermark_text, num_watermark_lines, rng)
+        if add_noise_lines:
+            _draw_noise_lines(overlay, num_noise_lines, rng)
+        final_image = Image.alpha_composite(final_image.convert('RGBA'), overlay).convert('RGB')
 
-    if add_point_noise and point_noise_density > 0:
-        num_noise_pixels = int(upscaled_width * upscaled_height * point_noise_density)
-        for _ in range(num_noise_pixels):
-            x = random.randint(0, upscaled_width - 1)
-            y = random.randint(0, upscaled_height - 1)
-            # Шум может быть оттенками серого или цветным
-            noise_val = random.randint(0, 255)
-            noise_color = (noise_val, noise_val, noise_val) 
-            # или случайный цвет:
-            # noise_color = (random.randint(0,255), random.randint(0,255), random.randint(0,255))
-            image.putpixel((x, y), noise_color)
-            
     # === КОНЕЦ: Добавление шума и водяных знаков ===
 
-    final_image = image.resize((final_width, final_height), Image.Resampling.LANCZOS)
     return final_image, drawn_shapes_info_list
\ No newline at end of file
@@ -1,4 +1,6 @@
 # shape_captcha_lib/logic_core.py
+import hashlib
+import json
 import random
 from typing import List, Tuple, Dict, Any, Union, Optional
 import gettext
@@ -12,11 +14,16 @@ from .image_generator import (
     DEFAULT_CAPTCHA_WIDTH,
     DEFAULT_CAPTCHA_HEIGHT,
     DEFAULT_UPSCALE_FACTOR,
+    DEFAULT_DOWNSAMPLE_MODE,
+    DOWNSAMPLE_MODES,
+    LAYOUT_ALGORITHM_VERSION,
     NUM_SHAPES_TO_DRAW,
     TARGET_MIN_FINAL_SHAPE_DIM as DEFAULT_TARGET_MIN_FINAL_SHAPE_DIM,
     TARGET_MAX_FINAL_SHAPE_DIM as DEFAULT_TARGET_MAX_FINAL_SHAPE_DIM
 )
-from .registry import get_model_shape_types, get_shape_class, get_model_colors
+from .hit_map import DEFAULT_HIT_MAP_SCALE, encode_hit_map, lookup_hit_map, render_hit_map
+from .registry import get_model_shape_types, get_model_colors, load_shape_from_storage
+from .utils import geometry_utils
 
 logger = logging.getLogger(__name__)
 
@@ -26,6 +33,11 @@ MODULE_DIR = os.path.dirname(os.path.abspath(__file__))
 DEFAULT_LOCALE_DIR = os.path.join(MODULE_DIR, 'locales')
 DEFAULT_TRANSLATION_DOMAIN = 'shape_captcha_lib'
 
+# Способы проверки клика: "shapes" - геометрия фигур из all_drawn_shapes,
+# "hit_map" - поиск в сжатой карте меток, построенной при генерации
+VERIFY_ENGINES = ("shapes", "hit_map")
+DEFAULT_VERIFY_ENGINE = "shapes"
+
 
 class CaptchaLogicCore:
     def __init__(
@@ -48,7 +60,10 @@ class CaptchaLogicCore:
         add_noise_lines: bool = False,   # Включить/выключить шумовые линии
         num_noise_lines: int = 10,       # Количество шумовых линий
         add_point_noise: bool = False,   # Включить/выключить точечный шум
-        point_noise_density: float = 0.02 # Плотность точечного шума (доля пикселей)
+        point_noise_density: float = 0.02, # Плотность точечного шума (доля пикселей)
+        downsample_mode: str = DEFAULT_DOWNSAMPLE_MODE, # "lanczos" (качество), "reduce" (скорость) или "bilinear"
+        verify_engine: str = DEFAULT_VERIFY_ENGINE, # "shapes" или "hit_map" (карта меток, проверка одним поиском)
+        hit_map_scale: int = DEFAULT_HIT_MAP_SCALE # Уменьшение карты меток относительно изображения
         # TODO: Продумать передачу model_specific_constraints для ShapeClass.generate_size_params, если необходимо
 
     ):
@@ -75,6 +90,23 @@ class CaptchaLogicCore:
         self.add_point_noise = add_point_noise
         self.point_noise_density = point_noise_density
 
+        if downsample_mode not in DOWNSAMPLE_MODES:
+            raise ValueError(
+                f"CaptchaLogicCore: Unknown downsample_mode '{downsample_mode}'. "
+                f"Expected one of: {', '.join(DOWNSAMPLE_MODES)}."
+            )
+        self.downsample_mode = downsample_mode
+
+        if verify_engine not in VERIFY_ENGINES:
+            raise ValueError(
+                f"CaptchaLogicCore: Unknown verify_engine '{verify_engine}'. "
+                f"Expected one of: {', '.join(VERIFY_ENGINES)}."
+            )
+        if hit_map_scale <= 0:
+            raise ValueError("CaptchaLogicCore: hit_map_scale must be positive.")
+        self.verify_engine = verify_engine
+        self.hit_map_scale = hit_map_scale
+
         self.current_model_shape_types: List[str] = get_model_shape_types(self.model_name)
         self.current_model_colors: List[Union[str, Tuple[int, int, int]]] = get_model_colors(self.model_name)
 
@@ -113,17 +145,18 @@ class CaptchaLogicCore:
             )
         return translation
 
-    def generate_challenge_data(
-        self, 
-        language_code: Optional[str] = None
-    ) -> Tuple[PILImage, List[Dict[str, Any]], str, str]:
-        # ... (логика генерации image_object, drawn_shapes_details_list, target_shape_type_key как раньше)
+    def build_generation_kwargs(self, seed: Optional[int] = None) -> Dict[str, Any]:
+        """
+        Собирает аргументы для generate_captcha_image из конфигурации ядра.
+        Аргументы сериализуемы (pickle), поэтому их можно передавать в процессы-воркеры.
+        Если задан seed, генерация детерминирована (rng=random.Random(seed)).
+        """
         actual_num_shapes = min(self.num_shapes_on_image_config, len(self.current_model_shape_types))
         if actual_num_shapes <= 0:
             logger.error(f"Cannot draw shapes for model '{self.model_name}', num_shapes: {actual_num_shapes}")
             raise ValueError("Not enough shape types or num_shapes_on_image_config is zero for CAPTCHA generation.")
 
-        image_object, drawn_shapes_details_list = generate_captcha_image(
+        return dict(
             model_name=self.model_name,
             model_shape_types=self.current_model_shape_types,
             model_available_colors=self.current_model_colors,
@@ -141,16 +174,139 @@ class CaptchaLogicCore:
             add_noise_lines=self.add_noise_lines,
             num_noise_lines=self.num_noise_lines,
             add_point_noise=self.add_point_noise,
-            point_noise_density=self.point_noise_density
+            point_noise_density=self.point_noise_density,
+            downsample_mode=self.downsample_mode,
+            rng=random.Random(seed) if seed is not None else None
         )
 
+    def config_hash(self) -> str:
+        """
+        Хэш параметров, влияющих на раскладку фигур. Сохраняется вместе с зерном:
+        если конфигурация или алгоритм раскладки изменились, зерно больше не
+        воспроизводит ту же CAPTCHA.
+        """
+        layout_config = {
+            "layout_version": LAYOUT_ALGORITHM_VERSION,
+            "model_name": self.model_name,
+            "shape_types": self.current_model_shape_types,
+            "colors": self.current_model_colors,
+            "size": [self.image_width, self.image_height],
+            "num_shapes": self.num_shapes_on_image_config,
+            "upscale_factor": self.upscale_factor,
+            "shape_dims": [self.target_min_final_shape_dim, self.target_max_final_shape_dim],
+        }
+        payload = json.dumps(layout_config, sort_keys=True, separators=(",", ":"))
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()[:16]
+
+    def regenerate_shapes(self, seed: int) -> List[Dict[str, Any]]:
+        """Восстанавливает раскладку фигур CAPTCHA по зерну без отрисовки изображения."""
+        generate_kwargs = self.build_generation_kwargs(seed)
+        generate_kwargs["layout_only"] = True
+        _, drawn_shapes_details_list = generate_captcha_image(**generate_kwargs)
+        return drawn_shapes_details_list
+
+    def build_challenge_record(self, seed: int, target_shape_type_key: str) -> Dict[str, Any]:
+        """
+        Компактная запись CAPTCHA для хранилища: вместо списка фигур хранится
+        зерно, по которому раскладка восстанавливается при проверке.
+        """
+        return {
+            "seed": seed,
+            "model_name": self.model_name,
+            "config_hash": self.config_hash(),
+            "target_shape_type": target_shape_type_key,
+        }
+
+    def verify_challenge_record(self, challenge_record: Dict[str, Any], click_x: int, click_y: int) -> bool:
+        """Проверяет клик по записи из build_challenge_record, восстанавливая фигуры по зерну."""
+        seed = challenge_record.get("seed")
+        target_shape_type = challenge_record.get("target_shape_type")
+        if not isinstance(seed, int) or not target_shape_type:
+            logger.warning("Invalid seed-only challenge record: missing seed or target shape type.")
+            return False
+        if challenge_record.get("model_name") != self.model_name or challenge_record.get("config_hash") != self.config_hash():
+            logger.warning(
+                f"Seed-only challenge record was created with a different configuration "
+                f"(model '{challenge_record.get('model_name')}', hash '{challenge_record.get('config_hash')}'). Rejecting."
+            )
+            return False
+
+        return self.verify_solution(
+            click_x=click_x,
+            click_y=click_y,
+            target_shape_type_from_challenge=target_shape_type,
+            all_drawn_shapes_data=self.regenerate_shapes(seed)
+        )
+
+    def build_stored_challenge(self, target_shape_type_key: str, drawn_shapes_details_list: List[Dict[str, Any]]) -> Dict[str, Any]:
+        """
+        Формирует запись CAPTCHA для хранилища в соответствии с verify_engine.
+        Для "hit_map" вместо списка фигур сохраняются сжатая карта меток и типы фигур;
+        если карту построить нельзя (у фигуры нет примитивов hit_test), сохраняется полный список фигур.
+        """
+        if self.verify_engine == "hit_map":
+            label_map = render_hit_map(
+                drawn_shapes_details_list, self.image_width, self.image_height, self.upscale_factor, self.hit_map_scale
+            )
+            if label_map is not None:
+                return {
+                    "target_shape_type": target_shape_type_key,
+                    "shape_types": [shape["shape_type"] for shape in drawn_shapes_details_list],
+                    "hit_map": encode_hit_map(label_map, self.hit_map_scale),
+                }
+            logger.warning(f"Hit map is not available for model '{self.model_name}'; storing full shape data.")
+        return {
+            "target_shape_type": target_shape_type_key, # target_type здесь это ключ для перевода, а не переведенное имя
+            "all_drawn_shapes": drawn_shapes_details_list
+        }
+
+    def verify_hit_map_record(self, challenge_record: Dict[str, Any], click_x: int, click_y: int) -> bool:
+        """Проверяет клик по записи с картой меток: один поиск по координатам клика."""
+        target_shape_type = challenge_record.get("target_shape_type")
+        shape_types = challenge_record.get("shape_types")
+        encoded_hit_map = challenge_record.get("hit_map")
+        if not target_shape_type or not isinstance(shape_types, list) or not isinstance(encoded_hit_map, str):
+            logger.warning("Invalid hit-map challenge record.")
+            return False
+
+        shape_index = lookup_hit_map(encoded_hit_map, click_x, click_y)
+        if shape_index is None or shape_index >= len(shape_types):
+            logger.warning("Corrupted hit map in challenge record.")
+            return False
+        if shape_index < 0:
+            logger.info(f"  Click ({click_x},{click_y}) DID NOT HIT any shape on the hit map.")
+            return False
+
+        is_correct = shape_types[shape_index] == target_shape_type
+        logger.info(
+            f"  Click ({click_x},{click_y}) hit '{shape_types[shape_index]}' on the hit map "
+            f"(expected '{target_shape_type}'): {is_correct}."
+        )
+        return is_correct
+
+    def select_target(self, drawn_shapes_details_list: List[Dict[str, Any]]) -> str:
+        """Выбирает тип целевой фигуры среди нарисованных."""
         if not drawn_shapes_details_list:
             logger.error(f"generate_captcha_image returned no shapes for model '{self.model_name}'.")
             raise ValueError("Failed to generate shapes for the CAPTCHA challenge.")
 
         target_shape_dict = random.choice(drawn_shapes_details_list)
-        target_shape_type_key = target_shape_dict["shape_type"]
+        return target_shape_dict["shape_type"]
+
+    def render_challenge(self, seed: Optional[int] = None) -> Tuple[PILImage, List[Dict[str, Any]], str]:
+        """
+        Генерирует изображение и выбирает целевую фигуру, не формируя текст подсказки.
+        Результат не зависит от языка, поэтому его можно генерировать заранее (см. ChallengePool).
+
+        Returns:
+            Кортеж (image_object, drawn_shapes_details_list, target_shape_type_key).
+        """
+        image_object, drawn_shapes_details_list = generate_captcha_image(**self.build_generation_kwargs(seed))
+        target_shape_type_key = self.select_target(drawn_shapes_details_list)
+        return image_object, drawn_shapes_details_list, target_shape_type_key
 
+    def build_prompt(self, target_shape_type_key: str, language_code: Optional[str] = None) -> str:
+        """Формирует локализованный текст подсказки для целевой фигуры."""
         translator = self._get_translator(language_code)
         _ = translator.gettext
 
@@ -164,8 +320,15 @@ class CaptchaLogicCore:
         # В .po: msgid "Please click on a shape of type: %s"
         #         msgstr "Пожалуйста, кликните на фигуру типа: %s"
         prompt_template = _("Please click on a shape of type: %s")
-        prompt_text = prompt_template % translated_shape_name
-        
+        return prompt_template % translated_shape_name
+
+    def generate_challenge_data(
+        self, 
+        language_code: Optional[str] = None,
+        seed: Optional[int] = None
+    ) -> Tuple[PILImage, List[Dict[str, Any]], str, str]:
+        image_object, drawn_shapes_details_list, target_shape_type_key = self.render_challenge(seed)
+        prompt_text = self.build_prompt(target_shape_type_key, language_code)
         return image_object, drawn_shapes_details_list, target_shape_type_key, prompt_text
 
     def verify_solution(
@@ -185,33 +348,31 @@ class CaptchaLogicCore:
         )
         # ... (остальная логика verify_solution без изменений) ...
         clicked_correct_shape = False
+        hit_this_shape = False
         for shape_data_dict in reversed(all_drawn_shapes_data):
-            shape_type_on_image = shape_data_dict.get("shape_type")
-            params_from_storage = shape_data_dict.get("params_for_storage")
-            color_from_storage = shape_data_dict.get("color_name_or_rgb")
-
-            if not all([shape_type_on_image, params_from_storage, color_from_storage is not None]):
-                logger.warning(f"Skipping shape with missing data in verify_solution: {shape_data_dict}")
+            # Префильтр по bbox: фигура не может содержать клик вне своего bbox
+            bbox = shape_data_dict.get("bbox_upscaled")
+            if bbox is not None and not (
+                bbox[0] <= upscaled_click_x <= bbox[2] and bbox[1] <= upscaled_click_y <= bbox[3]
+            ):
                 continue
-
-            shape_class = get_shape_class(self.model_name, shape_type_on_image)
-            if not shape_class:
-                logger.warning(f"Shape class for type '{shape_type_on_image}' in model '{self.model_name}' not found. Skipping.")
-                continue
-            
-            hit_this_shape = False
-            try:
-                shape_instance = shape_class(
-                    color_name_or_rgb=color_from_storage,
-                    **params_from_storage
-                )
-                hit_this_shape = shape_instance.is_point_inside(upscaled_click_x, upscaled_click_y)
-            except Exception as e:
-                logger.error(
-                    f"Failed to re-instantiate or check shape {shape_type_on_image}: {e}. Params: {params_from_storage}",
-                    exc_info=True
+            shape_type_on_image = shape_data_dict.get("shape_type")
+            hit_test_primitives = shape_data_dict.get("hit_test")
+            if hit_test_primitives is not None and shape_type_on_image:
+                # Быстрый путь: примитивы сохранены при генерации, реестр и конструктор не нужны
+                try:
+                    hit_this_shape = geometry_utils.is_point_in_hit_test(
+                        upscaled_click_x, upscaled_click_y, hit_test_primitives
+                    )
+                except (ValueError, TypeError, IndexError) as e:
+                    logger.warning(f"Invalid hit-test primitives for shape {shape_type_on_image}: {e}. Skipping.")
+                    continue
+            else:
+                hit_this_shape = self._is_point_inside_stored_shape(
+                    shape_data_dict, upscaled_click_x, upscaled_click_y
                 )
-                continue
+                if hit_this_shape is None:
+                    continue
 
             if hit_this_shape:
                 logger.debug(f"  Click HIT shape of type '{shape_type_on_image}'.")
@@ -223,9 +384,45 @@ class CaptchaLogicCore:
                         f"    This was NOT the target shape type (hit '{shape_type_on_image}', "
                         f"expected '{target_shape_type_from_challenge}')."
                     )
-                break 
-        
+                break
+
         if not clicked_correct_shape and not hit_this_shape :
             logger.info("  Click DID NOT HIT any identifiable shape geometry for which verification logic exists.")
-            
-        return clicked_correct_shape
\ No newline at end of file
+
+        return clicked_correct_shape
+
+    def _is_point_inside_stored_shape(
+        self,
+        shape_data_dict: Dict[str, Any],
+        upscaled_click_x: int,
+        upscaled_click_y: int
+    ) -> Optional[bool]:
+        """
+        Медленный путь для записей без "hit_test" (сохраненных до появления примитивов
+        или созданных сторонними фигурами): пересоздает фигуру и вызывает is_point_inside.
+        Returns:
+            Результат проверки или None, если фигуру восстановить не удалось.
+        """
+        shape_type_on_image = shape_data_dict.get("shape_type")
+        params_from_storage = shape_data_dict.get("params_for_storage")
+        color_from_storage = shape_data_dict.get("color_name_or_rgb")
+
+        if not all([shape_type_on_image, params_from_storage, color_from_storage is not None]):
+            logger.warning(f"Skipping shape with missing data in verify_solution: {shape_data_dict}")
+            return None
+
+        try:
+            # Восстановление через таблицу registry.SHAPE_LOADERS (AbstractShape.from_storage)
+            shape_instance = load_shape_from_storage(
+                self.model_name, shape_type_on_image, params_from_storage, color_from_storage
+            )
+            if shape_instance is None:
+                logger.warning(f"Shape class for type '{shape_type_on_image}' in model '{self.model_name}' not found. Skipping.")
+                return None
+            return shape_instance.is_point_inside(upscaled_click_x, upscaled_click_y)
+        except Exception as e:
+            logger.error(
+                f"Failed to re-instantiate or check shape {shape_type_on_image}: {e}. Params: {params_from_storage}",
+                exc_info=True
+            )
+            return None
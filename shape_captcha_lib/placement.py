@@ -0,0 +1,199 @@
+# shape_captcha_lib/placement.py
+import math
+import random
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+import logging
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_PLACEMENT_CELL_SIZE = 8 # Размер ячейки сетки занятости в пикселях увеличенного холста
+
+
+def bboxes_overlap(bbox1: Sequence[float], bbox2: Sequence[float], min_distance: float) -> bool:
+    """True, если bbox'ы пересекаются или находятся ближе min_distance друг к другу."""
+    return not (
+        bbox1[2] + min_distance < bbox2[0] or bbox1[0] - min_distance > bbox2[2] or
+        bbox1[3] + min_distance < bbox2[1] or bbox1[1] - min_distance > bbox2[3]
+    )
+
+
+class OccupancyGrid:
+    """
+    Сетка занятости холста для размещения фигур.
+
+    Каждая строка сетки хранится битовой маской (int): бит установлен, если ячейка
+    пересекается с уже размещенной фигурой (с учетом min_distance). Разметка
+    консервативная - ячейка считается занятой при любом касании, поэтому центр,
+    выбранный из свободных ячеек, почти всегда проходит точную проверку.
+    Точная проверка выполняется по отдельному списку bbox'ов размещенных фигур.
+    """
+
+    def __init__(
+        self,
+        width: int,
+        height: int,
+        min_distance: float = 0,
+        cell_size: int = DEFAULT_PLACEMENT_CELL_SIZE,
+        rng: Optional[random.Random] = None
+    ):
+        if width <= 0 or height <= 0:
+            raise ValueError("Grid width and height must be positive")
+        if cell_size <= 0:
+            raise ValueError("cell_size must be positive")
+        self.width = width
+        self.height = height
+        self.min_distance = min_distance
+        self.cell_size = cell_size
+        self._rng: Any = rng or random
+        self.cols = math.ceil(width / cell_size)
+        self.rows = math.ceil(height / cell_size)
+        self._row_masks: List[int] = [0] * self.rows
+        self._placed_bboxes: List[Tuple[float, float, float, float]] = []
+        # Маски допустимых "якорных" ячеек для (ширина, высота) фигуры в ячейках.
+        # Сбрасывается при каждой новой фигуре.
+        self._anchor_cache: Dict[Tuple[int, int], List[int]] = {}
+        self._run_cache: Dict[int, List[int]] = {}
+
+    @property
+    def placed_bboxes(self) -> List[Tuple[float, float, float, float]]:
+        return self._placed_bboxes
+
+    def mark(self, bbox: Sequence[float]) -> None:
+        """Отмечает размещенную фигуру: ячейки ее bbox, расширенного на min_distance, становятся занятыми."""
+        self._placed_bboxes.append((bbox[0], bbox[1], bbox[2], bbox[3]))
+        col_from = max(0, self._cell(bbox[0] - self.min_distance))
+        col_to = min(self.cols - 1, self._cell(bbox[2] + self.min_distance))
+        row_from = max(0, self._cell(bbox[1] - self.min_distance))
+        row_to = min(self.rows - 1, self._cell(bbox[3] + self.min_distance))
+        if col_from > col_to or row_from > row_to:
+            return
+        span_mask = ((1 << (col_to - col_from + 1)) - 1) << col_from
+        for row in range(row_from, row_to + 1):
+            self._row_masks[row] |= span_mask
+        self._anchor_cache.clear()
+        self._run_cache.clear()
+
+    def fits(self, bbox: Sequence[float]) -> bool:
+        """Точная проверка: bbox не пересекается с уже размещенными фигурами."""
+        return not any(bboxes_overlap(bbox, placed, self.min_distance) for placed in self._placed_bboxes)
+
+    def sample_center(
+        self,
+        bbox_at_origin: Sequence[float],
+        min_cx: float,
+        max_cx: float,
+        min_cy: float,
+        max_cy: float
+    ) -> Optional[Tuple[int, int]]:
+        """
+        Выбирает случайный центр фигуры только среди областей, где фигура целиком
+        помещается в свободные ячейки.
+
+        Args:
+            bbox_at_origin: Bbox фигуры с центром в (0,0).
+            min_cx, max_cx, min_cy, max_cy: Допустимые границы центра (края холста).
+        Returns:
+            (cx, cy) или None, если по сетке свободного места для фигуры нет.
+        """
+        min_cx, max_cx = math.ceil(min_cx), math.floor(max_cx)
+        min_cy, max_cy = math.ceil(min_cy), math.floor(max_cy)
+        if min_cx > max_cx or min_cy > max_cy:
+            return None
+
+        # Левый верхний угол bbox лежит в "якорной" ячейке; фигура занимает
+        # не больше span_cols x span_rows ячеек, начиная с нее
+        span_cols = math.ceil((bbox_at_origin[2] - bbox_at_origin[0]) / self.cell_size) + 1
+        span_rows = math.ceil((bbox_at_origin[3] - bbox_at_origin[1]) / self.cell_size) + 1
+        anchor_rows = self._anchor_masks(span_cols, span_rows)
+
+        # Ограничиваем якорные ячейки допустимым диапазоном центра
+        col_from = max(0, self._cell(min_cx + bbox_at_origin[0]))
+        col_to = min(self.cols - 1, self._cell(max_cx + bbox_at_origin[0]))
+        row_from = max(0, self._cell(min_cy + bbox_at_origin[1]))
+        row_to = min(self.rows - 1, self._cell(max_cy + bbox_at_origin[1]))
+        if col_from > col_to or row_from > row_to:
+            return None
+        col_window = ((1 << (col_to - col_from + 1)) - 1) << col_from
+
+        candidate_rows: List[Tuple[int, int]] = []
+        total_candidates = 0
+        for row in range(row_from, min(row_to, len(anchor_rows) - 1) + 1):
+            row_candidates = anchor_rows[row] & col_window
+            if row_candidates:
+                count = bin(row_candidates).count("1")
+                candidate_rows.append((row, row_candidates))
+                total_candidates += count
+        if total_candidates == 0:
+            return None
+
+        # Равномерно выбираем одну из свободных якорных ячеек
+        pick = self._rng.randrange(total_candidates)
+        for row, row_candidates in candidate_rows:
+            count = bin(row_candidates).count("1")
+            if pick < count:
+                break
+            pick -= count
+        col = _nth_set_bit(row_candidates, pick)
+
+        # Центр внутри якорной ячейки с учетом границ холста
+        cx_low = max(min_cx, math.ceil(col * self.cell_size - bbox_at_origin[0]))
+        cx_high = min(max_cx, math.floor((col + 1) * self.cell_size - 1 - bbox_at_origin[0]))
+        cy_low = max(min_cy, math.ceil(row * self.cell_size - bbox_at_origin[1]))
+        cy_high = min(max_cy, math.floor((row + 1) * self.cell_size - 1 - bbox_at_origin[1]))
+        if cx_low > cx_high or cy_low > cy_high:
+            return None
+        return self._rng.randint(cx_low, cx_high), self._rng.randint(cy_low, cy_high)
+
+    def _cell(self, coordinate: float) -> int:
+        return int(math.floor(coordinate / self.cell_size))
+
+    def _anchor_masks(self, span_cols: int, span_rows: int) -> List[int]:
+        """
+        Для каждой строки возвращает маску ячеек, с которых можно начать
+        свободный прямоугольник span_cols x span_rows ячеек.
+        """
+        key = (span_cols, span_rows)
+        cached = self._anchor_cache.get(key)
+        if cached is not None:
+            return cached
+
+        if span_cols > self.cols or span_rows > self.rows:
+            self._anchor_cache[key] = []
+            return []
+
+        masks = self._horizontal_run_masks(span_cols)
+        # Вертикально: строка r остается, если свободны строки r..r+span_rows-1
+        run = 1
+        while run < span_rows:
+            shift = min(run, span_rows - run)
+            masks = [masks[r] & masks[r + shift] for r in range(len(masks) - shift)]
+            run += shift
+        # Якорь не может начинаться в ячейках, из-за которых прямоугольник выходит за сетку
+        masks = [mask & ((1 << (self.cols - span_cols + 1)) - 1) for mask in masks]
+
+        self._anchor_cache[key] = masks
+        return masks
+
+    def _horizontal_run_masks(self, span_cols: int) -> List[int]:
+        """Для каждой строки: бит c установлен, если свободны ячейки c..c+span_cols-1."""
+        cached = self._run_cache.get(span_cols)
+        if cached is not None:
+            return cached
+        full_row = (1 << self.cols) - 1
+        masks = [~row_mask & full_row for row_mask in self._row_masks]
+        # Удвоение сдвигов: log(span_cols) проходов вместо span_cols
+        run = 1
+        while run < span_cols:
+            shift = min(run, span_cols - run)
+            masks = [mask & (mask >> shift) for mask in masks]
+            run += shift
+        self._run_cache[span_cols] = masks
+        return masks
+
+
+def _nth_set_bit(mask: int, n: int) -> int:
+    """Индекс n-го (с нуля) установленного бита маски."""
+    while n > 0:
+        mask &= mask - 1 # Сбрасываем младший установленный бит
+        n -= 1
+    return (mask & -mask).bit_length() - 1
@@ -3,14 +3,16 @@ import importlib
 import inspect
 import logging
 from pathlib import Path
-from typing import Dict, List, Optional, Union, Tuple, Type
+from typing import Any, Dict, List, Optional, Union, Tuple, Type
 
-from .shapes.abc import AbstractShape #
+from .shapes.abc import AbstractShape, ShapeStorageLoader #
 
 logger = logging.getLogger(__name__)
 
 MODEL_REGISTRIES: Dict[str, Dict[str, Type[AbstractShape]]] = {}
 MODEL_COLORS: Dict[str, List[Union[str, Tuple[int, int, int]]]] = {}
+# Таблица восстановления фигур из хранилища: (модель, тип фигуры) -> загрузчик (см. AbstractShape.from_storage)
+SHAPE_LOADERS: Dict[Tuple[str, str], ShapeStorageLoader] = {}
 
 AVAILABLE_COLORS_GENERAL: List[Union[str, Tuple[int, int, int]]] = [
     "red", "blue", "green", "#FFBF00", (128, 0, 128), "orange", "grey",
@@ -23,9 +25,10 @@ def discover_shapes(
     base_package_name: str = "shape_captcha_lib",
     shapes_root_module_name: str = "shapes"
 ):
-    global MODEL_REGISTRIES, MODEL_COLORS
+    global MODEL_REGISTRIES, MODEL_COLORS, SHAPE_LOADERS
     MODEL_REGISTRIES.clear()
     MODEL_COLORS.clear()
+    SHAPE_LOADERS.clear()
 
     try:
         package_spec = importlib.util.find_spec(base_package_name)
@@ -116,6 +119,8 @@ def discover_shapes(
                     except Exception as e:
                         logger.error(f"Error processing file {shape_file} in model {model_name}: {e}", exc_info=False)
 
+        _compile_shape_loaders()
+
         num_models = len(MODEL_REGISTRIES)
         num_total_shapes = sum(len(shapes) for shapes in MODEL_REGISTRIES.values())
         logger.info(f"Shape discovery complete. Found {num_total_shapes} shape types across {num_models} models.")
@@ -126,6 +131,19 @@ def discover_shapes(
         logger.error(f"General error during shape discovery process: {e}", exc_info=True)
 
 
+def _compile_shape_loaders() -> None:
+    """Заранее разбирает сигнатуры конструкторов всех зарегистрированных фигур для from_storage."""
+    for model_name, shapes in MODEL_REGISTRIES.items():
+        for shape_type_name, shape_class in shapes.items():
+            try:
+                shape_class.get_storage_loader()
+            except Exception as e_loader:
+                logger.error(f"Could not prepare storage loader for {shape_class.__name__}: {e_loader}")
+                continue
+            # Сохраняем from_storage, а не сам загрузчик: фигура может переопределить восстановление
+            SHAPE_LOADERS[(model_name, shape_type_name)] = shape_class.from_storage
+
+
 def get_model_colors(model_name: str) -> List[Union[str, Tuple[int, int, int]]]:
     return MODEL_COLORS.get(model_name, AVAILABLE_COLORS_GENERAL)
 
@@ -139,4 +157,22 @@ def get_model_shape_types(model_name: str) -> List[str]:
     return list(MODEL_REGISTRIES.get(model_name, {}).keys())
 
 def get_all_registered_models() -> List[str]:
-    return list(MODEL_REGISTRIES.keys())
\ No newline at end of file
+    return list(MODEL_REGISTRIES.keys())
+
+def load_shape_from_storage(
+    model_name: str,
+    shape_type: str,
+    params_for_storage: Dict[str, Any],
+    color_name_or_rgb: Union[str, Tuple[int, int, int]]
+) -> Optional[AbstractShape]:
+    """
+    Восстанавливает фигуру из сохраненных параметров через таблицу SHAPE_LOADERS.
+    Returns:
+        Экземпляр фигуры или None, если тип фигуры не зарегистрирован в модели.
+    Raises:
+        Исключения конструктора фигуры (TypeError, ValueError) при неполных параметрах.
+    """
+    loader = SHAPE_LOADERS.get((model_name, shape_type))
+    if loader is None:
+        return None
+    return loader(params_for_storage, color_name_or_rgb)
@@ -1,8 +1,25 @@
 # shape_captcha_lib/services/__init__.py
 from .async_service import AsyncCaptchaChallengeService
 from .sync_service import SyncCaptchaChallengeService
+from .challenge_pool import ChallengePool
+from .stateless_service import StatelessCaptchaService, AsyncStatelessCaptchaService
+from .render_executor import (
+    AbstractRenderExecutor,
+    InlineRenderExecutor,
+    ThreadRenderExecutor,
+    ProcessRenderExecutor,
+    RenderOverloadedError,
+)
 
 __all__ = [
     "AsyncCaptchaChallengeService",
     "SyncCaptchaChallengeService",
+    "ChallengePool",
+    "StatelessCaptchaService",
+    "AsyncStatelessCaptchaService",
+    "AbstractRenderExecutor",
+    "InlineRenderExecutor",
+    "ThreadRenderExecutor",
+    "ProcessRenderExecutor",
+    "RenderOverloadedError",
 ]
\ No newline at end of file
@@ -1,12 +1,17 @@
 # shape_captcha_lib/services/async_service.py
+import asyncio
+import secrets
 import uuid
-from typing import Tuple, Optional
+from typing import Any, Dict, Tuple, Optional, Union
 import logging
 
 from PIL.Image import Image as PILImage
 
 from ..logic_core import CaptchaLogicCore
 from ..stores.abc_store import AbstractAsyncCaptchaStore
+from ..utils.image_encoding import encode_image, resolve_encode_options
+from .challenge_pool import ChallengePool
+from .render_executor import AbstractRenderExecutor, InlineRenderExecutor, RenderOverloadedError
 # Предполагается, что DEFAULT_CAPTCHA_TTL_SECONDS определена где-то,
 # например, в settings.py или будет передана явно.
 # Если нет settings.py, можно определить здесь:
@@ -25,41 +30,87 @@ class AsyncCaptchaChallengeService:
         self,
         logic_core: CaptchaLogicCore,
         captcha_store: AbstractAsyncCaptchaStore,
-        captcha_ttl_seconds: int = DEFAULT_CAPTCHA_TTL_SECONDS
+        captcha_ttl_seconds: int = DEFAULT_CAPTCHA_TTL_SECONDS,
+        challenge_pool: Optional[ChallengePool] = None,
+        render_executor: Optional[AbstractRenderExecutor] = None,
+        seed_only_storage: bool = False
     ):
         if not isinstance(logic_core, CaptchaLogicCore):
             raise TypeError("logic_core must be an instance of CaptchaLogicCore")
         if not isinstance(captcha_store, AbstractAsyncCaptchaStore):
             raise TypeError("captcha_store must be an instance of AbstractAsyncCaptchaStore")
+        if challenge_pool is not None:
+            if not isinstance(challenge_pool, ChallengePool):
+                raise TypeError("challenge_pool must be an instance of ChallengePool")
+            if challenge_pool.logic_core is not logic_core:
+                raise ValueError("challenge_pool must be built on the same logic_core as the service")
+        if render_executor is not None and not isinstance(render_executor, AbstractRenderExecutor):
+            raise TypeError("render_executor must be an instance of AbstractRenderExecutor")
 
         self.logic_core = logic_core
         self.store = captcha_store
         self.captcha_ttl = captcha_ttl_seconds
-
-    async def create_challenge(self, language_code: Optional[str] = None) -> Tuple[str, PILImage, str]: 
+        # Пул заранее сгенерированных CAPTCHA (опционально). Жизненным циклом пула (start/close) управляет владелец.
+        self.challenge_pool = challenge_pool
+        # По умолчанию генерация выполняется прямо в event loop, как и раньше
+        self.render_executor = render_executor or InlineRenderExecutor()
+        # Хранить только (зерно, модель, хэш конфигурации, цель) вместо списка фигур;
+        # фигуры восстанавливаются по зерну при проверке
+        self.seed_only_storage = seed_only_storage
+
+    async def create_challenge(
+        self,
+        language_code: Optional[str] = None,
+        output_format: Optional[str] = None,
+        encode_options: Optional[Dict[str, Any]] = None
+    ) -> Tuple[str, Union[PILImage, bytes], str]:
         """
         Создает новый CAPTCHA "вызов".
 
+        Args:
+            language_code: Предпочитаемый код языка для подсказки.
+            output_format: "png", "webp" или "jpeg" - вернуть закодированные bytes
+                вместо объекта PIL. Кодирование выполняется в исполнителе генерации.
+            encode_options: Профиль ("profile": "fast" | "small") и/или параметры Image.save.
         Returns:
-            Кортеж (captcha_id, image_object, prompt_text).
+            Кортеж (captcha_id, image_object или bytes, prompt_text).
         Raises:
-            ValueError: Если не удалось сгенерировать CAPTCHA.
+            ValueError: Если не удалось сгенерировать CAPTCHA или формат неизвестен.
             ConnectionError: Если есть проблемы с сохранением в хранилище.
+            RenderOverloadedError: Если все слоты генерации исполнителя заняты.
         """
+        if output_format is not None:
+            resolve_encode_options(output_format, encode_options) # Проверяем формат до генерации
+
         try:
+            if self.challenge_pool is not None:
+                pooled = await self.challenge_pool.acquire_pooled()
+                image_obj, drawn_shapes_list, target_type, seed = (
+                    pooled.image, pooled.drawn_shapes, pooled.target_shape_type, pooled.seed
+                )
+                if output_format is not None:
+                    # Изображение из пула уже готово - кодируем его вне event loop
+                    image_obj = await asyncio.to_thread(encode_image, image_obj, output_format, encode_options)
+            else:
+                seed = secrets.randbits(64) if self.seed_only_storage else None
+                image_obj, drawn_shapes_list = await self.render_executor.generate(
+                    self.logic_core.build_generation_kwargs(seed), output_format, encode_options
+                )
+                target_type = self.logic_core.select_target(drawn_shapes_list)
             # language_code передается в logic_core
-            image_obj, drawn_shapes_list, target_type, prompt = self.logic_core.generate_challenge_data(
-                language_code=language_code
-            )
+            prompt = self.logic_core.build_prompt(target_type, language_code)
+        except RenderOverloadedError:
+            logger.warning("AsyncService: CAPTCHA rendering is overloaded, rejecting request.")
+            raise
         except Exception as e:
             logger.error(f"Error generating CAPTCHA data via logic_core: {e}", exc_info=True)
             raise ValueError(f"Failed to generate CAPTCHA challenge: {e}")
 
         captcha_id = uuid.uuid4().hex
-        challenge_data_to_store = {
-            "target_shape_type": target_type, # target_type здесь это ключ для перевода, а не переведенное имя
-            "all_drawn_shapes": drawn_shapes_list
-        }
+        if self.seed_only_storage:
+            challenge_data_to_store = self.logic_core.build_challenge_record(seed, target_type)
+        else:
+            challenge_data_to_store = self.logic_core.build_stored_challenge(target_type, drawn_shapes_list)
 
         try:
             await self.store.store_challenge(captcha_id, challenge_data_to_store, self.captcha_ttl)
@@ -78,7 +129,8 @@ class AsyncCaptchaChallengeService:
         """
         challenge_data: Optional[dict]
         try:
-            challenge_data = await self.store.retrieve_challenge(captcha_id)
+            # Чтение и удаление одной операцией хранилища: повторная проверка того же ID получит None
+            challenge_data = await self.store.consume_challenge(captcha_id)
         except Exception as e_retrieve:
             logger.error(f"AsyncService: Error retrieving CAPTCHA data for ID {captcha_id}: {e_retrieve}", exc_info=True)
             return False
@@ -87,11 +139,25 @@ class AsyncCaptchaChallengeService:
             logger.warning(f"AsyncService: CAPTCHA ID {captcha_id} not found or expired.")
             return False
 
-        try:
-            await self.store.delete_challenge(captcha_id)
-            logger.debug(f"AsyncService: CAPTCHA ID {captcha_id} deleted from store after retrieval.")
-        except Exception as e_delete:
-            logger.error(f"AsyncService: CRITICAL - Failed to delete CAPTCHA ID {captcha_id} after retrieval: {e_delete}", exc_info=True)
+        if "seed" in challenge_data:
+            # Запись только с зерном: фигуры восстанавливаются без отрисовки
+            try:
+                is_correct = self.logic_core.verify_challenge_record(challenge_data, click_x, click_y)
+                logger.info(f"AsyncService: CAPTCHA ID {captcha_id} verification result: {is_correct}")
+                return is_correct
+            except Exception as e_verify:
+                logger.error(f"AsyncService: Error during seed-based verification for ID {captcha_id}: {e_verify}", exc_info=True)
+                return False
+
+        if "hit_map" in challenge_data:
+            # Запись с картой меток: проверка одним поиском по координатам клика
+            try:
+                is_correct = self.logic_core.verify_hit_map_record(challenge_data, click_x, click_y)
+                logger.info(f"AsyncService: CAPTCHA ID {captcha_id} verification result: {is_correct}")
+                return is_correct
+            except Exception as e_verify:
+                logger.error(f"AsyncService: Error during hit-map verification for ID {captcha_id}: {e_verify}", exc_info=True)
+                return False
 
         target_shape_type = challenge_data.get("target_shape_type")
         all_drawn_shapes = challenge_data.get("all_drawn_shapes")
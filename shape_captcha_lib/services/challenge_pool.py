@@ -0,0 +1,180 @@
+# shape_captcha_lib/services/challenge_pool.py
+import asyncio
+import collections
+import secrets
+import time
+from typing import Any, Deque, Dict, List, NamedTuple, Optional, Tuple
+import logging
+
+from PIL.Image import Image as PILImage
+
+from ..logic_core import CaptchaLogicCore
+from .render_executor import AbstractRenderExecutor
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_POOL_SIZE = 32
+DEFAULT_POOL_LOW_WATERMARK = 8
+DEFAULT_POOL_MAX_AGE_SECONDS = 120.0
+
+
+class PooledChallenge(NamedTuple):
+    image: PILImage
+    drawn_shapes: List[Dict[str, Any]]
+    target_shape_type: str
+    created_at: float  # time.monotonic() на момент генерации
+    seed: int  # Зерно генерации: позволяет хранить CAPTCHA без списка фигур
+
+
+class ChallengePool:
+    """
+    Пул заранее сгенерированных CAPTCHA (изображение + данные фигур) для одной модели.
+
+    Пул привязан к конкретному CaptchaLogicCore. Когда количество готовых CAPTCHA
+    опускается ниже low_watermark, в фоне запускается пополнение до pool_size
+    (генерация выполняется через render_executor или, если он не задан, в отдельном
+    потоке, чтобы не блокировать event loop).
+    Если пул пуст, CAPTCHA генерируется inline (через render_executor, если он задан).
+    Подсказка не хранится в пуле: она зависит от языка и формируется при выдаче.
+    """
+
+    def __init__(
+        self,
+        logic_core: CaptchaLogicCore,
+        pool_size: int = DEFAULT_POOL_SIZE,
+        low_watermark: int = DEFAULT_POOL_LOW_WATERMARK,
+        max_age_seconds: Optional[float] = DEFAULT_POOL_MAX_AGE_SECONDS,
+        render_executor: Optional[AbstractRenderExecutor] = None
+    ):
+        if not isinstance(logic_core, CaptchaLogicCore):
+            raise TypeError("logic_core must be an instance of CaptchaLogicCore")
+        if pool_size <= 0:
+            raise ValueError("pool_size must be positive")
+        if not 0 <= low_watermark <= pool_size:
+            raise ValueError("low_watermark must be between 0 and pool_size")
+        if render_executor is not None and not isinstance(render_executor, AbstractRenderExecutor):
+            raise TypeError("render_executor must be an instance of AbstractRenderExecutor")
+
+        self.logic_core = logic_core
+        self.pool_size = pool_size
+        self.low_watermark = low_watermark
+        self.max_age_seconds = max_age_seconds
+        self.render_executor = render_executor
+
+        self._ready: Deque[PooledChallenge] = collections.deque()
+        self._refill_task: Optional[asyncio.Task] = None
+        self._closed = False
+
+        # Счетчики для подбора размера пула
+        self.hits = 0
+        self.misses = 0
+        self.expired = 0
+        self.refill_errors = 0
+
+    @property
+    def depth(self) -> int:
+        """Количество готовых CAPTCHA в пуле."""
+        return len(self._ready)
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "depth": self.depth,
+            "hits": self.hits,
+            "misses": self.misses,
+            "expired": self.expired,
+            "refill_errors": self.refill_errors,
+        }
+
+    def start(self) -> None:
+        """Запускает фоновое заполнение пула. Требует запущенного event loop."""
+        self._ensure_refill()
+
+    async def fill(self) -> None:
+        """Заполняет пул до pool_size и дожидается окончания заполнения (удобно при старте приложения)."""
+        self._ensure_refill()
+        if self._refill_task is not None:
+            await self._refill_task
+
+    async def acquire(self) -> Tuple[PILImage, List[Dict[str, Any]], str]:
+        """
+        Возвращает готовую CAPTCHA из пула или, если пул пуст, генерирует ее inline.
+
+        Returns:
+            Кортеж (image_object, drawn_shapes_details_list, target_shape_type_key).
+        """
+        pooled = await self.acquire_pooled()
+        return pooled.image, pooled.drawn_shapes, pooled.target_shape_type
+
+    async def acquire_pooled(self) -> PooledChallenge:
+        """Как acquire(), но возвращает PooledChallenge целиком (включая зерно генерации)."""
+        self._drop_expired()
+
+        if self._ready:
+            pooled = self._ready.popleft()
+            self.hits += 1
+        else:
+            self.misses += 1
+            logger.debug(f"ChallengePool: pool for model '{self.logic_core.model_name}' is empty, generating inline.")
+            pooled = await self._generate_one(inline=True)
+
+        if len(self._ready) < self.low_watermark:
+            self._ensure_refill()
+        return pooled
+
+    async def close(self) -> None:
+        """Останавливает фоновое пополнение и очищает пул."""
+        self._closed = True
+        if self._refill_task is not None and not self._refill_task.done():
+            self._refill_task.cancel()
+            try:
+                await self._refill_task
+            except asyncio.CancelledError:
+                pass
+        self._refill_task = None
+        self._ready.clear()
+
+    async def _generate_one(self, inline: bool) -> PooledChallenge:
+        seed = secrets.randbits(64)
+        if self.render_executor is not None:
+            image_obj, drawn_shapes_list = await self.render_executor.generate(
+                self.logic_core.build_generation_kwargs(seed)
+            )
+            target_type = self.logic_core.select_target(drawn_shapes_list)
+        elif inline:
+            image_obj, drawn_shapes_list, target_type = self.logic_core.render_challenge(seed)
+        else:
+            image_obj, drawn_shapes_list, target_type = await asyncio.to_thread(self.logic_core.render_challenge, seed)
+        return PooledChallenge(image_obj, drawn_shapes_list, target_type, time.monotonic(), seed)
+
+    def _drop_expired(self) -> None:
+        if self.max_age_seconds is None:
+            return
+        oldest_allowed = time.monotonic() - self.max_age_seconds
+        # CAPTCHA добавляются в конец в порядке генерации, поэтому самые старые всегда слева
+        while self._ready and self._ready[0].created_at < oldest_allowed:
+            self._ready.popleft()
+            self.expired += 1
+
+    def _ensure_refill(self) -> None:
+        if self._closed:
+            return
+        if self._refill_task is not None and not self._refill_task.done():
+            return
+        self._refill_task = asyncio.get_running_loop().create_task(self._refill())
+
+    async def _refill(self) -> None:
+        self._drop_expired()
+        # Число генераций ограничено заранее: если max_age меньше времени генерации,
+        # бесконечно догонять устаревающие CAPTCHA нельзя.
+        missing = self.pool_size - len(self._ready)
+        for _ in range(missing):
+            if self._closed:
+                break
+            try:
+                pooled = await self._generate_one(inline=False)
+            except Exception as e:
+                self.refill_errors += 1
+                logger.error(f"ChallengePool: Error pre-generating CAPTCHA for model '{self.logic_core.model_name}': {e}", exc_info=True)
+                break  # Не крутимся в цикле ошибок; следующая попытка будет при следующей выдаче
+            self._ready.append(pooled)
+        logger.debug(f"ChallengePool: refill finished for model '{self.logic_core.model_name}', depth {len(self._ready)}.")
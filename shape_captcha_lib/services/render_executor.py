@@ -0,0 +1,217 @@
+# shape_captcha_lib/services/render_executor.py
+import asyncio
+import functools
+import os
+from abc import ABC, abstractmethod
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Any, Dict, List, Optional, Tuple, Union
+import logging
+
+from PIL import Image
+from PIL.Image import Image as PILImage
+
+from ..image_generator import generate_captcha_image
+from ..utils.image_encoding import encode_image
+
+logger = logging.getLogger(__name__)
+
+
+class RenderOverloadedError(RuntimeError):
+    """Все слоты генерации заняты: запрос отклонен, чтобы не копить очередь."""
+
+
+def _init_render_worker() -> None:
+    """
+    Инициализатор процесса-воркера. Импорт пакета выполняет discover_shapes(),
+    поэтому реестр фигур заполняется один раз на процесс, а не на каждую задачу.
+    """
+    import shape_captcha_lib  # noqa: F401
+
+
+def _render_and_encode(
+    generate_kwargs: Dict[str, Any],
+    output_format: Optional[str] = None,
+    encode_options: Optional[Dict[str, Any]] = None
+) -> Tuple[Union[PILImage, bytes], List[Dict[str, Any]]]:
+    """Генерирует CAPTCHA и, если задан output_format, сразу кодирует изображение."""
+    image_object, drawn_shapes_info_list = generate_captcha_image(**generate_kwargs)
+    if output_format is not None:
+        return encode_image(image_object, output_format, encode_options), drawn_shapes_info_list
+    return image_object, drawn_shapes_info_list
+
+
+def _render_in_worker(
+    generate_kwargs: Dict[str, Any],
+    output_format: Optional[str] = None,
+    encode_options: Optional[Dict[str, Any]] = None
+) -> Tuple[Any, List[Dict[str, Any]]]:
+    """
+    Генерирует CAPTCHA в процессе-воркере. Возвращает закодированные байты изображения
+    или, если формат не задан, сырой буфер пикселей (mode, size, bytes) вместо объекта PIL.
+    """
+    image_or_bytes, drawn_shapes_info_list = _render_and_encode(generate_kwargs, output_format, encode_options)
+    if isinstance(image_or_bytes, bytes):
+        return image_or_bytes, drawn_shapes_info_list
+    return (image_or_bytes.mode, image_or_bytes.size, image_or_bytes.tobytes()), drawn_shapes_info_list
+
+
+class AbstractRenderExecutor(ABC):
+    """
+    Абстрактный исполнитель генерации изображений CAPTCHA для асинхронных сервисов.
+
+    Ограничивает число одновременных генераций (max_in_flight). Если свободного слота
+    нет в течение acquire_timeout_seconds, выбрасывается RenderOverloadedError.
+    """
+
+    def __init__(self, max_in_flight: Optional[int] = None, acquire_timeout_seconds: float = 0.0):
+        if max_in_flight is not None and max_in_flight <= 0:
+            raise ValueError("max_in_flight must be positive or None")
+        if acquire_timeout_seconds < 0:
+            raise ValueError("acquire_timeout_seconds must be non-negative")
+        self.max_in_flight = max_in_flight
+        self.acquire_timeout_seconds = acquire_timeout_seconds
+        self.in_flight = 0
+        # Семафор создается лениво, внутри работающего event loop
+        self._semaphore: Optional[asyncio.Semaphore] = None
+
+    async def generate(
+        self,
+        generate_kwargs: Dict[str, Any],
+        output_format: Optional[str] = None,
+        encode_options: Optional[Dict[str, Any]] = None
+    ) -> Tuple[Union[PILImage, bytes], List[Dict[str, Any]]]:
+        """
+        Генерирует изображение CAPTCHA с аргументами generate_captcha_image.
+        Если задан output_format ("png", "webp", "jpeg"), изображение кодируется
+        там же, где генерировалось (в потоке/процессе-воркере).
+
+        Returns:
+            Кортеж (image_object или закодированные bytes, drawn_shapes_info_list).
+        Raises:
+            RenderOverloadedError: Если все слоты генерации заняты.
+        """
+        if self.max_in_flight is None:
+            return await self._generate(generate_kwargs, output_format, encode_options)
+
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.max_in_flight)
+        if self._semaphore.locked() and self.acquire_timeout_seconds <= 0:
+            raise RenderOverloadedError(f"CAPTCHA rendering is overloaded ({self.in_flight} renders in flight).")
+        try:
+            await asyncio.wait_for(self._semaphore.acquire(), timeout=self.acquire_timeout_seconds or None)
+        except asyncio.TimeoutError:
+            raise RenderOverloadedError(
+                f"CAPTCHA rendering is overloaded: no free slot within {self.acquire_timeout_seconds}s."
+            )
+
+        self.in_flight += 1
+        try:
+            return await self._generate(generate_kwargs, output_format, encode_options)
+        finally:
+            self.in_flight -= 1
+            self._semaphore.release()
+
+    @abstractmethod
+    async def _generate(
+        self,
+        generate_kwargs: Dict[str, Any],
+        output_format: Optional[str],
+        encode_options: Optional[Dict[str, Any]]
+    ) -> Tuple[Union[PILImage, bytes], List[Dict[str, Any]]]:
+        pass
+
+    def shutdown(self, wait: bool = True) -> None:
+        """Освобождает ресурсы исполнителя (пулы потоков/процессов)."""
+        pass
+
+
+class InlineRenderExecutor(AbstractRenderExecutor):
+    """Генерирует изображение прямо в event loop (поведение по умолчанию, без пулов)."""
+
+    async def _generate(
+        self,
+        generate_kwargs: Dict[str, Any],
+        output_format: Optional[str],
+        encode_options: Optional[Dict[str, Any]]
+    ) -> Tuple[Union[PILImage, bytes], List[Dict[str, Any]]]:
+        return _render_and_encode(generate_kwargs, output_format, encode_options)
+
+
+class _PoolRenderExecutor(AbstractRenderExecutor):
+    def __init__(
+        self,
+        executor: Executor,
+        max_workers: int,
+        max_in_flight: Optional[int] = None,
+        acquire_timeout_seconds: float = 0.0
+    ):
+        # По умолчанию держим не больше двух задач на воркер: одна выполняется, одна ждет
+        super().__init__(max_in_flight if max_in_flight is not None else max_workers * 2, acquire_timeout_seconds)
+        self.max_workers = max_workers
+        self._executor = executor
+
+    def shutdown(self, wait: bool = True) -> None:
+        self._executor.shutdown(wait=wait)
+        logger.info(f"{self.__class__.__name__}: executor shut down.")
+
+
+class ThreadRenderExecutor(_PoolRenderExecutor):
+    """
+    Генерирует изображения в пуле потоков. Pillow отпускает GIL в тяжелых операциях
+    (resize, composite), так что для легких конфигураций этого достаточно.
+    """
+
+    def __init__(
+        self,
+        max_workers: Optional[int] = None,
+        max_in_flight: Optional[int] = None,
+        acquire_timeout_seconds: float = 0.0
+    ):
+        max_workers = max_workers or min(32, (os.cpu_count() or 1) + 4)
+        executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="captcha-render")
+        super().__init__(executor, max_workers, max_in_flight, acquire_timeout_seconds)
+
+    async def _generate(
+        self,
+        generate_kwargs: Dict[str, Any],
+        output_format: Optional[str],
+        encode_options: Optional[Dict[str, Any]]
+    ) -> Tuple[Union[PILImage, bytes], List[Dict[str, Any]]]:
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(
+            self._executor,
+            functools.partial(_render_and_encode, generate_kwargs, output_format, encode_options)
+        )
+
+
+class ProcessRenderExecutor(_PoolRenderExecutor):
+    """
+    Генерирует изображения в пуле процессов, так что пропускная способность
+    масштабируется по ядрам. Воркеры импортируют реестр фигур один раз при старте
+    и возвращают сырой буфер пикселей (или уже закодированное изображение) вместе с данными фигур.
+    """
+
+    def __init__(
+        self,
+        max_workers: Optional[int] = None,
+        max_in_flight: Optional[int] = None,
+        acquire_timeout_seconds: float = 0.0
+    ):
+        max_workers = max_workers or os.cpu_count() or 1
+        executor = ProcessPoolExecutor(max_workers=max_workers, initializer=_init_render_worker)
+        super().__init__(executor, max_workers, max_in_flight, acquire_timeout_seconds)
+
+    async def _generate(
+        self,
+        generate_kwargs: Dict[str, Any],
+        output_format: Optional[str],
+        encode_options: Optional[Dict[str, Any]]
+    ) -> Tuple[Union[PILImage, bytes], List[Dict[str, Any]]]:
+        loop = asyncio.get_running_loop()
+        image_payload, drawn_shapes_info_list = await loop.run_in_executor(
+            self._executor, _render_in_worker, generate_kwargs, output_format, encode_options
+        )
+        if output_format is not None:
+            return image_payload, drawn_shapes_info_list
+        mode, size, raw_pixels = image_payload
+        return Image.frombytes(mode, size, raw_pixels), drawn_shapes_info_list
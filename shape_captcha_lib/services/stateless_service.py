@@ -0,0 +1,230 @@
+# shape_captcha_lib/services/stateless_service.py
+import asyncio
+import secrets
+import time
+from typing import Any, Dict, Iterable, List, Optional, Tuple, Union
+import logging
+
+from PIL.Image import Image as PILImage
+
+from ..logic_core import CaptchaLogicCore
+from ..utils.challenge_token import ChallengeTokenCodec
+from ..utils.image_encoding import encode_image, resolve_encode_options
+from ..utils.replay_filter import AbstractReplayFilter, RotatingBloomFilter
+from .challenge_pool import ChallengePool
+from .render_executor import AbstractRenderExecutor, InlineRenderExecutor, RenderOverloadedError
+
+try:
+    from ..settings import DEFAULT_CAPTCHA_TTL_SECONDS
+except ImportError:
+    DEFAULT_CAPTCHA_TTL_SECONDS = 300
+
+logger = logging.getLogger(__name__)
+
+
+class _StatelessServiceBase:
+    """
+    Общая часть stateless-сервисов: данные CAPTCHA (зерно, срок действия, цель,
+    хэш конфигурации) не сохраняются в хранилище, а шифруются и подписываются
+    в токен, который и возвращается как captcha_id.
+    Повторное использование токена отсекается фильтром повторов (replay_filter).
+    """
+
+    _log_name = "StatelessService"
+
+    def __init__(
+        self,
+        logic_core: CaptchaLogicCore,
+        secret_key: Union[str, bytes],
+        captcha_ttl_seconds: int = DEFAULT_CAPTCHA_TTL_SECONDS,
+        replay_filter: Optional[AbstractReplayFilter] = None,
+        previous_secret_keys: Iterable[Union[str, bytes]] = (),
+        token_cipher: Optional[str] = None
+    ):
+        if not isinstance(logic_core, CaptchaLogicCore):
+            raise TypeError("logic_core must be an instance of CaptchaLogicCore")
+        if replay_filter is not None and not isinstance(replay_filter, AbstractReplayFilter):
+            raise TypeError("replay_filter must be an instance of AbstractReplayFilter")
+        if len(logic_core.current_model_shape_types) > 256:
+            raise ValueError("Stateless tokens support at most 256 shape types per model")
+
+        self.logic_core = logic_core
+        self.captcha_ttl = captcha_ttl_seconds
+        # token_cipher: "aes-gcm", "hmac-ctr" или None (см. ChallengeTokenCodec)
+        self.token_codec = ChallengeTokenCodec(secret_key, previous_secret_keys, token_cipher)
+        # Фильтр в памяти процесса; для нескольких процессов можно передать общий фильтр
+        self.replay_filter = replay_filter or RotatingBloomFilter()
+
+    def _issue_token(self, seed: int, target_type: str) -> str:
+        return self.token_codec.seal(
+            seed=seed,
+            expires_at=int(time.time()) + self.captcha_ttl,
+            target_index=self.logic_core.current_model_shape_types.index(target_type),
+            config_hash=self.logic_core.config_hash()
+        )
+
+    def _verify_token(self, captcha_id: str, click_x: int, click_y: int) -> bool:
+        claims = self.token_codec.open(captcha_id)
+        if claims is None:
+            logger.warning(f"{self._log_name}: Invalid or forged CAPTCHA token.")
+            return False
+        if claims.expires_at < time.time():
+            logger.warning(f"{self._log_name}: CAPTCHA token {claims.token_id.hex()} expired.")
+            return False
+
+        shape_types = self.logic_core.current_model_shape_types
+        if claims.target_index >= len(shape_types):
+            logger.warning(f"{self._log_name}: CAPTCHA token {claims.token_id.hex()} has an unknown target index.")
+            return False
+
+        # Токен "используется" до проверки ответа - как удаление записи из хранилища при проверке
+        if not self.replay_filter.add_if_absent(claims.token_id, claims.expires_at):
+            logger.warning(f"{self._log_name}: CAPTCHA token {claims.token_id.hex()} was already used.")
+            return False
+
+        challenge_record = {
+            "seed": claims.seed,
+            "model_name": self.logic_core.model_name,
+            "config_hash": claims.config_hash,
+            "target_shape_type": shape_types[claims.target_index],
+        }
+        try:
+            is_correct = self.logic_core.verify_challenge_record(challenge_record, click_x, click_y)
+        except Exception as e_verify:
+            logger.error(
+                f"{self._log_name}: Error during verification of token {claims.token_id.hex()}: {e_verify}", exc_info=True
+            )
+            return False
+        logger.info(f"{self._log_name}: CAPTCHA token {claims.token_id.hex()} verification result: {is_correct}")
+        return is_correct
+
+
+class StatelessCaptchaService(_StatelessServiceBase):
+    """
+    Синхронный сервис CAPTCHA без хранилища: create_challenge и verify_solution
+    не выполняют операций ввода-вывода, поэтому сервис масштабируется горизонтально.
+    Все экземпляры должны использовать один secret_key и одинаковую конфигурацию logic_core.
+    """
+
+    _log_name = "StatelessService"
+
+    def create_challenge(
+        self,
+        language_code: Optional[str] = None,
+        output_format: Optional[str] = None,
+        encode_options: Optional[Dict[str, Any]] = None
+    ) -> Tuple[str, Union[PILImage, bytes], str]:
+        """
+        Создает новый CAPTCHA "вызов".
+
+        Returns:
+            Кортеж (captcha_id - подписанный токен, image_object или bytes, prompt_text).
+        Raises:
+            ValueError: Если не удалось сгенерировать CAPTCHA или формат неизвестен.
+        """
+        if output_format is not None:
+            resolve_encode_options(output_format, encode_options) # Проверяем формат до генерации
+
+        seed = secrets.randbits(64)
+        try:
+            image_obj, _, target_type, prompt = self.logic_core.generate_challenge_data(
+                language_code=language_code,
+                seed=seed
+            )
+            if output_format is not None:
+                image_obj = encode_image(image_obj, output_format, encode_options)
+        except Exception as e:
+            logger.error(f"Error generating CAPTCHA data via logic_core: {e}", exc_info=True)
+            raise ValueError(f"Failed to generate CAPTCHA challenge: {e}")
+
+        captcha_id = self._issue_token(seed, target_type)
+        logger.info(f"{self._log_name}: CAPTCHA challenge issued (target: {target_type}).")
+        return captcha_id, image_obj, prompt
+
+    def verify_solution(self, captcha_id: str, click_x: int, click_y: int) -> bool:
+        """Проверяет решение пользователя по токену. Каждый токен можно проверить только один раз."""
+        return self._verify_token(captcha_id, click_x, click_y)
+
+
+class AsyncStatelessCaptchaService(_StatelessServiceBase):
+    """
+    Асинхронный вариант StatelessCaptchaService. Как и AsyncCaptchaChallengeService,
+    поддерживает пул заранее сгенерированных CAPTCHA и исполнитель генерации.
+    """
+
+    _log_name = "AsyncStatelessService"
+
+    def __init__(
+        self,
+        logic_core: CaptchaLogicCore,
+        secret_key: Union[str, bytes],
+        captcha_ttl_seconds: int = DEFAULT_CAPTCHA_TTL_SECONDS,
+        replay_filter: Optional[AbstractReplayFilter] = None,
+        previous_secret_keys: Iterable[Union[str, bytes]] = (),
+        challenge_pool: Optional[ChallengePool] = None,
+        render_executor: Optional[AbstractRenderExecutor] = None,
+        token_cipher: Optional[str] = None
+    ):
+        super().__init__(
+            logic_core, secret_key, captcha_ttl_seconds, replay_filter, previous_secret_keys, token_cipher
+        )
+        if challenge_pool is not None:
+            if not isinstance(challenge_pool, ChallengePool):
+                raise TypeError("challenge_pool must be an instance of ChallengePool")
+            if challenge_pool.logic_core is not logic_core:
+                raise ValueError("challenge_pool must be built on the same logic_core as the service")
+        if render_executor is not None and not isinstance(render_executor, AbstractRenderExecutor):
+            raise TypeError("render_executor must be an instance of AbstractRenderExecutor")
+
+        self.challenge_pool = challenge_pool
+        self.render_executor = render_executor or InlineRenderExecutor()
+
+    async def create_challenge(
+        self,
+        language_code: Optional[str] = None,
+        output_format: Optional[str] = None,
+        encode_options: Optional[Dict[str, Any]] = None
+    ) -> Tuple[str, Union[PILImage, bytes], str]:
+        """
+        Создает новый CAPTCHA "вызов".
+
+        Returns:
+            Кортеж (captcha_id - подписанный токен, image_object или bytes, prompt_text).
+        Raises:
+            ValueError: Если не удалось сгенерировать CAPTCHA или формат неизвестен.
+            RenderOverloadedError: Если все слоты генерации исполнителя заняты.
+        """
+        if output_format is not None:
+            resolve_encode_options(output_format, encode_options) # Проверяем формат до генерации
+
+        try:
+            if self.challenge_pool is not None:
+                pooled = await self.challenge_pool.acquire_pooled()
+                image_obj, target_type, seed = pooled.image, pooled.target_shape_type, pooled.seed
+                if output_format is not None:
+                    image_obj = await asyncio.to_thread(encode_image, image_obj, output_format, encode_options)
+            else:
+                seed = secrets.randbits(64)
+                drawn_shapes_list: List[Dict[str, Any]]
+                image_obj, drawn_shapes_list = await self.render_executor.generate(
+                    self.logic_core.build_generation_kwargs(seed), output_format, encode_options
+                )
+                target_type = self.logic_core.select_target(drawn_shapes_list)
+            prompt = self.logic_core.build_prompt(target_type, language_code)
+        except RenderOverloadedError:
+            logger.warning(f"{self._log_name}: CAPTCHA rendering is overloaded, rejecting request.")
+            raise
+        except Exception as e:
+            logger.error(f"Error generating CAPTCHA data via logic_core: {e}", exc_info=True)
+            raise ValueError(f"Failed to generate CAPTCHA challenge: {e}")
+
+        captcha_id = self._issue_token(seed, target_type)
+        logger.info(f"{self._log_name}: CAPTCHA challenge issued (target: {target_type}).")
+        return captcha_id, image_obj, prompt
+
+    async def verify_solution(self, captcha_id: str, click_x: int, click_y: int) -> bool:
+        """
+        Проверяет решение пользователя по токену. Раскладка восстанавливается
+        по зерну без отрисовки, поэтому проверка выполняется прямо в event loop.
+        """
+        return self._verify_token(captcha_id, click_x, click_y)
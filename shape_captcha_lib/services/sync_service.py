@@ -1,12 +1,14 @@
 # shape_captcha_lib/services/sync_service.py
+import secrets
 import uuid
-from typing import Tuple, Optional
+from typing import Any, Dict, Tuple, Optional, Union
 import logging
 
 from PIL.Image import Image as PILImage
 
 from ..logic_core import CaptchaLogicCore
 from ..stores.abc_store import AbstractSyncCaptchaStore
+from ..utils.image_encoding import encode_image, resolve_encode_options
 # Аналогично AsyncService, определяем DEFAULT_CAPTCHA_TTL_SECONDS
 try:
     from ..settings import DEFAULT_CAPTCHA_TTL_SECONDS
@@ -21,7 +23,8 @@ class SyncCaptchaChallengeService:
         self,
         logic_core: CaptchaLogicCore,
         captcha_store: AbstractSyncCaptchaStore,
-        captcha_ttl_seconds: int = DEFAULT_CAPTCHA_TTL_SECONDS
+        captcha_ttl_seconds: int = DEFAULT_CAPTCHA_TTL_SECONDS,
+        seed_only_storage: bool = False
     ):
         if not isinstance(logic_core, CaptchaLogicCore):
             raise TypeError("logic_core must be an instance of CaptchaLogicCore")
@@ -31,29 +34,45 @@ class SyncCaptchaChallengeService:
         self.logic_core = logic_core
         self.store = captcha_store
         self.captcha_ttl = captcha_ttl_seconds
+        # Хранить только (зерно, модель, хэш конфигурации, цель) вместо списка фигур
+        self.seed_only_storage = seed_only_storage
 
-    def create_challenge(self, language_code: Optional[str] = None) -> Tuple[str, PILImage, str]: # <--- ДОБАВЛЕН language_code
+    def create_challenge(
+        self,
+        language_code: Optional[str] = None,
+        output_format: Optional[str] = None,
+        encode_options: Optional[Dict[str, Any]] = None
+    ) -> Tuple[str, Union[PILImage, bytes], str]:
         """
         Создает новый CAPTCHA "вызов".
 
         Args:
             language_code (Optional[str]): Предпочитаемый код языка для подсказки.
+            output_format (Optional[str]): "png", "webp" или "jpeg" - вернуть закодированные bytes вместо объекта PIL.
+            encode_options (Optional[Dict]): Профиль ("profile": "fast" | "small") и/или параметры Image.save.
         # ... (остальные докстринги)
         """
+        if output_format is not None:
+            resolve_encode_options(output_format, encode_options) # Проверяем формат до генерации
+
+        seed = secrets.randbits(64) if self.seed_only_storage else None
         try:
             # language_code передается в logic_core
             image_obj, drawn_shapes_list, target_type, prompt = self.logic_core.generate_challenge_data(
-                language_code=language_code
+                language_code=language_code,
+                seed=seed
             )
+            if output_format is not None:
+                image_obj = encode_image(image_obj, output_format, encode_options)
         except Exception as e:
             logger.error(f"Error generating CAPTCHA data via logic_core: {e}", exc_info=True)
             raise ValueError(f"Failed to generate CAPTCHA challenge: {e}")
 
         captcha_id = uuid.uuid4().hex
-        challenge_data_to_store = {
-            "target_shape_type": target_type, # target_type здесь это ключ
-            "all_drawn_shapes": drawn_shapes_list
-        }
+        if self.seed_only_storage:
+            challenge_data_to_store = self.logic_core.build_challenge_record(seed, target_type)
+        else:
+            challenge_data_to_store = self.logic_core.build_stored_challenge(target_type, drawn_shapes_list)
 
         try:
             self.store.store_challenge(captcha_id, challenge_data_to_store, self.captcha_ttl)
@@ -71,7 +90,8 @@ class SyncCaptchaChallengeService:
         """
         challenge_data: Optional[dict]
         try:
-            challenge_data = self.store.retrieve_challenge(captcha_id)
+            # Чтение и удаление одной операцией хранилища: повторная проверка того же ID получит None
+            challenge_data = self.store.consume_challenge(captcha_id)
         except Exception as e_retrieve:
             logger.error(f"SyncService: Error retrieving CAPTCHA data for ID {captcha_id}: {e_retrieve}", exc_info=True)
             return False
@@ -79,12 +99,26 @@ class SyncCaptchaChallengeService:
         if not challenge_data:
             logger.warning(f"SyncService: CAPTCHA ID {captcha_id} not found or expired.")
             return False
-        
-        try:
-            self.store.delete_challenge(captcha_id)
-            logger.debug(f"SyncService: CAPTCHA ID {captcha_id} deleted from store after retrieval.")
-        except Exception as e_delete:
-            logger.error(f"SyncService: CRITICAL - Failed to delete CAPTCHA ID {captcha_id} after retrieval: {e_delete}", exc_info=True)
+
+        if "seed" in challenge_data:
+            # Запись только с зерном: фигуры восстанавливаются без отрисовки
+            try:
+                is_correct = self.logic_core.verify_challenge_record(challenge_data, click_x, click_y)
+                logger.info(f"SyncService: CAPTCHA ID {captcha_id} verification result: {is_correct}")
+                return is_correct
+            except Exception as e_verify:
+                logger.error(f"SyncService: Error during seed-based verification for ID {captcha_id}: {e_verify}", exc_info=True)
+                return False
+
+        if "hit_map" in challenge_data:
+            # Запись с картой меток: проверка одним поиском по координатам клика
+            try:
+                is_correct = self.logic_core.verify_hit_map_record(challenge_data, click_x, click_y)
+                logger.info(f"SyncService: CAPTCHA ID {captcha_id} verification result: {is_correct}")
+                return is_correct
+            except Exception as e_verify:
+                logger.error(f"SyncService: Error during hit-map verification for ID {captcha_id}: {e_verify}", exc_info=True)
+                return False
 
         target_shape_type = challenge_data.get("target_shape_type")
         all_drawn_shapes = challenge_data.get("all_drawn_shapes")
@@ -1,6 +1,8 @@
 # shape_captcha_lib/shapes/abc.py
+import inspect
+import random
 from abc import ABC, abstractmethod
-from typing import Dict, Any, List, Tuple, Union, Type, Optional # Добавлен Optional
+from typing import Dict, Any, Callable, List, Tuple, Union, Type, Optional # Добавлен Optional
 from PIL import ImageDraw
 from pydantic import BaseModel, Field
 
@@ -14,8 +16,26 @@ class ShapeDrawingDetails(BaseModel):
         max_length=4,
         description="Отмасштабированный Bounding Box [x_min, y_min, x_max, y_max]"
     )
+    hit_test: Optional[List[List[Any]]] = Field(
+        None,
+        description="Примитивы кликабельной области (см. geometry_utils.is_point_in_hit_test); "
+                    "None - проверка через пересоздание фигуры"
+    )
+
+# Псевдонимы ключей params_for_storage из старых форматов хранения -> имена аргументов конструктора
+STORAGE_KEY_ALIASES: Dict[str, str] = {
+    "cx": "cx_upscaled",
+    "cy": "cy_upscaled",
+    "rotation_rad": "rotation_angle_rad",
+}
+
+ShapeStorageLoader = Callable[[Dict[str, Any], Union[str, Tuple[int, int, int]]], "AbstractShape"]
+
 
 class AbstractShape(ABC):
+    # Дополнительные псевдонимы ключей хранения для конкретной фигуры, например {"r": "radius"}
+    storage_key_aliases: Dict[str, str] = {}
+
     @staticmethod
     @abstractmethod
     def get_shape_type() -> str:
@@ -30,14 +50,80 @@ class AbstractShape(ABC):
         max_primary_size_upscaled: int, # Максимальный основной размер
         min_secondary_size_upscaled: Optional[int] = None, # Опциональный минимальный вторичный размер
         max_secondary_size_upscaled: Optional[int] = None, # Опциональный максимальный вторичный размер
-        model_specific_constraints: Optional[Dict[str, Any]] = None
+        model_specific_constraints: Optional[Dict[str, Any]] = None,
+        rng: Optional[random.Random] = None
     ) -> Dict[str, Any]:
         """
         Генерирует параметры размера для фигуры (например, {'radius': 50}).
         Размеры должны быть в отмасштабированных (upscaled) значениях.
+        Все случайные значения берутся из rng (по умолчанию - модуль random),
+        чтобы генерация по зерну была воспроизводимой.
         """
         pass
 
+    @classmethod
+    def bbox_at_origin(cls, size_params: Dict[str, Any], rotation_angle_rad: float = 0.0) -> List[float]:
+        """
+        Возвращает bounding box [x_min, y_min, x_max, y_max] фигуры с центром в (0,0)
+        для заданных параметров размера (результат generate_size_params) и угла поворота.
+
+        Используется при размещении фигур, поэтому должен быть дешевым.
+        Реализация по умолчанию создает пробный экземпляр фигуры; фигурам стоит
+        переопределять этот метод аналитическим расчетом.
+        """
+        preview_shape_instance = cls(
+            cx_upscaled=0, cy_upscaled=0,
+            color_name_or_rgb=(0, 0, 0), # Цвет не важен для bbox
+            rotation_angle_rad=rotation_angle_rad,
+            **size_params
+        )
+        return preview_shape_instance.get_draw_details().bbox_upscaled
+
+    @classmethod
+    def from_storage(
+        cls,
+        params_for_storage: Dict[str, Any],
+        color_name_or_rgb: Union[str, Tuple[int, int, int]]
+    ) -> "AbstractShape":
+        """
+        Восстанавливает фигуру из params_for_storage (результат get_draw_details).
+        Ключи старых форматов переводятся через STORAGE_KEY_ALIASES и storage_key_aliases;
+        ключи, которые конструктор не принимает, отбрасываются.
+        """
+        return cls.get_storage_loader()(params_for_storage, color_name_or_rgb)
+
+    @classmethod
+    def get_storage_loader(cls) -> ShapeStorageLoader:
+        """
+        Возвращает (и кэширует на классе) функцию восстановления фигуры из хранилища.
+        Сигнатура конструктора и таблица псевдонимов разбираются один раз;
+        registry.discover_shapes() вызывает этот метод для всех фигур заранее.
+        """
+        loader = cls.__dict__.get("_storage_loader")
+        if loader is not None:
+            return loader
+
+        aliases = {**STORAGE_KEY_ALIASES, **cls.storage_key_aliases}
+        parameters = inspect.signature(cls.__init__).parameters
+        accepts_any_key = any(p.kind is inspect.Parameter.VAR_KEYWORD for p in parameters.values())
+        accepted_keys = frozenset(
+            name for name, p in parameters.items()
+            if p.kind is not inspect.Parameter.VAR_KEYWORD and name not in ("self", "color_name_or_rgb")
+        )
+
+        def load(params_for_storage: Dict[str, Any], color_name_or_rgb: Union[str, Tuple[int, int, int]]) -> "AbstractShape":
+            init_kwargs: Dict[str, Any] = {}
+            for key, value in params_for_storage.items():
+                name = aliases.get(key, key)
+                if name != key and name in params_for_storage:
+                    continue # Ключ в актуальном формате важнее псевдонима
+                if name in accepted_keys or (accepts_any_key and name != "color_name_or_rgb"):
+                    init_kwargs[name] = value
+            return cls(color_name_or_rgb=color_name_or_rgb, **init_kwargs)
+
+        cls._storage_loader = load
+        return load
+
     @abstractmethod
     def __init__(
         self,
@@ -69,4 +155,13 @@ class AbstractShape(ABC):
 
     @abstractmethod
     def is_point_inside(self, point_x_upscaled: int, point_y_upscaled: int) -> bool:
-        pass
\ No newline at end of file
+        pass
+
+    def get_hit_test_primitives(self) -> Optional[List[List[Any]]]:
+        """
+        Возвращает кликабельную область фигуры в виде компактных примитивов
+        (см. geometry_utils.is_point_in_hit_test), эквивалентных is_point_inside.
+        Примитивы сохраняются при генерации, и проверка клика не требует
+        пересоздания фигуры. None (по умолчанию) - фигура примитивы не поддерживает.
+        """
+        return None
\ No newline at end of file
@@ -10,6 +10,9 @@ from ...utils import color_utils
 
 
 class CircleShape(AbstractShape):
+    # Ключи старого формата хранения (verify_solution до появления from_storage)
+    storage_key_aliases = {"r": "radius"}
+
     @staticmethod
     def get_shape_type() -> str:
         return "circle"
@@ -22,19 +25,26 @@ class CircleShape(AbstractShape):
         max_primary_size_upscaled: int,  # Для круга это будет max_radius
         min_secondary_size_upscaled: Optional[int] = None,  # Не используется кругом
         max_secondary_size_upscaled: Optional[int] = None,  # Не используется кругом
-        model_specific_constraints: Optional[Dict[str, Any]] = None
+        model_specific_constraints: Optional[Dict[str, Any]] = None,
+        rng: Optional[random.Random] = None
     ) -> Dict[str, Any]:
         """
         Генерирует радиус для круга.
         min_primary_size_upscaled и max_primary_size_upscaled интерпретируются как мин/макс радиус.
         """
+        rng = rng or random
         if max_primary_size_upscaled <= min_primary_size_upscaled:
             # Гарантируем, что max больше min
             radius = max(1, min_primary_size_upscaled)
         else:
-            radius = random.randint(min_primary_size_upscaled, max_primary_size_upscaled)
+            radius = rng.randint(min_primary_size_upscaled, max_primary_size_upscaled)
         return {"radius": radius}
 
+    @classmethod
+    def bbox_at_origin(cls, size_params: Dict[str, Any], rotation_angle_rad: float = 0.0) -> List[float]:
+        radius = size_params["radius"]
+        return [float(-radius), float(-radius), float(radius), float(radius)]
+
     def __init__(
         self,
         cx_upscaled: int,
@@ -110,4 +120,7 @@ class CircleShape(AbstractShape):
             cx=self.cx_upscaled,
             cy=self.cy_upscaled,
             r=self.radius_upscaled
-        )
\ No newline at end of file
+        )
+
+    def get_hit_test_primitives(self) -> List[List[Any]]:
+        return [["circle", self.cx_upscaled, self.cy_upscaled, self.radius_upscaled]]
@@ -27,15 +27,17 @@ class CrossShape(AbstractShape):
         max_primary_size_upscaled: int,
         min_secondary_size_upscaled: Optional[int] = None,
         max_secondary_size_upscaled: Optional[int] = None,
-        model_specific_constraints: Optional[Dict[str, Any]] = None
+        model_specific_constraints: Optional[Dict[str, Any]] = None,
+        rng: Optional[random.Random] = None
     ) -> Dict[str, Any]:
         """
         Генерирует общий размер и толщину для креста.
         """
+        rng = rng or random
         if max_primary_size_upscaled <= min_primary_size_upscaled:
             size = max(10, min_primary_size_upscaled)
         else:
-            size = random.randint(min_primary_size_upscaled, max_primary_size_upscaled)
+            size = rng.randint(min_primary_size_upscaled, max_primary_size_upscaled)
 
         min_thick = min_secondary_size_upscaled if min_secondary_size_upscaled is not None else max(1, int(size * 0.2))
         max_thick = max_secondary_size_upscaled if max_secondary_size_upscaled is not None else max(min_thick + 1, int(size * 0.4))
@@ -43,13 +45,32 @@ class CrossShape(AbstractShape):
         if max_thick <= min_thick:
             thickness = max(1, min_thick)
         else:
-            thickness = random.randint(min_thick, max_thick)
+            thickness = rng.randint(min_thick, max_thick)
 
         if thickness * 2 >= size:
             thickness = max(1, int(size / 3))
 
         return {"size": size, "thickness": thickness}
 
+    @staticmethod
+    def _calculate_centered_vertices(size: int, thickness: int) -> List[Tuple[float, float]]:
+        hs = size / 2.0
+        ht = thickness / 2.0
+        return [
+            (-ht, -hs), (ht, -hs),
+            (ht, -ht), (hs, -ht),
+            (hs, ht), (ht, ht),
+            (ht, hs), (-ht, hs),
+            (-ht, ht), (-hs, ht),
+            (-hs, -ht), (-ht, -ht)
+        ]
+
+    @classmethod
+    def bbox_at_origin(cls, size_params: Dict[str, Any], rotation_angle_rad: float = 0.0) -> List[float]:
+        return geometry_utils.calculate_rotated_polygon_bbox_at_origin(
+            cls._calculate_centered_vertices(size_params["size"], size_params["thickness"]), rotation_angle_rad
+        )
+
     def __init__(
         self,
         cx_upscaled: int,
@@ -76,17 +97,8 @@ class CrossShape(AbstractShape):
         self.size_upscaled: int = size
         self.thickness_upscaled: int = thickness
 
-        hs = self.size_upscaled / 2.0
-        ht = self.thickness_upscaled / 2.0
-
-        self.vertices_orig_centered: List[Tuple[float, float]] = [
-            (-ht, -hs), (ht, -hs),
-            (ht, -ht), (hs, -ht),
-            (hs, ht), (ht, ht),
-            (ht, hs), (-ht, hs),
-            (-ht, ht), (-hs, ht),
-            (-hs, -ht), (-ht, -ht)
-        ]
+        self.vertices_orig_centered: List[Tuple[float, float]] = \
+            self._calculate_centered_vertices(self.size_upscaled, self.thickness_upscaled)
 
         self.final_vertices_upscaled: List[Tuple[int, int]] = \
             geometry_utils.calculate_rotated_polygon_vertices(
@@ -135,4 +147,7 @@ class CrossShape(AbstractShape):
         return geometry_utils.is_point_in_polygon(
             px=point_x_upscaled, py=point_y_upscaled,
             vertices=self.final_vertices_upscaled
-        )
\ No newline at end of file
+        )
+
+    def get_hit_test_primitives(self) -> List[List[Any]]:
+        return [geometry_utils.polygon_hit_primitive(self.final_vertices_upscaled)]
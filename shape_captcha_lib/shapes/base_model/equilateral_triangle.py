@@ -26,17 +26,35 @@ class EquilateralTriangleShape(AbstractShape):
         max_primary_size_upscaled: int,   # Будет использовано для длины стороны (side_length)
         min_secondary_size_upscaled: Optional[int] = None, # Не используется
         max_secondary_size_upscaled: Optional[int] = None, # Не используется
-        model_specific_constraints: Optional[Dict[str, Any]] = None
+        model_specific_constraints: Optional[Dict[str, Any]] = None,
+        rng: Optional[random.Random] = None
     ) -> Dict[str, Any]:
         """
         Генерирует длину стороны для равностороннего треугольника.
         """
+        rng = rng or random
         if max_primary_size_upscaled <= min_primary_size_upscaled:
             side_length = max(3, min_primary_size_upscaled) # Мин. сторона 3 для норм. полигона
         else:
-            side_length = random.randint(min_primary_size_upscaled, max_primary_size_upscaled)
+            side_length = rng.randint(min_primary_size_upscaled, max_primary_size_upscaled)
         return {"side_length": side_length}
 
+    @staticmethod
+    def _calculate_centered_vertices(side_length: int) -> List[Tuple[float, float]]:
+        # Радиус описанной окружности (R) для равностороннего треугольника: R = a / √3
+        radius_circumscribed = side_length / math.sqrt(3)
+        return geometry_utils.calculate_regular_polygon_centered_vertices(
+            radius=radius_circumscribed,
+            num_vertices=3,
+            start_angle_offset_rad=0 # Вершина сверху
+        )
+
+    @classmethod
+    def bbox_at_origin(cls, size_params: Dict[str, Any], rotation_angle_rad: float = 0.0) -> List[float]:
+        return geometry_utils.calculate_rotated_polygon_bbox_at_origin(
+            cls._calculate_centered_vertices(size_params["side_length"]), rotation_angle_rad
+        )
+
     def __init__(
         self,
         cx_upscaled: int,
@@ -70,14 +88,8 @@ class EquilateralTriangleShape(AbstractShape):
         
         # Радиус описанной окружности (R) для равностороннего треугольника: R = a / √3
         # Где 'a' - это side_length.
-        radius_circumscribed = self.side_length_upscaled / math.sqrt(3)
-
         self.vertices_orig_centered: List[Tuple[float, float]] = \
-            geometry_utils.calculate_regular_polygon_centered_vertices(
-                radius=radius_circumscribed,
-                num_vertices=3,
-                start_angle_offset_rad=0 # Вершина сверху
-            )
+            self._calculate_centered_vertices(self.side_length_upscaled)
         
         self.final_vertices_upscaled: List[Tuple[int, int]] = \
             geometry_utils.calculate_rotated_polygon_vertices(
@@ -125,4 +137,7 @@ class EquilateralTriangleShape(AbstractShape):
         return geometry_utils.is_point_in_polygon(
             px=point_x_upscaled, py=point_y_upscaled,
             vertices=self.final_vertices_upscaled
-        )
\ No newline at end of file
+        )
+
+    def get_hit_test_primitives(self) -> List[List[Any]]:
+        return [geometry_utils.polygon_hit_primitive(self.final_vertices_upscaled)]
@@ -27,14 +27,31 @@ class HexagonShape(AbstractShape):
         max_primary_size_upscaled: int,
         min_secondary_size_upscaled: Optional[int] = None,
         max_secondary_size_upscaled: Optional[int] = None,
-        model_specific_constraints: Optional[Dict[str, Any]] = None
+        model_specific_constraints: Optional[Dict[str, Any]] = None,
+        rng: Optional[random.Random] = None
     ) -> Dict[str, Any]:
+        rng = rng or random
         if max_primary_size_upscaled <= min_primary_size_upscaled:
             radius = max(int(HexagonShape.NUM_VERTICES * 1.5), min_primary_size_upscaled)
         else:
-            radius = random.randint(min_primary_size_upscaled, max_primary_size_upscaled)
+            radius = rng.randint(min_primary_size_upscaled, max_primary_size_upscaled)
         return {"radius": radius}
 
+    @classmethod
+    def _calculate_centered_vertices(cls, radius: int) -> List[Tuple[float, float]]:
+        # start_angle_offset_rad=0 для вершины "сверху"
+        return geometry_utils.calculate_regular_polygon_centered_vertices(
+            radius=float(radius), # Передаем float для точности
+            num_vertices=cls.NUM_VERTICES,
+            start_angle_offset_rad=0
+        )
+
+    @classmethod
+    def bbox_at_origin(cls, size_params: Dict[str, Any], rotation_angle_rad: float = 0.0) -> List[float]:
+        return geometry_utils.calculate_rotated_polygon_bbox_at_origin(
+            cls._calculate_centered_vertices(size_params["radius"]), rotation_angle_rad
+        )
+
     def __init__(
         self,
         cx_upscaled: int,
@@ -58,11 +75,7 @@ class HexagonShape(AbstractShape):
         self.radius_upscaled: int = radius
         
         self.vertices_orig_centered: List[Tuple[float, float]] = \
-            geometry_utils.calculate_regular_polygon_centered_vertices(
-                radius=float(self.radius_upscaled),
-                num_vertices=self.NUM_VERTICES, # Используем NUM_VERTICES класса
-                start_angle_offset_rad=0
-            )
+            self._calculate_centered_vertices(self.radius_upscaled)
         
         self.final_vertices_upscaled: List[Tuple[int, int]] = \
             geometry_utils.calculate_rotated_polygon_vertices(
@@ -110,4 +123,7 @@ class HexagonShape(AbstractShape):
         return geometry_utils.is_point_in_polygon(
             px=point_x_upscaled, py=point_y_upscaled,
             vertices=self.final_vertices_upscaled
-        )
\ No newline at end of file
+        )
+
+    def get_hit_test_primitives(self) -> List[List[Any]]:
+        return [geometry_utils.polygon_hit_primitive(self.final_vertices_upscaled)]
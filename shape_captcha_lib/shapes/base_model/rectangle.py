@@ -25,15 +25,17 @@ class RectangleShape(AbstractShape):
         max_primary_size_upscaled: int,   # Будет использовано для ширины (width)
         min_secondary_size_upscaled: Optional[int] = None, # Будет использовано для высоты (height)
         max_secondary_size_upscaled: Optional[int] = None, # Будет использовано для высоты (height)
-        model_specific_constraints: Optional[Dict[str, Any]] = None
+        model_specific_constraints: Optional[Dict[str, Any]] = None,
+        rng: Optional[random.Random] = None
     ) -> Dict[str, Any]:
         """
         Генерирует ширину и высоту для прямоугольника.
         """
+        rng = rng or random
         if max_primary_size_upscaled <= min_primary_size_upscaled:
             width = max(1, min_primary_size_upscaled)
         else:
-            width = random.randint(min_primary_size_upscaled, max_primary_size_upscaled)
+            width = rng.randint(min_primary_size_upscaled, max_primary_size_upscaled)
 
         # Если вторичные размеры не предоставлены, делаем высоту пропорциональной ширине
         # (например, от 40% до 70% ширины, как было в старом image_generator)
@@ -43,7 +45,7 @@ class RectangleShape(AbstractShape):
         if max_h <= min_h:
             height = max(1, min_h)
         else:
-            height = random.randint(min_h, max_h)
+            height = rng.randint(min_h, max_h)
             
         # Опционально: убедимся, что это не квадрат (если это важно для "прямоугольника")
         # Например, если abs(width - height) < порог, изменить один из размеров.
@@ -51,6 +53,21 @@ class RectangleShape(AbstractShape):
 
         return {"width": width, "height": height}
 
+    @staticmethod
+    def _calculate_centered_vertices(width: int, height: int) -> List[Tuple[float, float]]:
+        half_w = width / 2.0
+        half_h = height / 2.0
+        return [
+            (-half_w, -half_h), (half_w, -half_h),
+            (half_w, half_h),  (-half_w, half_h)
+        ]
+
+    @classmethod
+    def bbox_at_origin(cls, size_params: Dict[str, Any], rotation_angle_rad: float = 0.0) -> List[float]:
+        return geometry_utils.calculate_rotated_polygon_bbox_at_origin(
+            cls._calculate_centered_vertices(size_params["width"], size_params["height"]), rotation_angle_rad
+        )
+
     def __init__(
         self,
         cx_upscaled: int,
@@ -75,12 +92,8 @@ class RectangleShape(AbstractShape):
         self.width_upscaled: int = width
         self.height_upscaled: int = height
         
-        half_w = self.width_upscaled / 2.0
-        half_h = self.height_upscaled / 2.0
-        self.vertices_orig_centered: List[Tuple[float, float]] = [
-            (-half_w, -half_h), (half_w, -half_h),
-            (half_w, half_h),  (-half_w, half_h)
-        ]
+        self.vertices_orig_centered: List[Tuple[float, float]] = \
+            self._calculate_centered_vertices(self.width_upscaled, self.height_upscaled)
         
         self.final_vertices_upscaled: List[Tuple[int, int]] = \
             geometry_utils.calculate_rotated_polygon_vertices(
@@ -129,4 +142,7 @@ class RectangleShape(AbstractShape):
         return geometry_utils.is_point_in_polygon(
             px=point_x_upscaled, py=point_y_upscaled,
             vertices=self.final_vertices_upscaled
-        )
\ No newline at end of file
+        )
+
+    def get_hit_test_primitives(self) -> List[List[Any]]:
+        return [geometry_utils.polygon_hit_primitive(self.final_vertices_upscaled)]
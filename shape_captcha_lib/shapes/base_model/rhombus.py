@@ -27,12 +27,14 @@ class RhombusShape(AbstractShape):
         max_primary_size_upscaled: int,
         min_secondary_size_upscaled: Optional[int] = None,
         max_secondary_size_upscaled: Optional[int] = None,
-        model_specific_constraints: Optional[Dict[str, Any]] = None
+        model_specific_constraints: Optional[Dict[str, Any]] = None,
+        rng: Optional[random.Random] = None
     ) -> Dict[str, Any]:
+        rng = rng or random
         if max_primary_size_upscaled <= min_primary_size_upscaled:
             d1 = max(2, min_primary_size_upscaled)
         else:
-            d1 = random.randint(min_primary_size_upscaled, max_primary_size_upscaled)
+            d1 = rng.randint(min_primary_size_upscaled, max_primary_size_upscaled)
 
         min_d2 = min_secondary_size_upscaled if min_secondary_size_upscaled is not None else max(2, int(d1 * 0.5))
         max_d2 = max_secondary_size_upscaled if max_secondary_size_upscaled is not None else max(min_d2 + 1, int(d1 * 1.2))
@@ -40,10 +42,25 @@ class RhombusShape(AbstractShape):
         if max_d2 <= min_d2:
             d2 = max(2, min_d2)
         else:
-            d2 = random.randint(min_d2, max_d2)
+            d2 = rng.randint(min_d2, max_d2)
             
         return {"d1": d1, "d2": d2}
 
+    @staticmethod
+    def _calculate_centered_vertices(d1: int, d2: int) -> List[Tuple[float, float]]:
+        half_d1 = d1 / 2.0
+        half_d2 = d2 / 2.0
+        return [
+            (0, -half_d2), (half_d1, 0),
+            (0, half_d2),  (-half_d1, 0)
+        ]
+
+    @classmethod
+    def bbox_at_origin(cls, size_params: Dict[str, Any], rotation_angle_rad: float = 0.0) -> List[float]:
+        return geometry_utils.calculate_rotated_polygon_bbox_at_origin(
+            cls._calculate_centered_vertices(size_params["d1"], size_params["d2"]), rotation_angle_rad
+        )
+
     def __init__(
         self,
         cx_upscaled: int,
@@ -68,13 +85,8 @@ class RhombusShape(AbstractShape):
         self.d1_upscaled: int = d1
         self.d2_upscaled: int = d2
         
-        half_d1 = self.d1_upscaled / 2.0
-        half_d2 = self.d2_upscaled / 2.0
-        
-        self.vertices_orig_centered: List[Tuple[float, float]] = [
-            (0, -half_d2), (half_d1, 0),
-            (0, half_d2),  (-half_d1, 0)
-        ]
+        self.vertices_orig_centered: List[Tuple[float, float]] = \
+            self._calculate_centered_vertices(self.d1_upscaled, self.d2_upscaled)
         
         self.final_vertices_upscaled: List[Tuple[int, int]] = \
             geometry_utils.calculate_rotated_polygon_vertices(
@@ -130,4 +142,7 @@ class RhombusShape(AbstractShape):
         )
         print(f"DEBUG [RhombusShape@{id(self)}]: is_point_in_polygon returned: {result} for point ({point_x_upscaled}, {point_y_upscaled})")
         return result
-    # --- КОНЕЦ ПРОВЕРКИ МЕТОДА is_point_inside ---
\ No newline at end of file
+    # --- КОНЕЦ ПРОВЕРКИ МЕТОДА is_point_inside ---
+
+    def get_hit_test_primitives(self) -> List[List[Any]]:
+        return [geometry_utils.polygon_hit_primitive(self.final_vertices_upscaled)]
@@ -25,17 +25,35 @@ class SquareShape(AbstractShape):
         max_primary_size_upscaled: int, # Для квадрата это будет max_side
         min_secondary_size_upscaled: Optional[int] = None, # Не используется квадратом
         max_secondary_size_upscaled: Optional[int] = None, # Не используется квадратом
-        model_specific_constraints: Optional[Dict[str, Any]] = None
+        model_specific_constraints: Optional[Dict[str, Any]] = None,
+        rng: Optional[random.Random] = None
     ) -> Dict[str, Any]:
         """
         Генерирует длину стороны для квадрата.
         """
+        rng = rng or random
         if max_primary_size_upscaled <= min_primary_size_upscaled:
             side = max(1, min_primary_size_upscaled)
         else:
-            side = random.randint(min_primary_size_upscaled, max_primary_size_upscaled)
+            side = rng.randint(min_primary_size_upscaled, max_primary_size_upscaled)
         return {"side": side}
 
+    @staticmethod
+    def _calculate_centered_vertices(side: int) -> List[Tuple[float, float]]:
+        half_side = side / 2.0
+        return [
+            (-half_side, -half_side),
+            ( half_side, -half_side),
+            ( half_side,  half_side),
+            (-half_side,  half_side)
+        ]
+
+    @classmethod
+    def bbox_at_origin(cls, size_params: Dict[str, Any], rotation_angle_rad: float = 0.0) -> List[float]:
+        return geometry_utils.calculate_rotated_polygon_bbox_at_origin(
+            cls._calculate_centered_vertices(size_params["side"]), rotation_angle_rad
+        )
+
     def __init__(
         self,
         cx_upscaled: int,
@@ -59,13 +77,7 @@ class SquareShape(AbstractShape):
         self.side_upscaled: int = side
         
         # Рассчитываем вершины квадрата, центрированные относительно (0,0)
-        half_side = self.side_upscaled / 2.0
-        self.vertices_orig_centered: List[Tuple[float, float]] = [
-            (-half_side, -half_side),
-            ( half_side, -half_side),
-            ( half_side,  half_side),
-            (-half_side,  half_side)
-        ]
+        self.vertices_orig_centered: List[Tuple[float, float]] = self._calculate_centered_vertices(self.side_upscaled)
         
         # Поворачиваем и смещаем вершины
         self.final_vertices_upscaled: List[Tuple[int, int]] = \
@@ -119,4 +131,7 @@ class SquareShape(AbstractShape):
             px=point_x_upscaled,
             py=point_y_upscaled,
             vertices=self.final_vertices_upscaled
-        )
\ No newline at end of file
+        )
+
+    def get_hit_test_primitives(self) -> List[List[Any]]:
+        return [geometry_utils.polygon_hit_primitive(self.final_vertices_upscaled)]
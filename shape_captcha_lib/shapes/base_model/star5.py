@@ -27,15 +27,17 @@ class Star5Shape(AbstractShape):
         max_primary_size_upscaled: int,   # Будет использовано для внешнего радиуса (outer_radius)
         min_secondary_size_upscaled: Optional[int] = None, # Для мин. внутреннего радиуса (относительно внешнего)
         max_secondary_size_upscaled: Optional[int] = None, # Для макс. внутреннего радиуса (относительно внешнего)
-        model_specific_constraints: Optional[Dict[str, Any]] = None
+        model_specific_constraints: Optional[Dict[str, Any]] = None,
+        rng: Optional[random.Random] = None
     ) -> Dict[str, Any]:
         """
         Генерирует внешний и внутренний радиусы для звезды.
         """
+        rng = rng or random
         if max_primary_size_upscaled <= min_primary_size_upscaled:
             outer_radius = max(int(Star5Shape.NUM_POINTS * 3), min_primary_size_upscaled) # Достаточный размер для звезды
         else:
-            outer_radius = random.randint(min_primary_size_upscaled, max_primary_size_upscaled)
+            outer_radius = rng.randint(min_primary_size_upscaled, max_primary_size_upscaled)
 
         # Внутренний радиус как доля от внешнего (например, от 0.35 до 0.6 внешнего)
         # min_secondary/max_secondary могут определять эти факторы или абсолютные значения, если переданы
@@ -48,7 +50,7 @@ class Star5Shape(AbstractShape):
         if max_secondary_size_upscaled is not None and isinstance(max_secondary_size_upscaled, float):
             max_inner_ratio = max_secondary_size_upscaled
 
-        inner_radius = int(outer_radius * random.uniform(min_inner_ratio, max_inner_ratio))
+        inner_radius = int(outer_radius * rng.uniform(min_inner_ratio, max_inner_ratio))
         inner_radius = max(1, inner_radius) # Внутренний радиус должен быть > 0
 
         # Убедимся, что внутренний радиус значительно меньше внешнего
@@ -59,6 +61,21 @@ class Star5Shape(AbstractShape):
 
         return {"outer_radius": outer_radius, "inner_radius": inner_radius}
 
+    @classmethod
+    def _calculate_centered_vertices(cls, outer_radius: int, inner_radius: int) -> List[Tuple[float, float]]:
+        return geometry_utils.calculate_star_centered_vertices(
+            outer_radius=float(outer_radius),
+            inner_radius=float(inner_radius),
+            num_points=cls.NUM_POINTS,
+            start_angle_offset_rad=0 # Луч вверх
+        )
+
+    @classmethod
+    def bbox_at_origin(cls, size_params: Dict[str, Any], rotation_angle_rad: float = 0.0) -> List[float]:
+        return geometry_utils.calculate_rotated_polygon_bbox_at_origin(
+            cls._calculate_centered_vertices(size_params["outer_radius"], size_params["inner_radius"]), rotation_angle_rad
+        )
+
     def __init__(
         self,
         cx_upscaled: int,
@@ -88,12 +105,7 @@ class Star5Shape(AbstractShape):
         self.inner_radius_upscaled: int = inner_radius
 
         self.vertices_orig_centered: List[Tuple[float, float]] = \
-            geometry_utils.calculate_star_centered_vertices(
-                outer_radius=float(self.outer_radius_upscaled),
-                inner_radius=float(self.inner_radius_upscaled),
-                num_points=self.NUM_POINTS,
-                start_angle_offset_rad=0 # Луч вверх
-            )
+            self._calculate_centered_vertices(self.outer_radius_upscaled, self.inner_radius_upscaled)
 
         self.final_vertices_upscaled: List[Tuple[int, int]] = \
             geometry_utils.calculate_rotated_polygon_vertices(
@@ -142,4 +154,7 @@ class Star5Shape(AbstractShape):
         return geometry_utils.is_point_in_polygon(
             px=point_x_upscaled, py=point_y_upscaled,
             vertices=self.final_vertices_upscaled
-        )
\ No newline at end of file
+        )
+
+    def get_hit_test_primitives(self) -> List[List[Any]]:
+        return [geometry_utils.polygon_hit_primitive(self.final_vertices_upscaled)]
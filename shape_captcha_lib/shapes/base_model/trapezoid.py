@@ -26,15 +26,17 @@ class TrapezoidShape(AbstractShape):
         max_primary_size_upscaled: int,   # Будет использовано для высоты (height)
         min_secondary_size_upscaled: Optional[int] = None, # Для нижнего основания (bottom_width)
         max_secondary_size_upscaled: Optional[int] = None, # Для нижнего основания (bottom_width)
-        model_specific_constraints: Optional[Dict[str, Any]] = None
+        model_specific_constraints: Optional[Dict[str, Any]] = None,
+        rng: Optional[random.Random] = None
     ) -> Dict[str, Any]:
         """
         Генерирует высоту, нижнее и верхнее основания для трапеции.
         """
+        rng = rng or random
         if max_primary_size_upscaled <= min_primary_size_upscaled:
             height = max(3, min_primary_size_upscaled)
         else:
-            height = random.randint(min_primary_size_upscaled, max_primary_size_upscaled)
+            height = rng.randint(min_primary_size_upscaled, max_primary_size_upscaled)
 
         # Нижнее основание (bottom_width) как secondary_size
         min_bw = min_secondary_size_upscaled if min_secondary_size_upscaled is not None else max(int(height * 0.6), 5)
@@ -43,7 +45,7 @@ class TrapezoidShape(AbstractShape):
         if max_bw <= min_bw:
             bottom_width = max(3, min_bw)
         else:
-            bottom_width = random.randint(min_bw, max_bw)
+            bottom_width = rng.randint(min_bw, max_bw)
 
         # Верхнее основание (top_width) меньше нижнего, но больше 0
         min_tw = max(1, int(bottom_width * 0.2))
@@ -52,7 +54,7 @@ class TrapezoidShape(AbstractShape):
         if max_tw <= min_tw:
             top_width = max(1, min_tw)
         else:
-            top_width = random.randint(min_tw, max_tw)
+            top_width = rng.randint(min_tw, max_tw)
         
         # Убедимся, что top_width < bottom_width
         if top_width >= bottom_width:
@@ -63,6 +65,22 @@ class TrapezoidShape(AbstractShape):
 
         return {"height": height, "bottom_width": bottom_width, "top_width": top_width}
 
+    @staticmethod
+    def _calculate_centered_vertices(height: int, bottom_width: int, top_width: int) -> List[Tuple[float, float]]:
+        half_h = height / 2.0
+        half_bw = bottom_width / 2.0
+        half_tw = top_width / 2.0
+        return [
+            (-half_tw, -half_h), (half_tw, -half_h),  # Верхнее основание
+            (half_bw, half_h),   (-half_bw, half_h)   # Нижнее основание
+        ]
+
+    @classmethod
+    def bbox_at_origin(cls, size_params: Dict[str, Any], rotation_angle_rad: float = 0.0) -> List[float]:
+        return geometry_utils.calculate_rotated_polygon_bbox_at_origin(
+            cls._calculate_centered_vertices(size_params["height"], size_params["bottom_width"], size_params["top_width"]), rotation_angle_rad
+        )
+
     def __init__(
         self,
         cx_upscaled: int,
@@ -93,14 +111,9 @@ class TrapezoidShape(AbstractShape):
         self.bottom_width_upscaled: int = bottom_width
         self.top_width_upscaled: int = top_width
         
-        half_h = self.height_upscaled / 2.0
-        half_bw = self.bottom_width_upscaled / 2.0
-        half_tw = self.top_width_upscaled / 2.0
-        
-        self.vertices_orig_centered: List[Tuple[float, float]] = [
-            (-half_tw, -half_h), (half_tw, -half_h),  # Верхнее основание
-            (half_bw, half_h),   (-half_bw, half_h)   # Нижнее основание
-        ]
+        self.vertices_orig_centered: List[Tuple[float, float]] = self._calculate_centered_vertices(
+            self.height_upscaled, self.bottom_width_upscaled, self.top_width_upscaled
+        )
         
         self.final_vertices_upscaled: List[Tuple[int, int]] = \
             geometry_utils.calculate_rotated_polygon_vertices(
@@ -150,4 +163,7 @@ class TrapezoidShape(AbstractShape):
         return geometry_utils.is_point_in_polygon(
             px=point_x_upscaled, py=point_y_upscaled,
             vertices=self.final_vertices_upscaled
-        )
\ No newline at end of file
+        )
+
+    def get_hit_test_primitives(self) -> List[List[Any]]:
+        return [geometry_utils.polygon_hit_primitive(self.final_vertices_upscaled)]
@@ -29,13 +29,15 @@ class ArrowShape(AbstractShape):
         max_primary_size_upscaled: int,   # Будет использовано для общей длины (length)
         min_secondary_size_upscaled: Optional[int] = None, # Для ширины наконечника (head_width)
         max_secondary_size_upscaled: Optional[int] = None, # Для ширины наконечника (head_width)
-        model_specific_constraints: Optional[Dict[str, Any]] = None
+        model_specific_constraints: Optional[Dict[str, Any]] = None,
+        rng: Optional[random.Random] = None
     ) -> Dict[str, Any]:
+        rng = rng or random
         
         if max_primary_size_upscaled <= min_primary_size_upscaled:
             length = max(20, min_primary_size_upscaled) # Стрелка должна быть достаточно длинной
         else:
-            length = random.randint(min_primary_size_upscaled, max_primary_size_upscaled)
+            length = rng.randint(min_primary_size_upscaled, max_primary_size_upscaled)
 
         # Ширина наконечника, например, от 30% до 60% длины
         min_hw = min_secondary_size_upscaled if min_secondary_size_upscaled is not None else max(int(length * 0.3), 10)
@@ -43,13 +45,13 @@ class ArrowShape(AbstractShape):
         if max_hw <= min_hw:
             head_width = max(5, min_hw)
         else:
-            head_width = random.randint(min_hw, max_hw)
+            head_width = rng.randint(min_hw, max_hw)
 
         # Длина наконечника как доля от общей длины
-        head_length_ratio = random.uniform(0.25, 0.40)
+        head_length_ratio = rng.uniform(0.25, 0.40)
         
         # Ширина древка как доля от ширины наконечника
-        shaft_width_ratio = random.uniform(0.3, 0.6)
+        shaft_width_ratio = rng.uniform(0.3, 0.6)
         
         return {
             "length": length,
@@ -58,42 +60,22 @@ class ArrowShape(AbstractShape):
             "shaft_width_ratio": shaft_width_ratio
         }
 
-    def __init__(
-        self,
-        cx_upscaled: int,
-        cy_upscaled: int,
-        color_name_or_rgb: Union[str, Tuple[int, int, int]],
-        rotation_angle_rad: float = 0.0,
-        length: Optional[int] = None,
-        head_width: Optional[int] = None,
-        head_length_ratio: Optional[float] = None,
-        shaft_width_ratio: Optional[float] = None,
-        **kwargs: Any
-    ):
-        super().__init__(
-            cx_upscaled=cx_upscaled,
-            cy_upscaled=cy_upscaled,
-            color_name_or_rgb=color_name_or_rgb,
-            rotation_angle_rad=rotation_angle_rad
-        )
-        if None in [length, head_width, head_length_ratio, shaft_width_ratio]:
-            raise ValueError("All dimensions (length, head_width, head_length_ratio, shaft_width_ratio) must be provided for ArrowShape.")
-        
-        self.length: int = length
-        self.head_width: int = head_width
-        self.head_length_ratio: float = head_length_ratio
-        self.shaft_width_ratio: float = shaft_width_ratio
-
-        # Рассчитываем геометрию стрелки, центрированную относительно (0,0)
+    @staticmethod
+    def _calculate_centered_vertices(
+        length: int,
+        head_width: int,
+        head_length_ratio: float,
+        shaft_width_ratio: float
+    ) -> List[Tuple[float, float]]:
         # Стрелка направлена вверх (вдоль отрицательной оси Y)
         # Центр (0,0) будет примерно на 1/3 длины от хвоста на древке
 
-        total_len = float(self.length)
-        head_len = total_len * self.head_length_ratio
+        total_len = float(length)
+        head_len = total_len * head_length_ratio
         shaft_len = total_len - head_len
 
-        half_head_w = self.head_width / 2.0
-        shaft_w = self.head_width * self.shaft_width_ratio
+        half_head_w = head_width / 2.0
+        shaft_w = head_width * shaft_width_ratio
         half_shaft_w = shaft_w / 2.0
 
         # Задаем y-координаты точек относительно желаемого центра (0,0)
@@ -126,7 +108,48 @@ class ArrowShape(AbstractShape):
         # 7. Левый внешний угол наконечника
         v7 = (-half_head_w, v2_y)
 
-        self.vertices_orig_centered: List[Tuple[float, float]] = [v1, v2, v3, v4, v5, v6, v7]
+        return [v1, v2, v3, v4, v5, v6, v7]
+
+    @classmethod
+    def bbox_at_origin(cls, size_params: Dict[str, Any], rotation_angle_rad: float = 0.0) -> List[float]:
+        return geometry_utils.calculate_rotated_polygon_bbox_at_origin(
+            cls._calculate_centered_vertices(
+                size_params["length"], size_params["head_width"],
+                size_params["head_length_ratio"], size_params["shaft_width_ratio"]
+            ),
+            rotation_angle_rad
+        )
+
+    def __init__(
+        self,
+        cx_upscaled: int,
+        cy_upscaled: int,
+        color_name_or_rgb: Union[str, Tuple[int, int, int]],
+        rotation_angle_rad: float = 0.0,
+        length: Optional[int] = None,
+        head_width: Optional[int] = None,
+        head_length_ratio: Optional[float] = None,
+        shaft_width_ratio: Optional[float] = None,
+        **kwargs: Any
+    ):
+        super().__init__(
+            cx_upscaled=cx_upscaled,
+            cy_upscaled=cy_upscaled,
+            color_name_or_rgb=color_name_or_rgb,
+            rotation_angle_rad=rotation_angle_rad
+        )
+        if None in [length, head_width, head_length_ratio, shaft_width_ratio]:
+            raise ValueError("All dimensions (length, head_width, head_length_ratio, shaft_width_ratio) must be provided for ArrowShape.")
+        
+        self.length: int = length
+        self.head_width: int = head_width
+        self.head_length_ratio: float = head_length_ratio
+        self.shaft_width_ratio: float = shaft_width_ratio
+
+        # Рассчитываем геометрию стрелки, центрированную относительно (0,0)
+        self.vertices_orig_centered: List[Tuple[float, float]] = self._calculate_centered_vertices(
+            self.length, self.head_width, self.head_length_ratio, self.shaft_width_ratio
+        )
         
         self.final_vertices_upscaled: List[Tuple[int, int]] = \
             geometry_utils.calculate_rotated_polygon_vertices(
@@ -177,4 +200,7 @@ class ArrowShape(AbstractShape):
         return geometry_utils.is_point_in_polygon(
             px=point_x_upscaled, py=point_y_upscaled,
             vertices=self.final_vertices_upscaled
-        )
\ No newline at end of file
+        )
+
+    def get_hit_test_primitives(self) -> List[List[Any]]:
+        return [geometry_utils.polygon_hit_primitive(self.final_vertices_upscaled)]
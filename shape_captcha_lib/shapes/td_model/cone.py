@@ -17,6 +17,9 @@ class ConeShape(AbstractShape):
     Представление фигуры "Псевдо-3D Конус" для CAPTCHA.
     """
 
+    # Ключи старого формата хранения (verify_solution до появления from_storage)
+    storage_key_aliases = {"cx_base": "cx_upscaled", "cy_base": "cy_upscaled"}
+
     @staticmethod
     def get_shape_type() -> str:
         return "cone"
@@ -29,12 +32,14 @@ class ConeShape(AbstractShape):
         max_primary_size_upscaled: int,   # Для высоты (height)
         min_secondary_size_upscaled: Optional[int] = None, # Для радиуса основания (base_radius)
         max_secondary_size_upscaled: Optional[int] = None, # Для радиуса основания (base_radius)
-        model_specific_constraints: Optional[Dict[str, Any]] = None
+        model_specific_constraints: Optional[Dict[str, Any]] = None,
+        rng: Optional[random.Random] = None
     ) -> Dict[str, Any]:
+        rng = rng or random
         if max_primary_size_upscaled <= min_primary_size_upscaled:
             height = max(10, min_primary_size_upscaled)
         else:
-            height = random.randint(min_primary_size_upscaled, max_primary_size_upscaled)
+            height = rng.randint(min_primary_size_upscaled, max_primary_size_upscaled)
 
         min_r = min_secondary_size_upscaled if min_secondary_size_upscaled is not None else max(5, int(height * 0.3))
         max_r = max_secondary_size_upscaled if max_secondary_size_upscaled is not None else max(min_r + 1, int(height * 0.7))
@@ -42,9 +47,9 @@ class ConeShape(AbstractShape):
         if max_r <= min_r:
             base_radius = max(3, min_r)
         else:
-            base_radius = random.randint(min_r, max_r)
+            base_radius = rng.randint(min_r, max_r)
         
-        perspective_factor_base = random.uniform(0.3, 0.5)
+        perspective_factor_base = rng.uniform(0.3, 0.5)
         
         constraints = model_specific_constraints or {}
         side_gradient_start_factor = constraints.get("side_gradient_start_factor", 1.1)
@@ -58,6 +63,13 @@ class ConeShape(AbstractShape):
             "side_gradient_end_factor": side_gradient_end_factor
         }
 
+    @classmethod
+    def bbox_at_origin(cls, size_params: Dict[str, Any], rotation_angle_rad: float = 0.0) -> List[float]:
+        # (0,0) - центр основания, апекс выше на height
+        base_radius = size_params["base_radius"]
+        ellipse_ry = max(1, int(base_radius * size_params.get("perspective_factor_base", 0.4)))
+        return [float(-base_radius), float(-size_params["height"]), float(base_radius), float(ellipse_ry)]
+
     def __init__(
         self,
         cx_upscaled: int, # Центр X основания конуса
@@ -233,4 +245,12 @@ class ConeShape(AbstractShape):
             return True
             
         # print(f"DEBUG [ConeShape]: MISS on all parts for point ({point_x_upscaled}, {point_y_upscaled})")
-        return False
\ No newline at end of file
+        return False
+
+    def get_hit_test_primitives(self) -> List[List[Any]]:
+        base_ellipse = self.clickable_base_ellipse_params
+        return [
+            # Основание засчитывается только ниже апекса, как в is_point_inside
+            ["ellipse", base_ellipse["cx"], base_ellipse["cy"], base_ellipse["rx"], base_ellipse["ry"], self.apex_y],
+            geometry_utils.polygon_hit_primitive(self.cone_body_triangle_vertices),
+        ]
@@ -30,13 +30,15 @@ class Cross3DShape(AbstractShape):
         max_primary_size_upscaled: int,   # Для arm_length
         min_secondary_size_upscaled: Optional[int] = None, # Для arm_thickness
         max_secondary_size_upscaled: Optional[int] = None, # Для arm_thickness
-        model_specific_constraints: Optional[Dict[str, Any]] = None
+        model_specific_constraints: Optional[Dict[str, Any]] = None,
+        rng: Optional[random.Random] = None
     ) -> Dict[str, Any]:
+        rng = rng or random
         
         if max_primary_size_upscaled <= min_primary_size_upscaled:
             arm_length = max(10, min_primary_size_upscaled)
         else:
-            arm_length = random.randint(min_primary_size_upscaled, max_primary_size_upscaled)
+            arm_length = rng.randint(min_primary_size_upscaled, max_primary_size_upscaled)
 
         min_thick = min_secondary_size_upscaled if min_secondary_size_upscaled is not None else max(1, int(arm_length * 0.25))
         max_thick = max_secondary_size_upscaled if max_secondary_size_upscaled is not None else max(min_thick + 1, int(arm_length * 0.4))
@@ -44,12 +46,12 @@ class Cross3DShape(AbstractShape):
         if max_thick <= min_thick:
             arm_thickness = max(1, min_thick)
         else:
-            arm_thickness = random.randint(min_thick, max_thick)
+            arm_thickness = rng.randint(min_thick, max_thick)
         
         if arm_thickness * 2 >= arm_length : # Убедимся, что толщина меньше половины длины руки
             arm_thickness = max(1, int(arm_length / 3))
 
-        depth_factor = random.uniform(0.25, 0.4) # Визуальная глубина экструзии
+        depth_factor = rng.uniform(0.25, 0.4) # Визуальная глубина экструзии
         
         constraints = model_specific_constraints or {}
         top_face_brightness_factor = constraints.get("top_face_brightness_factor", 1.25)
@@ -63,6 +65,29 @@ class Cross3DShape(AbstractShape):
             "side_face_brightness_factor": side_face_brightness_factor
         }
 
+    @staticmethod
+    def _calculate_centered_vertices(arm_length: int, arm_thickness: int) -> List[Tuple[float, float]]:
+        half_len = arm_length / 2.0 # Половина длины "руки" от виртуального центра креста до конца руки
+        half_thick = arm_thickness / 2.0 # Половина толщины "руки"
+        return [
+            (-half_thick, -half_len), (half_thick, -half_len), (half_thick, -half_thick),
+            (half_len, -half_thick),  (half_len, half_thick),  (half_thick, half_thick),
+            (half_thick, half_len),   (-half_thick, half_len), (-half_thick, half_thick),
+            (-half_len, half_thick),  (-half_len, -half_thick),(-half_thick, -half_thick)
+        ]
+
+    @classmethod
+    def bbox_at_origin(cls, size_params: Dict[str, Any], rotation_angle_rad: float = 0.0) -> List[float]:
+        arm_thickness = size_params["arm_thickness"]
+        front_bbox = geometry_utils.calculate_rotated_polygon_bbox_at_origin(
+            cls._calculate_centered_vertices(size_params["arm_length"], arm_thickness), rotation_angle_rad
+        )
+        actual_depth_offset = int(arm_thickness * size_params.get("depth_factor", 0.3))
+        depth_display_angle = -math.pi / 4 + rotation_angle_rad
+        dx_depth = int(actual_depth_offset * math.cos(depth_display_angle))
+        dy_depth = int(actual_depth_offset * math.sin(depth_display_angle))
+        return geometry_utils.extend_bbox_by_offset(front_bbox, dx_depth, dy_depth)
+
     def __init__(
         self,
         cx_upscaled: int,
@@ -100,17 +125,10 @@ class Cross3DShape(AbstractShape):
 
     def _calculate_internal_geometry(self):
         """Рассчитывает геометрию 3D-креста."""
-        half_len = self.arm_length_upscaled / 2.0 # Половина длины "руки" от виртуального центра креста до конца руки
-        half_thick = self.arm_thickness_upscaled / 2.0 # Половина толщины "руки"
-
         # Вершины 2D-креста, центрированные относительно (0,0)
         # Это форма передней грани
-        cross_orig_centered: List[Tuple[float, float]] = [
-            (-half_thick, -half_len), (half_thick, -half_len), (half_thick, -half_thick),
-            (half_len, -half_thick),  (half_len, half_thick),  (half_thick, half_thick),
-            (half_thick, half_len),   (-half_thick, half_len), (-half_thick, half_thick),
-            (-half_len, half_thick),  (-half_len, -half_thick),(-half_thick, -half_thick)
-        ]
+        cross_orig_centered: List[Tuple[float, float]] = \
+            self._calculate_centered_vertices(self.arm_length_upscaled, self.arm_thickness_upscaled)
         
         self.front_vertices: List[Tuple[int, int]] = \
             geometry_utils.calculate_rotated_polygon_vertices(
@@ -210,4 +228,7 @@ class Cross3DShape(AbstractShape):
         return geometry_utils.is_point_in_polygon(
             px=point_x_upscaled, py=point_y_upscaled,
             vertices=self.front_vertices # self.front_vertices рассчитываются в __init__
-        )
\ No newline at end of file
+        )
+
+    def get_hit_test_primitives(self) -> List[List[Any]]:
+        return [geometry_utils.polygon_hit_primitive(self.front_vertices)]
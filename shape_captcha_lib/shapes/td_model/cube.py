@@ -27,15 +27,17 @@ class CubeShape(AbstractShape):
         max_primary_size_upscaled: int,   # Длина стороны (side)
         min_secondary_size_upscaled: Optional[int] = None, # Не используется напрямую для основных размеров
         max_secondary_size_upscaled: Optional[int] = None, # Не используется напрямую для основных размеров
-        model_specific_constraints: Optional[Dict[str, Any]] = None
+        model_specific_constraints: Optional[Dict[str, Any]] = None,
+        rng: Optional[random.Random] = None
     ) -> Dict[str, Any]:
+        rng = rng or random
         if max_primary_size_upscaled <= min_primary_size_upscaled:
             side = max(10, min_primary_size_upscaled) 
         else:
-            side = random.randint(min_primary_size_upscaled, max_primary_size_upscaled)
+            side = rng.randint(min_primary_size_upscaled, max_primary_size_upscaled)
         
         # depth_factor определяет визуальную глубину куба
-        depth_factor = random.uniform(0.4, 0.6) 
+        depth_factor = rng.uniform(0.4, 0.6) 
         
         # Факторы яркости для граней (можно сделать конфигурируемыми)
         top_face_brightness_factor = model_specific_constraints.get("top_face_brightness_factor", 1.45) \
@@ -50,6 +52,19 @@ class CubeShape(AbstractShape):
             "side_face_brightness_factor": side_face_brightness_factor
         }
 
+    @classmethod
+    def bbox_at_origin(cls, size_params: Dict[str, Any], rotation_angle_rad: float = 0.0) -> List[float]:
+        side = size_params["side"]
+        half_side = side / 2.0
+        front_bbox = geometry_utils.calculate_rotated_polygon_bbox_at_origin(
+            [(-half_side, -half_side), (half_side, -half_side), (half_side, half_side), (-half_side, half_side)],
+            rotation_angle_rad
+        )
+        depth_display_angle = -math.pi / 4 + rotation_angle_rad
+        dx_depth = int(side * size_params["depth_factor"] * math.cos(depth_display_angle))
+        dy_depth = int(side * size_params["depth_factor"] * math.sin(depth_display_angle))
+        return geometry_utils.extend_bbox_by_offset(front_bbox, dx_depth, dy_depth)
+
     def __init__(
         self,
         cx_upscaled: int,
@@ -206,4 +221,7 @@ class CubeShape(AbstractShape):
                 # print(f"DEBUG [CubeShape@{id(self)}]: HIT on face {face_data['name']}")
                 return True
         # print(f"DEBUG [CubeShape@{id(self)}]: MISS on all faces for point ({point_x_upscaled}, {point_y_upscaled})")
-        return False
\ No newline at end of file
+        return False
+
+    def get_hit_test_primitives(self) -> List[List[Any]]:
+        return [geometry_utils.polygon_hit_primitive(face_data["vertices"]) for face_data in self.clickable_polygons]
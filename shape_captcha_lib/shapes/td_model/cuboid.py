@@ -30,29 +30,31 @@ class CuboidShape(AbstractShape):
         max_primary_size_upscaled: int,   # Для ширины (width)
         min_secondary_size_upscaled: Optional[int] = None, # Для высоты (height)
         max_secondary_size_upscaled: Optional[int] = None, # Для высоты (height)
-        model_specific_constraints: Optional[Dict[str, Any]] = None
+        model_specific_constraints: Optional[Dict[str, Any]] = None,
+        rng: Optional[random.Random] = None
     ) -> Dict[str, Any]:
+        rng = rng or random
         
         constraints = model_specific_constraints or {}
 
         if max_primary_size_upscaled <= min_primary_size_upscaled:
             width = max(10, min_primary_size_upscaled)
         else:
-            width = random.randint(min_primary_size_upscaled, max_primary_size_upscaled)
+            width = rng.randint(min_primary_size_upscaled, max_primary_size_upscaled)
 
         # Высота как secondary или пропорционально ширине
         min_h = min_secondary_size_upscaled if min_secondary_size_upscaled is not None else max(int(width * 0.4), 5)
         max_h = max_secondary_size_upscaled if max_secondary_size_upscaled is not None else max(min_h + 1, int(width * 0.7))
         if max_h <= min_h: height = max(5, min_h)
-        else: height = random.randint(min_h, max_h)
+        else: height = rng.randint(min_h, max_h)
 
         # Глубина, например, пропорционально ширине или высоте
         min_d_factor = constraints.get("min_depth_factor_of_width", 0.3)
         max_d_factor = constraints.get("max_depth_factor_of_width", 0.6)
-        depth = int(width * random.uniform(min_d_factor, max_d_factor))
+        depth = int(width * rng.uniform(min_d_factor, max_d_factor))
         depth = max(5, depth)
         
-        depth_factor_visual = random.uniform(0.4, 0.6)
+        depth_factor_visual = rng.uniform(0.4, 0.6)
         top_face_brightness_factor = constraints.get("top_face_brightness_factor", 1.4)
         side_face_brightness_factor = constraints.get("side_face_brightness_factor", 0.75)
 
@@ -63,6 +65,20 @@ class CuboidShape(AbstractShape):
             "side_face_brightness_factor": side_face_brightness_factor
         }
 
+    @classmethod
+    def bbox_at_origin(cls, size_params: Dict[str, Any], rotation_angle_rad: float = 0.0) -> List[float]:
+        half_w = size_params["width"] / 2.0
+        half_h = size_params["height"] / 2.0
+        front_bbox = geometry_utils.calculate_rotated_polygon_bbox_at_origin(
+            [(-half_w, -half_h), (half_w, -half_h), (half_w, half_h), (-half_w, half_h)],
+            rotation_angle_rad
+        )
+        visual_depth = size_params["depth"] * size_params.get("depth_factor_visual", 0.5)
+        depth_display_angle = -math.pi / 4 + rotation_angle_rad
+        dx_depth = int(visual_depth * math.cos(depth_display_angle))
+        dy_depth = int(visual_depth * math.sin(depth_display_angle))
+        return geometry_utils.extend_bbox_by_offset(front_bbox, dx_depth, dy_depth)
+
     def __init__(
         self,
         cx_upscaled: int,
@@ -204,4 +220,7 @@ class CuboidShape(AbstractShape):
                 vertices=face_data["vertices"]
             ):
                 return True
-        return False
\ No newline at end of file
+        return False
+
+    def get_hit_test_primitives(self) -> List[List[Any]]:
+        return [geometry_utils.polygon_hit_primitive(face_data["vertices"]) for face_data in self.clickable_polygons]
@@ -17,6 +17,9 @@ class CylinderShape(AbstractShape):
     Представление фигуры "Псевдо-3D Цилиндр" для CAPTCHA.
     """
 
+    # Ключи старого формата хранения (verify_solution до появления from_storage)
+    storage_key_aliases = {"cx_top": "cx_upscaled", "cy_top": "cy_upscaled"}
+
     @staticmethod
     def get_shape_type() -> str:
         return "cylinder"
@@ -29,12 +32,14 @@ class CylinderShape(AbstractShape):
         max_primary_size_upscaled: int,   # Будет для высоты (height)
         min_secondary_size_upscaled: Optional[int] = None, # Для радиуса основания (radius)
         max_secondary_size_upscaled: Optional[int] = None, # Для радиуса основания (radius)
-        model_specific_constraints: Optional[Dict[str, Any]] = None
+        model_specific_constraints: Optional[Dict[str, Any]] = None,
+        rng: Optional[random.Random] = None
     ) -> Dict[str, Any]:
+        rng = rng or random
         if max_primary_size_upscaled <= min_primary_size_upscaled:
             height = max(10, min_primary_size_upscaled) # Минимальная высота
         else:
-            height = random.randint(min_primary_size_upscaled, max_primary_size_upscaled)
+            height = rng.randint(min_primary_size_upscaled, max_primary_size_upscaled)
 
         min_r = min_secondary_size_upscaled if min_secondary_size_upscaled is not None else max(5, int(height * 0.2))
         max_r = max_secondary_size_upscaled if max_secondary_size_upscaled is not None else max(min_r + 1, int(height * 0.5))
@@ -42,9 +47,9 @@ class CylinderShape(AbstractShape):
         if max_r <= min_r:
             radius = max(3, min_r) # Минимальный радиус
         else:
-            radius = random.randint(min_r, max_r)
+            radius = rng.randint(min_r, max_r)
         
-        perspective_factor_ellipse = random.uniform(0.3, 0.5)
+        perspective_factor_ellipse = rng.uniform(0.3, 0.5)
         
         # Используем get с значениями по умолчанию, если model_specific_constraints это None или не содержит ключей
         constraints = model_specific_constraints or {}
@@ -61,6 +66,13 @@ class CylinderShape(AbstractShape):
             "side_gradient_end_factor": side_gradient_end_factor
         }
 
+    @classmethod
+    def bbox_at_origin(cls, size_params: Dict[str, Any], rotation_angle_rad: float = 0.0) -> List[float]:
+        # (0,0) - центр верхнего эллипса, поворот не используется
+        radius = size_params["radius"]
+        ellipse_ry = max(1, int(radius * size_params.get("perspective_factor_ellipse", 0.4)))
+        return [float(-radius), float(-ellipse_ry), float(radius), float(size_params["height"] + ellipse_ry)]
+
     def __init__(
         self,
         cx_upscaled: int, # Центр X верхнего эллипса
@@ -266,4 +278,12 @@ class CylinderShape(AbstractShape):
             return True
             
         # print(f"DEBUG [CylinderShape]: MISS on all parts for point ({point_x_upscaled}, {point_y_upscaled})")
-        return False
\ No newline at end of file
+        return False
+
+    def get_hit_test_primitives(self) -> List[List[Any]]:
+        top_ellipse, bottom_ellipse = (data["params"] for data in self.clickable_ellipses_params[:2])
+        return [
+            ["ellipse", top_ellipse["cx"], top_ellipse["cy"], top_ellipse["rx"], top_ellipse["ry"]],
+            geometry_utils.polygon_hit_primitive(self.clickable_polygons_params[0]["vertices"]),
+            ["ellipse", bottom_ellipse["cx"], bottom_ellipse["cy"], bottom_ellipse["rx"], bottom_ellipse["ry"]],
+        ]
@@ -30,12 +30,14 @@ class OctahedronShape(AbstractShape):
         max_primary_size_upscaled: int,   # Для "размера"
         min_secondary_size_upscaled: Optional[int] = None, # Не используется напрямую
         max_secondary_size_upscaled: Optional[int] = None, # Не используется напрямую
-        model_specific_constraints: Optional[Dict[str, Any]] = None
+        model_specific_constraints: Optional[Dict[str, Any]] = None,
+        rng: Optional[random.Random] = None
     ) -> Dict[str, Any]:
+        rng = rng or random
         if max_primary_size_upscaled <= min_primary_size_upscaled:
             size = max(10, min_primary_size_upscaled)
         else:
-            size = random.randint(min_primary_size_upscaled, max_primary_size_upscaled)
+            size = rng.randint(min_primary_size_upscaled, max_primary_size_upscaled)
         
         constraints = model_specific_constraints or {}
         # Фиксированные углы для статичного вида, но позволяем их переопределить через constraints
@@ -56,6 +58,39 @@ class OctahedronShape(AbstractShape):
             "brightness_factors": brightness_factors,
         }
 
+    @staticmethod
+    def _project_centered(
+        point_3d: Tuple[float, float, float],
+        tilt_angle_rad: float,
+        rotation_angle_rad: float,
+        perspective_factor_z: float
+    ) -> Tuple[int, int]:
+        """Поворачивает 3D-точку и проецирует ее на 2D относительно центра (0,0)."""
+        x, y, z = point_3d
+        
+        # 1. Применяем наклон (вокруг оси X)
+        y_t = y * math.cos(tilt_angle_rad) - z * math.sin(tilt_angle_rad)
+        z_t = y * math.sin(tilt_angle_rad) + z * math.cos(tilt_angle_rad)
+        x_t = x
+
+        # 2. Применяем вращение (вокруг оси Y)
+        x_r = x_t * math.cos(rotation_angle_rad) + z_t * math.sin(rotation_angle_rad)
+        z_r = -x_t * math.sin(rotation_angle_rad) + z_t * math.cos(rotation_angle_rad)
+        y_r = y_t
+        
+        # 3. Простая ортографическая проекция с учетом перспективы по Z
+        return int(round(x_r)), int(round(y_r + z_r * perspective_factor_z))
+
+    @classmethod
+    def bbox_at_origin(cls, size_params: Dict[str, Any], rotation_angle_rad: float = 0.0) -> List[float]:
+        s = float(size_params["size"])
+        tilt_angle_rad = size_params.get("tilt_angle_rad", 0.0)
+        perspective_factor_z = size_params.get("perspective_factor_z", 0.4)
+        return geometry_utils.calculate_polygon_bounding_box([
+            cls._project_centered(v_3d, tilt_angle_rad, rotation_angle_rad, perspective_factor_z)
+            for v_3d in ((0, -s, 0), (0, s, 0), (s, 0, 0), (0, 0, s), (-s, 0, 0), (0, 0, -s))
+        ])
+
     def __init__(
         self,
         cx_upscaled: int,
@@ -87,24 +122,11 @@ class OctahedronShape(AbstractShape):
         self._calculate_internal_geometry()
 
     def _apply_rotations_and_projection(self, point_3d: Tuple[float, float, float]) -> Tuple[int, int]:
-        x, y, z = point_3d
-        
-        # 1. Применяем наклон (вокруг оси X)
-        y_t = y * math.cos(self.tilt_angle_rad) - z * math.sin(self.tilt_angle_rad)
-        z_t = y * math.sin(self.tilt_angle_rad) + z * math.cos(self.tilt_angle_rad)
-        x_t = x
-
-        # 2. Применяем вращение (вокруг оси Y)
-        x_r = x_t * math.cos(self.rotation_angle_rad) + z_t * math.sin(self.rotation_angle_rad)
-        z_r = -x_t * math.sin(self.rotation_angle_rad) + z_t * math.cos(self.rotation_angle_rad)
-        y_r = y_t
-        
-        # 3. Проекция на 2D и смещение в центр CAPTCHA
-        # Простая ортографическая проекция с учетом перспективы по Z
-        projected_x = self.cx_upscaled + int(round(x_r))
-        projected_y = self.cy_upscaled + int(round(y_r + z_r * self.perspective_factor_z))
-        
-        return projected_x, projected_y
+        offset_x, offset_y = self._project_centered(
+            point_3d, self.tilt_angle_rad, self.rotation_angle_rad, self.perspective_factor_z
+        )
+        # Смещение в центр CAPTCHA
+        return self.cx_upscaled + offset_x, self.cy_upscaled + offset_y
 
     def _get_vertex_avg_z_after_transform(self, point_3d: Tuple[float, float, float]) -> float:
         """ Вспомогательная функция для получения Z-координаты вершины ПОСЛЕ всех трансформаций,
@@ -265,4 +287,9 @@ class OctahedronShape(AbstractShape):
                 vertices=face_data["vertices"] # vertices - это vertices_2d
             ):
                 return True
-        return False
\ No newline at end of file
+        return False
+
+    def get_hit_test_primitives(self) -> List[List[Any]]:
+        return [
+            geometry_utils.polygon_hit_primitive(face_data["vertices"]) for face_data in self.clickable_polygons_params
+        ]
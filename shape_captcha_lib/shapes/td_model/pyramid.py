@@ -18,6 +18,9 @@ class PyramidShape(AbstractShape):
     cx_upscaled, cy_upscaled в __init__ - это центр квадратного основания на плоскости отрисовки.
     """
 
+    # Ключи старого формата хранения (verify_solution до появления from_storage)
+    storage_key_aliases = {"cx_base": "cx_upscaled", "cy_base": "cy_upscaled"}
+
     @staticmethod
     def get_shape_type() -> str:
         return "pyramid"
@@ -30,12 +33,14 @@ class PyramidShape(AbstractShape):
         max_primary_size_upscaled: int,   # Для стороны основания (base_side)
         min_secondary_size_upscaled: Optional[int] = None, # Для высоты (height)
         max_secondary_size_upscaled: Optional[int] = None, # Для высоты (height)
-        model_specific_constraints: Optional[Dict[str, Any]] = None
+        model_specific_constraints: Optional[Dict[str, Any]] = None,
+        rng: Optional[random.Random] = None
     ) -> Dict[str, Any]:
+        rng = rng or random
         if max_primary_size_upscaled <= min_primary_size_upscaled:
             base_side = max(10, min_primary_size_upscaled)
         else:
-            base_side = random.randint(min_primary_size_upscaled, max_primary_size_upscaled)
+            base_side = rng.randint(min_primary_size_upscaled, max_primary_size_upscaled)
 
         min_h = min_secondary_size_upscaled if min_secondary_size_upscaled is not None else max(int(base_side * 0.7), 10)
         max_h = max_secondary_size_upscaled if max_secondary_size_upscaled is not None else max(min_h + 1, int(base_side * 1.3))
@@ -43,9 +48,9 @@ class PyramidShape(AbstractShape):
         if max_h <= min_h:
             height = max(5, min_h)
         else:
-            height = random.randint(min_h, max_h)
+            height = rng.randint(min_h, max_h)
         
-        depth_factor_base = random.uniform(0.45, 0.6) # Для перспективы основания
+        depth_factor_base = rng.uniform(0.45, 0.6) # Для перспективы основания
         
         constraints = model_specific_constraints or {}
         # Факторы яркости граней и основания
@@ -60,6 +65,21 @@ class PyramidShape(AbstractShape):
             "base_brightness_factor": base_brightness_factor
         }
 
+    @classmethod
+    def bbox_at_origin(cls, size_params: Dict[str, Any], rotation_angle_rad: float = 0.0) -> List[float]:
+        # Повторяет проекцию основания из _calculate_internal_geometry для центра (0,0)
+        half_s = size_params["base_side"] / 2.0
+        depth_factor_base = size_params.get("depth_factor_base", 0.5)
+        cos_rot = math.cos(rotation_angle_rad)
+        sin_rot = math.sin(rotation_angle_rad)
+        vertices_for_bbox: List[Tuple[int, int]] = [(0, -size_params["height"])]
+        for vx, vy in ((-half_s, -half_s), (half_s, -half_s), (half_s, half_s), (-half_s, half_s)):
+            rvx = vx * cos_rot - vy * sin_rot
+            rvy = vx * sin_rot + vy * cos_rot
+            projected_y = rvy * (depth_factor_base if rvy < 0 else 1.0)
+            vertices_for_bbox.append((int(round(rvx)), int(round(projected_y))))
+        return geometry_utils.calculate_polygon_bounding_box(vertices_for_bbox)
+
     def __init__(
         self,
         cx_upscaled: int, # Центр X основания на плоскости отрисовки
@@ -269,4 +289,9 @@ class PyramidShape(AbstractShape):
                 # print(f"DEBUG [PyramidShape@{id(self)}]: HIT on face {face_data.get('name', 'unknown')}")
                 return True
         # print(f"DEBUG [PyramidShape@{id(self)}]: MISS on all faces for point ({point_x_upscaled}, {point_y_upscaled})")
-        return False
\ No newline at end of file
+        return False
+
+    def get_hit_test_primitives(self) -> List[List[Any]]:
+        return [
+            geometry_utils.polygon_hit_primitive(face_data["vertices"]) for face_data in self.clickable_polygons_params
+        ]
@@ -31,13 +31,15 @@ class Star5_3DShape(AbstractShape):
         max_primary_size_upscaled: int,   # Для внешнего радиуса (outer_radius)
         min_secondary_size_upscaled: Optional[int] = None, # Для внутреннего радиуса (inner_radius)
         max_secondary_size_upscaled: Optional[int] = None, # Для внутреннего радиуса (inner_radius)
-        model_specific_constraints: Optional[Dict[str, Any]] = None
+        model_specific_constraints: Optional[Dict[str, Any]] = None,
+        rng: Optional[random.Random] = None
     ) -> Dict[str, Any]:
+        rng = rng or random
         
         if max_primary_size_upscaled <= min_primary_size_upscaled:
             outer_radius = max(int(Star5_3DShape.NUM_POINTS * 4), min_primary_size_upscaled) # Звезда требует большего радиуса
         else:
-            outer_radius = random.randint(min_primary_size_upscaled, max_primary_size_upscaled)
+            outer_radius = rng.randint(min_primary_size_upscaled, max_primary_size_upscaled)
 
         # --- ИЗМЕНЕНИЯ ДЛЯ БОЛЕЕ ОСТРЫХ ЛУЧЕЙ ---
         # Устанавливаем более строгие рамки для соотношения внутреннего и внешнего радиусов.
@@ -62,7 +64,7 @@ class Star5_3DShape(AbstractShape):
         if final_max_inner_r <= final_min_inner_r:
             inner_radius = max(1, final_min_inner_r)
         else:
-            inner_radius = random.randint(final_min_inner_r, final_max_inner_r)
+            inner_radius = rng.randint(final_min_inner_r, final_max_inner_r)
         
         # Дополнительная гарантия: если inner_radius все еще слишком большой
         if inner_radius >= outer_radius * (max_inner_radius_ratio + 0.05): # +0.05 для небольшого запаса
@@ -79,7 +81,7 @@ class Star5_3DShape(AbstractShape):
         # --- КОНЕЦ ИЗМЕНЕНИЙ ДЛЯ ЛУЧЕЙ ---
 
 
-        depth_factor = random.uniform(0.15, 0.3) # Визуальная глубина экструзии
+        depth_factor = rng.uniform(0.15, 0.3) # Визуальная глубина экструзии
         
         constraints = model_specific_constraints or {}
         top_face_brightness_factor = constraints.get("top_face_brightness_factor", 1.25)
@@ -93,6 +95,27 @@ class Star5_3DShape(AbstractShape):
             "side_face_brightness_factor": side_face_brightness_factor
         }
 
+    @classmethod
+    def _calculate_centered_vertices(cls, outer_radius: int, inner_radius: int) -> List[Tuple[float, float]]:
+        return geometry_utils.calculate_star_centered_vertices(
+            outer_radius=float(outer_radius),
+            inner_radius=float(inner_radius),
+            num_points=cls.NUM_POINTS,
+            start_angle_offset_rad=-math.pi / 2 # Один луч направлен вверх
+        )
+
+    @classmethod
+    def bbox_at_origin(cls, size_params: Dict[str, Any], rotation_angle_rad: float = 0.0) -> List[float]:
+        inner_radius = size_params["inner_radius"]
+        front_bbox = geometry_utils.calculate_rotated_polygon_bbox_at_origin(
+            cls._calculate_centered_vertices(size_params["outer_radius"], inner_radius), rotation_angle_rad
+        )
+        actual_depth_offset = max(1, int(inner_radius * size_params.get("depth_factor", 0.2) * 2))
+        depth_display_angle = -math.pi / 4 + rotation_angle_rad
+        dx_depth = int(actual_depth_offset * math.cos(depth_display_angle))
+        dy_depth = int(actual_depth_offset * math.sin(depth_display_angle))
+        return geometry_utils.extend_bbox_by_offset(front_bbox, dx_depth, dy_depth)
+
     def __init__(
         self,
         cx_upscaled: int,
@@ -131,12 +154,7 @@ class Star5_3DShape(AbstractShape):
     def _calculate_internal_geometry(self):
         # 1. Вершины передней грани (2D звезда)
         star_orig_centered: List[Tuple[float, float]] = \
-            geometry_utils.calculate_star_centered_vertices(
-                outer_radius=float(self.outer_radius_upscaled),
-                inner_radius=float(self.inner_radius_upscaled),
-                num_points=self.NUM_POINTS,
-                start_angle_offset_rad=-math.pi / 2 # Один луч направлен вверх
-            )
+            self._calculate_centered_vertices(self.outer_radius_upscaled, self.inner_radius_upscaled)
         
         self.front_vertices: List[Tuple[int, int]] = \
             geometry_utils.calculate_rotated_polygon_vertices(
@@ -236,4 +254,7 @@ class Star5_3DShape(AbstractShape):
         return geometry_utils.is_point_in_polygon(
             px=point_x_upscaled, py=point_y_upscaled,
             vertices=self.front_vertices
-        )
\ No newline at end of file
+        )
+
+    def get_hit_test_primitives(self) -> List[List[Any]]:
+        return [geometry_utils.polygon_hit_primitive(self.front_vertices)]
@@ -30,13 +30,15 @@ class TorusShape(AbstractShape):
         max_primary_size_upscaled: int,   # Для внешнего радиуса (outer_radius)
         min_secondary_size_upscaled: Optional[int] = None, # Для радиуса трубки (tube_radius)
         max_secondary_size_upscaled: Optional[int] = None, # Для радиуса трубки (tube_radius)
-        model_specific_constraints: Optional[Dict[str, Any]] = None
+        model_specific_constraints: Optional[Dict[str, Any]] = None,
+        rng: Optional[random.Random] = None
     ) -> Dict[str, Any]:
+        rng = rng or random
         
         if max_primary_size_upscaled <= min_primary_size_upscaled:
             outer_radius = max(10, min_primary_size_upscaled)
         else:
-            outer_radius = random.randint(min_primary_size_upscaled, max_primary_size_upscaled)
+            outer_radius = rng.randint(min_primary_size_upscaled, max_primary_size_upscaled)
 
         min_tube_r_abs = min_secondary_size_upscaled if min_secondary_size_upscaled is not None else max(2, int(outer_radius * 0.25))
         max_tube_r_abs = max_secondary_size_upscaled if max_secondary_size_upscaled is not None else max(min_tube_r_abs + 1, int(outer_radius * 0.45))
@@ -44,7 +46,7 @@ class TorusShape(AbstractShape):
         if max_tube_r_abs <= min_tube_r_abs:
             tube_radius = max(1, min_tube_r_abs)
         else:
-            tube_radius = random.randint(min_tube_r_abs, max_tube_r_abs)
+            tube_radius = rng.randint(min_tube_r_abs, max_tube_r_abs)
         
         if tube_radius >= outer_radius / 1.5: 
             tube_radius = int(outer_radius / 2.0)
@@ -76,6 +78,12 @@ class TorusShape(AbstractShape):
             "shadow_factor": shadow_factor
         }
 
+    @classmethod
+    def bbox_at_origin(cls, size_params: Dict[str, Any], rotation_angle_rad: float = 0.0) -> List[float]:
+        # Проекция тора - окружность внешнего радиуса, поворот на bbox не влияет
+        outer_radius = size_params["outer_radius"]
+        return [float(-outer_radius), float(-outer_radius), float(outer_radius), float(outer_radius)]
+
     def __init__(
         self,
         cx_upscaled: int,
@@ -225,4 +233,8 @@ class TorusShape(AbstractShape):
             )
             return not in_inner_circle 
         else:
-            return True # Нет отверстия, значит если внутри внешнего, то это попадание
\ No newline at end of file
+            return True # Нет отверстия, значит если внутри внешнего, то это попадание
+
+    def get_hit_test_primitives(self) -> List[List[Any]]:
+        # Кольцо; при inner_ellipse_rx == 0 вырождается в круг
+        return [["annulus", self.cx_upscaled, self.cy_upscaled, self.outer_ellipse_rx, self.inner_ellipse_rx]]
@@ -1,6 +1,10 @@
 # shape_captcha_lib/stores/__init__.py
 from .abc_store import AbstractAsyncCaptchaStore, AbstractSyncCaptchaStore
 from .memory_store import SyncInMemoryStore, AsyncInMemoryStore
+from .codecs import ChallengeCodec, get_challenge_codec
+from .log_store import SyncLogStore, AsyncLogStore
+from .sqlite_store import SyncSqliteStore, AsyncSqliteStore
+from .shared_memory_store import SyncSharedMemoryStore, AsyncSharedMemoryStore
 # Дальше будут добавлены JsonFileStore и RedisStore
 
 __all__ = [
@@ -8,6 +12,14 @@ __all__ = [
     "AbstractSyncCaptchaStore",
     "SyncInMemoryStore",
     "AsyncInMemoryStore",
+    "SyncLogStore",
+    "AsyncLogStore",
+    "SyncSqliteStore",
+    "AsyncSqliteStore",
+    "SyncSharedMemoryStore",
+    "AsyncSharedMemoryStore",
+    "ChallengeCodec",
+    "get_challenge_codec",
     # "SyncJsonFileStore",        # Будет добавлено
     # "AsyncJsonFileStore",       # Будет добавлено
     # "SyncRedisStore",           # Будет добавлено
@@ -43,6 +43,24 @@ class AbstractAsyncCaptchaStore(ABC):
         """
         pass
 
+    async def consume_challenge(self, challenge_id: str) -> Optional[Dict[str, Any]]:
+        """
+        Атомарно извлекает и удаляет данные вызова CAPTCHA: из нескольких
+        одновременных вызовов данные получит только один.
+        Реализация по умолчанию (retrieve + delete) не атомарна;
+        хранилища переопределяют метод одной нативной операцией.
+
+        Args:
+            challenge_id: Уникальный идентификатор вызова.
+
+        Returns:
+            Словарь с данными вызова или None, если не найден, истек или уже использован.
+        """
+        data = await self.retrieve_challenge(challenge_id)
+        if data is not None:
+            await self.delete_challenge(challenge_id)
+        return data
+
     async def close(self) -> None:
         """
         Опциональный метод для закрытия соединений или освобождения ресурсов.
@@ -91,6 +109,24 @@ class AbstractSyncCaptchaStore(ABC):
         """
         pass
 
+    def consume_challenge(self, challenge_id: str) -> Optional[Dict[str, Any]]:
+        """
+        Атомарно извлекает и удаляет данные вызова CAPTCHA: из нескольких
+        одновременных вызовов данные получит только один.
+        Реализация по умолчанию (retrieve + delete) не атомарна;
+        хранилища переопределяют метод одной нативной операцией.
+
+        Args:
+            challenge_id: Уникальный идентификатор вызова.
+
+        Returns:
+            Словарь с данными вызова или None, если не найден, истек или уже использован.
+        """
+        data = self.retrieve_challenge(challenge_id)
+        if data is not None:
+            self.delete_challenge(challenge_id)
+        return data
+
     def close(self) -> None:
         """
         Опциональный метод для закрытия соединений или освобождения ресурсов.
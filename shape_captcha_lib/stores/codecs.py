@@ -0,0 +1,207 @@
+# shape_captcha_lib/stores/codecs.py
+import json
+import zlib
+from abc import ABC, abstractmethod
+from typing import Any, Callable, Dict, Union
+
+from .compact_record import pack_challenge_record, unpack_challenge_record
+
+# Первый байт закодированной записи определяет формат, поэтому любое хранилище
+# читает записи любого кодека (смена кодека не требует миграции данных).
+# Обычный JSON-объект начинается с "{", этот байт и служит версией формата JSON:
+# записи, сохраненные до появления кодеков, читаются без изменений.
+FORMAT_JSON = ord("{")
+FORMAT_COMPACT_JSON = 0x01
+FORMAT_BINARY = 0x02
+FORMAT_ZLIB = 0x80 # Далее - сжатая zlib запись другого формата (со своим байтом версии)
+
+# Короткие ключи compact-json: поля записей, фигур и общие параметры фигур
+COMPACT_JSON_KEYS = {
+    "target_shape_type": "t",
+    "all_drawn_shapes": "s",
+    "shape_types": "ts",
+    "hit_map": "m",
+    "seed": "sd",
+    "model_name": "mn",
+    "config_hash": "ch",
+    "shape_type": "k",
+    "color_name_or_rgb": "c",
+    "params_for_storage": "p",
+    "bbox_upscaled": "b",
+    "hit_test": "h",
+    "cx_upscaled": "x",
+    "cy_upscaled": "y",
+    "rotation_angle_rad": "r",
+}
+_COMPACT_JSON_LONG_KEYS = {short: long for long, short in COMPACT_JSON_KEYS.items()}
+_ESCAPE_PREFIX = "=" # Неизвестный ключ, совпадающий с коротким, хранится с этим префиксом
+
+
+class ChallengeCodec(ABC):
+    """
+    Сериализация записи CAPTCHA в bytes для хранилищ (Redis, файлы).
+    Результат encode начинается с байта format_id; decode принимает записи всех форматов.
+    """
+    name: str
+    format_id: int
+
+    @abstractmethod
+    def encode(self, data: Dict[str, Any]) -> bytes:
+        """
+        Raises:
+            TypeError, ValueError: Если запись не сериализуется.
+        """
+        pass
+
+    def decode(self, payload: Union[bytes, str]) -> Dict[str, Any]:
+        """
+        Raises:
+            ValueError: Если запись повреждена или формат неизвестен.
+        """
+        return decode_challenge(payload)
+
+
+class JsonCodec(ChallengeCodec):
+    """Обычный JSON, совместимый с записями, сохраненными до появления кодеков."""
+    name = "json"
+    format_id = FORMAT_JSON
+
+    def encode(self, data: Dict[str, Any]) -> bytes:
+        return json.dumps(data, ensure_ascii=False).encode("utf-8")
+
+
+def _compact_value(value: Any) -> Any:
+    if isinstance(value, dict):
+        return {_compact_key(key): _compact_value(item) for key, item in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [_compact_value(item) for item in value]
+    if isinstance(value, float) and value.is_integer():
+        return int(value)
+    return value
+
+
+def _compact_key(key: str) -> str:
+    short_key = COMPACT_JSON_KEYS.get(key)
+    if short_key is not None:
+        return short_key
+    if key in _COMPACT_JSON_LONG_KEYS or key.startswith(_ESCAPE_PREFIX):
+        return _ESCAPE_PREFIX + key
+    return key
+
+
+def _expand_value(value: Any) -> Any:
+    if isinstance(value, dict):
+        return {_expand_key(key): _expand_value(item) for key, item in value.items()}
+    if isinstance(value, list):
+        return [_expand_value(item) for item in value]
+    return value
+
+
+def _expand_key(key: str) -> str:
+    if key.startswith(_ESCAPE_PREFIX):
+        return key[len(_ESCAPE_PREFIX):]
+    return _COMPACT_JSON_LONG_KEYS.get(key, key)
+
+
+class CompactJsonCodec(ChallengeCodec):
+    """
+    JSON с короткими ключами (COMPACT_JSON_KEYS), без пробелов и с целыми числами
+    вместо целых float (bbox_upscaled 96.0 -> 96). Остальные значения не меняются.
+    """
+    name = "compact-json"
+    format_id = FORMAT_COMPACT_JSON
+
+    def encode(self, data: Dict[str, Any]) -> bytes:
+        encoded = json.dumps(_compact_value(data), ensure_ascii=False, separators=(",", ":"))
+        return bytes((self.format_id,)) + encoded.encode("utf-8")
+
+
+class BinaryCodec(ChallengeCodec):
+    """
+    Записи all_drawn_shapes упаковываются struct-буфером compact_record (int16-координаты,
+    номера типов фигур). Сохраняются только данные для проверки клика: shape_type,
+    bbox_upscaled и hit_test, без цвета и params_for_storage. Записи, которые так
+    не упаковываются (seed, hit_map, фигуры без hit_test), кодируются compact-json.
+    """
+    name = "binary"
+    format_id = FORMAT_BINARY
+
+    def encode(self, data: Dict[str, Any]) -> bytes:
+        packed = pack_challenge_record(data)
+        if packed is None:
+            return _COMPACT_JSON.encode(data)
+        return bytes((self.format_id,)) + packed
+
+
+class ZlibCodec(ChallengeCodec):
+    """Сжимает zlib результат другого кодека; выгодно для больших записей all_drawn_shapes."""
+    format_id = FORMAT_ZLIB
+
+    def __init__(self, inner: ChallengeCodec, level: int = 6):
+        if isinstance(inner, ZlibCodec):
+            raise ValueError("ZlibCodec cannot wrap another ZlibCodec")
+        self.inner = inner
+        self.level = level
+        self.name = f"{inner.name}+zlib"
+
+    def encode(self, data: Dict[str, Any]) -> bytes:
+        return bytes((self.format_id,)) + zlib.compress(self.inner.encode(data), self.level)
+
+
+_COMPACT_JSON = CompactJsonCodec()
+
+CHALLENGE_CODECS: Dict[str, Callable[[], ChallengeCodec]] = {
+    "json": JsonCodec,
+    "compact-json": CompactJsonCodec,
+    "binary": BinaryCodec,
+}
+
+
+def get_challenge_codec(codec: Union[str, ChallengeCodec]) -> ChallengeCodec:
+    """
+    Кодек по имени ("json", "compact-json", "binary", с суффиксом "+zlib" - сжатый) или сам кодек.
+
+    Raises:
+        ValueError: Если имя неизвестно.
+    """
+    if isinstance(codec, ChallengeCodec):
+        return codec
+    base_name, _, suffix = codec.partition("+")
+    factory = CHALLENGE_CODECS.get(base_name)
+    if factory is None or suffix not in ("", "zlib"):
+        raise ValueError(f"Unknown challenge codec '{codec}'. Available: {sorted(CHALLENGE_CODECS)} (optionally with '+zlib')")
+    return ZlibCodec(factory()) if suffix else factory()
+
+
+def decode_challenge(payload: Union[bytes, str]) -> Dict[str, Any]:
+    """
+    Декодирует запись любого кодека по ее первому байту.
+    str принимается для клиентов Redis с decode_responses=True (подходит только для формата json).
+
+    Raises:
+        ValueError: Если запись повреждена или формат неизвестен.
+    """
+    if isinstance(payload, str):
+        payload = payload.encode("utf-8")
+    if not payload:
+        raise ValueError("Empty challenge payload")
+    format_id = payload[0]
+    if format_id == FORMAT_ZLIB:
+        try:
+            payload = zlib.decompress(payload[1:])
+        except zlib.error as e:
+            raise ValueError(f"Corrupted zlib challenge payload: {e}") from e
+        if payload[:1] == bytes((FORMAT_ZLIB,)):
+            raise ValueError("Nested zlib challenge payload")
+        return decode_challenge(payload)
+    if format_id == FORMAT_JSON:
+        data = json.loads(payload)
+    elif format_id == FORMAT_COMPACT_JSON:
+        data = _expand_value(json.loads(payload[1:]))
+    elif format_id == FORMAT_BINARY:
+        return unpack_challenge_record(payload[1:])
+    else:
+        raise ValueError(f"Unknown challenge payload format 0x{format_id:02x}")
+    if not isinstance(data, dict):
+        raise ValueError("Challenge payload is not an object")
+    return data
@@ -0,0 +1,137 @@
+# shape_captcha_lib/stores/compact_record.py
+import struct
+from typing import Any, Dict, List, Optional
+
+# Упакованная запись all_drawn_shapes: только то, что нужно verify_solution
+# (тип фигуры, bbox и примитивы hit_test). Все координаты - int16, типы фигур
+# заменены номерами в таблице строк в начале записи, цель - номер в той же таблице.
+#
+# Формат (little-endian):
+#   B число типов, B номер типа цели, далее для каждого типа: B длина + UTF-8
+#   B число фигур, далее для каждой фигуры:
+#     B номер типа, B число примитивов, 4h bbox_upscaled
+#     для каждого примитива: B вид (PRIMITIVE_KINDS), B число значений, Nh значения
+PRIMITIVE_KINDS = ("polygon", "circle", "ellipse", "annulus")
+_PRIMITIVE_KIND_IDS = {kind: kind_id for kind_id, kind in enumerate(PRIMITIVE_KINDS)}
+
+_INT16_MIN, _INT16_MAX = -32768, 32767
+_MAX_COUNT = 255
+
+_HEADER = struct.Struct("<BB")
+_SHAPE_HEADER = struct.Struct("<BB4h")
+_PRIMITIVE_HEADER = struct.Struct("<BB")
+_BYTE = struct.Struct("<B")
+
+
+def _bbox_as_int16(bbox: Any) -> Optional[List[int]]:
+    """bbox целыми числами или None, если он не хранится в int16 без потерь."""
+    if not isinstance(bbox, (list, tuple)) or len(bbox) != 4:
+        return None
+    values = []
+    for value in bbox:
+        if isinstance(value, float) and value.is_integer():
+            value = int(value)
+        if type(value) is not int or not _INT16_MIN <= value <= _INT16_MAX:
+            return None
+        values.append(value)
+    return values
+
+
+def pack_challenge_record(data: Dict[str, Any]) -> Optional[bytes]:
+    """
+    Упаковывает запись {"target_shape_type", "all_drawn_shapes"} в компактный буфер.
+
+    Returns:
+        Буфер или None, если запись нельзя упаковать без потерь для проверки
+        (другой вид записи, фигура без bbox/hit_test, дробные или слишком большие
+        координаты, больше 255 фигур/типов/значений). Такую запись хранят как есть.
+    """
+    target_shape_type = data.get("target_shape_type")
+    drawn_shapes = data.get("all_drawn_shapes")
+    if not isinstance(target_shape_type, str) or not isinstance(drawn_shapes, list) or len(data) != 2:
+        return None
+    if len(drawn_shapes) > _MAX_COUNT:
+        return None
+
+    type_ids: Dict[str, int] = {target_shape_type: 0}
+    shape_parts: List[bytes] = []
+    for shape_data in drawn_shapes:
+        shape_type = shape_data.get("shape_type")
+        bbox = shape_data.get("bbox_upscaled")
+        primitives = shape_data.get("hit_test")
+        bbox_values = _bbox_as_int16(bbox)
+        if not isinstance(shape_type, str) or bbox_values is None:
+            return None
+        if not isinstance(primitives, list) or len(primitives) > _MAX_COUNT:
+            return None
+        type_id = type_ids.setdefault(shape_type, len(type_ids))
+        if type_id >= _MAX_COUNT:
+            return None
+
+        parts = [_SHAPE_HEADER.pack(type_id, len(primitives), *bbox_values)]
+        for primitive in primitives:
+            kind_id = _PRIMITIVE_KIND_IDS.get(primitive[0]) if primitive else None
+            num_values = len(primitive) - 1
+            if kind_id is None or num_values > _MAX_COUNT:
+                return None
+            parts.append(_PRIMITIVE_HEADER.pack(kind_id, num_values))
+            try:
+                # struct сам отклоняет дробные значения и выход за int16
+                parts.append(struct.pack(f"<{num_values}h", *primitive[1:]))
+            except struct.error:
+                return None
+        shape_parts.append(b"".join(parts))
+
+    header_parts = [_HEADER.pack(len(type_ids), 0)]
+    for shape_type in type_ids: # Порядок вставки совпадает с номерами типов
+        encoded_type = shape_type.encode("utf-8")
+        if len(encoded_type) > _MAX_COUNT:
+            return None
+        header_parts.append(_BYTE.pack(len(encoded_type)))
+        header_parts.append(encoded_type)
+    header_parts.append(_BYTE.pack(len(shape_parts)))
+    return b"".join(header_parts + shape_parts)
+
+
+def unpack_challenge_record(buffer: bytes) -> Dict[str, Any]:
+    """
+    Восстанавливает запись для verify_solution из буфера pack_challenge_record.
+    В фигурах есть только shape_type, bbox_upscaled и hit_test: цвет и params_for_storage не сохраняются.
+
+    Raises:
+        ValueError: Если буфер поврежден.
+    """
+    try:
+        num_types, target_type_id = _HEADER.unpack_from(buffer, 0)
+        offset = _HEADER.size
+        shape_types = []
+        for _ in range(num_types):
+            (length,) = _BYTE.unpack_from(buffer, offset)
+            offset += 1
+            shape_types.append(buffer[offset:offset + length].decode("utf-8"))
+            offset += length
+
+        (num_shapes,) = _BYTE.unpack_from(buffer, offset)
+        offset += 1
+        drawn_shapes = []
+        for _ in range(num_shapes):
+            type_id, num_primitives, *bbox = _SHAPE_HEADER.unpack_from(buffer, offset)
+            offset += _SHAPE_HEADER.size
+            primitives = []
+            for _ in range(num_primitives):
+                kind_id, num_values = _PRIMITIVE_HEADER.unpack_from(buffer, offset)
+                offset += _PRIMITIVE_HEADER.size
+                values = struct.unpack_from(f"<{num_values}h", buffer, offset)
+                offset += 2 * num_values
+                primitives.append([PRIMITIVE_KINDS[kind_id], *values])
+            drawn_shapes.append({
+                "shape_type": shape_types[type_id],
+                "bbox_upscaled": [float(value) for value in bbox],
+                "hit_test": primitives,
+            })
+        target_shape_type = shape_types[target_type_id]
+    except (struct.error, IndexError, UnicodeDecodeError) as e:
+        raise ValueError(f"Corrupted compact challenge record: {e}") from e
+    if offset != len(buffer):
+        raise ValueError("Corrupted compact challenge record: trailing bytes")
+    return {"target_shape_type": target_shape_type, "all_drawn_shapes": drawn_shapes}
@@ -1,29 +1,289 @@
 # shape_captcha_lib/stores/json_file_store.py
+import hashlib
 import json
+import math
+import threading
 import time
 import os
-import random
+import struct
+import uuid
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
-from typing import Dict, Any, Optional, Union # Добавил Union
+from typing import Callable, Dict, Any, Optional, Tuple, TypeVar, Union # Добавил Union
 
 # Для асинхронной версии
-import aiofiles
 import asyncio
 
 from .abc_store import AbstractSyncCaptchaStore, AbstractAsyncCaptchaStore
+from .codecs import ChallengeCodec, JsonCodec, decode_challenge, get_challenge_codec
 
 import logging
 logger = logging.getLogger(__name__)
 
 DEFAULT_STORE_DIR = "captcha_store_data"
+CONSUMED_FILE_SUFFIX = ".consumed"
+TEMP_FILE_SUFFIX = ".tmp"
+EXPIRY_DIR_NAME = "expiry"
+DEFAULT_EXPIRY_BUCKET_SECONDS = 60
+DEFAULT_LOCK_STRIPES = 64
+DEFAULT_IO_WORKERS = 8
+
+_T = TypeVar("_T")
+
+# Файлы кодеков, кроме json: байт-маркер, срок истечения (monotonic, double) и запись кодека
+_BINARY_FILE_MAGIC = b"\x00"
+_BINARY_FILE_HEADER = struct.Struct(">d")
+
+
+def _encode_file_content(codec: ChallengeCodec, data: Dict[str, Any], expiration_time: float) -> bytes:
+    """Содержимое файла вызова; для JsonCodec - прежний JSON-формат с полем challenge_data."""
+    if isinstance(codec, JsonCodec):
+        content = {"challenge_data": data, "expiration_timestamp_monotonic": expiration_time}
+        return json.dumps(content, ensure_ascii=False, indent=None).encode("utf-8")
+    return _BINARY_FILE_MAGIC + _BINARY_FILE_HEADER.pack(expiration_time) + codec.encode(data)
+
+
+def _decode_file_content(raw: bytes) -> Dict[str, Any]:
+    """
+    Содержимое файла любого кодека в виде {"challenge_data", "expiration_timestamp_monotonic"}.
+
+    Raises:
+        ValueError: Файл поврежден.
+    """
+    if raw[:1] == _BINARY_FILE_MAGIC:
+        try:
+            (expiration_time,) = _BINARY_FILE_HEADER.unpack_from(raw, len(_BINARY_FILE_MAGIC))
+        except struct.error as e:
+            raise ValueError(f"Truncated challenge file: {e}") from e
+        challenge_data = decode_challenge(raw[len(_BINARY_FILE_MAGIC) + _BINARY_FILE_HEADER.size:])
+        return {"challenge_data": challenge_data, "expiration_timestamp_monotonic": expiration_time}
+    content = json.loads(raw)
+    if not isinstance(content, dict):
+        raise ValueError("Challenge file content is not an object")
+    return content
+
+
+def _claim_and_read(file_path: Path, legacy_path: Optional[Path] = None) -> Optional[Dict[str, Any]]:
+    """
+    Забирает файл вызова: переименовывает его под уникальное имя, читает и удаляет.
+    Переименование атомарно, поэтому из конкурентных вызовов файл получит только один,
+    остальные увидят FileNotFoundError. Ссылка в корзине сроков остается
+    и удаляется вместе с корзиной. Если файла нет, забирается legacy_path (см. _legacy_flat_path).
+
+    Returns:
+        Содержимое файла или None, если файла нет (не создан или уже забран).
+    Raises:
+        ValueError, OSError: Файл поврежден или не читается (он все равно удаляется).
+    """
+    claimed_path = file_path.with_name(f"{file_path.name}.{uuid.uuid4().hex}{CONSUMED_FILE_SUFFIX}")
+    try:
+        os.rename(file_path, claimed_path)
+    except FileNotFoundError:
+        return _claim_and_read(legacy_path) if legacy_path is not None else None
+    try:
+        with open(claimed_path, 'rb') as f:
+            return _decode_file_content(f.read())
+    finally:
+        try:
+            os.remove(claimed_path)
+        except OSError as e_rm:
+            logger.warning(f"Failed to remove consumed challenge file {claimed_path}: {e_rm}")
+
+
+def _challenge_data_from_content(content: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    """Данные вызова из содержимого файла или None, если запись истекла или неполна."""
+    expiration_time = content.get("expiration_timestamp_monotonic")
+    challenge_data = content.get("challenge_data")
+    if expiration_time is None or challenge_data is None or time.monotonic() >= expiration_time:
+        return None
+    return challenge_data
+
+
+def _read_challenge_file(file_path: Path, legacy_path: Optional[Path] = None) -> Tuple[Optional[Dict[str, Any]], str]:
+    """
+    Читает файл вызова и проверяет срок; истекший, неполный или поврежденный файл удаляется.
+    Если файла нет, читается legacy_path (см. _legacy_flat_path).
+
+    Returns:
+        (данные, "ok") или (None, причина): "not found", "expired", "invalid content"
+        или текст ошибки декодирования.
+    Raises:
+        OSError: Файл не читается.
+    """
+    try:
+        with open(file_path, 'rb') as f:
+            raw_content = f.read()
+    except FileNotFoundError:
+        if legacy_path is not None:
+            return _read_challenge_file(legacy_path)
+        return None, "not found"
+    try:
+        content = _decode_file_content(raw_content)
+        expiration_time = content.get("expiration_timestamp_monotonic")
+        challenge_data = content.get("challenge_data")
+        if expiration_time is None or challenge_data is None:
+            reason = "invalid content"
+        elif time.monotonic() >= expiration_time:
+            reason = "expired"
+        else:
+            return challenge_data, "ok"
+    except ValueError as e:
+        reason = f"decode error: {e}"
+    try:
+        os.remove(file_path)
+    except OSError:
+        pass
+    return None, reason
+
+
+def _remove_challenge_file(file_path: Path, legacy_path: Optional[Path] = None) -> bool:
+    """Удаляет файл вызова (а если его нет - legacy_path); False, если нет ни того, ни другого."""
+    try:
+        os.remove(file_path)
+    except FileNotFoundError:
+        return _remove_challenge_file(legacy_path) if legacy_path is not None else False
+    return True
+
+
+# --- Раскладка каталога ---
+# Файл вызова лежит в <store>/ab/cd/<id>.json, где ab/cd - первые байты хэша id
+# (в одном каталоге не больше ~1/65536 файлов). Жесткая ссылка на тот же файл
+# лежит в корзине сроков <store>/expiry/<конец корзины, time.time()>/<id>.<uuid>,
+# поэтому истекшую корзину удаляет очистка без чтения файлов: для каждой ссылки
+# удаляется файл вызова (если это все еще тот же inode) и сама ссылка.
+
+def _shard_path(store_path: Path, challenge_id: str, file_extension: str) -> Path:
+    digest = hashlib.blake2b(challenge_id.encode("utf-8"), digest_size=2).hexdigest()
+    return store_path / digest[:2] / digest[2:] / f"{challenge_id}{file_extension}"
+
+
+def _legacy_flat_path(store_path: Path, challenge_id: str, file_extension: str) -> Path:
+    """
+    Путь файла в плоской раскладке до шардирования (<store>/<id>.json). Такие файлы
+    читаются, забираются и удаляются, пока legacy_flat_layout=True, чтобы вызовы,
+    созданные до обновления, не терялись при поэтапном развертывании. Новые файлы
+    в плоскую раскладку не пишутся, очистка корзин их не видит. Удалить совместимость
+    в следующем выпуске.
+    """
+    return store_path / f"{challenge_id}{file_extension}"
+
+
+def _expiry_bucket_path(store_path: Path, expires_at: float, bucket_seconds: int) -> Path:
+    bucket_end = (math.floor(expires_at / bucket_seconds) + 1) * bucket_seconds
+    return store_path / EXPIRY_DIR_NAME / str(bucket_end)
+
+
+def _write_challenge_file(file_path: Path, bucket_path: Path, file_content: bytes) -> None:
+    """
+    Пишет файл вызова через временный файл и os.replace (читатели не видят
+    недописанный файл, перезапись создает новый inode) и связывает его с корзиной сроков.
+
+    Raises:
+        OSError: Ошибка записи.
+    """
+    unique_suffix = uuid.uuid4().hex
+    temp_path = file_path.with_name(f"{file_path.name}.{unique_suffix}{TEMP_FILE_SUFFIX}")
+    try:
+        with open(temp_path, 'wb') as f:
+            f.write(file_content)
+    except FileNotFoundError:
+        file_path.parent.mkdir(parents=True, exist_ok=True)
+        with open(temp_path, 'wb') as f:
+            f.write(file_content)
+    try:
+        link_path = bucket_path / f"{file_path.name}.{unique_suffix}"
+        try:
+            os.link(temp_path, link_path)
+        except FileNotFoundError:
+            bucket_path.mkdir(parents=True, exist_ok=True)
+            os.link(temp_path, link_path)
+    except OSError as e:
+        # Без жесткой ссылки файл удаляется только при обращении к нему (FS без поддержки ссылок)
+        logger.warning(f"Failed to link {temp_path} into expiry bucket {bucket_path}: {e}")
+    os.replace(temp_path, file_path)
+
+
+def _sweep_expired_buckets(store_path: Path, now: float) -> int:
+    """
+    Удаляет истекшие корзины сроков и их файлы вызовов, не читая содержимого файлов.
+
+    Returns:
+        Число удаленных файлов вызовов.
+    """
+    expiry_path = store_path / EXPIRY_DIR_NAME
+    try:
+        bucket_names = os.listdir(expiry_path)
+    except FileNotFoundError:
+        return 0
+    removed_count = 0
+    for bucket_name in bucket_names:
+        try:
+            if int(bucket_name) > now:
+                continue
+        except ValueError:
+            continue
+        bucket_path = expiry_path / bucket_name
+        try:
+            link_names = os.listdir(bucket_path)
+        except FileNotFoundError:
+            continue # Корзину удалил параллельный проход
+        for link_name in link_names:
+            link_path = bucket_path / link_name
+            file_name = link_name.rpartition(".")[0]
+            challenge_id, _, file_extension = file_name.rpartition(".")
+            file_path = _shard_path(store_path, challenge_id, f".{file_extension}")
+            try:
+                # Файл мог быть перезаписан с другим сроком - тогда это другой inode
+                if os.path.samefile(file_path, link_path):
+                    os.remove(file_path)
+                    removed_count += 1
+            except FileNotFoundError:
+                pass
+            except OSError as e:
+                logger.warning(f"Failed to remove expired challenge file {file_path}: {e}")
+            try:
+                os.remove(link_path)
+            except FileNotFoundError:
+                pass
+            except OSError as e:
+                logger.warning(f"Failed to remove expiry link {link_path}: {e}")
+        try:
+            os.rmdir(bucket_path)
+        except OSError:
+            pass # Не пуст (запись в последний момент) или уже удален - уберется следующим проходом
+    return removed_count
 
 
 class SyncJsonFileStore(AbstractSyncCaptchaStore):
     """
     Синхронное хранилище состояний CAPTCHA в JSON-файлах.
     Управляет TTL через временные метки в файлах.
+
+    Файлы разложены по подкаталогам ab/cd/ по хэшу challenge_id и связаны жесткими
+    ссылками с корзинами сроков (expiry/<время конца корзины>) шириной
+    expiry_bucket_seconds. Истекшие корзины удаляются целиком, без чтения файлов:
+    по умолчанию при записи (не чаще раза в expiry_bucket_seconds), а с
+    sweep_interval_seconds - фоновым потоком, который останавливается в close().
+
+    codec - имя или экземпляр ChallengeCodec (см. codecs.py). С "json" файлы
+    имеют прежний формат (*.json), с остальными кодеками - двоичный (*.bin).
+
+    legacy_flat_layout=True: если файла нет в ab/cd/, проверяется прежний путь
+    <store>/<id>.json (вызовы, сохраненные до шардирования). Отключите, когда
+    в каталоге не осталось таких файлов: промах тогда стоит на один open меньше.
     """
-    def __init__(self, store_directory: Union[str, Path] = DEFAULT_STORE_DIR):
+    def __init__(
+        self,
+        store_directory: Union[str, Path] = DEFAULT_STORE_DIR,
+        codec: Union[str, ChallengeCodec] = "json",
+        expiry_bucket_seconds: int = DEFAULT_EXPIRY_BUCKET_SECONDS,
+        sweep_interval_seconds: Optional[float] = None,
+        legacy_flat_layout: bool = True
+    ):
+        if expiry_bucket_seconds <= 0:
+            raise ValueError("expiry_bucket_seconds must be positive")
+        if sweep_interval_seconds is not None and sweep_interval_seconds <= 0:
+            raise ValueError("sweep_interval_seconds must be positive")
         self.store_path = Path(store_directory)
         try:
             self.store_path.mkdir(parents=True, exist_ok=True)
@@ -31,60 +291,57 @@ class SyncJsonFileStore(AbstractSyncCaptchaStore):
         except OSError as e:
             logger.error(f"SyncJsonFileStore: Failed to create CAPTCHA store directory {self.store_path}: {e}")
             raise
-        self._file_extension = ".json"
+        self.codec = get_challenge_codec(codec)
+        self._file_extension = ".json" if isinstance(self.codec, JsonCodec) else ".bin"
+        self._legacy_flat_layout = legacy_flat_layout
+        self._expiry_bucket_seconds = expiry_bucket_seconds
+        self._next_sweep_at = 0.0
+        self._sweep_lock = threading.Lock()
+        self._sweep_interval = sweep_interval_seconds
+        self._sweeper_stop = threading.Event()
+        self._sweeper: Optional[threading.Thread] = None
+        if sweep_interval_seconds is not None:
+            self._sweeper = threading.Thread(target=self._sweep_loop, name="SyncJsonFileStore-sweeper", daemon=True)
+            self._sweeper.start()
 
     def _get_file_path(self, challenge_id: str) -> Path:
-        return self.store_path / f"{challenge_id}{self._file_extension}"
+        return _shard_path(self.store_path, challenge_id, self._file_extension)
+
+    def _get_legacy_path(self, challenge_id: str) -> Optional[Path]:
+        if not self._legacy_flat_layout:
+            return None
+        return _legacy_flat_path(self.store_path, challenge_id, self._file_extension)
 
-    def _cleanup_one_expired_file(self) -> None:
-        """Удаляет один случайный истекший файл. Вызывается с некоторой вероятностью."""
+    def _cleanup_expired(self) -> None:
+        """Удаляет истекшие корзины сроков; параллельный проход пропускается."""
+        if not self._sweep_lock.acquire(blocking=False):
+            return
         try:
-            # Получаем список всех .json файлов в директории
-            # os.listdir() может быть более эффективным для большого кол-ва файлов, чем glob
-            file_names = [f for f in os.listdir(self.store_path) if f.endswith(self._file_extension)]
-            if not file_names:
-                return
-            
-            random_file_name = random.choice(file_names)
-            random_file_path = self.store_path / random_file_name
-            
-            try:
-                with open(random_file_path, 'r', encoding='utf-8') as f:
-                    content = json.load(f)
-                
-                expiration_time = content.get("expiration_timestamp_monotonic")
-                if expiration_time and time.monotonic() >= expiration_time:
-                    logger.debug(f"SyncJsonFileStore: Cleaning up expired file {random_file_path}")
-                    os.remove(random_file_path)
-            except FileNotFoundError:
-                logger.debug(f"SyncJsonFileStore: File {random_file_path} not found during cleanup (possibly already deleted).")
-            except (json.JSONDecodeError, KeyError) as e_parse:
-                logger.warning(f"SyncJsonFileStore: Error parsing or missing key in {random_file_path} during cleanup: {e_parse}. Deleting file.")
-                try:
-                    os.remove(random_file_path) # Удаляем поврежденный/невалидный файл
-                except OSError as e_rm:
-                    logger.warning(f"SyncJsonFileStore: Failed to remove problematic file {random_file_path} during cleanup: {e_rm}")
-            except OSError as e_os:
-                 logger.warning(f"SyncJsonFileStore: OS error during cleanup of {random_file_path}: {e_os}")
-            except Exception as e:
-                 logger.warning(f"SyncJsonFileStore: Unexpected error during cleanup of {random_file_path}: {e}")
-
-        except Exception as e: # Ошибки листинга директории и т.п.
-            logger.warning(f"SyncJsonFileStore: General error during cleanup attempt: {e}")
+            removed_count = _sweep_expired_buckets(self.store_path, time.time())
+        except OSError as e:
+            logger.warning(f"SyncJsonFileStore: Error during expired bucket cleanup: {e}")
+            return
+        finally:
+            self._sweep_lock.release()
+        if removed_count:
+            logger.debug(f"SyncJsonFileStore: Removed {removed_count} expired challenge files.")
+
+    def _sweep_loop(self) -> None:
+        while not self._sweeper_stop.wait(self._sweep_interval):
+            self._cleanup_expired()
 
     def store_challenge(self, challenge_id: str, data: Dict[str, Any], ttl_seconds: int) -> None:
-        if random.random() < 0.05: # Вероятность очистки 5%
-            self._cleanup_one_expired_file()
+        now = time.time()
+        if self._sweeper is None and now >= self._next_sweep_at:
+            self._next_sweep_at = now + self._expiry_bucket_seconds
+            self._cleanup_expired()
 
         file_path = self._get_file_path(challenge_id)
         expiration_time = time.monotonic() + ttl_seconds
-        content_to_store = {
-            "challenge_data": data,
-            "expiration_timestamp_monotonic": expiration_time
-        }
+        bucket_path = _expiry_bucket_path(self.store_path, now + ttl_seconds, self._expiry_bucket_seconds)
+        file_content = _encode_file_content(self.codec, data, expiration_time)
         try:
-            with open(file_path, 'w', encoding='utf-8') as f:
-                json.dump(content_to_store, f, ensure_ascii=False, indent=None)
+            _write_challenge_file(file_path, bucket_path, file_content)
             logger.debug(f"SyncJsonFileStore: Stored challenge_id: {challenge_id} at {file_path}")
         except IOError as e:
             logger.error(f"SyncJsonFileStore: Failed to write to {file_path}: {e}")
@@ -92,57 +349,90 @@ class SyncJsonFileStore(AbstractSyncCaptchaStore):
 
     def retrieve_challenge(self, challenge_id: str) -> Optional[Dict[str, Any]]:
         file_path = self._get_file_path(challenge_id)
-        if not file_path.exists():
-            logger.debug(f"SyncJsonFileStore: Challenge_id: {challenge_id} (file {file_path}) not found.")
-            return None
         try:
-            with open(file_path, 'r', encoding='utf-8') as f:
-                content = json.load(f)
-            
-            expiration_time = content.get("expiration_timestamp_monotonic")
-            challenge_data = content.get("challenge_data")
-
-            if expiration_time is None or challenge_data is None:
-                logger.warning(f"SyncJsonFileStore: Invalid content in {file_path}. Deleting.")
-                self.delete_challenge(challenge_id)
-                return None
-
-            if time.monotonic() < expiration_time:
-                logger.debug(f"SyncJsonFileStore: Retrieved challenge_id: {challenge_id} from {file_path}")
-                return challenge_data
-            else:
-                logger.debug(f"SyncJsonFileStore: Challenge {challenge_id} expired. Deleting file {file_path}.")
-                self.delete_challenge(challenge_id)
-                return None
-        except json.JSONDecodeError as e:
-            logger.warning(f"SyncJsonFileStore: JSON decode error for {file_path}: {e}. Deleting file.")
-            self.delete_challenge(challenge_id)
-            return None
-        except IOError as e:
+            challenge_data, reason = _read_challenge_file(file_path, self._get_legacy_path(challenge_id))
+        except OSError as e:
             logger.error(f"SyncJsonFileStore: Failed to read from {file_path}: {e}")
             return None
+        if challenge_data is None:
+            logger.debug(f"SyncJsonFileStore: Challenge_id: {challenge_id} ({file_path}) not returned: {reason}.")
+            return None
+        logger.debug(f"SyncJsonFileStore: Retrieved challenge_id: {challenge_id} from {file_path}")
+        return challenge_data
 
     def delete_challenge(self, challenge_id: str) -> None:
         file_path = self._get_file_path(challenge_id)
         try:
-            if file_path.exists():
-                os.remove(file_path)
+            if _remove_challenge_file(file_path, self._get_legacy_path(challenge_id)):
                 logger.debug(f"SyncJsonFileStore: Deleted challenge_id: {challenge_id} (file {file_path})")
             else:
                 logger.debug(f"SyncJsonFileStore: Attempted to delete non-existent file for challenge_id: {challenge_id} (file {file_path})")
         except OSError as e:
             logger.error(f"SyncJsonFileStore: Failed to delete {file_path}: {e}")
 
+    def consume_challenge(self, challenge_id: str) -> Optional[Dict[str, Any]]:
+        file_path = self._get_file_path(challenge_id)
+        try:
+            content = _claim_and_read(file_path, self._get_legacy_path(challenge_id))
+        except ValueError as e:
+            logger.warning(f"SyncJsonFileStore: Decode error for {file_path}: {e}. File removed.")
+            return None
+        except OSError as e:
+            logger.error(f"SyncJsonFileStore: Failed to consume {file_path}: {e}")
+            return None
+
+        if content is None:
+            logger.debug(f"SyncJsonFileStore: Challenge_id: {challenge_id} (file {file_path}) not found.")
+            return None
+        challenge_data = _challenge_data_from_content(content)
+        if challenge_data is None:
+            logger.debug(f"SyncJsonFileStore: Challenge {challenge_id} expired or invalid. File removed.")
+            return None
+        logger.debug(f"SyncJsonFileStore: Consumed challenge_id: {challenge_id} from {file_path}")
+        return challenge_data
+
     def close(self) -> None:
-        logger.debug("SyncJsonFileStore: Close called (no-op).")
-        pass
+        if self._sweeper is not None:
+            self._sweeper_stop.set()
+            self._sweeper.join()
+            self._sweeper = None
+            logger.debug("SyncJsonFileStore: Sweeper thread stopped.")
 
 
 class AsyncJsonFileStore(AbstractAsyncCaptchaStore):
     """
     Асинхронное хранилище состояний CAPTCHA в JSON-файлах.
+    Раскладка файлов, codec, expiry_bucket_seconds и legacy_flat_layout - как в SyncJsonFileStore.
+
+    Каждая операция целиком (сериализация, запись или чтение, десериализация)
+    выполняется одним заданием в собственном пуле потоков на io_workers потоков,
+    поэтому event loop не блокируется ни файловыми вызовами, ни JSON. Операции
+    с одним challenge_id упорядочены одной из lock_stripes блокировок, операции
+    с разными id идут параллельно (атомарность на уровне ФС дают os.replace
+    при записи и os.rename при consume).
+
+    С sweep_interval_seconds истекшие корзины удаляет фоновая задача (запускается
+    при первой записи, т.к. требует работающего event loop) и останавливается в close();
+    без него - проход при записи не чаще раза в expiry_bucket_seconds.
     """
-    def __init__(self, store_directory: Union[str, Path] = DEFAULT_STORE_DIR):
+    def __init__(
+        self,
+        store_directory: Union[str, Path] = DEFAULT_STORE_DIR,
+        codec: Union[str, ChallengeCodec] = "json",
+        expiry_bucket_seconds: int = DEFAULT_EXPIRY_BUCKET_SECONDS,
+        sweep_interval_seconds: Optional[float] = None,
+        lock_stripes: int = DEFAULT_LOCK_STRIPES,
+        io_workers: int = DEFAULT_IO_WORKERS,
+        legacy_flat_layout: bool = True
+    ):
+        if expiry_bucket_seconds <= 0:
+            raise ValueError("expiry_bucket_seconds must be positive")
+        if sweep_interval_seconds is not None and sweep_interval_seconds <= 0:
+            raise ValueError("sweep_interval_seconds must be positive")
+        if lock_stripes <= 0:
+            raise ValueError("lock_stripes must be positive")
+        if io_workers <= 0:
+            raise ValueError("io_workers must be positive")
         self.store_path = Path(store_directory)
         if not self.store_path.exists():
             try:
@@ -151,147 +441,130 @@ class AsyncJsonFileStore(AbstractAsyncCaptchaStore):
             except OSError as e:
                 logger.error(f"AsyncJsonFileStore: Failed to create CAPTCHA store directory {self.store_path} (sync attempt): {e}")
                 raise
-        
-        self._file_extension = ".json"
-        self._lock = asyncio.Lock()
+
+        self.codec = get_challenge_codec(codec)
+        self._file_extension = ".json" if isinstance(self.codec, JsonCodec) else ".bin"
+        self._legacy_flat_layout = legacy_flat_layout
+        self._expiry_bucket_seconds = expiry_bucket_seconds
+        self._next_sweep_at = 0.0
+        self._sweep_interval = sweep_interval_seconds
+        self._sweeper_task: Optional[asyncio.Task] = None
+        self._locks = [asyncio.Lock() for _ in range(lock_stripes)]
+        self._executor = ThreadPoolExecutor(max_workers=io_workers, thread_name_prefix="AsyncJsonFileStore-io")
 
     def _get_file_path(self, challenge_id: str) -> Path:
-        return self.store_path / f"{challenge_id}{self._file_extension}"
+        return _shard_path(self.store_path, challenge_id, self._file_extension)
 
-    async def _cleanup_one_expired_file_async(self) -> None:
-        # Блокировка нужна для синхронизации доступа к ФС, если эта функция может вызываться конкурентно
-        async with self._lock:
-            try:
-                # Синхронный листинг директории, т.к. aiofiles не предоставляет асинхронный listdir
-                # Для очень больших директорий это может быть проблемой в асинхронном контексте.
-                # В реальном приложении это лучше делать в отдельном потоке (executor).
-                try:
-                    file_names = await asyncio.to_thread(os.listdir, self.store_path)
-                except OSError:
-                    logger.warning(f"AsyncJsonFileStore: Could not list directory {self.store_path} for cleanup.")
-                    return
-
-                json_file_names = [f_name for f_name in file_names if f_name.endswith(self._file_extension)]
-                if not json_file_names:
-                    return
-                
-                random_file_name = random.choice(json_file_names)
-                random_file_path = self.store_path / random_file_name
-                
-                try:
-                    async with aiofiles.open(random_file_path, mode='r', encoding='utf-8') as f:
-                        content_str = await f.read()
-                    content = json.loads(content_str)
-                    
-                    expiration_time = content.get("expiration_timestamp_monotonic")
-                    if expiration_time and time.monotonic() >= expiration_time:
-                        logger.debug(f"AsyncJsonFileStore: Cleaning up expired file {random_file_path}")
-                        # Используем asyncio.to_thread для синхронной операции удаления файла
-                        await asyncio.to_thread(os.remove, random_file_path)
-                except FileNotFoundError:
-                    logger.debug(f"AsyncJsonFileStore: File {random_file_path} not found during cleanup (possibly already deleted).")
-                except (json.JSONDecodeError, KeyError) as e_parse:
-                    logger.warning(f"AsyncJsonFileStore: Error parsing or missing key in {random_file_path} during cleanup: {e_parse}. Deleting file.")
-                    try:
-                        await asyncio.to_thread(os.remove, random_file_path)
-                    except OSError as e_rm:
-                        logger.warning(f"AsyncJsonFileStore: Failed to remove problematic file {random_file_path} during cleanup: {e_rm}")
-                except OSError as e_os:
-                     logger.warning(f"AsyncJsonFileStore: OS error during cleanup of {random_file_path}: {e_os}")
-                except Exception as e_clean_inner:
-                     logger.warning(f"AsyncJsonFileStore: Unexpected inner error during cleanup of {random_file_path}: {e_clean_inner}")
-            except Exception as e_clean_outer: # Ошибки при работе с блокировкой или внешние ошибки
-                logger.warning(f"AsyncJsonFileStore: General error during cleanup attempt: {e_clean_outer}")
+    def _get_legacy_path(self, challenge_id: str) -> Optional[Path]:
+        if not self._legacy_flat_layout:
+            return None
+        return _legacy_flat_path(self.store_path, challenge_id, self._file_extension)
+
+    def _get_lock(self, challenge_id: str) -> asyncio.Lock:
+        return self._locks[hash(challenge_id) % len(self._locks)]
+
+    async def _run_io(self, func: Callable[..., _T], *args: Any) -> _T:
+        return await asyncio.get_running_loop().run_in_executor(self._executor, func, *args)
+
+    async def _cleanup_expired_async(self) -> None:
+        try:
+            removed_count = await self._run_io(_sweep_expired_buckets, self.store_path, time.time())
+        except OSError as e:
+            logger.warning(f"AsyncJsonFileStore: Error during expired bucket cleanup: {e}")
+            return
+        if removed_count:
+            logger.debug(f"AsyncJsonFileStore: Removed {removed_count} expired challenge files.")
+
+    async def _sweep_loop(self) -> None:
+        while True:
+            await asyncio.sleep(self._sweep_interval)
+            await self._cleanup_expired_async()
+
+    def _encode_and_write(self, file_path: Path, bucket_path: Path, data: Dict[str, Any], expiration_time: float) -> None:
+        _write_challenge_file(file_path, bucket_path, _encode_file_content(self.codec, data, expiration_time))
 
     async def store_challenge(self, challenge_id: str, data: Dict[str, Any], ttl_seconds: int) -> None:
-        if random.random() < 0.05:
-            await self._cleanup_one_expired_file_async()
+        now = time.time()
+        if self._sweep_interval is None:
+            if now >= self._next_sweep_at:
+                self._next_sweep_at = now + self._expiry_bucket_seconds
+                await self._cleanup_expired_async()
+        elif self._sweeper_task is None:
+            self._sweeper_task = asyncio.create_task(self._sweep_loop())
 
         file_path = self._get_file_path(challenge_id)
         expiration_time = time.monotonic() + ttl_seconds
-        content_to_store = {
-            "challenge_data": data,
-            "expiration_timestamp_monotonic": expiration_time
-        }
-        # Сериализация в JSON может быть блокирующей для очень больших данных,
-        # но обычно она достаточно быстра. При необходимости можно вынести в to_thread.
-        json_string = json.dumps(content_to_store, ensure_ascii=False, indent=None)
-
-        async with self._lock:
+        bucket_path = _expiry_bucket_path(self.store_path, now + ttl_seconds, self._expiry_bucket_seconds)
+        async with self._get_lock(challenge_id):
             try:
-                async with aiofiles.open(file_path, mode='w', encoding='utf-8') as f:
-                    await f.write(json_string)
+                await self._run_io(self._encode_and_write, file_path, bucket_path, data, expiration_time)
                 logger.debug(f"AsyncJsonFileStore: Stored challenge_id: {challenge_id} at {file_path}")
-            except IOError as e: # aiofiles может бросать стандартные IOError/OSError
+            except (TypeError, ValueError) as e_encode:
+                logger.error(f"AsyncJsonFileStore: Failed to serialize data for challenge {challenge_id}: {e_encode}")
+                raise TypeError(f"Data for CAPTCHA challenge {challenge_id} is not serializable with codec '{self.codec.name}'.")
+            except IOError as e: # Стандартные IOError/OSError
                 logger.error(f"AsyncJsonFileStore: Failed to write to {file_path}: {e}")
                 raise ConnectionError(f"Failed to write CAPTCHA data to file store: {e}")
 
     async def retrieve_challenge(self, challenge_id: str) -> Optional[Dict[str, Any]]:
         file_path = self._get_file_path(challenge_id)
-        
-        # Проверка существования файла асинхронно (если есть aiopathlib или подобное)
-        # Для простоты и совместимости, используем блокирующий os.path.exists, но он быстрый.
-        # Либо обернуть в asyncio.to_thread:
-        try:
-            exists = await asyncio.to_thread(file_path.exists)
-            if not exists:
-                logger.debug(f"AsyncJsonFileStore: Challenge_id: {challenge_id} (file {file_path}) not found.")
-                return None
-        except Exception as e_exists: # На случай ошибок в to_thread или file_path
-            logger.error(f"AsyncJsonFileStore: Error checking existence of {file_path}: {e_exists}")
-            return None # Считаем, что файл недоступен
-            
-        async with self._lock:
+        async with self._get_lock(challenge_id):
             try:
-                async with aiofiles.open(file_path, mode='r', encoding='utf-8') as f:
-                    content_str = await f.read()
-                content = json.loads(content_str) # Десериализация также может быть вынесена в to_thread
-                
-                expiration_time = content.get("expiration_timestamp_monotonic")
-                challenge_data = content.get("challenge_data")
-
-                if expiration_time is None or challenge_data is None:
-                    logger.warning(f"AsyncJsonFileStore: Invalid content in {file_path}. Deleting.")
-                    try:
-                        await asyncio.to_thread(os.remove, file_path)
-                    except OSError: pass
-                    return None
-
-                if time.monotonic() < expiration_time:
-                    logger.debug(f"AsyncJsonFileStore: Retrieved challenge_id: {challenge_id} from {file_path}")
-                    return challenge_data
-                else:
-                    logger.debug(f"AsyncJsonFileStore: Challenge {challenge_id} expired. Deleting file {file_path}.")
-                    try:
-                        await asyncio.to_thread(os.remove, file_path)
-                    except OSError: pass
-                    return None
-            except FileNotFoundError: # Файл мог быть удален между проверкой exists() и open() без блокировки на всё
-                logger.debug(f"AsyncJsonFileStore: File {file_path} disappeared before reading.")
-                return None
-            except json.JSONDecodeError as e:
-                logger.warning(f"AsyncJsonFileStore: JSON decode error for {file_path}: {e}. Deleting file.")
-                try:
-                    await asyncio.to_thread(os.remove, file_path)
-                except OSError: pass
-                return None
-            except IOError as e:
+                challenge_data, reason = await self._run_io(_read_challenge_file, file_path, self._get_legacy_path(challenge_id))
+            except OSError as e:
                 logger.error(f"AsyncJsonFileStore: Failed to read from {file_path}: {e}")
                 return None
+        if challenge_data is None:
+            logger.debug(f"AsyncJsonFileStore: Challenge_id: {challenge_id} ({file_path}) not returned: {reason}.")
+            return None
+        logger.debug(f"AsyncJsonFileStore: Retrieved challenge_id: {challenge_id} from {file_path}")
+        return challenge_data
 
     async def delete_challenge(self, challenge_id: str) -> None:
         file_path = self._get_file_path(challenge_id)
-        async with self._lock:
+        async with self._get_lock(challenge_id):
             try:
-                exists = await asyncio.to_thread(file_path.exists)
-                if exists:
-                    await asyncio.to_thread(os.remove, file_path)
+                if await self._run_io(_remove_challenge_file, file_path, self._get_legacy_path(challenge_id)):
                     logger.debug(f"AsyncJsonFileStore: Deleted challenge_id: {challenge_id} (file {file_path})")
                 else:
                     logger.debug(f"AsyncJsonFileStore: Attempted to delete non-existent file for challenge_id: {challenge_id} (file {file_path})")
             except OSError as e:
                 logger.error(f"AsyncJsonFileStore: Failed to delete {file_path}: {e}")
 
+    async def consume_challenge(self, challenge_id: str) -> Optional[Dict[str, Any]]:
+        file_path = self._get_file_path(challenge_id)
+        # Блокировка только упорядочивает операции в процессе; единственность
+        # получателя обеспечивает атомарное переименование в _claim_and_read
+        async with self._get_lock(challenge_id):
+            try:
+                # Переименование, чтение, декодирование и удаление - одним заданием пула
+                content = await self._run_io(_claim_and_read, file_path, self._get_legacy_path(challenge_id))
+            except ValueError as e:
+                logger.warning(f"AsyncJsonFileStore: Decode error for {file_path}: {e}. File removed.")
+                return None
+            except OSError as e:
+                logger.error(f"AsyncJsonFileStore: Failed to consume {file_path}: {e}")
+                return None
+
+        if content is None:
+            logger.debug(f"AsyncJsonFileStore: Challenge_id: {challenge_id} (file {file_path}) not found.")
+            return None
+        challenge_data = _challenge_data_from_content(content)
+        if challenge_data is None:
+            logger.debug(f"AsyncJsonFileStore: Challenge {challenge_id} expired or invalid. File removed.")
+            return None
+        logger.debug(f"AsyncJsonFileStore: Consumed challenge_id: {challenge_id} from {file_path}")
+        return challenge_data
+
     async def close(self) -> None:
-        logger.debug("AsyncJsonFileStore: Close called (no-op).")
-        pass
\ No newline at end of file
+        if self._sweeper_task is not None:
+            self._sweeper_task.cancel()
+            try:
+                await self._sweeper_task
+            except asyncio.CancelledError:
+                pass
+            self._sweeper_task = None
+            logger.debug("AsyncJsonFileStore: Sweeper task stopped.")
+        # Дожидаемся начатых операций, не блокируя event loop
+        await asyncio.to_thread(self._executor.shutdown, True)
+        logger.debug("AsyncJsonFileStore: I/O thread pool stopped.")
@@ -0,0 +1,313 @@
+# shape_captcha_lib/stores/log_store.py
+import asyncio
+import os
+import struct
+import threading
+import time
+import zlib
+from pathlib import Path
+from typing import Any, Dict, List, NamedTuple, Optional, Union
+
+from .abc_store import AbstractSyncCaptchaStore, AbstractAsyncCaptchaStore
+from .codecs import ChallengeCodec, get_challenge_codec
+
+import logging
+logger = logging.getLogger(__name__)
+
+DEFAULT_LOG_STORE_DIR = "captcha_store_log"
+DEFAULT_SEGMENT_SECONDS = 60.0
+DEFAULT_MAX_SEGMENT_BYTES = 64 * 1024 * 1024
+SEGMENT_FILE_SUFFIX = ".seg"
+
+RECORD_PUT = 1
+RECORD_TOMBSTONE = 2
+
+# Запись лога: вид, длина id, длина данных, срок истечения (time.time()), CRC32 id и данных;
+# далее id (UTF-8) и данные кодека. Надгробие (RECORD_TOMBSTONE) - запись без данных
+_RECORD_HEADER = struct.Struct(">BHIdI")
+
+
+class _IndexEntry(NamedTuple):
+    segment_id: int
+    offset: int # Смещение данных кодека в сегменте
+    length: int
+    expires_at: float
+
+
+class _Segment:
+    """Файл сегмента: открытый дескриптор, размер и самый поздний срок истечения записей в нем."""
+
+    __slots__ = ("segment_id", "path", "fd", "size", "created_at", "max_expires_at", "challenge_ids")
+
+    def __init__(self, segment_id: int, path: Path, fd: int, size: int, created_at: float):
+        self.segment_id = segment_id
+        self.path = path
+        self.fd = fd
+        self.size = size
+        self.created_at = created_at
+        self.max_expires_at = 0.0
+        self.challenge_ids: List[str] = [] # Для очистки индекса при удалении сегмента
+
+
+def _segment_file_name(segment_id: int) -> str:
+    return f"{segment_id:012d}{SEGMENT_FILE_SUFFIX}"
+
+
+class SyncLogStore(AbstractSyncCaptchaStore):
+    """
+    Синхронное файловое хранилище состояний CAPTCHA в виде журнала сегментов.
+
+    Записи дописываются в конец активного сегмента (одна запись write на вызов,
+    без создания файлов), в памяти хранится индекс challenge_id -> (сегмент, смещение).
+    Использованные и удаленные вызовы помечаются надгробием в журнале. Новый сегмент
+    открывается каждые segment_seconds или по достижении max_segment_bytes, а
+    сегмент, все записи которого истекли, удаляется целиком - один unlink на сегмент
+    вместо одного на вызов.
+
+    Сроки истечения - time.time(), поэтому после перезапуска индекс восстанавливается
+    чтением сегментов (оборванная последняя запись отбрасывается). Каталог должен
+    принадлежать одному процессу; fsync не выполняется.
+    """
+    def __init__(
+        self,
+        store_directory: Union[str, Path] = DEFAULT_LOG_STORE_DIR,
+        codec: Union[str, ChallengeCodec] = "json",
+        segment_seconds: float = DEFAULT_SEGMENT_SECONDS,
+        max_segment_bytes: int = DEFAULT_MAX_SEGMENT_BYTES
+    ):
+        if not hasattr(os, "pread"): # Чтение записей по смещению; на Windows os.pread нет
+            raise RuntimeError("SyncLogStore requires os.pread (POSIX)")
+        if segment_seconds <= 0:
+            raise ValueError("segment_seconds must be positive")
+        if max_segment_bytes <= _RECORD_HEADER.size:
+            raise ValueError("max_segment_bytes is too small")
+        self.store_path = Path(store_directory)
+        try:
+            self.store_path.mkdir(parents=True, exist_ok=True)
+        except OSError as e:
+            logger.error(f"SyncLogStore: Failed to create CAPTCHA store directory {self.store_path}: {e}")
+            raise
+        self.codec = get_challenge_codec(codec)
+        self._segment_seconds = segment_seconds
+        self._max_segment_bytes = max_segment_bytes
+        self._lock = threading.Lock()
+        self._index: Dict[str, _IndexEntry] = {}
+        self._segments: Dict[int, _Segment] = {}
+        self._active: Optional[_Segment] = None
+        self._recover()
+        logger.info(
+            f"SyncLogStore: Using store directory: {self.store_path.resolve()}, "
+            f"{len(self._segments)} segments, {len(self._index)} live challenges recovered."
+        )
+
+    def __len__(self) -> int:
+        """Число записей в индексе (включая истекшие, но еще не удаленные)."""
+        return len(self._index)
+
+    # --- Восстановление после перезапуска ---
+
+    def _recover(self) -> None:
+        now = time.time()
+        segment_paths = sorted(self.store_path.glob(f"*{SEGMENT_FILE_SUFFIX}"))
+        for path in segment_paths:
+            try:
+                segment_id = int(path.stem)
+            except ValueError:
+                logger.warning(f"SyncLogStore: Ignoring unexpected file {path}.")
+                continue
+            fd = os.open(path, os.O_RDWR | os.O_APPEND)
+            segment = _Segment(segment_id, path, fd, 0, now)
+            self._segments[segment_id] = segment
+            self._replay_segment(segment, now)
+        self._drop_expired_segments(now)
+
+    def _replay_segment(self, segment: _Segment, now: float) -> None:
+        """Применяет записи сегмента к индексу; оборванный или поврежденный хвост отрезается."""
+        with open(segment.fd, "rb", closefd=False) as f:
+            data = f.read()
+        offset = 0
+        while offset + _RECORD_HEADER.size <= len(data):
+            kind, id_length, payload_length, expires_at, checksum = _RECORD_HEADER.unpack_from(data, offset)
+            body_start = offset + _RECORD_HEADER.size
+            body_end = body_start + id_length + payload_length
+            body = data[body_start:body_end]
+            if kind not in (RECORD_PUT, RECORD_TOMBSTONE) or len(body) != id_length + payload_length \
+                    or zlib.crc32(body) != checksum:
+                break
+            challenge_id = body[:id_length].decode("utf-8", errors="replace")
+            segment.max_expires_at = max(segment.max_expires_at, expires_at)
+            if kind == RECORD_PUT and expires_at > now:
+                self._index[challenge_id] = _IndexEntry(segment.segment_id, body_start + id_length, payload_length, expires_at)
+                segment.challenge_ids.append(challenge_id)
+            else:
+                self._index.pop(challenge_id, None)
+            offset = body_end
+        if offset != len(data):
+            logger.warning(f"SyncLogStore: Truncating damaged tail of {segment.path} at offset {offset}.")
+            os.ftruncate(segment.fd, offset)
+        segment.size = offset
+
+    # --- Сегменты ---
+
+    def _open_segment(self, now: float) -> _Segment:
+        segment_id = max(self._segments, default=0) + 1
+        path = self.store_path / _segment_file_name(segment_id)
+        fd = os.open(path, os.O_RDWR | os.O_APPEND | os.O_CREAT, 0o644)
+        segment = _Segment(segment_id, path, fd, 0, now)
+        self._segments[segment_id] = segment
+        logger.debug(f"SyncLogStore: Opened segment {path}.")
+        return segment
+
+    def _active_segment(self, now: float, record_size: int) -> _Segment:
+        active = self._active
+        if active is None or now - active.created_at >= self._segment_seconds or \
+                (active.size and active.size + record_size > self._max_segment_bytes):
+            active = self._active = self._open_segment(now)
+        return active
+
+    def _drop_expired_segments(self, now: float) -> None:
+        """Удаляет неактивные сегменты, в которых истекли все записи (и надгробия)."""
+        for segment in list(self._segments.values()):
+            if segment is self._active or segment.max_expires_at > now:
+                continue
+            for challenge_id in segment.challenge_ids:
+                entry = self._index.get(challenge_id)
+                if entry is not None and entry.segment_id == segment.segment_id:
+                    del self._index[challenge_id]
+            del self._segments[segment.segment_id]
+            os.close(segment.fd)
+            try:
+                os.remove(segment.path)
+            except OSError as e:
+                logger.warning(f"SyncLogStore: Failed to remove expired segment {segment.path}: {e}")
+                continue
+            logger.debug(f"SyncLogStore: Removed expired segment {segment.path} ({len(segment.challenge_ids)} records).")
+
+    def _append(self, kind: int, challenge_id: str, payload: bytes, expires_at: float, now: float) -> _IndexEntry:
+        encoded_id = challenge_id.encode("utf-8")
+        body = encoded_id + payload
+        record = _RECORD_HEADER.pack(kind, len(encoded_id), len(payload), expires_at, zlib.crc32(body)) + body
+        segment = self._active_segment(now, len(record))
+        written = os.write(segment.fd, record)
+        if written != len(record):
+            # Неполная запись отрезается, чтобы журнал оставался разбираемым
+            os.ftruncate(segment.fd, segment.size)
+            raise OSError(f"Short write to {segment.path}: {written} of {len(record)} bytes")
+        entry = _IndexEntry(segment.segment_id, segment.size + _RECORD_HEADER.size + len(encoded_id), len(payload), expires_at)
+        segment.size += len(record)
+        segment.max_expires_at = max(segment.max_expires_at, expires_at)
+        if kind == RECORD_PUT:
+            segment.challenge_ids.append(challenge_id)
+        return entry
+
+    def _read_payload(self, entry: _IndexEntry) -> bytes:
+        return os.pread(self._segments[entry.segment_id].fd, entry.length, entry.offset)
+
+    def _decode(self, challenge_id: str, payload: bytes) -> Optional[Dict[str, Any]]:
+        try:
+            return self.codec.decode(payload)
+        except ValueError as e:
+            logger.warning(f"SyncLogStore: Decode error for challenge {challenge_id}: {e}")
+            return None
+
+    # --- Интерфейс хранилища ---
+
+    def store_challenge(self, challenge_id: str, data: Dict[str, Any], ttl_seconds: int) -> None:
+        try:
+            payload = self.codec.encode(data)
+        except (TypeError, ValueError) as e:
+            logger.error(f"SyncLogStore: Failed to serialize data for challenge {challenge_id}: {e}")
+            raise TypeError(f"Data for CAPTCHA challenge {challenge_id} is not serializable with codec '{self.codec.name}'.")
+        now = time.time()
+        expires_at = now + ttl_seconds
+        with self._lock:
+            try:
+                self._index[challenge_id] = self._append(RECORD_PUT, challenge_id, payload, expires_at, now)
+            except OSError as e:
+                logger.error(f"SyncLogStore: Failed to append challenge {challenge_id}: {e}")
+                raise ConnectionError(f"Failed to write CAPTCHA data to log store: {e}")
+            self._drop_expired_segments(now)
+        logger.debug(f"SyncLogStore: Stored challenge_id: {challenge_id}, expires at {expires_at:.2f}")
+
+    def retrieve_challenge(self, challenge_id: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            entry = self._index.get(challenge_id)
+            if entry is None:
+                logger.debug(f"SyncLogStore: Challenge_id: {challenge_id} not found.")
+                return None
+            if time.time() >= entry.expires_at:
+                # Надгробие не нужно: после перезапуска запись тоже окажется истекшей
+                del self._index[challenge_id]
+                logger.debug(f"SyncLogStore: Challenge_id: {challenge_id} found but expired.")
+                return None
+            payload = self._read_payload(entry)
+        logger.debug(f"SyncLogStore: Retrieved challenge_id: {challenge_id}")
+        return self._decode(challenge_id, payload)
+
+    def _remove(self, challenge_id: str, read_payload: bool) -> Optional[bytes]:
+        """Убирает запись из индекса и пишет надгробие; возвращает данные живой записи, если read_payload."""
+        now = time.time()
+        with self._lock:
+            entry = self._index.pop(challenge_id, None)
+            if entry is None or now >= entry.expires_at:
+                return None
+            payload = self._read_payload(entry) if read_payload else b""
+            try:
+                self._append(RECORD_TOMBSTONE, challenge_id, b"", entry.expires_at, now)
+            except OSError as e:
+                # Индекс уже обновлен; без надгробия запись вернется только после перезапуска
+                logger.error(f"SyncLogStore: Failed to append tombstone for {challenge_id}: {e}")
+        return payload
+
+    def delete_challenge(self, challenge_id: str) -> None:
+        if self._remove(challenge_id, read_payload=False) is not None:
+            logger.debug(f"SyncLogStore: Deleted challenge_id: {challenge_id}")
+        else:
+            logger.debug(f"SyncLogStore: Attempted to delete non-existent challenge_id: {challenge_id}")
+
+    def consume_challenge(self, challenge_id: str) -> Optional[Dict[str, Any]]:
+        payload = self._remove(challenge_id, read_payload=True)
+        if payload is None:
+            logger.debug(f"SyncLogStore: Challenge_id: {challenge_id} not found or expired.")
+            return None
+        logger.debug(f"SyncLogStore: Consumed challenge_id: {challenge_id}")
+        return self._decode(challenge_id, payload)
+
+    def close(self) -> None:
+        with self._lock:
+            for segment in self._segments.values():
+                os.close(segment.fd)
+            self._segments.clear()
+            self._index.clear()
+            self._active = None
+        logger.debug("SyncLogStore: Segments closed.")
+
+
+class AsyncLogStore(AbstractAsyncCaptchaStore):
+    """
+    Асинхронная обертка над SyncLogStore: операции с файлами выполняются в asyncio.to_thread.
+    Параметры - как у SyncLogStore.
+    """
+    def __init__(
+        self,
+        store_directory: Union[str, Path] = DEFAULT_LOG_STORE_DIR,
+        codec: Union[str, ChallengeCodec] = "json",
+        segment_seconds: float = DEFAULT_SEGMENT_SECONDS,
+        max_segment_bytes: int = DEFAULT_MAX_SEGMENT_BYTES
+    ):
+        self._store = SyncLogStore(store_directory, codec, segment_seconds, max_segment_bytes)
+
+    async def store_challenge(self, challenge_id: str, data: Dict[str, Any], ttl_seconds: int) -> None:
+        await asyncio.to_thread(self._store.store_challenge, challenge_id, data, ttl_seconds)
+
+    async def retrieve_challenge(self, challenge_id: str) -> Optional[Dict[str, Any]]:
+        return await asyncio.to_thread(self._store.retrieve_challenge, challenge_id)
+
+    async def delete_challenge(self, challenge_id: str) -> None:
+        await asyncio.to_thread(self._store.delete_challenge, challenge_id)
+
+    async def consume_challenge(self, challenge_id: str) -> Optional[Dict[str, Any]]:
+        return await asyncio.to_thread(self._store.consume_challenge, challenge_id)
+
+    async def close(self) -> None:
+        await asyncio.to_thread(self._store.close)
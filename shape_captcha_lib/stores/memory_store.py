@@ -1,99 +1,254 @@
 # shape_captcha_lib/stores/memory_store.py
 import time
 import asyncio # Для AsyncInMemoryStore
-import random # Для периодической очистки
-from typing import Dict, Any, Optional, Tuple
+import heapq
+import math
+import threading
+from collections import OrderedDict
+from typing import Dict, Any, List, Optional, Tuple
 
 from .abc_store import AbstractSyncCaptchaStore, AbstractAsyncCaptchaStore
+from .compact_record import pack_challenge_record, unpack_challenge_record
 
 import logging
 logger = logging.getLogger(__name__)
 
-class SyncInMemoryStore(AbstractSyncCaptchaStore):
+DEFAULT_NUM_SHARDS = 16
+
+def _pop_expired(
+    store: Dict[str, Tuple[Dict[str, Any], float]],
+    expiry_heap: List[Tuple[float, str]],
+    current_time: float
+) -> List[str]:
     """
-    Синхронное хранилище состояний CAPTCHA в памяти.
-    Управляет временем жизни (TTL) записей.
+    Удаляет из store истекшие записи по min-куче (expiration_time, challenge_id).
+    Стоимость пропорциональна числу истекших элементов кучи, а не размеру хранилища.
+    Элементы кучи для удаленных или перезаписанных записей отбрасываются без удаления из store.
     """
+    removed_keys = []
+    while expiry_heap and expiry_heap[0][0] <= current_time:
+        expiration_time, key = heapq.heappop(expiry_heap)
+        stored_item = store.get(key)
+        if stored_item is not None and stored_item[1] == expiration_time:
+            del store[key]
+            removed_keys.append(key)
+    return removed_keys
+
+
+def _compact_data(data: Dict[str, Any]) -> Any:
+    """Упакованная запись (bytes), если ее можно упаковать, иначе сама запись."""
+    packed = pack_challenge_record(data)
+    return packed if packed is not None else data
+
+
+def _expand_data(data: Any) -> Dict[str, Any]:
+    return unpack_challenge_record(data) if isinstance(data, bytes) else data
+
+
+class _MemoryShard:
+    """Шард SyncInMemoryStore: записи в порядке добавления, куча сроков истечения и своя блокировка."""
+
+    __slots__ = ("store", "expiry_heap", "lock")
+
     def __init__(self):
-        self._store: Dict[str, Tuple[Dict[str, Any], float]] = {}
-        # Для SyncInMemoryStore блокировка (threading.Lock) может понадобиться,
-        # если один экземпляр используется несколькими потоками.
-        # Для простоты здесь не используется.
+        self.store: "OrderedDict[str, Tuple[Dict[str, Any], float]]" = OrderedDict()
+        self.expiry_heap: List[Tuple[float, str]] = []
+        self.lock = threading.Lock()
+
+    def compact_heap(self) -> None:
+        """
+        Пересобирает кучу из живых записей, если в ней накопились элементы удаленных
+        и вытесненных записей (иначе при потоке брошенных CAPTCHA куча росла бы до истечения TTL).
+        """
+        if len(self.expiry_heap) > 2 * len(self.store) + 64:
+            self.expiry_heap = [(expiration_time, key) for key, (_, expiration_time) in self.store.items()]
+            heapq.heapify(self.expiry_heap)
+
+
+class SyncInMemoryStore(AbstractSyncCaptchaStore):
+    """
+    Синхронное потокобезопасное хранилище состояний CAPTCHA в памяти.
+
+    Записи разбиты на num_shards шардов по хэшу challenge_id; у каждого шарда свой
+    словарь и своя блокировка, поэтому потоки WSGI-сервера (gunicorn --threads,
+    waitress) блокируют друг друга, только попадая в один шард.
+
+    TTL отслеживается min-кучей сроков истечения в каждом шарде. По умолчанию истекшие
+    записи шарда удаляются при записи в него; с sweep_interval_seconds очистку всех
+    шардов выполняет фоновый поток, который останавливается в close().
+
+    max_entries ограничивает число записей: емкость каждого шарда равна
+    ceil(max_entries / num_shards), и при переполнении шарда вытесняется самая
+    старая запись в нем. Ограничение действует по шардам, поэтому при неравномерном
+    распределении хэшей записи могут вытесняться раньше, чем хранилище целиком
+    наберет max_entries записей.
+
+    С compact_records=True записи all_drawn_shapes хранятся упакованными
+    (см. compact_record.pack_challenge_record): ~20 раз меньше памяти на запись,
+    но retrieve_challenge/consume_challenge возвращают только данные для проверки
+    клика - без цвета и params_for_storage фигур. Остальные записи хранятся как есть.
+    """
+    def __init__(
+        self,
+        sweep_interval_seconds: Optional[float] = None,
+        num_shards: int = DEFAULT_NUM_SHARDS,
+        max_entries: Optional[int] = None,
+        compact_records: bool = False
+    ):
+        if num_shards <= 0:
+            raise ValueError("num_shards must be positive")
+        if max_entries is not None and max_entries <= 0:
+            raise ValueError("max_entries must be positive")
+        if sweep_interval_seconds is not None and sweep_interval_seconds <= 0:
+            raise ValueError("sweep_interval_seconds must be positive")
+
+        self._shards = [_MemoryShard() for _ in range(num_shards)]
+        self._shard_capacity = math.ceil(max_entries / num_shards) if max_entries is not None else None
+        self._compact_records = compact_records
+        self._sweep_interval = sweep_interval_seconds
+        self._sweeper_stop = threading.Event()
+        self._sweeper: Optional[threading.Thread] = None
+        if sweep_interval_seconds is not None:
+            self._sweeper = threading.Thread(target=self._sweep_loop, name="SyncInMemoryStore-sweeper", daemon=True)
+            self._sweeper.start()
+
+    def __len__(self) -> int:
+        """Число хранимых записей (включая истекшие, но еще не удаленные)."""
+        return sum(len(shard.store) for shard in self._shards)
+
+    def _get_shard(self, challenge_id: str) -> _MemoryShard:
+        return self._shards[hash(challenge_id) % len(self._shards)]
+
+    def _cleanup_shard(self, shard: _MemoryShard) -> int:
+        with shard.lock:
+            removed_keys = _pop_expired(shard.store, shard.expiry_heap, time.monotonic())
+        return len(removed_keys)
 
     def _cleanup_expired(self):
-        """Внутренний метод для удаления истекших записей."""
-        current_time = time.monotonic()
-        # Чтобы избежать изменения словаря во время итерации, сначала собираем ключи
-        expired_keys = [
-            key for key, (_, expiration_time) in self._store.items()
-            if current_time >= expiration_time
-        ]
-        for key in expired_keys:
-            self._store.pop(key, None)
-            logger.debug(f"SyncInMemoryStore: Removed expired challenge_id: {key}")
+        """Внутренний метод для удаления истекших записей из всех шардов."""
+        removed_count = sum(self._cleanup_shard(shard) for shard in self._shards)
+        if removed_count:
+            logger.debug(f"SyncInMemoryStore: Removed {removed_count} expired challenges.")
+
+    def _sweep_loop(self) -> None:
+        while not self._sweeper_stop.wait(self._sweep_interval):
+            self._cleanup_expired()
 
     def store_challenge(self, challenge_id: str, data: Dict[str, Any], ttl_seconds: int) -> None:
-        if random.random() < 0.1: # Вероятность очистки 10% при каждой записи
-             self._cleanup_expired()
+        shard = self._get_shard(challenge_id)
+        if self._sweeper is None:
+            self._cleanup_shard(shard)
 
+        if self._compact_records:
+            data = _compact_data(data)
         expiration_time = time.monotonic() + ttl_seconds
-        self._store[challenge_id] = (data, expiration_time)
+        evicted_key = None
+        with shard.lock:
+            shard.store[challenge_id] = (data, expiration_time)
+            shard.store.move_to_end(challenge_id)
+            heapq.heappush(shard.expiry_heap, (expiration_time, challenge_id))
+            if self._shard_capacity is not None and len(shard.store) > self._shard_capacity:
+                evicted_key, _ = shard.store.popitem(last=False)
+                shard.compact_heap()
         logger.debug(f"SyncInMemoryStore: Stored challenge_id: {challenge_id}, expires at {expiration_time:.2f}")
+        if evicted_key is not None:
+            logger.debug(f"SyncInMemoryStore: Capacity reached, evicted oldest challenge_id: {evicted_key}")
 
     def retrieve_challenge(self, challenge_id: str) -> Optional[Dict[str, Any]]:
-        stored_item = self._store.get(challenge_id)
-        if stored_item:
-            data, expiration_time = stored_item
-            if time.monotonic() < expiration_time:
-                logger.debug(f"SyncInMemoryStore: Retrieved challenge_id: {challenge_id}")
-                return data
-            else:
+        shard = self._get_shard(challenge_id)
+        with shard.lock:
+            stored_item = shard.store.get(challenge_id)
+            if stored_item:
+                data, expiration_time = stored_item
+                if time.monotonic() < expiration_time:
+                    logger.debug(f"SyncInMemoryStore: Retrieved challenge_id: {challenge_id}")
+                    return _expand_data(data)
                 logger.debug(f"SyncInMemoryStore: Challenge_id: {challenge_id} found but expired. Deleting.")
-                self._store.pop(challenge_id, None)
-        else:
-            logger.debug(f"SyncInMemoryStore: Challenge_id: {challenge_id} not found.")
+                del shard.store[challenge_id]
+            else:
+                logger.debug(f"SyncInMemoryStore: Challenge_id: {challenge_id} not found.")
         return None
 
     def delete_challenge(self, challenge_id: str) -> None:
-        if self._store.pop(challenge_id, None):
+        shard = self._get_shard(challenge_id)
+        # Элемент кучи остается и будет отброшен при истечении срока или пересборке кучи
+        with shard.lock:
+            stored_item = shard.store.pop(challenge_id, None)
+            if stored_item is not None:
+                shard.compact_heap()
+        if stored_item:
             logger.debug(f"SyncInMemoryStore: Deleted challenge_id: {challenge_id}")
         else:
             logger.debug(f"SyncInMemoryStore: Attempted to delete non-existent challenge_id: {challenge_id}")
 
+    def consume_challenge(self, challenge_id: str) -> Optional[Dict[str, Any]]:
+        shard = self._get_shard(challenge_id)
+        with shard.lock:
+            stored_item = shard.store.pop(challenge_id, None)
+            if stored_item is not None:
+                shard.compact_heap()
+        if stored_item is None:
+            logger.debug(f"SyncInMemoryStore: Challenge_id: {challenge_id} not found.")
+            return None
+        data, expiration_time = stored_item
+        if time.monotonic() >= expiration_time:
+            logger.debug(f"SyncInMemoryStore: Challenge_id: {challenge_id} found but expired.")
+            return None
+        logger.debug(f"SyncInMemoryStore: Consumed challenge_id: {challenge_id}")
+        return _expand_data(data)
+
     def close(self) -> None:
-        logger.debug("SyncInMemoryStore: Close called (no-op).")
-        pass
+        if self._sweeper is not None:
+            self._sweeper_stop.set()
+            self._sweeper.join()
+            self._sweeper = None
+            logger.debug("SyncInMemoryStore: Sweeper thread stopped.")
 
 
 class AsyncInMemoryStore(AbstractAsyncCaptchaStore):
     """
     Асинхронное хранилище состояний CAPTCHA в памяти.
-    Управляет временем жизни (TTL) записей и использует asyncio.Lock.
+    Управляет временем жизни (TTL) записей через min-кучу сроков истечения и использует asyncio.Lock.
+
+    С sweep_interval_seconds очистку выполняет фоновая задача (запускается при первой
+    записи, т.к. требует работающего event loop) и останавливается в close().
+
+    compact_records - как в SyncInMemoryStore.
     """
-    def __init__(self):
+    def __init__(self, sweep_interval_seconds: Optional[float] = None, compact_records: bool = False):
+        if sweep_interval_seconds is not None and sweep_interval_seconds <= 0:
+            raise ValueError("sweep_interval_seconds must be positive")
         self._store: Dict[str, Tuple[Dict[str, Any], float]] = {}
+        self._expiry_heap: List[Tuple[float, str]] = []
         self._lock = asyncio.Lock()
+        self._sweep_interval = sweep_interval_seconds
+        self._sweeper_task: Optional[asyncio.Task] = None
+        self._compact_records = compact_records
 
     async def _cleanup_expired_async(self):
         """Асинхронный метод для удаления истекших записей."""
-        current_time = time.monotonic()
-        expired_keys = []
-        # Собираем ключи под блокировкой, чтобы избежать проблем с изменением словаря во время итерации
         async with self._lock:
-            for key, (_, expiration_time) in self._store.items():
-                if current_time >= expiration_time:
-                    expired_keys.append(key)
-            for key in expired_keys:
-                self._store.pop(key, None)
-                logger.debug(f"AsyncInMemoryStore: Removed expired challenge_id: {key}")
+            removed_keys = _pop_expired(self._store, self._expiry_heap, time.monotonic())
+        if removed_keys:
+            logger.debug(f"AsyncInMemoryStore: Removed {len(removed_keys)} expired challenges.")
+
+    async def _sweep_loop(self) -> None:
+        while True:
+            await asyncio.sleep(self._sweep_interval)
+            await self._cleanup_expired_async()
 
     async def store_challenge(self, challenge_id: str, data: Dict[str, Any], ttl_seconds: int) -> None:
-        if random.random() < 0.1: # Вероятность очистки 10%
+        if self._sweep_interval is None:
             await self._cleanup_expired_async()
-            
+        elif self._sweeper_task is None:
+            self._sweeper_task = asyncio.create_task(self._sweep_loop())
+
+        if self._compact_records:
+            data = _compact_data(data)
         expiration_time = time.monotonic() + ttl_seconds
         async with self._lock:
             self._store[challenge_id] = (data, expiration_time)
+            heapq.heappush(self._expiry_heap, (expiration_time, challenge_id))
         logger.debug(f"AsyncInMemoryStore: Stored challenge_id: {challenge_id}, expires at {expiration_time:.2f}")
 
     async def retrieve_challenge(self, challenge_id: str) -> Optional[Dict[str, Any]]:
@@ -103,7 +258,7 @@ class AsyncInMemoryStore(AbstractAsyncCaptchaStore):
                 data, expiration_time = stored_item
                 if time.monotonic() < expiration_time:
                     logger.debug(f"AsyncInMemoryStore: Retrieved challenge_id: {challenge_id}")
-                    return data
+                    return _expand_data(data)
                 else:
                     # Запись истекла, удаляем ее (уже под блокировкой)
                     logger.debug(f"AsyncInMemoryStore: Challenge_id: {challenge_id} found but expired. Deleting.")
@@ -119,6 +274,25 @@ class AsyncInMemoryStore(AbstractAsyncCaptchaStore):
             else:
                 logger.debug(f"AsyncInMemoryStore: Attempted to delete non-existent challenge_id: {challenge_id}")
 
+    async def consume_challenge(self, challenge_id: str) -> Optional[Dict[str, Any]]:
+        async with self._lock:
+            stored_item = self._store.pop(challenge_id, None)
+        if stored_item is None:
+            logger.debug(f"AsyncInMemoryStore: Challenge_id: {challenge_id} not found.")
+            return None
+        data, expiration_time = stored_item
+        if time.monotonic() >= expiration_time:
+            logger.debug(f"AsyncInMemoryStore: Challenge_id: {challenge_id} found but expired.")
+            return None
+        logger.debug(f"AsyncInMemoryStore: Consumed challenge_id: {challenge_id}")
+        return _expand_data(data)
+
     async def close(self) -> None:
-        logger.debug("AsyncInMemoryStore: Close called (no-op).")
-        pass
\ No newline at end of file
+        if self._sweeper_task is not None:
+            self._sweeper_task.cancel()
+            try:
+                await self._sweeper_task
+            except asyncio.CancelledError:
+                pass
+            self._sweeper_task = None
+            logger.debug("AsyncInMemoryStore: Sweeper task stopped.")
\ No newline at end of file
@@ -1,30 +1,55 @@
 # shape_captcha_lib/stores/redis_store.py
-import json
-from typing import Dict, Any, Optional
+from typing import Dict, Any, Optional, Union
 
 # Клиенты Redis
 import redis # Для синхронной версии
 import redis.asyncio as redis_async # Для асинхронной версии
 
 from .abc_store import AbstractSyncCaptchaStore, AbstractAsyncCaptchaStore
+from .codecs import ChallengeCodec, get_challenge_codec
 
 import logging
 logger = logging.getLogger(__name__)
 
 DEFAULT_REDIS_KEY_PREFIX = "captcha_challenge:"
 
+# GET + DEL одной атомарной операцией для серверов Redis < 6.2, где нет команды GETDEL
+_CONSUME_SCRIPT = """
+local value = redis.call('GET', KEYS[1])
+if value then
+    redis.call('DEL', KEYS[1])
+end
+return value
+"""
+
+
+def _is_unknown_command_error(error: redis.ResponseError) -> bool:
+    return "unknown command" in str(error).lower()
+
 
 class SyncRedisStore(AbstractSyncCaptchaStore):
     """
     Синхронное хранилище состояний CAPTCHA в Redis.
     Использует встроенный TTL Redis.
+
+    codec - имя или экземпляр ChallengeCodec (см. codecs.py). Читаются записи любого
+    кодека, поэтому кодек можно сменить без миграции. Для кодеков, кроме "json",
+    клиент должен быть создан с decode_responses=False.
     """
-    def __init__(self, redis_client: redis.Redis, key_prefix: str = DEFAULT_REDIS_KEY_PREFIX):
+    def __init__(
+        self,
+        redis_client: redis.Redis,
+        key_prefix: str = DEFAULT_REDIS_KEY_PREFIX,
+        codec: Union[str, ChallengeCodec] = "json"
+    ):
         if not isinstance(redis_client, redis.Redis):
             raise TypeError("redis_client must be an instance of redis.Redis for SyncRedisStore.")
         self.redis_client = redis_client
         self.key_prefix = key_prefix
-        logger.info(f"SyncRedisStore initialized with key prefix: '{key_prefix}'")
+        self._getdel_supported = True # Сбрасывается, если сервер не знает GETDEL
+        self._consume_script = None
+        self.codec = get_challenge_codec(codec)
+        logger.info(f"SyncRedisStore initialized with key prefix: '{key_prefix}', codec: '{self.codec.name}'")
 
     def _get_redis_key(self, challenge_id: str) -> str:
         return f"{self.key_prefix}{challenge_id}"
@@ -32,15 +57,15 @@ class SyncRedisStore(AbstractSyncCaptchaStore):
     def store_challenge(self, challenge_id: str, data: Dict[str, Any], ttl_seconds: int) -> None:
         redis_key = self._get_redis_key(challenge_id)
         try:
-            json_data = json.dumps(data)
-            self.redis_client.set(redis_key, json_data, ex=ttl_seconds)
+            payload = self.codec.encode(data)
+            self.redis_client.set(redis_key, payload, ex=ttl_seconds)
             logger.debug(f"SyncRedisStore: Stored challenge_id: {challenge_id} (key: {redis_key}) with TTL: {ttl_seconds}s")
         except redis.RedisError as e:
             logger.error(f"SyncRedisStore: Failed to store challenge {challenge_id} in Redis: {e}")
             raise ConnectionError(f"Failed to store CAPTCHA data in Redis: {e}")
-        except json.JSONEncodeError as e_json:
-            logger.error(f"SyncRedisStore: Failed to serialize data for challenge {challenge_id}: {e_json}")
-            raise TypeError(f"Data for CAPTCHA challenge {challenge_id} is not JSON serializable.")
+        except (TypeError, ValueError) as e_encode:
+            logger.error(f"SyncRedisStore: Failed to serialize data for challenge {challenge_id}: {e_encode}")
+            raise TypeError(f"Data for CAPTCHA challenge {challenge_id} is not serializable with codec '{self.codec.name}'.")
 
     def retrieve_challenge(self, challenge_id: str) -> Optional[Dict[str, Any]]:
         redis_key = self._get_redis_key(challenge_id)
@@ -49,15 +74,14 @@ class SyncRedisStore(AbstractSyncCaptchaStore):
             if stored_data_json:
                 logger.debug(f"SyncRedisStore: Retrieved raw data for key: {redis_key}")
                 # stored_data_json может быть bytes или str в зависимости от клиента Redis (decode_responses)
-                # json.loads корректно обработает и то, и другое.
-                return json.loads(stored_data_json)
+                return self.codec.decode(stored_data_json)
             logger.debug(f"SyncRedisStore: No data found for key: {redis_key}")
             return None
         except redis.RedisError as e:
             logger.error(f"SyncRedisStore: Failed to retrieve challenge {challenge_id} from Redis: {e}")
             return None 
-        except json.JSONDecodeError as e_json:
-            logger.warning(f"SyncRedisStore: JSON decode error for challenge {challenge_id}. Key: {redis_key}. Error: {e_json}")
+        except ValueError as e_decode:
+            logger.warning(f"SyncRedisStore: Decode error for challenge {challenge_id}. Key: {redis_key}. Error: {e_decode}")
             return None
 
     def delete_challenge(self, challenge_id: str) -> None:
@@ -71,6 +95,36 @@ class SyncRedisStore(AbstractSyncCaptchaStore):
         except redis.RedisError as e:
             logger.error(f"SyncRedisStore: Failed to delete challenge {challenge_id} from Redis: {e}")
 
+    def consume_challenge(self, challenge_id: str) -> Optional[Dict[str, Any]]:
+        redis_key = self._get_redis_key(challenge_id)
+        try:
+            stored_data_json = self._get_and_delete(redis_key)
+            if stored_data_json:
+                logger.debug(f"SyncRedisStore: Consumed challenge_id: {challenge_id} (key: {redis_key})")
+                return self.codec.decode(stored_data_json)
+            logger.debug(f"SyncRedisStore: No data found for key: {redis_key}")
+            return None
+        except redis.RedisError as e:
+            logger.error(f"SyncRedisStore: Failed to consume challenge {challenge_id} from Redis: {e}")
+            return None
+        except ValueError as e_decode:
+            logger.warning(f"SyncRedisStore: Decode error for challenge {challenge_id}. Key: {redis_key}. Error: {e_decode}")
+            return None
+
+    def _get_and_delete(self, redis_key: str) -> Optional[Union[str, bytes]]:
+        """Один запрос к Redis: GETDEL (Redis >= 6.2) или Lua-скрипт на старых серверах."""
+        if self._getdel_supported:
+            try:
+                return self.redis_client.getdel(redis_key)
+            except redis.ResponseError as e:
+                if not _is_unknown_command_error(e):
+                    raise
+                logger.info("SyncRedisStore: GETDEL is not supported by the server, falling back to a Lua script.")
+                self._getdel_supported = False
+        if self._consume_script is None:
+            self._consume_script = self.redis_client.register_script(_CONSUME_SCRIPT)
+        return self._consume_script(keys=[redis_key])
+
     def close(self) -> None:
         """
         Закрытие соединения Redis обычно управляется извне кодом, который создал и передал redis_client.
@@ -86,13 +140,22 @@ class SyncRedisStore(AbstractSyncCaptchaStore):
 class AsyncRedisStore(AbstractAsyncCaptchaStore):
     """
     Асинхронное хранилище состояний CAPTCHA в Redis.
+    codec - как в SyncRedisStore.
     """
-    def __init__(self, redis_client: redis_async.Redis, key_prefix: str = DEFAULT_REDIS_KEY_PREFIX):
+    def __init__(
+        self,
+        redis_client: redis_async.Redis,
+        key_prefix: str = DEFAULT_REDIS_KEY_PREFIX,
+        codec: Union[str, ChallengeCodec] = "json"
+    ):
         if not isinstance(redis_client, redis_async.Redis):
             raise TypeError("redis_client must be an instance of redis.asyncio.Redis for AsyncRedisStore.")
         self.redis_client = redis_client
         self.key_prefix = key_prefix
-        logger.info(f"AsyncRedisStore initialized with key prefix: '{key_prefix}'")
+        self._getdel_supported = True # Сбрасывается, если сервер не знает GETDEL
+        self._consume_script = None
+        self.codec = get_challenge_codec(codec)
+        logger.info(f"AsyncRedisStore initialized with key prefix: '{key_prefix}', codec: '{self.codec.name}'")
 
     def _get_redis_key(self, challenge_id: str) -> str:
         return f"{self.key_prefix}{challenge_id}"
@@ -100,15 +163,15 @@ class AsyncRedisStore(AbstractAsyncCaptchaStore):
     async def store_challenge(self, challenge_id: str, data: Dict[str, Any], ttl_seconds: int) -> None:
         redis_key = self._get_redis_key(challenge_id)
         try:
-            json_data = json.dumps(data)
-            await self.redis_client.set(redis_key, json_data, ex=ttl_seconds)
+            payload = self.codec.encode(data)
+            await self.redis_client.set(redis_key, payload, ex=ttl_seconds)
             logger.debug(f"AsyncRedisStore: Stored challenge_id: {challenge_id} (key: {redis_key}) with TTL: {ttl_seconds}s")
         except redis.RedisError as e:
             logger.error(f"AsyncRedisStore: Failed to store challenge {challenge_id} in Redis: {e}")
             raise ConnectionError(f"Failed to store CAPTCHA data in Redis: {e}")
-        except json.JSONEncodeError as e_json:
-            logger.error(f"AsyncRedisStore: Failed to serialize data for challenge {challenge_id}: {e_json}")
-            raise TypeError(f"Data for CAPTCHA challenge {challenge_id} is not JSON serializable.")
+        except (TypeError, ValueError) as e_encode:
+            logger.error(f"AsyncRedisStore: Failed to serialize data for challenge {challenge_id}: {e_encode}")
+            raise TypeError(f"Data for CAPTCHA challenge {challenge_id} is not serializable with codec '{self.codec.name}'.")
 
     async def retrieve_challenge(self, challenge_id: str) -> Optional[Dict[str, Any]]:
         redis_key = self._get_redis_key(challenge_id)
@@ -116,14 +179,14 @@ class AsyncRedisStore(AbstractAsyncCaptchaStore):
             stored_data_json = await self.redis_client.get(redis_key)
             if stored_data_json:
                 logger.debug(f"AsyncRedisStore: Retrieved raw data for key: {redis_key}")
-                return json.loads(stored_data_json) # json.loads может принимать bytes
+                return self.codec.decode(stored_data_json)
             logger.debug(f"AsyncRedisStore: No data found for key: {redis_key}")
             return None
         except redis.RedisError as e:
             logger.error(f"AsyncRedisStore: Failed to retrieve challenge {challenge_id} from Redis: {e}")
             return None
-        except json.JSONDecodeError as e_json:
-            logger.warning(f"AsyncRedisStore: JSON decode error for challenge {challenge_id}. Key: {redis_key}. Error: {e_json}")
+        except ValueError as e_decode:
+            logger.warning(f"AsyncRedisStore: Decode error for challenge {challenge_id}. Key: {redis_key}. Error: {e_decode}")
             return None
 
     async def delete_challenge(self, challenge_id: str) -> None:
@@ -137,6 +200,36 @@ class AsyncRedisStore(AbstractAsyncCaptchaStore):
         except redis.RedisError as e:
             logger.error(f"AsyncRedisStore: Failed to delete challenge {challenge_id} from Redis: {e}")
 
+    async def consume_challenge(self, challenge_id: str) -> Optional[Dict[str, Any]]:
+        redis_key = self._get_redis_key(challenge_id)
+        try:
+            stored_data_json = await self._get_and_delete(redis_key)
+            if stored_data_json:
+                logger.debug(f"AsyncRedisStore: Consumed challenge_id: {challenge_id} (key: {redis_key})")
+                return self.codec.decode(stored_data_json)
+            logger.debug(f"AsyncRedisStore: No data found for key: {redis_key}")
+            return None
+        except redis.RedisError as e:
+            logger.error(f"AsyncRedisStore: Failed to consume challenge {challenge_id} from Redis: {e}")
+            return None
+        except ValueError as e_decode:
+            logger.warning(f"AsyncRedisStore: Decode error for challenge {challenge_id}. Key: {redis_key}. Error: {e_decode}")
+            return None
+
+    async def _get_and_delete(self, redis_key: str) -> Optional[Union[str, bytes]]:
+        """Один запрос к Redis: GETDEL (Redis >= 6.2) или Lua-скрипт на старых серверах."""
+        if self._getdel_supported:
+            try:
+                return await self.redis_client.getdel(redis_key)
+            except redis.ResponseError as e:
+                if not _is_unknown_command_error(e):
+                    raise
+                logger.info("AsyncRedisStore: GETDEL is not supported by the server, falling back to a Lua script.")
+                self._getdel_supported = False
+        if self._consume_script is None:
+            self._consume_script = self.redis_client.register_script(_CONSUME_SCRIPT)
+        return await self._consume_script(keys=[redis_key])
+
     async def close(self) -> None:
         """
         Закрытие соединения Redis обычно управляется извне кодом, который создал и передал redis_client.
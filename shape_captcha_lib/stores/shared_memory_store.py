@@ -0,0 +1,380 @@
+# shape_captcha_lib/stores/shared_memory_store.py
+import contextlib
+import hashlib
+import mmap
+import os
+import struct
+import tempfile
+import threading
+import time
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional, Tuple, Union
+
+try: # Блокировки fcntl есть только на POSIX
+    import fcntl
+except ImportError:
+    fcntl = None
+
+from .abc_store import AbstractSyncCaptchaStore, AbstractAsyncCaptchaStore
+from .codecs import ChallengeCodec, get_challenge_codec
+
+import logging
+logger = logging.getLogger(__name__)
+
+# /dev/shm - tmpfs: страницы файла живут только в памяти и не сбрасываются на диск
+DEFAULT_SHARED_MEMORY_PATH = os.path.join(
+    "/dev/shm" if os.path.isdir("/dev/shm") else tempfile.gettempdir(), "shape_captcha_store"
+)
+DEFAULT_NUM_SLOTS = 16384
+DEFAULT_SLOT_SIZE = 1024 # binary-запись base_model ~430 байт, td_model ~650 байт
+DEFAULT_NUM_STRIPES = 64
+MAX_KEY_BYTES = 64
+
+SLOT_EMPTY = 0
+SLOT_USED = 1
+SLOT_DELETED = 2 # Надгробие: слот свободен, но цепочка проб через него продолжается
+
+_MAGIC = b"SCSM"
+_FORMAT_VERSION = 2 # 2: полосы блокируют байты 1..N, байт 0 - инициализация
+# Заголовок файла: сигнатура, версия, число слотов, размер слота, число полос блокировок
+_FILE_HEADER = struct.Struct("<4sHIII")
+_FILE_HEADER_SIZE = 64
+# Заголовок слота: состояние, длина id, длина данных, 64-битный хэш id, срок истечения (time.time());
+# далее MAX_KEY_BYTES байт под id (UTF-8) и данные кодека
+_SLOT_HEADER = struct.Struct("<BBHQd")
+_SLOT_DATA_OFFSET = _SLOT_HEADER.size + MAX_KEY_BYTES
+
+# Байты файла, которые блокируются fcntl.lockf (блокировки не связаны с содержимым байтов):
+# байт _INIT_LOCK_OFFSET - инициализация файла, байт _stripe_lock_offset(i) - полоса i.
+# Диапазоны не пересекаются, поэтому снятие блокировки инициализации не снимает блокировки полос
+_INIT_LOCK_OFFSET = 0
+
+# Блокировки fcntl принадлежат процессу: потоки одного процесса не исключают друг друга,
+# а LOCK_UN или close любого дескриптора файла снимает блокировки всех экземпляров процесса
+# на этот байт (close - на весь файл). Поэтому экземпляры хранилища одного файла в процессе
+# делят потоковые блокировки полос, а инициализация и закрытие файла идут под _process_init_lock
+_process_stripe_locks: Dict[Tuple[int, int], List[threading.Lock]] = {}
+_process_stripe_locks_guard = threading.Lock()
+_process_init_lock = threading.Lock()
+
+
+def _stripe_lock_offset(stripe: int) -> int:
+    return _INIT_LOCK_OFFSET + 1 + stripe
+
+
+def _stripe_locks_for(fd: int, num_stripes: int) -> List[threading.Lock]:
+    file_stat = os.fstat(fd)
+    with _process_stripe_locks_guard:
+        locks = _process_stripe_locks.get((file_stat.st_dev, file_stat.st_ino))
+        if locks is None or len(locks) != num_stripes:
+            locks = [threading.Lock() for _ in range(num_stripes)]
+            _process_stripe_locks[(file_stat.st_dev, file_stat.st_ino)] = locks
+        return locks
+
+
+def _close_store_file(fd: int, file_map: Optional[mmap.mmap] = None) -> None:
+    """
+    Закрывает отображение (у него своя копия дескриптора) и дескриптор файла хранилища.
+    Закрытие снимает все блокировки fcntl процесса на файл, поэтому выполняется, только
+    когда ни один поток процесса не держит блокировку полосы или инициализации этого файла.
+    """
+    file_stat = os.fstat(fd)
+    with _process_stripe_locks_guard:
+        stripe_locks = _process_stripe_locks.get((file_stat.st_dev, file_stat.st_ino), [])
+    with _process_init_lock:
+        for lock in stripe_locks:
+            lock.acquire()
+        try:
+            if file_map is not None:
+                file_map.close()
+            os.close(fd)
+        finally:
+            for lock in stripe_locks:
+                lock.release()
+
+
+def _key_hash(key: bytes) -> int:
+    return int.from_bytes(hashlib.blake2b(key, digest_size=8).digest(), "little")
+
+
+class SyncSharedMemoryStore(AbstractSyncCaptchaStore):
+    """
+    Хранилище состояний CAPTCHA в общей памяти для воркеров gunicorn/uvicorn одного хоста.
+
+    Файл database_path (по умолчанию в /dev/shm) отображается через mmap во все
+    процессы, открывшие его, - вызов, созданный одним воркером, проверяется любым
+    другим без сетевого обращения. Хранилище можно создать до fork (--preload):
+    отображение MAP_SHARED наследуется воркерами.
+
+    Файл - хэш-таблица с открытой адресацией из num_slots слотов по slot_size байт.
+    Слоты разбиты на num_stripes полос; хэш challenge_id выбирает полосу и начальный
+    слот, линейное пробирование не выходит за полосу. Операция держит блокировку
+    только своей полосы: threading.Lock для потоков процесса и fcntl.lockf на байт
+    файла для других процессов. Чтение и запись слотов идут через mmap без вызовов
+    read/write. У слота свой срок истечения: истекшие и удаленные слоты
+    переиспользуются при записи, фоновая очистка не нужна. Если в полосе нет
+    свободного слота, вытесняется запись с ближайшим сроком истечения.
+
+    Данные сериализуются кодеком (по умолчанию "binary") и должны помещаться
+    в слот (slot_size - 84 байта), challenge_id - не длиннее MAX_KEY_BYTES байт UTF-8.
+    Файл не удаляется в close(): его используют другие воркеры. Закрывайте хранилище
+    через close(): оно дожидается, пока другие экземпляры процесса выйдут из своих полос.
+    """
+    def __init__(
+        self,
+        database_path: Union[str, Path] = DEFAULT_SHARED_MEMORY_PATH,
+        codec: Union[str, ChallengeCodec] = "binary",
+        num_slots: int = DEFAULT_NUM_SLOTS,
+        slot_size: int = DEFAULT_SLOT_SIZE,
+        num_stripes: int = DEFAULT_NUM_STRIPES
+    ):
+        if fcntl is None:
+            raise RuntimeError("SyncSharedMemoryStore requires POSIX fcntl locks")
+        if num_stripes <= 0 or num_slots <= 0 or num_slots % num_stripes:
+            raise ValueError("num_slots must be a positive multiple of num_stripes")
+        if not _SLOT_DATA_OFFSET < slot_size <= _SLOT_DATA_OFFSET + 0xFFFF:
+            raise ValueError(f"slot_size must be between {_SLOT_DATA_OFFSET + 1} and {_SLOT_DATA_OFFSET + 0xFFFF}")
+
+        self.codec = get_challenge_codec(codec)
+        self._num_slots = num_slots
+        self._slot_size = slot_size
+        self._num_stripes = num_stripes
+        self._slots_per_stripe = num_slots // num_stripes
+        self._max_payload_size = slot_size - _SLOT_DATA_OFFSET
+        self._path = str(database_path)
+
+        file_size = _FILE_HEADER_SIZE + num_slots * slot_size
+        self._fd = os.open(self._path, os.O_RDWR | os.O_CREAT, 0o600)
+        try:
+            # Воркеры стартуют одновременно: разметка файла - под блокировкой отдельного байта
+            with _process_init_lock:
+                fcntl.lockf(self._fd, fcntl.LOCK_EX, 1, _INIT_LOCK_OFFSET)
+                try:
+                    self._init_file(file_size)
+                finally:
+                    fcntl.lockf(self._fd, fcntl.LOCK_UN, 1, _INIT_LOCK_OFFSET)
+            self._map = mmap.mmap(self._fd, file_size)
+        except BaseException:
+            _close_store_file(self._fd)
+            raise
+        self._stripe_locks = _stripe_locks_for(self._fd, num_stripes)
+        self._closed = False
+        logger.info(
+            f"SyncSharedMemoryStore initialized: {self._path}, {num_slots} slots x {slot_size} bytes, "
+            f"{num_stripes} stripes, codec '{self.codec.name}'"
+        )
+
+    def _init_file(self, file_size: int) -> None:
+        """Размечает новый файл или проверяет, что существующий создан с теми же параметрами."""
+        expected_header = _FILE_HEADER.pack(_MAGIC, _FORMAT_VERSION, self._num_slots, self._slot_size, self._num_stripes)
+        current_size = os.fstat(self._fd).st_size
+        if current_size == 0:
+            os.ftruncate(self._fd, file_size) # Нулевые байты - пустые слоты
+            os.pwrite(self._fd, expected_header, 0)
+            return
+        header = os.pread(self._fd, _FILE_HEADER.size, 0)
+        if header != expected_header or current_size != file_size:
+            raise ValueError(
+                f"Shared memory store file {self._path} was created with different parameters "
+                "(num_slots, slot_size, num_stripes) or is not a store file"
+            )
+
+    def __len__(self) -> int:
+        """Число неистекших записей (снимок без блокировок)."""
+        now = time.time()
+        live_count = 0
+        for slot_index in range(self._num_slots):
+            state, _, _, _, expires_at = _SLOT_HEADER.unpack_from(self._map, self._slot_offset(slot_index))
+            if state == SLOT_USED and expires_at > now:
+                live_count += 1
+        return live_count
+
+    def _slot_offset(self, slot_index: int) -> int:
+        return _FILE_HEADER_SIZE + slot_index * self._slot_size
+
+    def _encode_key(self, challenge_id: str) -> bytes:
+        key = challenge_id.encode("utf-8")
+        if len(key) > MAX_KEY_BYTES:
+            raise ValueError(f"challenge_id is longer than {MAX_KEY_BYTES} bytes")
+        return key
+
+    @contextlib.contextmanager
+    def _locked_stripe(self, stripe: int) -> Iterator[None]:
+        with self._stripe_locks[stripe]:
+            fcntl.lockf(self._fd, fcntl.LOCK_EX, 1, _stripe_lock_offset(stripe))
+            try:
+                yield
+            finally:
+                fcntl.lockf(self._fd, fcntl.LOCK_UN, 1, _stripe_lock_offset(stripe))
+
+    def _probe(self, key_hash: int) -> Iterator[int]:
+        """Номера слотов полосы ключа в порядке линейного пробирования."""
+        stripe_start = (key_hash % self._num_stripes) * self._slots_per_stripe
+        first = (key_hash // self._num_stripes) % self._slots_per_stripe
+        for step in range(self._slots_per_stripe):
+            yield stripe_start + (first + step) % self._slots_per_stripe
+
+    def _find(self, key: bytes, key_hash: int, now: float) -> Tuple[Optional[int], Optional[int], Optional[int]]:
+        """
+        Ищет ключ в его полосе (под блокировкой полосы).
+
+        Returns:
+            (слот ключа, первый свободный слот, живой слот с ближайшим сроком истечения).
+            Слот ключа возвращается и для истекшей записи: в полосе не бывает двух слотов одного ключа.
+        """
+        free_slot = None
+        oldest_slot = None
+        oldest_expires_at = float("inf")
+        for slot_index in self._probe(key_hash):
+            offset = self._slot_offset(slot_index)
+            state, key_len, _, slot_hash, expires_at = _SLOT_HEADER.unpack_from(self._map, offset)
+            if state == SLOT_EMPTY:
+                if free_slot is None:
+                    free_slot = slot_index
+                break
+            if state == SLOT_USED and slot_hash == key_hash and key_len == len(key):
+                key_offset = offset + _SLOT_HEADER.size
+                if self._map[key_offset:key_offset + key_len] == key:
+                    return slot_index, free_slot, oldest_slot
+            if state == SLOT_DELETED or expires_at <= now:
+                if free_slot is None:
+                    free_slot = slot_index
+            elif expires_at < oldest_expires_at:
+                oldest_slot, oldest_expires_at = slot_index, expires_at
+        return None, free_slot, oldest_slot
+
+    def _read_slot(self, slot_index: int) -> Tuple[bytes, float]:
+        offset = self._slot_offset(slot_index)
+        _, _, payload_len, _, expires_at = _SLOT_HEADER.unpack_from(self._map, offset)
+        payload_offset = offset + _SLOT_DATA_OFFSET
+        return self._map[payload_offset:payload_offset + payload_len], expires_at
+
+    def _release_slot(self, slot_index: int, key_hash: int, now: float) -> None:
+        """
+        Освобождает слот (под блокировкой полосы). Если следующий слот цепочки пуст,
+        слот и стоящие перед ним надгробия и истекшие записи становятся пустыми,
+        чтобы цепочки проб не удлинялись от удалений.
+        """
+        stripe_start = (key_hash % self._num_stripes) * self._slots_per_stripe
+        position = slot_index - stripe_start
+        next_slot = stripe_start + (position + 1) % self._slots_per_stripe
+        if self._map[self._slot_offset(next_slot)] != SLOT_EMPTY:
+            self._map[self._slot_offset(slot_index)] = SLOT_DELETED
+            return
+        for step in range(self._slots_per_stripe):
+            current_slot = stripe_start + (position - step) % self._slots_per_stripe
+            offset = self._slot_offset(current_slot)
+            state, _, _, _, expires_at = _SLOT_HEADER.unpack_from(self._map, offset)
+            if step and not (state == SLOT_DELETED or (state == SLOT_USED and expires_at <= now)):
+                break
+            self._map[offset] = SLOT_EMPTY
+
+    def _take(self, challenge_id: str, remove: bool) -> Optional[Dict[str, Any]]:
+        try:
+            key = self._encode_key(challenge_id)
+        except ValueError:
+            logger.debug(f"SyncSharedMemoryStore: Challenge_id: {challenge_id} is too long, not found.")
+            return None
+        key_hash = _key_hash(key)
+        now = time.time()
+        with self._locked_stripe(key_hash % self._num_stripes):
+            slot_index, _, _ = self._find(key, key_hash, now)
+            if slot_index is None:
+                logger.debug(f"SyncSharedMemoryStore: Challenge_id: {challenge_id} not found.")
+                return None
+            payload, expires_at = self._read_slot(slot_index)
+            if remove or expires_at <= now:
+                self._release_slot(slot_index, key_hash, now)
+        if expires_at <= now:
+            logger.debug(f"SyncSharedMemoryStore: Challenge_id: {challenge_id} found but expired.")
+            return None
+        try:
+            return self.codec.decode(payload)
+        except ValueError as e:
+            logger.warning(f"SyncSharedMemoryStore: Decode error for challenge {challenge_id}: {e}")
+            return None
+
+    # --- Интерфейс хранилища ---
+
+    def store_challenge(self, challenge_id: str, data: Dict[str, Any], ttl_seconds: int) -> None:
+        key = self._encode_key(challenge_id)
+        try:
+            payload = self.codec.encode(data)
+        except (TypeError, ValueError) as e:
+            logger.error(f"SyncSharedMemoryStore: Failed to serialize data for challenge {challenge_id}: {e}")
+            raise TypeError(f"Data for CAPTCHA challenge {challenge_id} is not serializable with codec '{self.codec.name}'.")
+        if len(payload) > self._max_payload_size:
+            raise ValueError(
+                f"Encoded challenge {challenge_id} is {len(payload)} bytes, "
+                f"slot holds at most {self._max_payload_size} (increase slot_size or use the 'binary' codec)"
+            )
+        key_hash = _key_hash(key)
+        now = time.time()
+        slot_header = _SLOT_HEADER.pack(SLOT_USED, len(key), len(payload), key_hash, now + ttl_seconds)
+        with self._locked_stripe(key_hash % self._num_stripes):
+            slot_index, free_slot, oldest_slot = self._find(key, key_hash, now)
+            if slot_index is None:
+                slot_index = free_slot if free_slot is not None else oldest_slot
+                if free_slot is None:
+                    logger.debug("SyncSharedMemoryStore: Stripe is full, evicting the slot closest to expiry.")
+            offset = self._slot_offset(slot_index)
+            # Сначала id и данные, затем заголовок: состояние SLOT_USED появляется последним
+            self._map[offset + _SLOT_HEADER.size:offset + _SLOT_HEADER.size + len(key)] = key
+            self._map[offset + _SLOT_DATA_OFFSET:offset + _SLOT_DATA_OFFSET + len(payload)] = payload
+            self._map[offset:offset + _SLOT_HEADER.size] = slot_header
+        logger.debug(f"SyncSharedMemoryStore: Stored challenge_id: {challenge_id} with TTL: {ttl_seconds}s")
+
+    def retrieve_challenge(self, challenge_id: str) -> Optional[Dict[str, Any]]:
+        return self._take(challenge_id, remove=False)
+
+    def delete_challenge(self, challenge_id: str) -> None:
+        try:
+            key = self._encode_key(challenge_id)
+        except ValueError:
+            return
+        key_hash = _key_hash(key)
+        now = time.time()
+        with self._locked_stripe(key_hash % self._num_stripes):
+            slot_index, _, _ = self._find(key, key_hash, now)
+            if slot_index is not None:
+                self._release_slot(slot_index, key_hash, now)
+        if slot_index is not None:
+            logger.debug(f"SyncSharedMemoryStore: Deleted challenge_id: {challenge_id}")
+        else:
+            logger.debug(f"SyncSharedMemoryStore: Attempted to delete non-existent challenge_id: {challenge_id}")
+
+    def consume_challenge(self, challenge_id: str) -> Optional[Dict[str, Any]]:
+        return self._take(challenge_id, remove=True)
+
+    def close(self) -> None:
+        if self._closed:
+            return
+        self._closed = True
+        _close_store_file(self._fd, self._map)
+        logger.debug("SyncSharedMemoryStore: Closed.")
+
+
+class AsyncSharedMemoryStore(AbstractAsyncCaptchaStore):
+    """
+    Асинхронная обертка над SyncSharedMemoryStore. Операции выполняются прямо в event loop:
+    они не делают ввода-вывода и держат блокировку полосы на время чтения нескольких
+    слотов, так что переход в поток стоил бы дороже самой операции.
+    Параметры - как у SyncSharedMemoryStore.
+    """
+    def __init__(self, database_path: Union[str, Path] = DEFAULT_SHARED_MEMORY_PATH, **store_options: Any):
+        self._store = SyncSharedMemoryStore(database_path, **store_options)
+
+    async def store_challenge(self, challenge_id: str, data: Dict[str, Any], ttl_seconds: int) -> None:
+        self._store.store_challenge(challenge_id, data, ttl_seconds)
+
+    async def retrieve_challenge(self, challenge_id: str) -> Optional[Dict[str, Any]]:
+        return self._store.retrieve_challenge(challenge_id)
+
+    async def delete_challenge(self, challenge_id: str) -> None:
+        self._store.delete_challenge(challenge_id)
+
+    async def consume_challenge(self, challenge_id: str) -> Optional[Dict[str, Any]]:
+        return self._store.consume_challenge(challenge_id)
+
+    async def close(self) -> None:
+        self._store.close()
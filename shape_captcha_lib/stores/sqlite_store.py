@@ -0,0 +1,294 @@
+# shape_captcha_lib/stores/sqlite_store.py
+import asyncio
+import sqlite3
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Any, Dict, Optional, Union
+
+from .abc_store import AbstractSyncCaptchaStore, AbstractAsyncCaptchaStore
+from .codecs import ChallengeCodec, get_challenge_codec
+
+import logging
+logger = logging.getLogger(__name__)
+
+DEFAULT_SQLITE_PATH = "captcha_store.sqlite3"
+DEFAULT_TABLE_NAME = "captcha_challenges"
+DEFAULT_PURGE_INTERVAL_SECONDS = 60.0
+DEFAULT_MAX_BATCH_SIZE = 256
+BUSY_TIMEOUT_SECONDS = 5.0
+
+# DELETE ... RETURNING появился в SQLite 3.35; на старых версиях consume - SELECT + DELETE в транзакции
+_RETURNING_SUPPORTED = sqlite3.sqlite_version_info >= (3, 35, 0)
+
+
+class SyncSqliteStore(AbstractSyncCaptchaStore):
+    """
+    Синхронное хранилище состояний CAPTCHA в SQLite (режим WAL).
+
+    Таблица (challenge_id TEXT PRIMARY KEY, payload BLOB, expires_at REAL) без rowid
+    и индекс по expires_at: истекшие записи удаляются одним DELETE по диапазону
+    индекса - при записи не чаще раза в purge_interval_seconds или фоновым потоком
+    с sweep_interval_seconds. consume_challenge - один DELETE ... RETURNING.
+    Тексты запросов постоянны, поэтому sqlite3 берет подготовленные выражения
+    из кэша соединения. Данные сериализуются кодеком (см. codecs.py), сроки -
+    time.time(), так что записи переживают перезапуск и видны всем процессам хоста.
+
+    По умолчанию каждая операция фиксируется сразу (synchronous=NORMAL: в WAL
+    это без fsync на коммит). С commit_interval_seconds операции копятся в одной
+    транзакции и фиксируются раз в интервал (фоновым потоком) или каждые
+    max_batch_size операций. Пока транзакция открыта, другие процессы не видят
+    новых записей и ждут блокировку записи, поэтому пакетная фиксация подходит
+    для одного процесса с потоками.
+    """
+    def __init__(
+        self,
+        database_path: Union[str, Path] = DEFAULT_SQLITE_PATH,
+        codec: Union[str, ChallengeCodec] = "json",
+        table_name: str = DEFAULT_TABLE_NAME,
+        purge_interval_seconds: float = DEFAULT_PURGE_INTERVAL_SECONDS,
+        sweep_interval_seconds: Optional[float] = None,
+        commit_interval_seconds: Optional[float] = None,
+        max_batch_size: int = DEFAULT_MAX_BATCH_SIZE
+    ):
+        if not table_name.isidentifier():
+            raise ValueError("table_name must be a valid SQL identifier")
+        if purge_interval_seconds <= 0:
+            raise ValueError("purge_interval_seconds must be positive")
+        if sweep_interval_seconds is not None and sweep_interval_seconds <= 0:
+            raise ValueError("sweep_interval_seconds must be positive")
+        if commit_interval_seconds is not None and commit_interval_seconds <= 0:
+            raise ValueError("commit_interval_seconds must be positive")
+        if max_batch_size <= 0:
+            raise ValueError("max_batch_size must be positive")
+
+        self.codec = get_challenge_codec(codec)
+        self._table_name = table_name
+        self._connection = sqlite3.connect(
+            str(database_path), timeout=BUSY_TIMEOUT_SECONDS, isolation_level=None, check_same_thread=False
+        )
+        self._connection.execute("PRAGMA journal_mode=WAL")
+        self._connection.execute("PRAGMA synchronous=NORMAL")
+        self._connection.execute(
+            f"CREATE TABLE IF NOT EXISTS {table_name} "
+            f"(challenge_id TEXT PRIMARY KEY, payload BLOB NOT NULL, expires_at REAL NOT NULL) WITHOUT ROWID"
+        )
+        self._connection.execute(f"CREATE INDEX IF NOT EXISTS {table_name}_expires_at ON {table_name} (expires_at)")
+        self._insert_sql = f"INSERT OR REPLACE INTO {table_name} (challenge_id, payload, expires_at) VALUES (?, ?, ?)"
+        self._select_sql = f"SELECT payload FROM {table_name} WHERE challenge_id = ? AND expires_at > ?"
+        self._delete_sql = f"DELETE FROM {table_name} WHERE challenge_id = ?"
+        self._consume_sql = f"DELETE FROM {table_name} WHERE challenge_id = ? RETURNING payload, expires_at"
+        self._select_for_consume_sql = f"SELECT payload, expires_at FROM {table_name} WHERE challenge_id = ?"
+        self._purge_sql = f"DELETE FROM {table_name} WHERE expires_at <= ?"
+
+        self._lock = threading.Lock()
+        self._purge_interval = purge_interval_seconds
+        self._next_purge_at = 0.0
+        self._commit_interval = commit_interval_seconds
+        self._max_batch_size = max_batch_size
+        self._pending_operations = 0 # Операций в открытой пакетной транзакции
+        self._returning_supported = _RETURNING_SUPPORTED
+
+        self._background_stop = threading.Event()
+        self._background_threads = []
+        self._has_sweeper = sweep_interval_seconds is not None
+        if sweep_interval_seconds is not None:
+            self._start_background(self._sweep_loop, sweep_interval_seconds, "sweeper")
+        if commit_interval_seconds is not None:
+            self._start_background(self._flush_loop, commit_interval_seconds, "committer")
+        logger.info(f"SyncSqliteStore initialized: {database_path}, table '{table_name}', codec '{self.codec.name}'")
+
+    def _start_background(self, target, interval: float, role: str) -> None:
+        thread = threading.Thread(target=target, args=(interval,), name=f"SyncSqliteStore-{role}", daemon=True)
+        thread.start()
+        self._background_threads.append(thread)
+
+    def __len__(self) -> int:
+        """Число строк в таблице (включая истекшие, но еще не удаленные)."""
+        with self._lock:
+            return self._connection.execute(f"SELECT COUNT(*) FROM {self._table_name}").fetchone()[0]
+
+    # --- Транзакции ---
+
+    def _begin_write(self) -> None:
+        """Открывает пакетную транзакцию, если она включена и еще не открыта (под self._lock)."""
+        if self._commit_interval is not None and not self._connection.in_transaction:
+            self._connection.execute("BEGIN IMMEDIATE")
+
+    def _end_write(self) -> None:
+        """Фиксирует пакет, если он набрал max_batch_size операций (под self._lock)."""
+        if self._connection.in_transaction and self._commit_interval is not None:
+            self._pending_operations += 1
+            if self._pending_operations >= self._max_batch_size:
+                self._commit()
+
+    def _commit(self) -> None:
+        if self._connection.in_transaction:
+            self._connection.execute("COMMIT")
+        self._pending_operations = 0
+
+    def flush(self) -> None:
+        """Фиксирует открытую пакетную транзакцию."""
+        with self._lock:
+            self._commit()
+
+    def _flush_loop(self, interval: float) -> None:
+        while not self._background_stop.wait(interval):
+            try:
+                self.flush()
+            except sqlite3.Error as e:
+                logger.error(f"SyncSqliteStore: Failed to commit batch: {e}")
+
+    # --- Очистка ---
+
+    def _purge_expired(self) -> None:
+        with self._lock:
+            self._begin_write()
+            removed_count = self._connection.execute(self._purge_sql, (time.time(),)).rowcount
+            self._end_write()
+        if removed_count:
+            logger.debug(f"SyncSqliteStore: Removed {removed_count} expired challenges.")
+
+    def _sweep_loop(self, interval: float) -> None:
+        while not self._background_stop.wait(interval):
+            try:
+                self._purge_expired()
+            except sqlite3.Error as e:
+                logger.warning(f"SyncSqliteStore: Error during expired challenge purge: {e}")
+
+    # --- Интерфейс хранилища ---
+
+    def _decode(self, challenge_id: str, payload: bytes) -> Optional[Dict[str, Any]]:
+        try:
+            return self.codec.decode(payload)
+        except ValueError as e:
+            logger.warning(f"SyncSqliteStore: Decode error for challenge {challenge_id}: {e}")
+            return None
+
+    def store_challenge(self, challenge_id: str, data: Dict[str, Any], ttl_seconds: int) -> None:
+        try:
+            payload = self.codec.encode(data)
+        except (TypeError, ValueError) as e:
+            logger.error(f"SyncSqliteStore: Failed to serialize data for challenge {challenge_id}: {e}")
+            raise TypeError(f"Data for CAPTCHA challenge {challenge_id} is not serializable with codec '{self.codec.name}'.")
+        now = time.time()
+        try:
+            if not self._has_sweeper and now >= self._next_purge_at:
+                self._next_purge_at = now + self._purge_interval
+                self._purge_expired()
+            with self._lock:
+                self._begin_write()
+                self._connection.execute(self._insert_sql, (challenge_id, payload, now + ttl_seconds))
+                self._end_write()
+        except sqlite3.Error as e:
+            logger.error(f"SyncSqliteStore: Failed to store challenge {challenge_id}: {e}")
+            raise ConnectionError(f"Failed to store CAPTCHA data in SQLite: {e}")
+        logger.debug(f"SyncSqliteStore: Stored challenge_id: {challenge_id} with TTL: {ttl_seconds}s")
+
+    def retrieve_challenge(self, challenge_id: str) -> Optional[Dict[str, Any]]:
+        try:
+            with self._lock:
+                row = self._connection.execute(self._select_sql, (challenge_id, time.time())).fetchone()
+        except sqlite3.Error as e:
+            logger.error(f"SyncSqliteStore: Failed to retrieve challenge {challenge_id}: {e}")
+            return None
+        if row is None:
+            logger.debug(f"SyncSqliteStore: Challenge_id: {challenge_id} not found or expired.")
+            return None
+        logger.debug(f"SyncSqliteStore: Retrieved challenge_id: {challenge_id}")
+        return self._decode(challenge_id, row[0])
+
+    def delete_challenge(self, challenge_id: str) -> None:
+        try:
+            with self._lock:
+                self._begin_write()
+                deleted_count = self._connection.execute(self._delete_sql, (challenge_id,)).rowcount
+                self._end_write()
+        except sqlite3.Error as e:
+            logger.error(f"SyncSqliteStore: Failed to delete challenge {challenge_id}: {e}")
+            return
+        if deleted_count:
+            logger.debug(f"SyncSqliteStore: Deleted challenge_id: {challenge_id}")
+        else:
+            logger.debug(f"SyncSqliteStore: Attempted to delete non-existent challenge_id: {challenge_id}")
+
+    def _take_row(self, challenge_id: str):
+        """Удаляет строку и возвращает (payload, expires_at) или None (под self._lock)."""
+        if self._returning_supported:
+            return self._connection.execute(self._consume_sql, (challenge_id,)).fetchone()
+        in_batch = self._connection.in_transaction
+        if not in_batch:
+            self._connection.execute("BEGIN IMMEDIATE")
+        try:
+            row = self._connection.execute(self._select_for_consume_sql, (challenge_id,)).fetchone()
+            if row is not None:
+                self._connection.execute(self._delete_sql, (challenge_id,))
+        except sqlite3.Error:
+            if not in_batch:
+                self._connection.execute("ROLLBACK")
+            raise
+        if not in_batch:
+            self._connection.execute("COMMIT")
+        return row
+
+    def consume_challenge(self, challenge_id: str) -> Optional[Dict[str, Any]]:
+        try:
+            with self._lock:
+                self._begin_write()
+                row = self._take_row(challenge_id)
+                self._end_write()
+        except sqlite3.Error as e:
+            logger.error(f"SyncSqliteStore: Failed to consume challenge {challenge_id}: {e}")
+            return None
+        if row is None:
+            logger.debug(f"SyncSqliteStore: Challenge_id: {challenge_id} not found.")
+            return None
+        payload, expires_at = row
+        if time.time() >= expires_at:
+            logger.debug(f"SyncSqliteStore: Challenge_id: {challenge_id} found but expired.")
+            return None
+        logger.debug(f"SyncSqliteStore: Consumed challenge_id: {challenge_id}")
+        return self._decode(challenge_id, payload)
+
+    def close(self) -> None:
+        self._background_stop.set()
+        for thread in self._background_threads:
+            thread.join()
+        self._background_threads = []
+        with self._lock:
+            try:
+                self._commit()
+            finally:
+                self._connection.close()
+        logger.debug("SyncSqliteStore: Connection closed.")
+
+
+class AsyncSqliteStore(AbstractAsyncCaptchaStore):
+    """
+    Асинхронная обертка над SyncSqliteStore: операции выполняются в отдельном
+    потоке (соединение одно, поэтому одного потока достаточно), event loop не блокируется.
+    Параметры - как у SyncSqliteStore.
+    """
+    def __init__(self, database_path: Union[str, Path] = DEFAULT_SQLITE_PATH, **store_options: Any):
+        self._store = SyncSqliteStore(database_path, **store_options)
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="AsyncSqliteStore")
+
+    async def _run(self, func, *args):
+        return await asyncio.get_running_loop().run_in_executor(self._executor, func, *args)
+
+    async def store_challenge(self, challenge_id: str, data: Dict[str, Any], ttl_seconds: int) -> None:
+        await self._run(self._store.store_challenge, challenge_id, data, ttl_seconds)
+
+    async def retrieve_challenge(self, challenge_id: str) -> Optional[Dict[str, Any]]:
+        return await self._run(self._store.retrieve_challenge, challenge_id)
+
+    async def delete_challenge(self, challenge_id: str) -> None:
+        await self._run(self._store.delete_challenge, challenge_id)
+
+    async def consume_challenge(self, challenge_id: str) -> Optional[Dict[str, Any]]:
+        return await self._run(self._store.consume_challenge, challenge_id)
+
+    async def close(self) -> None:
+        await self._run(self._store.close)
+        await asyncio.to_thread(self._executor.shutdown, True)
@@ -0,0 +1,175 @@
+# shape_captcha_lib/utils/challenge_token.py
+import base64
+import binascii
+import hashlib
+import hmac
+import secrets
+import struct
+from typing import Iterable, List, NamedTuple, Optional, Union
+import logging
+
+try: # Необязательная зависимость: pip install shape-captcha-lib[crypto]
+    from cryptography.hazmat.primitives.ciphers.aead import AESGCM
+except ImportError:
+    AESGCM = None
+
+logger = logging.getLogger(__name__)
+
+TOKEN_FORMAT_VERSION = 1 # HMAC-SHA256 CTR + HMAC (только стандартная библиотека)
+TOKEN_FORMAT_VERSION_AES_GCM = 2
+TOKEN_CIPHERS = ("aes-gcm", "hmac-ctr")
+TOKEN_NONCE_SIZE = 12
+TOKEN_TAG_SIZE = 16
+MIN_SECRET_KEY_SIZE = 32
+
+# Заголовок (открытый, но аутентифицированный): версия формата и nonce.
+# Nonce одновременно служит идентификатором токена для защиты от повторов.
+_HEADER = struct.Struct(">B12s")
+# Зашифрованная часть: зерно, срок действия (unix time), индекс целевой фигуры, хэш конфигурации
+_CLAIMS = struct.Struct(">QIB8s")
+_TOKEN_SIZE = _HEADER.size + _CLAIMS.size + TOKEN_TAG_SIZE
+_SHA256_SIZE = 32
+
+
+class ChallengeClaims(NamedTuple):
+    token_id: bytes
+    seed: int
+    expires_at: int
+    target_index: int
+    config_hash: str  # 16 hex-символов, см. CaptchaLogicCore.config_hash()
+
+
+class _DerivedKeys(NamedTuple):
+    encryption: bytes
+    authentication: bytes
+    aead: bytes
+
+
+def _derive_keys(secret_key: Union[str, bytes]) -> _DerivedKeys:
+    if isinstance(secret_key, str):
+        secret_key = secret_key.encode("utf-8")
+    if len(secret_key) < MIN_SECRET_KEY_SIZE:
+        raise ValueError(f"secret_key must be at least {MIN_SECRET_KEY_SIZE} bytes long")
+    return _DerivedKeys(
+        encryption=hmac.new(secret_key, b"shape-captcha-token/enc", hashlib.sha256).digest(),
+        authentication=hmac.new(secret_key, b"shape-captcha-token/mac", hashlib.sha256).digest(),
+        aead=hmac.new(secret_key, b"shape-captcha-token/aes-gcm", hashlib.sha256).digest(),
+    )
+
+
+def _keystream(encryption_key: bytes, nonce: bytes, length: int) -> bytes:
+    """Поток ключа HMAC-SHA256(key, nonce || counter) - режим счетчика на стандартной библиотеке."""
+    blocks = [
+        hmac.new(encryption_key, nonce + counter.to_bytes(4, "big"), hashlib.sha256).digest()
+        for counter in range((length + _SHA256_SIZE - 1) // _SHA256_SIZE)
+    ]
+    return b"".join(blocks)[:length]
+
+
+def _xor(data: bytes, stream: bytes) -> bytes:
+    return (int.from_bytes(data, "big") ^ int.from_bytes(stream, "big")).to_bytes(len(data), "big")
+
+
+class ChallengeTokenCodec:
+    """
+    Шифрует и подписывает данные CAPTCHA в компактный токен (URL-safe base64, ~68 символов).
+    Раскладка токена: версия (1 байт) || nonce (12 байт) || шифротекст (21 байт) || тег (16 байт).
+
+    cipher выбирает схему для новых токенов:
+      - "aes-gcm": AES-256-GCM из пакета cryptography (extra "crypto"), заголовок - associated data;
+      - "hmac-ctr": резервная схема только на стандартной библиотеке. Это собственная
+        конструкция encrypt-then-MAC, а не стандартный AEAD: шифрование - XOR с потоком
+        HMAC-SHA256(key, nonce || counter), затем HMAC-SHA256 по заголовку и шифротексту,
+        усеченный до 16 байт;
+      - None (по умолчанию): "aes-gcm", если cryptography установлен, иначе "hmac-ctr".
+    Проверяются токены обеих версий (версия "aes-gcm" - только при установленном cryptography),
+    поэтому все экземпляры сервиса должны иметь одинаковый набор зависимостей.
+
+    Nonce - 96 случайных бит на токен. Вероятность совпадения nonce среди n токенов одного
+    ключа ~ n^2 / 2^97 (для 2^32 токенов ~ 2^-33). Совпадение раскрывает XOR двух открытых
+    текстов (для AES-GCM - еще и ключ аутентификации), поэтому ключ нужно менять раньше,
+    чем им будет подписано 2^32 токенов.
+
+    previous_secret_keys позволяют ротацию ключей: новые токены подписываются secret_key,
+    а проверяются всеми ключами по очереди.
+    """
+
+    def __init__(
+        self,
+        secret_key: Union[str, bytes],
+        previous_secret_keys: Iterable[Union[str, bytes]] = (),
+        cipher: Optional[str] = None
+    ):
+        if cipher is None:
+            cipher = "aes-gcm" if AESGCM is not None else "hmac-ctr"
+        if cipher not in TOKEN_CIPHERS:
+            raise ValueError(f"Unknown token cipher '{cipher}'. Available: {TOKEN_CIPHERS}")
+        if cipher == "aes-gcm" and AESGCM is None:
+            raise ImportError("Token cipher 'aes-gcm' requires the 'cryptography' package (shape-captcha-lib[crypto]).")
+        self.cipher = cipher
+        self._keys: List[_DerivedKeys] = [_derive_keys(secret_key)]
+        self._keys.extend(_derive_keys(key) for key in previous_secret_keys)
+
+    def seal(self, seed: int, expires_at: int, target_index: int, config_hash: str) -> str:
+        """Создает токен. Возвращает строку, пригодную для использования как captcha_id."""
+        nonce = secrets.token_bytes(TOKEN_NONCE_SIZE)
+        claims = _CLAIMS.pack(seed, expires_at, target_index, bytes.fromhex(config_hash))
+        keys = self._keys[0]
+
+        if self.cipher == "aes-gcm":
+            header = _HEADER.pack(TOKEN_FORMAT_VERSION_AES_GCM, nonce)
+            sealed = AESGCM(keys.aead).encrypt(nonce, claims, header) # Шифротекст || тег (16 байт)
+        else:
+            header = _HEADER.pack(TOKEN_FORMAT_VERSION, nonce)
+            ciphertext = _xor(claims, _keystream(keys.encryption, nonce, len(claims)))
+            tag = hmac.new(keys.authentication, header + ciphertext, hashlib.sha256).digest()[:TOKEN_TAG_SIZE]
+            sealed = ciphertext + tag
+        return base64.urlsafe_b64encode(header + sealed).rstrip(b"=").decode("ascii")
+
+    def open(self, token: str) -> Optional[ChallengeClaims]:
+        """
+        Проверяет подпись и расшифровывает токен.
+        Returns:
+            ChallengeClaims или None, если токен поврежден, подделан или подписан неизвестным ключом.
+            Срок действия здесь не проверяется.
+        """
+        try:
+            raw = base64.urlsafe_b64decode(token + "=" * (-len(token) % 4))
+        except (binascii.Error, ValueError, TypeError):
+            return None
+        if len(raw) != _TOKEN_SIZE:
+            return None
+
+        header, sealed = raw[:_HEADER.size], raw[_HEADER.size:]
+        version, nonce = _HEADER.unpack(header)
+        if version == TOKEN_FORMAT_VERSION_AES_GCM:
+            claims = self._open_aes_gcm(header, nonce, sealed)
+        elif version == TOKEN_FORMAT_VERSION:
+            claims = self._open_hmac_ctr(header, nonce, sealed)
+        else:
+            logger.debug(f"Rejecting challenge token with unsupported version {version}.")
+            return None
+        if claims is None:
+            return None
+        seed, expires_at, target_index, config_hash = _CLAIMS.unpack(claims)
+        return ChallengeClaims(nonce, seed, expires_at, target_index, config_hash.hex())
+
+    def _open_aes_gcm(self, header: bytes, nonce: bytes, sealed: bytes) -> Optional[bytes]:
+        if AESGCM is None:
+            logger.warning("Rejecting AES-GCM challenge token: the 'cryptography' package is not installed.")
+            return None
+        from cryptography.exceptions import InvalidTag
+        for keys in self._keys:
+            try:
+                return AESGCM(keys.aead).decrypt(nonce, sealed, header)
+            except InvalidTag:
+                continue
+        return None
+
+    def _open_hmac_ctr(self, header: bytes, nonce: bytes, sealed: bytes) -> Optional[bytes]:
+        ciphertext, tag = sealed[:_CLAIMS.size], sealed[_CLAIMS.size:]
+        for keys in self._keys:
+            expected_tag = hmac.new(keys.authentication, header + ciphertext, hashlib.sha256).digest()[:TOKEN_TAG_SIZE]
+            if hmac.compare_digest(tag, expected_tag):
+                return _xor(ciphertext, _keystream(keys.encryption, nonce, len(ciphertext)))
+        return None
@@ -0,0 +1,80 @@
+# shape_captcha_lib/utils/font_utils.py
+import functools
+import random
+from typing import Optional, Tuple
+import logging
+
+from PIL import Image, ImageDraw, ImageFont
+
+logger = logging.getLogger(__name__)
+
+# Углы поворота водяного знака квантуются корзинами, чтобы повернутые спрайты можно было кэшировать
+WATERMARK_ANGLE_BUCKETS: Tuple[int, ...] = tuple(range(-25, 26, 5))
+WATERMARK_WORD_BANK_SIZE = 64
+# Постоянное зерно: набор слов одинаков во всех процессах и воркерах пула,
+# поэтому CAPTCHA с одним зерном (rng) рисует один и тот же водяной знак
+WATERMARK_WORD_BANK_SEED = 0x5CA7C4A
+WATERMARK_SPRITE_CACHE_SIZE = 1024
+
+
+@functools.lru_cache(maxsize=32)
+def get_font(font_path: Optional[str], font_size: int):
+    """
+    Загружает шрифт один раз на процесс для пары (путь, размер).
+    Если TrueType-шрифт загрузить не удалось, возвращает ImageFont.load_default().
+    """
+    try:
+        # Если font_path is None, ImageFont.truetype пытается загрузить шрифт по умолчанию.
+        return ImageFont.truetype(font_path, font_size)
+    except Exception as e_font: # Ловим более широкий спектр исключений
+        logger.warning(
+            f"Failed to load font (path: {font_path}, size: {font_size}): {e_font}. "
+            "Falling back to ImageFont.load_default()."
+        )
+        return ImageFont.load_default() # Это очень базовый, не масштабируемый растровый шрифт
+
+
+@functools.lru_cache(maxsize=8)
+def get_watermark_word_bank(candidate_chars: str, bank_size: int = WATERMARK_WORD_BANK_SIZE) -> Tuple[str, ...]:
+    """
+    Набор случайных строк для водяных знаков, генерируется один раз на процесс
+    из WATERMARK_WORD_BANK_SEED (не из глобального random).
+    Размер набора ограничен, чтобы маски всех слов и углов помещались в кэш get_rotated_text_mask.
+    """
+    bank_rng = random.Random(WATERMARK_WORD_BANK_SEED)
+    return tuple(
+        ''.join(bank_rng.choices(candidate_chars, k=bank_rng.randint(6, 10)))
+        for _ in range(bank_size)
+    )
+
+
+@functools.lru_cache(maxsize=WATERMARK_SPRITE_CACHE_SIZE)
+def get_rotated_text_mask(
+    font_path: Optional[str],
+    font_size: int,
+    text: str,
+    angle: int,
+    opacity: int
+) -> Optional[Image.Image]:
+    """
+    Возвращает повернутую альфа-маску (режим "L") строки водяного знака.
+    Маски кэшируются (атлас спрайтов), цвет подставляется при наложении.
+    Возвращенное изображение общее для всех вызовов и не должно изменяться.
+    """
+    font = get_font(font_path, font_size)
+    try:
+        text_bbox = font.getbbox(text) # (left, top, right, bottom)
+    except Exception as e_textsize:
+        logger.warning(f"Could not get text dimensions for watermark: {e_textsize}")
+        return None
+
+    text_width = text_bbox[2] - text_bbox[0]
+    text_height = text_bbox[3] - text_bbox[1]
+    if text_width <= 0 or text_height <= 0:
+        return None
+
+    mask = Image.new('L', (text_width, text_height), 0)
+    ImageDraw.Draw(mask).text((-text_bbox[0], -text_bbox[1]), text, font=font, fill=opacity)
+    rotated_mask = mask.rotate(angle, expand=True, resample=Image.Resampling.BICUBIC)
+    # BICUBIC дает небольшие выбросы выше исходной прозрачности - обрезаем их
+    return rotated_mask.point([min(value, opacity) for value in range(256)])
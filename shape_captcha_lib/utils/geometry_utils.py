@@ -46,6 +46,69 @@ def is_point_in_polygon(px: int, py: int, vertices: List[Tuple[int, int]]) -> bo
 
     return inside
 
+# --- Компактные примитивы проверки попадания ---
+# Фигура при генерации описывает свою кликабельную область списком примитивов
+# (объединение); список сохраняется в all_drawn_shapes["hit_test"] и при проверке
+# вычисляется is_point_in_hit_test без пересоздания объекта фигуры.
+# Примитивы - JSON-совместимые списки:
+#   ["polygon", x1, y1, x2, y2, ...]     - многоугольник (плоский список вершин)
+#   ["circle", cx, cy, r]
+#   ["ellipse", cx, cy, rx, ry]          - или ["ellipse", cx, cy, rx, ry, y_min]: только точки с py >= y_min
+#   ["annulus", cx, cy, r_outer, r_inner] - кольцо
+HitTestPrimitive = List[Any]
+
+
+def polygon_hit_primitive(vertices: List[Tuple[int, int]]) -> HitTestPrimitive:
+    primitive: HitTestPrimitive = ["polygon"]
+    for vx, vy in vertices:
+        primitive.append(vx)
+        primitive.append(vy)
+    return primitive
+
+
+def _is_point_in_flat_polygon(px: float, py: float, coords: List[Any]) -> bool:
+    """То же, что is_point_in_polygon, но для плоского списка координат coords[1:]."""
+    num_coords = len(coords) - 1
+    if num_coords < 6:
+        return False
+    inside = False
+    p1x, p1y = coords[num_coords - 1], coords[num_coords]
+    for i in range(1, num_coords, 2):
+        p2x, p2y = coords[i], coords[i + 1]
+        if ((p1y > py) != (p2y > py)) and (px < (float(p2x - p1x) * (py - p1y)) / (p2y - p1y) + p1x):
+            inside = not inside
+        p1x, p1y = p2x, p2y
+    return inside
+
+
+def is_point_in_hit_test(px: float, py: float, primitives: List[HitTestPrimitive]) -> bool:
+    """
+    True, если точка попадает хотя бы в один примитив.
+    Результат совпадает с is_point_inside фигуры, которая создала примитивы.
+
+    Raises:
+        ValueError: Если тип примитива неизвестен.
+    """
+    for primitive in primitives:
+        kind = primitive[0]
+        if kind == "polygon":
+            if _is_point_in_flat_polygon(px, py, primitive):
+                return True
+        elif kind == "circle":
+            if is_point_in_circle(px, py, primitive[1], primitive[2], primitive[3]):
+                return True
+        elif kind == "ellipse":
+            if is_point_in_ellipse(px, py, primitive[1], primitive[2], primitive[3], primitive[4]) and \
+                    (len(primitive) < 6 or py >= primitive[5]):
+                return True
+        elif kind == "annulus":
+            if is_point_in_circle(px, py, primitive[1], primitive[2], primitive[3]) and \
+                    not is_point_in_circle(px, py, primitive[1], primitive[2], primitive[4]):
+                return True
+        else:
+            raise ValueError(f"Unknown hit-test primitive '{kind}'")
+    return False
+
 def calculate_rotated_polygon_vertices(
     cx: int,
     cy: int,
@@ -94,6 +157,30 @@ def calculate_polygon_bounding_box(
         float(max(y_coords))
     ]
 
+def calculate_rotated_polygon_bbox_at_origin(
+    vertices_orig_centered: List[Tuple[float, float]],
+    rotation_angle_rad: float
+) -> List[float]:
+    """
+    Рассчитывает bounding box повернутого полигона с центром в (0,0).
+    Вершины округляются так же, как в calculate_rotated_polygon_vertices.
+    """
+    return calculate_polygon_bounding_box(
+        calculate_rotated_polygon_vertices(0, 0, vertices_orig_centered, rotation_angle_rad)
+    )
+
+def extend_bbox_by_offset(bbox: List[float], dx: int, dy: int) -> List[float]:
+    """
+    Объединяет bbox с его копией, смещенной на (dx, dy).
+    Используется для псевдо-3D фигур, у которых задняя грань - смещенная передняя.
+    """
+    return [
+        min(bbox[0], bbox[0] + dx),
+        min(bbox[1], bbox[1] + dy),
+        max(bbox[2], bbox[2] + dx),
+        max(bbox[3], bbox[3] + dy)
+    ]
+
 def calculate_regular_polygon_centered_vertices(
     radius: float, # Используем float для радиуса для большей точности внутренних расчетов
     num_vertices: int,
@@ -0,0 +1,74 @@
+# shape_captcha_lib/utils/image_encoding.py
+import io
+from typing import Any, Dict, Optional
+
+from PIL import Image
+
+IMAGE_OUTPUT_FORMATS = ("png", "webp", "jpeg")
+DEFAULT_ENCODE_PROFILE = "fast"
+
+# Предустановленные профили кодирования.
+# "fast" - минимальное время кодирования (низкий compress_level, WebP method=0);
+# "small" - малый размер (палитра для PNG, более сильное сжатие) без максимальных, но медленных уровней.
+ENCODE_PROFILES: Dict[str, Dict[str, Dict[str, Any]]] = {
+    "fast": {
+        "png": {"compress_level": 1},
+        "webp": {"quality": 80, "method": 0},
+        "jpeg": {"quality": 85},
+    },
+    "small": {
+        "png": {"compress_level": 6, "quantize": 128},
+        "webp": {"quality": 70, "method": 4},
+        "jpeg": {"quality": 75, "optimize": True},
+    },
+}
+
+_PIL_FORMAT_NAMES = {"png": "PNG", "webp": "WEBP", "jpeg": "JPEG"}
+
+
+def resolve_encode_options(output_format: str, encode_options: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+    """
+    Собирает итоговые параметры кодирования: профиль (encode_options["profile"],
+    по умолчанию "fast") плюс явные переопределения из encode_options.
+
+    Raises:
+        ValueError: Если формат или профиль неизвестны.
+    """
+    if output_format not in IMAGE_OUTPUT_FORMATS:
+        raise ValueError(
+            f"Unknown output_format '{output_format}'. Expected one of: {', '.join(IMAGE_OUTPUT_FORMATS)}."
+        )
+    overrides = dict(encode_options or {})
+    profile_name = overrides.pop("profile", DEFAULT_ENCODE_PROFILE)
+    if profile_name not in ENCODE_PROFILES:
+        raise ValueError(f"Unknown encode profile '{profile_name}'. Expected one of: {', '.join(ENCODE_PROFILES)}.")
+    options = dict(ENCODE_PROFILES[profile_name][output_format])
+    options.update(overrides)
+    return options
+
+
+def encode_image(image: Image.Image, output_format: str, encode_options: Optional[Dict[str, Any]] = None) -> bytes:
+    """
+    Кодирует изображение CAPTCHA в PNG/WebP/JPEG.
+
+    Args:
+        image: Изображение (обычно RGB).
+        output_format: "png", "webp" или "jpeg".
+        encode_options: Имя профиля ("profile") и/или параметры Image.save.
+            Дополнительно поддерживается "quantize": число цветов палитры
+            (квантование перед сохранением; для JPEG игнорируется).
+    Returns:
+        Закодированное изображение в виде bytes.
+    """
+    options = resolve_encode_options(output_format, encode_options)
+    palette_colors = options.pop("quantize", None)
+
+    if output_format == "jpeg":
+        if image.mode != "RGB":
+            image = image.convert("RGB")
+    elif palette_colors:
+        image = image.quantize(colors=int(palette_colors), method=Image.Quantize.FASTOCTREE)
+
+    buffer = io.BytesIO()
+    image.save(buffer, format=_PIL_FORMAT_NAMES[output_format], **options)
+    return buffer.getvalue()
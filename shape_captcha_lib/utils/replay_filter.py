@@ -0,0 +1,112 @@
+# shape_captcha_lib/utils/replay_filter.py
+import hashlib
+import math
+import threading
+import time
+from abc import ABC, abstractmethod
+from typing import Dict, Optional
+import logging
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_BUCKET_SECONDS = 60
+DEFAULT_BUCKET_CAPACITY = 100_000
+DEFAULT_FALSE_POSITIVE_RATE = 1e-4
+
+
+class AbstractReplayFilter(ABC):
+    """
+    Набор уже использованных идентификаторов токенов.
+    Идентификатор нужно помнить только до истечения срока действия токена.
+    """
+
+    @abstractmethod
+    def add_if_absent(self, token_id: bytes, expires_at: float) -> bool:
+        """
+        Атомарно отмечает token_id как использованный.
+        Returns:
+            True, если идентификатор встретился впервые; False, если токен уже использовался.
+        """
+        pass
+
+
+class BloomFilter:
+    """Простой фильтр Блума на bytearray; позиции вычисляются двойным хэшированием blake2b."""
+
+    def __init__(self, capacity: int, false_positive_rate: float):
+        if capacity <= 0:
+            raise ValueError("capacity must be positive")
+        if not 0 < false_positive_rate < 1:
+            raise ValueError("false_positive_rate must be between 0 and 1")
+        self.num_bits = max(8, math.ceil(-capacity * math.log(false_positive_rate) / (math.log(2) ** 2)))
+        self.num_hashes = max(1, round(self.num_bits / capacity * math.log(2)))
+        self._bits = bytearray((self.num_bits + 7) // 8)
+
+    def _positions(self, item: bytes):
+        digest = hashlib.blake2b(item, digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], "little")
+        h2 = int.from_bytes(digest[8:], "little") | 1
+        return [(h1 + i * h2) % self.num_bits for i in range(self.num_hashes)]
+
+    def add_if_absent(self, item: bytes) -> bool:
+        """Добавляет элемент. Возвращает False, если он (вероятно) уже был в фильтре."""
+        is_new = False
+        for position in self._positions(item):
+            byte_index, bit = divmod(position, 8)
+            if not self._bits[byte_index] & (1 << bit):
+                self._bits[byte_index] |= 1 << bit
+                is_new = True
+        return is_new
+
+    def __contains__(self, item: bytes) -> bool:
+        return all(self._bits[p >> 3] & (1 << (p & 7)) for p in self._positions(item))
+
+
+class RotatingBloomFilter(AbstractReplayFilter):
+    """
+    Фильтр повторов в памяти процесса: фильтры Блума по корзинам времени истечения.
+
+    Идентификатор попадает в корзину expires_at // bucket_seconds, поэтому корзину
+    можно удалить целиком, как только истекли все токены в ней. Память ограничена
+    (ttl / bucket_seconds + 1) корзинами по capacity_per_bucket элементов.
+
+    Ложные срабатывания (с вероятностью false_positive_rate) приводят лишь к отказу
+    в проверке верного ответа - пользователь получит новую CAPTCHA; пропустить
+    повтор фильтр не может.
+    """
+
+    def __init__(
+        self,
+        bucket_seconds: int = DEFAULT_BUCKET_SECONDS,
+        capacity_per_bucket: int = DEFAULT_BUCKET_CAPACITY,
+        false_positive_rate: float = DEFAULT_FALSE_POSITIVE_RATE
+    ):
+        if bucket_seconds <= 0:
+            raise ValueError("bucket_seconds must be positive")
+        self.bucket_seconds = bucket_seconds
+        self.capacity_per_bucket = capacity_per_bucket
+        self.false_positive_rate = false_positive_rate
+        self._buckets: Dict[int, BloomFilter] = {}
+        self._lock = threading.Lock()
+
+    @property
+    def bucket_count(self) -> int:
+        return len(self._buckets)
+
+    def add_if_absent(self, token_id: bytes, expires_at: float, now: Optional[float] = None) -> bool:
+        now = time.time() if now is None else now
+        bucket_index = int(expires_at // self.bucket_seconds)
+        with self._lock:
+            self._drop_expired_buckets(now)
+            bloom = self._buckets.get(bucket_index)
+            if bloom is None:
+                bloom = BloomFilter(self.capacity_per_bucket, self.false_positive_rate)
+                self._buckets[bucket_index] = bloom
+            return bloom.add_if_absent(token_id)
+
+    def _drop_expired_buckets(self, now: float) -> None:
+        # Корзина i содержит токены с expires_at < (i + 1) * bucket_seconds
+        current_index = int(now // self.bucket_seconds)
+        for bucket_index in [index for index in self._buckets if index < current_index]:
+            del self._buckets[bucket_index]
+            logger.debug(f"RotatingBloomFilter: dropped expired bucket {bucket_index}.")
@@ -1,8 +1,11 @@
 # tests/conftest.py
+import pytest
 import pytest_asyncio # Для асинхронных фикстур
 from unittest import mock
 import redis.asyncio as redis # Для типизации мока
 
+from shape_captcha_lib.logic_core import CaptchaLogicCore
+
 @pytest_asyncio.fixture
 async def mock_redis_client():
     # Создаем AsyncMock, имитирующий redis.asyncio.Redis
@@ -13,4 +16,43 @@ async def mock_redis_client():
     client.delete = mock.AsyncMock(return_value=1) # delete обычно возвращает кол-во удаленных ключей
     # Если CaptchaChallengeService вызывает client.ping() при инициализации, его тоже нужно замокать:
     # client.ping = mock.AsyncMock(return_value=True)
-    return client
\ No newline at end of file
+    return client
+
+@pytest.fixture
+def logic_core():
+    # Небольшое число фигур ускоряет генерацию в тестах сервисов
+    return CaptchaLogicCore(model_name="base_model", num_shapes_on_image=3)
+
+
+def _find_click_on_target(logic_core, target_type, drawn_shapes):
+    """Ищет точку (в финальных координатах), клик по которой засчитывается как верный."""
+    target_bbox = next(s["bbox_upscaled"] for s in drawn_shapes if s["shape_type"] == target_type)
+    factor = logic_core.upscale_factor
+    for x in range(int(target_bbox[0]) // factor, int(target_bbox[2]) // factor + 1):
+        for y in range(int(target_bbox[1]) // factor, int(target_bbox[3]) // factor + 1):
+            if logic_core.verify_solution(x, y, target_type, drawn_shapes):
+                return x, y
+    raise AssertionError("No clickable point found on the target shape")
+
+
+@pytest.fixture
+def find_click_on_target():
+    return _find_click_on_target
+
+
+class FakeClock:
+    """Замена модуля time в хранилищах: time() и monotonic() возвращают управляемое время now."""
+    def __init__(self, now: float = 10_000.0):
+        self.now = now
+
+    def time(self) -> float:
+        return self.now
+
+    def monotonic(self) -> float:
+        return self.now
+
+
+@pytest.fixture
+def clock():
+    # Подключается к модулю хранилища через monkeypatch.setattr(<модуль>, "time", clock)
+    return FakeClock()
@@ -0,0 +1,74 @@
+# tests/test_challenge_pool.py
+import asyncio
+
+import pytest
+from PIL import Image
+
+from shape_captcha_lib.logic_core import CaptchaLogicCore
+from shape_captcha_lib.services import AsyncCaptchaChallengeService, ChallengePool
+from shape_captcha_lib.stores.memory_store import AsyncInMemoryStore
+
+
+@pytest.mark.asyncio
+async def test_pool_fill_and_hit(logic_core):
+    pool = ChallengePool(logic_core, pool_size=3, low_watermark=0)
+    await pool.fill()
+    assert pool.depth == 3
+
+    image_obj, drawn_shapes, target_type = await pool.acquire()
+    assert isinstance(image_obj, Image.Image)
+    assert target_type in [shape["shape_type"] for shape in drawn_shapes]
+    assert pool.stats()["hits"] == 1
+    assert pool.stats()["misses"] == 0
+    assert pool.depth == 2
+    await pool.close()
+
+
+@pytest.mark.asyncio
+async def test_pool_miss_falls_back_to_inline_and_refills(logic_core):
+    pool = ChallengePool(logic_core, pool_size=2, low_watermark=1)
+    image_obj, drawn_shapes, target_type = await pool.acquire()
+    assert isinstance(image_obj, Image.Image)
+    assert pool.misses == 1
+
+    # Пул опустел ниже low_watermark -> должно запуститься фоновое пополнение
+    await pool.fill()
+    assert pool.depth == 2
+    await pool.close()
+    assert pool.depth == 0
+
+
+@pytest.mark.asyncio
+async def test_pool_drops_expired_challenges(logic_core):
+    pool = ChallengePool(logic_core, pool_size=2, low_watermark=0, max_age_seconds=0.01)
+    await pool.fill()
+    await asyncio.sleep(0.02)
+
+    await pool.acquire()
+    assert pool.expired == 2
+    assert pool.misses == 1
+    await pool.close()
+
+
+@pytest.mark.asyncio
+async def test_async_service_uses_pool(logic_core):
+    pool = ChallengePool(logic_core, pool_size=2, low_watermark=0)
+    await pool.fill()
+    service = AsyncCaptchaChallengeService(logic_core, AsyncInMemoryStore(), challenge_pool=pool)
+
+    captcha_id, image_obj, prompt = await service.create_challenge(language_code="en")
+    assert isinstance(image_obj, Image.Image)
+    assert prompt
+    assert pool.hits == 1
+    assert await service.store.retrieve_challenge(captcha_id) is not None
+
+    _, image_bytes, _ = await service.create_challenge(output_format="jpeg")
+    assert image_bytes[:2] == b"\xff\xd8"
+    assert pool.hits == 2
+    await pool.close()
+
+
+def test_async_service_rejects_pool_for_other_logic_core(logic_core):
+    pool = ChallengePool(CaptchaLogicCore(model_name="base_model"))
+    with pytest.raises(ValueError):
+        AsyncCaptchaChallengeService(logic_core, AsyncInMemoryStore(), challenge_pool=pool)
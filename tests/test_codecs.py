@@ -0,0 +1,127 @@
+# tests/test_codecs.py
+import json
+from unittest import mock
+
+import pytest
+import redis
+
+from shape_captcha_lib.stores import ChallengeCodec, get_challenge_codec
+from shape_captcha_lib.stores.codecs import (
+    FORMAT_BINARY, FORMAT_COMPACT_JSON, FORMAT_JSON, FORMAT_ZLIB, BinaryCodec, decode_challenge
+)
+from shape_captcha_lib.stores.json_file_store import AsyncJsonFileStore, SyncJsonFileStore
+from shape_captcha_lib.stores.redis_store import SyncRedisStore
+
+CODEC_NAMES = ["json", "compact-json", "binary", "json+zlib", "compact-json+zlib", "binary+zlib"]
+
+
+@pytest.fixture
+def full_record(logic_core):
+    _, drawn_shapes, target_type = logic_core.render_challenge(seed=9)
+    # Как после любого JSON-хранилища: кортежи цветов становятся списками
+    return json.loads(json.dumps(logic_core.build_stored_challenge(target_type, drawn_shapes)))
+
+
+def _verification_view(record):
+    return {
+        "target_shape_type": record["target_shape_type"],
+        "all_drawn_shapes": [
+            {key: shape[key] for key in ("shape_type", "bbox_upscaled", "hit_test")}
+            for shape in record["all_drawn_shapes"]
+        ],
+    }
+
+
+@pytest.mark.parametrize("codec_name", CODEC_NAMES)
+def test_codec_round_trip(codec_name, full_record):
+    codec = get_challenge_codec(codec_name)
+    assert codec.name == codec_name
+    decoded = codec.decode(codec.encode(full_record))
+    if codec_name.startswith("binary"):
+        assert decoded == _verification_view(full_record) # Хранит только данные для проверки клика
+    else:
+        assert decoded == full_record
+
+
+@pytest.mark.parametrize("codec_name", CODEC_NAMES)
+def test_codec_round_trips_non_shape_records(codec_name):
+    record = {"seed": 12345, "model_name": "base_model", "config_hash": "abc", "target_shape_type": "circle"}
+    codec = get_challenge_codec(codec_name)
+    assert codec.decode(codec.encode(record)) == record
+
+
+@pytest.mark.parametrize("codec_name, format_id", [
+    ("json", FORMAT_JSON), ("compact-json", FORMAT_COMPACT_JSON), ("binary", FORMAT_BINARY), ("binary+zlib", FORMAT_ZLIB),
+])
+def test_payload_starts_with_format_byte(codec_name, format_id, full_record):
+    assert get_challenge_codec(codec_name).encode(full_record)[0] == format_id
+
+
+def test_any_codec_decodes_payloads_of_other_codecs(full_record):
+    payloads = [get_challenge_codec(name).encode(full_record) for name in CODEC_NAMES]
+    json_codec = get_challenge_codec("json")
+    assert all(json_codec.decode(payload)["target_shape_type"] == full_record["target_shape_type"] for payload in payloads)
+    # Записи, сохраненные до появления кодеков, - обычный JSON
+    assert decode_challenge(json.dumps(full_record)) == full_record
+
+
+def test_compact_json_is_smaller_and_escapes_colliding_keys(full_record):
+    assert len(get_challenge_codec("compact-json").encode(full_record)) < len(get_challenge_codec("json").encode(full_record))
+    record = {"t": 1, "=x": 2, "target_shape_type": "circle", "nested": [{"hit_test": [], "s": 3}]}
+    codec = get_challenge_codec("compact-json")
+    assert codec.decode(codec.encode(record)) == record
+
+
+@pytest.mark.parametrize("payload", [b"", b"\x7f{}", b"\x80not zlib", b"\x01[1, 2]", b"\x02\x01"])
+def test_decode_rejects_corrupted_payloads(payload):
+    with pytest.raises(ValueError):
+        decode_challenge(payload)
+
+
+def test_unknown_codec_name_raises():
+    with pytest.raises(ValueError):
+        get_challenge_codec("msgpack")
+    with pytest.raises(ValueError):
+        get_challenge_codec("json+lz4")
+    codec = BinaryCodec()
+    assert get_challenge_codec(codec) is codec
+    assert isinstance(codec, ChallengeCodec)
+
+
+def test_redis_store_writes_with_selected_codec(full_record):
+    client = mock.MagicMock(spec=redis.Redis)
+    store = SyncRedisStore(client, codec="compact-json+zlib")
+    store.store_challenge("abc", full_record, 60)
+    payload = client.set.call_args.args[1]
+    assert payload[0] == FORMAT_ZLIB
+    client.getdel.return_value = payload
+    assert store.consume_challenge("abc") == full_record
+
+
+def test_redis_store_logs_and_returns_none_for_corrupted_payload():
+    client = mock.MagicMock(spec=redis.Redis)
+    client.get.return_value = b"\x7fgarbage"
+    assert SyncRedisStore(client, codec="binary").retrieve_challenge("abc") is None
+
+
+@pytest.mark.parametrize("codec_name", ["compact-json", "binary+zlib"])
+def test_file_store_with_binary_codec(codec_name, full_record, tmp_path):
+    store = SyncJsonFileStore(tmp_path, codec=codec_name)
+    store.store_challenge("abc", full_record, 60)
+    assert store._get_file_path("abc").name == "abc.bin" and store._get_file_path("abc").exists()
+    expected = _verification_view(full_record) if codec_name.startswith("binary") else full_record
+    assert store.retrieve_challenge("abc") == expected
+    assert store.consume_challenge("abc") == expected
+    assert not store._get_file_path("abc").exists()
+
+    store.store_challenge("old", full_record, -1)
+    assert store.consume_challenge("old") is None
+
+
+@pytest.mark.asyncio
+async def test_async_file_store_with_binary_codec(full_record, tmp_path):
+    store = AsyncJsonFileStore(tmp_path, codec="compact-json")
+    await store.store_challenge("abc", full_record, 60)
+    assert await store.retrieve_challenge("abc") == full_record
+    assert await store.consume_challenge("abc") == full_record
+    assert await store.consume_challenge("abc") is None
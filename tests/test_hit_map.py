@@ -0,0 +1,87 @@
+# tests/test_hit_map.py
+import json
+
+import pytest
+
+from shape_captcha_lib.hit_map import encode_hit_map, lookup_hit_map, render_hit_map
+from shape_captcha_lib.logic_core import CaptchaLogicCore
+from shape_captcha_lib.services import SyncCaptchaChallengeService
+from shape_captcha_lib.stores.memory_store import SyncInMemoryStore
+from shape_captcha_lib.utils import geometry_utils
+
+
+def _topmost_shape_index(drawn_shapes, upscaled_x, upscaled_y):
+    for index in range(len(drawn_shapes) - 1, -1, -1):
+        if geometry_utils.is_point_in_hit_test(upscaled_x, upscaled_y, drawn_shapes[index]["hit_test"]):
+            return index
+    return -1
+
+
+def test_overlapping_primitives_keep_draw_order():
+    drawn_shapes = [
+        {"shape_type": "square", "hit_test": [["polygon", 0, 0, 60, 0, 60, 60, 0, 60]]},
+        # Кольцо поверх квадрата: в отверстии виден квадрат
+        {"shape_type": "torus", "hit_test": [["annulus", 60, 60, 45, 15]]},
+    ]
+    label_map = render_hit_map(drawn_shapes, final_width=40, final_height=30, upscale_factor=3, scale=1)
+    encoded = encode_hit_map(label_map, scale=1, band_rows=8)
+
+    assert lookup_hit_map(encoded, 5, 5) == 0      # Только квадрат
+    assert lookup_hit_map(encoded, 20, 10) == 1    # Кольцо поверх квадрата
+    assert lookup_hit_map(encoded, 20, 20) == 0    # Отверстие кольца - снова квадрат
+    assert lookup_hit_map(encoded, 39, 29) == -1   # Фон
+    assert lookup_hit_map(encoded, 400, 5) == -1   # Вне карты
+    assert lookup_hit_map("not a hit map", 5, 5) is None
+
+
+def test_shapes_without_primitives_have_no_hit_map():
+    assert render_hit_map([{"shape_type": "plugin", "hit_test": None}], 40, 30, 3) is None
+
+
+@pytest.mark.parametrize("model_name", ["base_model", "td_model"])
+@pytest.mark.parametrize("scale", [1, 2, 4])
+def test_hit_map_agrees_with_shape_geometry(model_name, scale):
+    logic_core = CaptchaLogicCore(model_name=model_name, verify_engine="hit_map", hit_map_scale=scale)
+    _, drawn_shapes, target_type = logic_core.render_challenge(seed=3)
+    record = logic_core.build_stored_challenge(target_type, drawn_shapes)
+    assert "all_drawn_shapes" not in record
+
+    mismatches = total = 0
+    for x in range(0, logic_core.image_width, 2):
+        for y in range(0, logic_core.image_height, 2):
+            expected = _topmost_shape_index(drawn_shapes, x * logic_core.upscale_factor, y * logic_core.upscale_factor)
+            mismatches += lookup_hit_map(record["hit_map"], x, y) != expected
+            total += 1
+    # Отличия возможны только на границах фигур (растеризация против точной геометрии)
+    assert mismatches / total < 0.01 * scale + 0.02
+
+
+def test_default_hit_map_record_is_smaller_than_full_record():
+    logic_core = CaptchaLogicCore(model_name="base_model", verify_engine="hit_map")
+    full_core = CaptchaLogicCore(model_name="base_model")
+    for seed in range(5):
+        _, drawn_shapes, target_type = logic_core.render_challenge(seed=seed)
+        hit_map_size = len(json.dumps(logic_core.build_stored_challenge(target_type, drawn_shapes)))
+        full_size = len(json.dumps(full_core.build_stored_challenge(target_type, drawn_shapes)))
+        assert hit_map_size * 3 < full_size
+
+
+def test_sync_service_with_hit_map_engine():
+    logic_core = CaptchaLogicCore(model_name="base_model", num_shapes_on_image=4, verify_engine="hit_map")
+    service = SyncCaptchaChallengeService(logic_core, SyncInMemoryStore())
+    captcha_id, _, _ = service.create_challenge()
+    stored = service.store.retrieve_challenge(captcha_id)
+    assert "hit_map" in stored
+
+    target_index = stored["shape_types"].index(stored["target_shape_type"])
+    click = next(
+        (x, y)
+        for x in range(logic_core.image_width) for y in range(logic_core.image_height)
+        if lookup_hit_map(stored["hit_map"], x, y) == target_index
+    )
+    assert service.verify_solution(captcha_id, *click)
+
+
+def test_unknown_verify_engine_is_rejected():
+    with pytest.raises(ValueError):
+        CaptchaLogicCore(verify_engine="pixels")
@@ -0,0 +1,37 @@
+# tests/test_image_encoding.py
+import io
+
+import pytest
+from PIL import Image
+
+from shape_captcha_lib.utils.image_encoding import IMAGE_OUTPUT_FORMATS, encode_image, resolve_encode_options
+
+
+@pytest.fixture
+def image():
+    image = Image.new("RGB", (120, 80), "white")
+    image.paste((200, 30, 30), (10, 10, 60, 50))
+    return image
+
+
+@pytest.mark.parametrize("profile", ["fast", "small"])
+@pytest.mark.parametrize("output_format", IMAGE_OUTPUT_FORMATS)
+def test_encode_image_round_trips(image, output_format, profile):
+    encoded = encode_image(image, output_format, {"profile": profile})
+    assert isinstance(encoded, bytes)
+    decoded = Image.open(io.BytesIO(encoded))
+    assert decoded.format == output_format.upper()
+    assert decoded.size == image.size
+
+
+def test_overrides_are_applied_on_top_of_profile():
+    options = resolve_encode_options("png", {"profile": "small", "compress_level": 3})
+    assert options["compress_level"] == 3
+    assert options["quantize"] == 128
+
+
+def test_unknown_format_or_profile_is_rejected():
+    with pytest.raises(ValueError):
+        resolve_encode_options("gif")
+    with pytest.raises(ValueError):
+        resolve_encode_options("png", {"profile": "tiny"})
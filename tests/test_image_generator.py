@@ -0,0 +1,161 @@
+# tests/test_image_generator.py
+import random
+
+import pytest
+from PIL import Image
+
+from shape_captcha_lib.image_generator import DOWNSAMPLE_MODES, _apply_point_noise, _downsample, generate_captcha_image
+from shape_captcha_lib.logic_core import CaptchaLogicCore
+from shape_captcha_lib.registry import get_model_colors, get_model_shape_types
+
+
+def _non_white_fraction(image: Image.Image) -> float:
+    return image.convert("L").point([1] * 255 + [0]).histogram()[1] / (image.width * image.height)
+
+
+def test_point_noise_density_matches_requested():
+    image = Image.new("RGB", (600, 400), "white")
+    _apply_point_noise(image, 0.02)
+    # Часть шума случайно белая, поэтому доля чуть ниже запрошенной
+    assert 0.018 < _non_white_fraction(image) < 0.022
+
+
+@pytest.mark.parametrize("density", [0.0, 0.001, 0.0005])
+def test_point_noise_honours_low_density(density):
+    image = Image.new("RGB", (1200, 750), "white")
+    _apply_point_noise(image, density, random.Random(3))
+    assert abs(_non_white_fraction(image) - density) < 0.0002
+
+
+def test_point_noise_is_grey():
+    image = Image.new("RGB", (200, 100), "white")
+    _apply_point_noise(image, 0.5)
+    assert all(r == g == b for _, (r, g, b) in image.getcolors(256 * 256))
+
+
+def test_generate_with_all_noise_options():
+    image, drawn_shapes = generate_captcha_image(
+        model_name="base_model",
+        model_shape_types=get_model_shape_types("base_model"),
+        model_available_colors=get_model_colors("base_model"),
+        num_shapes=4,
+        add_watermark_text=True,
+        add_noise_lines=True,
+        add_point_noise=True,
+    )
+    assert image.size == (400, 250)
+    assert image.mode == "RGB"
+    assert len(drawn_shapes) == 4
+
+
+@pytest.mark.parametrize("option", ["add_watermark_text", "add_noise_lines"])
+def test_overlay_options_change_pixels(option):
+    def render(**options):
+        image, _ = generate_captcha_image(
+            model_name="base_model",
+            model_shape_types=get_model_shape_types("base_model"),
+            model_available_colors=get_model_colors("base_model"),
+            num_shapes=4,
+            rng=random.Random(5),
+            **options,
+        )
+        return image
+
+    plain = render()
+    assert plain.tobytes() == render().tobytes()
+    assert render(**{option: True}).tobytes() != plain.tobytes()
+
+
+def test_watermark_sprites_and_fonts_are_cached():
+    from shape_captcha_lib.image_generator import DEFAULT_FONT_PATH
+    from shape_captcha_lib.utils import font_utils
+
+    assert font_utils.get_font(DEFAULT_FONT_PATH, 25) is font_utils.get_font(DEFAULT_FONT_PATH, 25)
+    first = font_utils.get_rotated_text_mask(DEFAULT_FONT_PATH, 25, "AB12CD", 10, 60)
+    assert first is font_utils.get_rotated_text_mask(DEFAULT_FONT_PATH, 25, "AB12CD", 10, 60)
+    assert first.mode == "L"
+    assert first.getextrema()[1] <= 60
+
+
+def test_watermark_is_reproducible_across_processes():
+    from shape_captcha_lib.utils import font_utils
+
+    def render_in_fresh_process(global_seed):
+        # Новый процесс: пустые кэши и другое состояние глобального random
+        font_utils.get_watermark_word_bank.cache_clear()
+        random.seed(global_seed)
+        image, _ = generate_captcha_image(
+            model_name="base_model",
+            model_shape_types=get_model_shape_types("base_model"),
+            model_available_colors=get_model_colors("base_model"),
+            num_shapes=3,
+            add_watermark_text=True,
+            rng=random.Random(11),
+        )
+        return image.tobytes()
+
+    assert render_in_fresh_process(1) == render_in_fresh_process(2)
+
+
+@pytest.mark.parametrize("downsample_mode", DOWNSAMPLE_MODES)
+def test_generate_with_each_downsample_mode(downsample_mode):
+    image, drawn_shapes = generate_captcha_image(
+        model_name="base_model",
+        model_shape_types=get_model_shape_types("base_model"),
+        model_available_colors=get_model_colors("base_model"),
+        num_shapes=3,
+        downsample_mode=downsample_mode,
+    )
+    assert image.size == (400, 250)
+    assert len(drawn_shapes) == 3
+
+
+def test_reduce_mode_averages_blocks():
+    canvas = Image.new("RGB", (6, 3), "white")
+    canvas.paste((0, 0, 0), (0, 0, 3, 3))
+    result = _downsample(canvas, (2, 1), 3, "reduce")
+    assert result.getpixel((0, 0)) == (0, 0, 0)
+    assert result.getpixel((1, 0)) == (255, 255, 255)
+
+
+def test_unknown_downsample_mode_is_rejected():
+    with pytest.raises(ValueError):
+        generate_captcha_image(
+            model_name="base_model",
+            model_shape_types=get_model_shape_types("base_model"),
+            model_available_colors=get_model_colors("base_model"),
+            downsample_mode="nearest",
+        )
+    with pytest.raises(ValueError):
+        CaptchaLogicCore(model_name="base_model", downsample_mode="nearest")
+
+
+@pytest.mark.parametrize("model_name", ["base_model", "td_model"])
+def test_stored_hit_test_matches_reinstantiation(model_name, monkeypatch):
+    monkeypatch.setattr("builtins.print", lambda *args, **kwargs: None)
+    logic_core = CaptchaLogicCore(model_name=model_name, num_shapes_on_image=5)
+    _, drawn_shapes, target_type = logic_core.render_challenge(seed=99)
+    assert all(shape["hit_test"] for shape in drawn_shapes)
+
+    # Записи без "hit_test" (старый формат) проверяются пересозданием фигур
+    legacy_shapes = [{k: v for k, v in shape.items() if k != "hit_test"} for shape in drawn_shapes]
+    for x in range(0, logic_core.image_width, 4):
+        for y in range(0, logic_core.image_height, 4):
+            assert logic_core.verify_solution(x, y, target_type, drawn_shapes) == \
+                logic_core.verify_solution(x, y, target_type, legacy_shapes)
+
+
+def test_verify_skips_shapes_whose_bbox_excludes_click(monkeypatch):
+    logic_core = CaptchaLogicCore(model_name="base_model")
+    far_shape = {
+        "shape_type": "circle",
+        "color_name_or_rgb": "red",
+        "params_for_storage": {"cx_upscaled": 900, "cy_upscaled": 600, "radius": 30},
+        "bbox_upscaled": [870.0, 570.0, 930.0, 630.0],
+    }
+
+    def fail_lookup(*args, **kwargs):
+        raise AssertionError("shape outside the click bbox must not be re-instantiated")
+
+    monkeypatch.setattr("shape_captcha_lib.logic_core.load_shape_from_storage", fail_lookup)
+    assert not logic_core.verify_solution(10, 10, "circle", [far_shape])
@@ -0,0 +1,105 @@
+# tests/test_log_store.py
+import pytest
+
+from shape_captcha_lib.stores import log_store
+from shape_captcha_lib.stores.log_store import SEGMENT_FILE_SUFFIX, SyncLogStore
+
+RECORD = {"target_shape_type": "circle", "all_drawn_shapes": []}
+
+
+@pytest.fixture
+def clock(clock, monkeypatch):
+    monkeypatch.setattr(log_store, "time", clock)
+    return clock
+
+
+def _segment_files(path):
+    return sorted(p.name for p in path.iterdir() if p.name.endswith(SEGMENT_FILE_SUFFIX))
+
+
+def test_log_store_appends_all_records_to_one_segment(tmp_path):
+    store = SyncLogStore(tmp_path)
+    store.store_challenge("abc", RECORD, 60)
+    store.store_challenge("def", {"seed": 1}, 60)
+    assert store.consume_challenge("abc") == RECORD
+    store.delete_challenge("def")
+    assert len(_segment_files(tmp_path)) == 1 # Записи и надгробия - в одном файле
+    store.close()
+
+
+def test_log_store_recovers_index_and_tombstones_after_reopen(tmp_path):
+    store = SyncLogStore(tmp_path, codec="binary+zlib")
+    store.store_challenge("consumed", RECORD, 60)
+    store.store_challenge("deleted", RECORD, 60)
+    store.store_challenge("live", RECORD, 60)
+    store.store_challenge("overwritten", {"seed": 1}, 60)
+    store.store_challenge("overwritten", {"seed": 2}, 60)
+    store.consume_challenge("consumed")
+    store.delete_challenge("deleted")
+    store.close()
+
+    reopened = SyncLogStore(tmp_path)
+    assert len(reopened) == 2
+    assert reopened.retrieve_challenge("live") == RECORD
+    assert reopened.retrieve_challenge("overwritten") == {"seed": 2}
+    assert reopened.consume_challenge("consumed") is None
+    assert reopened.consume_challenge("deleted") is None
+    reopened.close()
+
+
+def test_log_store_truncates_torn_tail_on_reopen(tmp_path):
+    store = SyncLogStore(tmp_path)
+    store.store_challenge("abc", RECORD, 60)
+    store.close()
+    segment_path = tmp_path / _segment_files(tmp_path)[0]
+    intact_size = segment_path.stat().st_size
+    with open(segment_path, "ab") as f:
+        f.write(b"\x01\x00\x03partial")
+
+    reopened = SyncLogStore(tmp_path)
+    assert segment_path.stat().st_size == intact_size
+    assert reopened.consume_challenge("abc") == RECORD
+    reopened.store_challenge("def", RECORD, 60)
+    reopened.close()
+    assert SyncLogStore(tmp_path).retrieve_challenge("def") == RECORD
+
+
+def test_log_store_drops_whole_segment_once_all_records_expire(tmp_path, clock):
+    store = SyncLogStore(tmp_path, segment_seconds=10)
+    for i in range(5):
+        store.store_challenge(f"old{i}", RECORD, 30)
+    store.consume_challenge("old0") # Надгробие продлевается до срока записи, а не дольше
+    clock.now += 10
+    store.store_challenge("new", RECORD, 300) # Новый активный сегмент
+    assert len(_segment_files(tmp_path)) == 2
+
+    clock.now += 19
+    store.store_challenge("new2", RECORD, 300)
+    assert len(_segment_files(tmp_path)) == 3 # old1..old4 еще живы
+
+    clock.now += 1
+    store.store_challenge("new3", RECORD, 300)
+    assert _segment_files(tmp_path) == ["000000000002.seg", "000000000003.seg"]
+    assert len(store) == 3
+    assert store.retrieve_challenge("new") == RECORD
+
+
+def test_log_store_rotates_by_size(tmp_path):
+    store = SyncLogStore(tmp_path, max_segment_bytes=200)
+    for i in range(10):
+        store.store_challenge(f"id{i}", RECORD, 60)
+    assert len(_segment_files(tmp_path)) > 1
+    assert all(store.retrieve_challenge(f"id{i}") == RECORD for i in range(10))
+
+
+def test_log_store_rejects_invalid_settings(tmp_path):
+    with pytest.raises(ValueError):
+        SyncLogStore(tmp_path, segment_seconds=0)
+    with pytest.raises(ValueError):
+        SyncLogStore(tmp_path, max_segment_bytes=1)
+
+
+def test_log_store_requires_pread(tmp_path, monkeypatch):
+    monkeypatch.delattr(log_store.os, "pread") # Как на Windows
+    with pytest.raises(RuntimeError):
+        SyncLogStore(tmp_path)
@@ -0,0 +1,53 @@
+# tests/test_placement.py
+import random
+
+from shape_captcha_lib.image_generator import generate_captcha_image
+from shape_captcha_lib.placement import OccupancyGrid, bboxes_overlap
+from shape_captcha_lib.registry import get_model_colors, get_model_shape_types
+
+
+def test_sampled_centers_never_collide():
+    random.seed(7)
+    grid = OccupancyGrid(600, 400, min_distance=3)
+    bbox_at_origin = [-30.0, -20.0, 30.0, 20.0]
+    placed = 0
+    while True:
+        center = grid.sample_center(bbox_at_origin, 33, 600 - 33, 23, 400 - 23)
+        if center is None:
+            break
+        cx, cy = center
+        bbox = [bbox_at_origin[0] + cx, bbox_at_origin[1] + cy, bbox_at_origin[2] + cx, bbox_at_origin[3] + cy]
+        assert 0 <= bbox[0] and bbox[2] <= 600 and 0 <= bbox[1] and bbox[3] <= 400
+        assert grid.fits(bbox)
+        grid.mark(bbox)
+        placed += 1
+    assert placed >= 20
+    for i, first in enumerate(grid.placed_bboxes):
+        for second in grid.placed_bboxes[i + 1:]:
+            assert not bboxes_overlap(first, second, 3)
+
+
+def test_sample_center_returns_none_when_full():
+    grid = OccupancyGrid(100, 100)
+    grid.mark([0, 0, 100, 100])
+    assert grid.sample_center([-10, -10, 10, 10], 10, 90, 10, 90) is None
+
+
+def test_dense_configuration_places_shapes_without_overlap():
+    model_name = "base_model"
+    _, drawn_shapes = generate_captcha_image(
+        model_name=model_name,
+        model_shape_types=get_model_shape_types(model_name),
+        model_available_colors=get_model_colors(model_name),
+        num_shapes=10,
+        final_width=250,
+        final_height=160,
+        add_point_noise=False,
+        add_watermark_text=False,
+        add_noise_lines=False,
+    )
+    assert len(drawn_shapes) >= 6
+    bboxes = [shape["bbox_upscaled"] for shape in drawn_shapes]
+    for i, first in enumerate(bboxes):
+        for second in bboxes[i + 1:]:
+            assert not bboxes_overlap(first, second, 0)
@@ -0,0 +1,99 @@
+# tests/test_render_executor.py
+import asyncio
+
+import pytest
+from PIL import Image
+
+from shape_captcha_lib.services import (
+    AsyncCaptchaChallengeService,
+    InlineRenderExecutor,
+    ProcessRenderExecutor,
+    RenderOverloadedError,
+    ThreadRenderExecutor,
+)
+from shape_captcha_lib.stores.memory_store import AsyncInMemoryStore
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("executor_factory", [
+    InlineRenderExecutor,
+    lambda: ThreadRenderExecutor(max_workers=2),
+    lambda: ProcessRenderExecutor(max_workers=1),
+])
+async def test_executors_render_image_and_shapes(logic_core, executor_factory):
+    executor = executor_factory()
+    try:
+        image_obj, drawn_shapes = await executor.generate(logic_core.build_generation_kwargs())
+    finally:
+        executor.shutdown()
+
+    assert isinstance(image_obj, Image.Image)
+    assert image_obj.size == (logic_core.image_width, logic_core.image_height)
+    assert len(drawn_shapes) == 3
+    assert {"shape_type", "params_for_storage", "bbox_upscaled"} <= set(drawn_shapes[0])
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("executor_factory", [
+    InlineRenderExecutor,
+    lambda: ThreadRenderExecutor(max_workers=1),
+    lambda: ProcessRenderExecutor(max_workers=1),
+])
+async def test_executors_encode_in_worker(logic_core, executor_factory):
+    executor = executor_factory()
+    try:
+        encoded, drawn_shapes = await executor.generate(logic_core.build_generation_kwargs(), "webp", {"profile": "fast"})
+    finally:
+        executor.shutdown()
+
+    assert isinstance(encoded, bytes)
+    assert encoded[:4] == b"RIFF" and encoded[8:12] == b"WEBP"
+    assert len(drawn_shapes) == 3
+
+
+@pytest.mark.asyncio
+async def test_executor_rejects_when_overloaded(logic_core):
+    executor = ThreadRenderExecutor(max_workers=1, max_in_flight=1)
+    kwargs = logic_core.build_generation_kwargs()
+    try:
+        results = await asyncio.gather(
+            executor.generate(kwargs), executor.generate(kwargs), return_exceptions=True
+        )
+    finally:
+        executor.shutdown()
+
+    assert sum(isinstance(r, RenderOverloadedError) for r in results) == 1
+    assert executor.in_flight == 0
+
+
+@pytest.mark.asyncio
+async def test_async_service_with_thread_executor(logic_core):
+    executor = ThreadRenderExecutor(max_workers=2)
+    service = AsyncCaptchaChallengeService(logic_core, AsyncInMemoryStore(), render_executor=executor)
+    try:
+        captcha_id, image_obj, prompt = await service.create_challenge()
+    finally:
+        executor.shutdown()
+
+    assert isinstance(image_obj, Image.Image)
+    stored = await service.store.retrieve_challenge(captcha_id)
+    assert stored["target_shape_type"] in [s["shape_type"] for s in stored["all_drawn_shapes"]]
+
+
+@pytest.mark.asyncio
+async def test_async_service_returns_encoded_png(logic_core):
+    service = AsyncCaptchaChallengeService(logic_core, AsyncInMemoryStore())
+    captcha_id, image_bytes, prompt = await service.create_challenge(output_format="png")
+
+    assert image_bytes.startswith(b"\x89PNG")
+    assert await service.store.retrieve_challenge(captcha_id) is not None
+
+    with pytest.raises(ValueError):
+        await service.create_challenge(output_format="bmp")
+
+
+def test_executor_rejects_invalid_limits():
+    with pytest.raises(ValueError):
+        InlineRenderExecutor(max_in_flight=0)
+    with pytest.raises(ValueError):
+        InlineRenderExecutor(max_in_flight=1, acquire_timeout_seconds=-1)
@@ -0,0 +1,80 @@
+# tests/test_seeded_generation.py
+import json
+
+import pytest
+
+from shape_captcha_lib.logic_core import CaptchaLogicCore
+from shape_captcha_lib.services import AsyncCaptchaChallengeService, ChallengePool, SyncCaptchaChallengeService
+from shape_captcha_lib.stores.memory_store import AsyncInMemoryStore, SyncInMemoryStore
+
+
+@pytest.fixture
+def td_logic_core():
+    # Воспроизводимость по зерну проверяется вместе с шумом
+    return CaptchaLogicCore(model_name="td_model", num_shapes_on_image=5, add_point_noise=True, add_noise_lines=True)
+
+
+def test_same_seed_gives_same_image_and_layout(td_logic_core):
+    image_a, shapes_a, target_a = td_logic_core.render_challenge(seed=12345)
+    image_b, shapes_b, _ = td_logic_core.render_challenge(seed=12345)
+    _, shapes_c, _ = td_logic_core.render_challenge(seed=54321)
+
+    assert shapes_a == shapes_b
+    assert image_a.tobytes() == image_b.tobytes()
+    assert shapes_a != shapes_c
+    # Раскладка без отрисовки совпадает с отрисованной
+    assert td_logic_core.regenerate_shapes(12345) == shapes_a
+
+
+def test_verify_challenge_record(td_logic_core, find_click_on_target):
+    _, drawn_shapes, target_type = td_logic_core.render_challenge(seed=777)
+    record = td_logic_core.build_challenge_record(777, target_type)
+    click_x, click_y = find_click_on_target(td_logic_core, target_type, drawn_shapes)
+
+    assert td_logic_core.verify_challenge_record(record, click_x, click_y)
+    assert not td_logic_core.verify_challenge_record(record, 0, 0)
+    # Запись, созданная с другой конфигурацией, отклоняется
+    other_core = CaptchaLogicCore(model_name="td_model", num_shapes_on_image=4)
+    assert other_core.config_hash() != td_logic_core.config_hash()
+    assert not other_core.verify_challenge_record(record, click_x, click_y)
+
+
+def test_seed_record_is_much_smaller(td_logic_core):
+    _, drawn_shapes, target_type = td_logic_core.render_challenge(seed=1)
+    full_record = {"target_shape_type": target_type, "all_drawn_shapes": drawn_shapes}
+    seed_record = td_logic_core.build_challenge_record(1, target_type)
+    assert len(json.dumps(seed_record)) * 10 < len(json.dumps(full_record))
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("use_pool", [False, True])
+async def test_async_service_seed_only_storage(td_logic_core, use_pool, find_click_on_target):
+    pool = None
+    if use_pool:
+        pool = ChallengePool(td_logic_core, pool_size=1, low_watermark=0)
+        await pool.fill()
+    service = AsyncCaptchaChallengeService(
+        td_logic_core, AsyncInMemoryStore(), challenge_pool=pool, seed_only_storage=True
+    )
+    captcha_id, _, _ = await service.create_challenge()
+    stored = await service.store.retrieve_challenge(captcha_id)
+    assert set(stored) == {"seed", "model_name", "config_hash", "target_shape_type"}
+
+    drawn_shapes = td_logic_core.regenerate_shapes(stored["seed"])
+    click_x, click_y = find_click_on_target(td_logic_core, stored["target_shape_type"], drawn_shapes)
+    assert await service.verify_solution(captcha_id, click_x, click_y)
+    if pool is not None:
+        await pool.close()
+
+
+def test_sync_service_seed_only_storage(td_logic_core, find_click_on_target):
+    service = SyncCaptchaChallengeService(td_logic_core, SyncInMemoryStore(), seed_only_storage=True)
+    captcha_id, _, _ = service.create_challenge()
+    stored = service.store.retrieve_challenge(captcha_id)
+    assert "all_drawn_shapes" not in stored
+
+    drawn_shapes = td_logic_core.regenerate_shapes(stored["seed"])
+    click_x, click_y = find_click_on_target(td_logic_core, stored["target_shape_type"], drawn_shapes)
+    assert service.verify_solution(captcha_id, click_x, click_y)
+    # Повторная проверка невозможна: запись удалена
+    assert not service.verify_solution(captcha_id, click_x, click_y)
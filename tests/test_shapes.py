@@ -0,0 +1,119 @@
+# tests/test_shapes.py
+import math
+import random
+
+import pytest
+
+from shape_captcha_lib import registry
+from shape_captcha_lib.registry import get_all_registered_models, get_model_shape_types, get_shape_class
+from shape_captcha_lib.shapes.abc import AbstractShape
+from shape_captcha_lib.utils import geometry_utils
+
+ROTATIONS = (0.0, math.pi / 12, -math.pi / 7, 1.0, math.pi / 2, 2.5, 5.9)
+
+
+def _all_shape_classes():
+    for model_name in get_all_registered_models():
+        for shape_type in get_model_shape_types(model_name):
+            yield pytest.param(get_shape_class(model_name, shape_type), id=f"{model_name}-{shape_type}")
+
+
+@pytest.mark.parametrize("shape_class", list(_all_shape_classes()))
+def test_analytic_bbox_matches_instance_bbox(shape_class):
+    random.seed(1234)
+    preview_bbox_at_origin = AbstractShape.bbox_at_origin.__func__
+    for _ in range(20):
+        size_params = shape_class.generate_size_params(
+            image_width_upscaled=600,
+            image_height_upscaled=450,
+            min_primary_size_upscaled=30,
+            max_primary_size_upscaled=120,
+        )
+        for rotation_rad in ROTATIONS:
+            expected = preview_bbox_at_origin(shape_class, size_params, rotation_rad)
+            assert shape_class.bbox_at_origin(size_params, rotation_rad) == expected
+
+
+@pytest.mark.parametrize("shape_class", list(_all_shape_classes()))
+def test_hit_test_primitives_match_is_point_inside(shape_class, monkeypatch):
+    monkeypatch.setattr("builtins.print", lambda *args, **kwargs: None) # rhombus печатает отладку на каждый вызов
+    rng = random.Random(4321)
+    for _ in range(5):
+        size_params = shape_class.generate_size_params(
+            image_width_upscaled=600,
+            image_height_upscaled=450,
+            min_primary_size_upscaled=30,
+            max_primary_size_upscaled=120,
+            rng=rng,
+        )
+        for rotation_rad in ROTATIONS[:4]:
+            shape = shape_class(
+                cx_upscaled=300, cy_upscaled=225, color_name_or_rgb=(0, 0, 0),
+                rotation_angle_rad=rotation_rad, **size_params
+            )
+            primitives = shape.get_hit_test_primitives()
+            assert primitives
+            bbox = shape.get_draw_details().bbox_upscaled
+            for px in range(int(bbox[0]) - 3, int(bbox[2]) + 4, 3):
+                for py in range(int(bbox[1]) - 3, int(bbox[3]) + 4, 3):
+                    is_hit = shape.is_point_inside(px, py)
+                    assert geometry_utils.is_point_in_hit_test(px, py, primitives) == is_hit
+                    # verify_solution отбрасывает фигуры по bbox, поэтому кликабельная область должна лежать внутри него
+                    assert not is_hit or (bbox[0] <= px <= bbox[2] and bbox[1] <= py <= bbox[3])
+
+
+def _random_shape(shape_class, rng, rotation_rad=0.4):
+    size_params = shape_class.generate_size_params(
+        image_width_upscaled=600,
+        image_height_upscaled=450,
+        min_primary_size_upscaled=30,
+        max_primary_size_upscaled=120,
+        rng=rng,
+    )
+    return shape_class(
+        cx_upscaled=300, cy_upscaled=225, color_name_or_rgb=(10, 20, 30),
+        rotation_angle_rad=rotation_rad, **size_params
+    )
+
+
+def test_shape_loaders_cover_every_registered_shape():
+    expected = {
+        (model_name, shape_type)
+        for model_name in get_all_registered_models()
+        for shape_type in get_model_shape_types(model_name)
+    }
+    assert set(registry.SHAPE_LOADERS) == expected
+    assert ("community_plugins", "arrow") in registry.SHAPE_LOADERS
+
+
+@pytest.mark.parametrize("shape_class", list(_all_shape_classes()))
+def test_from_storage_round_trips_draw_details(shape_class):
+    shape = _random_shape(shape_class, random.Random(99))
+    details = shape.get_draw_details()
+    restored = shape_class.from_storage(details.params_for_storage, details.color_name_or_rgb)
+    assert type(restored) is shape_class
+    assert restored.get_hit_test_primitives() == shape.get_hit_test_primitives()
+
+
+@pytest.mark.parametrize("shape_type, legacy_keys", [
+    ("circle", {"cx_upscaled": "cx", "cy_upscaled": "cy", "radius": "r", "rotation_angle_rad": "rotation_rad"}),
+    ("sphere", {"cx_upscaled": "cx", "cy_upscaled": "cy", "radius": "r"}),
+    ("cylinder", {"cx_upscaled": "cx_top", "cy_upscaled": "cy_top", "rotation_angle_rad": "rotation_rad"}),
+    ("cone", {"cx_upscaled": "cx_base", "cy_upscaled": "cy_base"}),
+    ("pyramid", {"cx_upscaled": "cx_base", "cy_upscaled": "cy_base"}),
+    ("square", {"cx_upscaled": "cx", "cy_upscaled": "cy", "rotation_angle_rad": "rotation_rad"}),
+])
+def test_from_storage_accepts_legacy_keys(shape_type, legacy_keys):
+    model_name = next(m for m in get_all_registered_models() if shape_type in get_model_shape_types(m))
+    shape_class = get_shape_class(model_name, shape_type)
+    shape = _random_shape(shape_class, random.Random(7))
+    params = shape.get_draw_details().params_for_storage
+    legacy_params = {legacy_keys.get(key, key): value for key, value in params.items()}
+    assert set(legacy_params) != set(params)
+
+    restored = registry.load_shape_from_storage(model_name, shape_type, legacy_params, (10, 20, 30))
+    assert restored.get_hit_test_primitives() == shape.get_hit_test_primitives()
+
+
+def test_load_shape_from_storage_unknown_type_returns_none():
+    assert registry.load_shape_from_storage("base_model", "no_such_shape", {}, "red") is None
@@ -0,0 +1,179 @@
+# tests/test_shared_memory_store.py
+import fcntl
+import multiprocessing
+import os
+import threading
+
+import pytest
+
+from shape_captcha_lib.stores import SyncSharedMemoryStore
+from shape_captcha_lib.stores import shared_memory_store
+
+RECORD = {
+    "target_shape_type": "circle",
+    "all_drawn_shapes": [
+        {"shape_type": "circle", "bbox_upscaled": [10.0, 10.0, 50.0, 50.0], "hit_test": [["circle", 30, 30, 20]]},
+    ],
+}
+
+
+@pytest.fixture
+def store_path(tmp_path):
+    return tmp_path / "captcha.shm"
+
+
+@pytest.fixture
+def store(store_path):
+    shared = SyncSharedMemoryStore(store_path, num_slots=64, num_stripes=4)
+    yield shared
+    shared.close()
+
+
+def test_shared_memory_store_probe_chains_survive_deletes(store_path):
+    # Одна полоса из 16 слотов: ключи неизбежно сталкиваются
+    store = SyncSharedMemoryStore(store_path, num_slots=16, num_stripes=1)
+    ids = [f"id{i}" for i in range(14)]
+    for challenge_id in ids:
+        store.store_challenge(challenge_id, {"seed": 1}, 60)
+    for challenge_id in ids[::2]:
+        store.delete_challenge(challenge_id)
+    for challenge_id in ids[1::2]:
+        assert store.retrieve_challenge(challenge_id) == {"seed": 1}
+    for challenge_id in ids[1::2]:
+        assert store.consume_challenge(challenge_id) == {"seed": 1}
+    # После удаления всех записей не остается надгробий: все слоты снова пусты
+    states = [store._map[store._slot_offset(slot_index)] for slot_index in range(16)]
+    assert states == [shared_memory_store.SLOT_EMPTY] * 16
+    store.close()
+
+
+def test_shared_memory_store_expired_slots_are_reused(store_path, monkeypatch, clock):
+    monkeypatch.setattr(shared_memory_store, "time", clock)
+    store = SyncSharedMemoryStore(store_path, num_slots=4, num_stripes=1)
+    for i in range(4):
+        store.store_challenge(f"old{i}", {"seed": i}, 10)
+    clock.now += 10
+    assert store.retrieve_challenge("old0") is None
+    assert len(store) == 0
+    for i in range(4):
+        store.store_challenge(f"new{i}", {"seed": i}, 10)
+    assert [store.retrieve_challenge(f"new{i}") for i in range(4)] == [{"seed": i} for i in range(4)]
+    store.close()
+
+
+def test_shared_memory_store_full_stripe_evicts_closest_to_expiry(store_path):
+    store = SyncSharedMemoryStore(store_path, num_slots=4, num_stripes=1)
+    for i, ttl in enumerate((300, 100, 200, 400)):
+        store.store_challenge(f"id{i}", {"seed": i}, ttl)
+    store.store_challenge("extra", {"seed": 9}, 300)
+    assert store.retrieve_challenge("id1") is None
+    assert store.retrieve_challenge("extra") == {"seed": 9}
+    assert len(store) == 4
+    store.close()
+
+
+def test_shared_memory_store_rejects_oversized_records(store):
+    with pytest.raises(ValueError):
+        store.store_challenge("abc", {"seed": "x" * 2000}, 60)
+    with pytest.raises(ValueError):
+        store.store_challenge("x" * 65, RECORD, 60)
+    assert store.retrieve_challenge("x" * 65) is None
+
+
+def test_shared_memory_store_reopen_checks_parameters(store_path):
+    store = SyncSharedMemoryStore(store_path, num_slots=64, num_stripes=4)
+    store.store_challenge("abc", RECORD, 60)
+    reopened = SyncSharedMemoryStore(store_path, num_slots=64, num_stripes=4)
+    assert reopened.consume_challenge("abc") == RECORD
+    assert store.retrieve_challenge("abc") is None
+    reopened.close()
+    store.close()
+    with pytest.raises(ValueError):
+        SyncSharedMemoryStore(store_path, num_slots=128, num_stripes=4)
+
+
+def test_shared_memory_store_rejects_invalid_settings(store_path):
+    with pytest.raises(ValueError):
+        SyncSharedMemoryStore(store_path, num_slots=10, num_stripes=4)
+    with pytest.raises(ValueError):
+        SyncSharedMemoryStore(store_path, slot_size=64)
+
+
+def _store_in_child(path, challenge_ids):
+    store = SyncSharedMemoryStore(path, num_slots=64, num_stripes=4)
+    for challenge_id in challenge_ids:
+        store.store_challenge(challenge_id, RECORD, 60)
+    store.close()
+
+
+def _consume_in_child(path, challenge_ids, results):
+    store = SyncSharedMemoryStore(path, num_slots=64, num_stripes=4)
+    results.put(sum(store.consume_challenge(challenge_id) is not None for challenge_id in challenge_ids))
+    store.close()
+
+
+def test_shared_memory_store_is_shared_between_processes(store, store_path):
+    context = multiprocessing.get_context("fork")
+    challenge_ids = [f"id{i}" for i in range(20)]
+    writer = context.Process(target=_store_in_child, args=(store_path, challenge_ids))
+    writer.start()
+    writer.join()
+    assert writer.exitcode == 0
+    assert len(store) == 20
+
+    results = context.Queue()
+    consumers = [context.Process(target=_consume_in_child, args=(store_path, challenge_ids, results)) for _ in range(4)]
+    for consumer in consumers:
+        consumer.start()
+    won = sum(results.get(timeout=30) for _ in consumers)
+    for consumer in consumers:
+        consumer.join()
+    assert won == 20 # Каждый вызов достается ровно одному процессу
+    assert len(store) == 0
+
+def _try_lock_stripe_in_child(path, stripe, results):
+    fd = os.open(path, os.O_RDWR)
+    try:
+        fcntl.lockf(fd, fcntl.LOCK_EX | fcntl.LOCK_NB, 1, shared_memory_store._stripe_lock_offset(stripe))
+        results.put(False)
+    except OSError:
+        results.put(True)
+    finally:
+        os.close(fd)
+
+
+def _stripe_is_locked_for_other_processes(path, stripe):
+    context = multiprocessing.get_context("fork")
+    results = context.Queue()
+    child = context.Process(target=_try_lock_stripe_in_child, args=(path, stripe, results))
+    child.start()
+    locked = results.get(timeout=30)
+    child.join()
+    return locked
+
+
+def test_opening_the_file_again_keeps_stripe_locks_of_other_instances(store_path):
+    first = SyncSharedMemoryStore(store_path, num_slots=64, num_stripes=4)
+    errors = []
+
+    def open_with_other_parameters():
+        try:
+            SyncSharedMemoryStore(store_path, num_slots=128, num_stripes=4)
+        except ValueError as e:
+            errors.append(e)
+
+    with first._locked_stripe(2):
+        assert _stripe_is_locked_for_other_processes(store_path, 2)
+        second = SyncSharedMemoryStore(store_path, num_slots=64, num_stripes=4)
+        assert _stripe_is_locked_for_other_processes(store_path, 2)
+        # Неудачное открытие закрывает свой дескриптор только после выхода first из полосы
+        failing = threading.Thread(target=open_with_other_parameters)
+        failing.start()
+        failing.join(timeout=0.2)
+        assert failing.is_alive()
+        assert _stripe_is_locked_for_other_processes(store_path, 2)
+    failing.join(timeout=10)
+    assert len(errors) == 1
+    assert not _stripe_is_locked_for_other_processes(store_path, 2)
+    second.close()
+    first.close()
@@ -0,0 +1,125 @@
+# tests/test_sqlite_store.py
+import sqlite3
+import threading
+
+import pytest
+
+from shape_captcha_lib.stores import SyncSqliteStore
+from shape_captcha_lib.stores import sqlite_store
+
+RECORD = {"target_shape_type": "circle", "all_drawn_shapes": []}
+
+
+@pytest.fixture
+def store(tmp_path):
+    sqlite = SyncSqliteStore(tmp_path / "captcha.sqlite3")
+    yield sqlite
+    sqlite.close()
+
+
+def test_sqlite_store_uses_wal_and_expiry_index(store):
+    assert store._connection.execute("PRAGMA journal_mode").fetchone()[0] == "wal"
+    plan = store._connection.execute(f"EXPLAIN QUERY PLAN {store._purge_sql}", (0.0,)).fetchall()
+    assert any("captcha_challenges_expires_at" in row[-1] for row in plan)
+
+
+def test_sqlite_store_purges_expired_records_by_range(tmp_path, monkeypatch, clock):
+    monkeypatch.setattr(sqlite_store, "time", clock)
+    store = SyncSqliteStore(tmp_path / "captcha.sqlite3", purge_interval_seconds=30)
+    for i in range(10):
+        store.store_challenge(f"short{i}", RECORD, 10)
+    store.store_challenge("long", RECORD, 300)
+    clock.now += 10
+    assert store.retrieve_challenge("short0") is None
+    assert store.consume_challenge("short1") is None
+    assert len(store) == 10 # Истекшие строки еще не удалены
+
+    clock.now += 20
+    store.store_challenge("trigger", RECORD, 300) # Очистка при записи раз в purge_interval_seconds
+    assert len(store) == 2
+    assert store.retrieve_challenge("long") == RECORD
+    store.close()
+
+
+def test_sqlite_store_records_survive_reopen(tmp_path):
+    path = tmp_path / "captcha.sqlite3"
+    store = SyncSqliteStore(path, codec="binary")
+    store.store_challenge("abc", RECORD, 60)
+    store.close()
+    reopened = SyncSqliteStore(path)
+    assert reopened.consume_challenge("abc") == RECORD
+    reopened.close()
+
+
+def test_sqlite_store_batched_commits_become_visible_after_flush(tmp_path):
+    path = tmp_path / "captcha.sqlite3"
+    # Фоновая очистка раз в час: очистка при записи не занимает место в пакете
+    store = SyncSqliteStore(path, sweep_interval_seconds=3600, commit_interval_seconds=60, max_batch_size=3)
+    reader = sqlite3.connect(str(path))
+
+    def committed_rows():
+        return reader.execute("SELECT COUNT(*) FROM captcha_challenges").fetchone()[0]
+
+    store.store_challenge("a", RECORD, 60)
+    store.store_challenge("b", RECORD, 60)
+    assert store.retrieve_challenge("a") == RECORD # Своя транзакция видна сразу
+    assert committed_rows() == 0
+    store.store_challenge("c", RECORD, 60) # max_batch_size операций - фиксация
+    assert committed_rows() == 3
+    assert store.consume_challenge("a") == RECORD
+    assert committed_rows() == 3
+    store.flush()
+    assert committed_rows() == 2
+    reader.close()
+    store.close()
+
+
+def test_sqlite_store_background_committer_flushes_batches(tmp_path):
+    path = tmp_path / "captcha.sqlite3"
+    store = SyncSqliteStore(path, commit_interval_seconds=0.01)
+    try:
+        store.store_challenge("abc", RECORD, 60)
+        other = SyncSqliteStore(path)
+        for _ in range(200):
+            if other.retrieve_challenge("abc") is not None:
+                break
+            threading.Event().wait(0.01)
+        assert other.retrieve_challenge("abc") == RECORD
+        other.close()
+    finally:
+        store.close()
+
+
+def test_sqlite_store_consume_without_returning(store):
+    store._returning_supported = False
+    store.store_challenge("abc", RECORD, 60)
+    assert store.consume_challenge("abc") == RECORD
+    assert store.consume_challenge("abc") is None
+
+
+def test_sqlite_store_consume_is_won_once_across_connections(tmp_path):
+    path = tmp_path / "captcha.sqlite3"
+    SyncSqliteStore(path).store_challenge("abc", RECORD, 60)
+    stores = [SyncSqliteStore(path) for _ in range(4)]
+    barrier = threading.Barrier(len(stores) * 2)
+    results = []
+
+    def consume(worker_store):
+        barrier.wait()
+        results.append(worker_store.consume_challenge("abc"))
+
+    threads = [threading.Thread(target=consume, args=(worker_store,)) for worker_store in stores * 2]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert [result for result in results if result is not None] == [RECORD]
+    for worker_store in stores:
+        worker_store.close()
+
+
+def test_sqlite_store_rejects_invalid_settings(tmp_path):
+    with pytest.raises(ValueError):
+        SyncSqliteStore(tmp_path / "x.sqlite3", table_name="bad name; drop")
+    with pytest.raises(ValueError):
+        SyncSqliteStore(tmp_path / "x.sqlite3", commit_interval_seconds=0)
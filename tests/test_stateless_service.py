@@ -0,0 +1,118 @@
+# tests/test_stateless_service.py
+import pytest
+
+from shape_captcha_lib.logic_core import CaptchaLogicCore
+from shape_captcha_lib.services import AsyncStatelessCaptchaService, ChallengePool, StatelessCaptchaService
+from shape_captcha_lib.services import stateless_service
+from shape_captcha_lib.utils.challenge_token import ChallengeTokenCodec
+from shape_captcha_lib.utils.replay_filter import RotatingBloomFilter
+
+SECRET_KEY = "0123456789abcdef0123456789abcdef"
+
+
+@pytest.fixture
+def find_correct_click(find_click_on_target):
+    def find(logic_core, captcha_id):
+        claims = ChallengeTokenCodec(SECRET_KEY).open(captcha_id)
+        target_type = logic_core.current_model_shape_types[claims.target_index]
+        return find_click_on_target(logic_core, target_type, logic_core.regenerate_shapes(claims.seed))
+    return find
+
+
+def test_token_roundtrip_and_tampering():
+    codec = ChallengeTokenCodec(SECRET_KEY)
+    token = codec.seal(seed=2**64 - 1, expires_at=1_900_000_000, target_index=7, config_hash="00ff" * 4)
+    claims = codec.open(token)
+    assert (claims.seed, claims.expires_at, claims.target_index, claims.config_hash) == (
+        2**64 - 1, 1_900_000_000, 7, "00ff" * 4
+    )
+    assert len(token) < 80
+
+    tampered = token[:20] + ("A" if token[20] != "A" else "B") + token[21:]
+    assert codec.open(tampered) is None
+    assert codec.open("not a token") is None
+    assert ChallengeTokenCodec("x" * 32).open(token) is None
+    # Ротация ключей: старые токены проверяются по previous_secret_keys
+    assert ChallengeTokenCodec("x" * 32, previous_secret_keys=[SECRET_KEY]).open(token) == claims
+
+    with pytest.raises(ValueError):
+        ChallengeTokenCodec("short")
+
+
+def test_token_cipher_selection():
+    from shape_captcha_lib.utils import challenge_token
+
+    fallback = ChallengeTokenCodec(SECRET_KEY, cipher="hmac-ctr")
+    token = fallback.seal(seed=1, expires_at=2, target_index=3, config_hash="ab" * 8)
+    assert fallback.open(token).seed == 1
+    # Токены резервной схемы проверяются и кодеком с выбором по умолчанию
+    assert ChallengeTokenCodec(SECRET_KEY).open(token).seed == 1
+    with pytest.raises(ValueError):
+        ChallengeTokenCodec(SECRET_KEY, cipher="rot13")
+    if challenge_token.AESGCM is None:
+        assert ChallengeTokenCodec(SECRET_KEY).cipher == "hmac-ctr"
+        with pytest.raises(ImportError):
+            ChallengeTokenCodec(SECRET_KEY, cipher="aes-gcm")
+
+
+def test_aes_gcm_token_roundtrip():
+    pytest.importorskip("cryptography")
+    codec = ChallengeTokenCodec(SECRET_KEY, cipher="aes-gcm")
+    token = codec.seal(seed=2**64 - 1, expires_at=1_900_000_000, target_index=7, config_hash="00ff" * 4)
+    assert codec.open(token).seed == 2**64 - 1
+    assert len(token) == len(ChallengeTokenCodec(SECRET_KEY, cipher="hmac-ctr").seal(1, 2, 3, "00" * 8))
+    tampered = token[:20] + ("A" if token[20] != "A" else "B") + token[21:]
+    assert codec.open(tampered) is None
+    assert ChallengeTokenCodec("x" * 32, cipher="aes-gcm").open(token) is None
+
+
+def test_rotating_bloom_filter_drops_expired_buckets():
+    replay_filter = RotatingBloomFilter(bucket_seconds=10, capacity_per_bucket=100)
+    assert replay_filter.add_if_absent(b"token-1", expires_at=105, now=100)
+    assert not replay_filter.add_if_absent(b"token-1", expires_at=105, now=101)
+    assert replay_filter.add_if_absent(b"token-2", expires_at=125, now=101)
+    assert replay_filter.bucket_count == 2
+
+    replay_filter.add_if_absent(b"token-3", expires_at=135, now=121)
+    assert replay_filter.bucket_count == 2  # Корзина [100, 110) удалена целиком
+
+
+def test_sync_stateless_service_roundtrip(logic_core, find_correct_click):
+    service = StatelessCaptchaService(logic_core, SECRET_KEY)
+    captcha_id, image_bytes, prompt = service.create_challenge(output_format="png")
+    assert image_bytes.startswith(b"\x89PNG")
+
+    click_x, click_y = find_correct_click(logic_core, captcha_id)
+    assert service.verify_solution(captcha_id, click_x, click_y)
+    # Повтор того же токена отклоняется
+    assert not service.verify_solution(captcha_id, click_x, click_y)
+
+
+def test_stateless_token_expiry_and_config_mismatch(logic_core, monkeypatch, find_correct_click):
+    service = StatelessCaptchaService(logic_core, SECRET_KEY, captcha_ttl_seconds=60)
+    captcha_id, _, _ = service.create_challenge()
+    click_x, click_y = find_correct_click(logic_core, captcha_id)
+
+    other_core = CaptchaLogicCore(model_name="base_model", num_shapes_on_image=5)
+    assert not StatelessCaptchaService(other_core, SECRET_KEY).verify_solution(captcha_id, click_x, click_y)
+
+    real_time = stateless_service.time.time
+    monkeypatch.setattr(stateless_service.time, "time", lambda: real_time() + 120)
+    assert not service.verify_solution(captcha_id, click_x, click_y)
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("use_pool", [False, True])
+async def test_async_stateless_service_roundtrip(logic_core, use_pool, find_correct_click):
+    pool = None
+    if use_pool:
+        pool = ChallengePool(logic_core, pool_size=1, low_watermark=0)
+        await pool.fill()
+    service = AsyncStatelessCaptchaService(logic_core, SECRET_KEY, challenge_pool=pool)
+    captcha_id, _, _ = await service.create_challenge()
+
+    click_x, click_y = find_correct_click(logic_core, captcha_id)
+    assert await service.verify_solution(captcha_id, click_x, click_y)
+    assert not await service.verify_solution(captcha_id, click_x, click_y)
+    if pool is not None:
+        await pool.close()
@@ -0,0 +1,500 @@
+# tests/test_stores.py
+import asyncio
+import json
+import os
+import threading
+from unittest import mock
+
+import pytest
+import pytest_asyncio
+import redis
+import redis.asyncio as redis_async
+
+from shape_captcha_lib.stores import AbstractSyncCaptchaStore, AsyncInMemoryStore, SyncInMemoryStore
+from shape_captcha_lib.stores import json_file_store, log_store, memory_store, shared_memory_store, sqlite_store
+from shape_captcha_lib.stores.compact_record import pack_challenge_record, unpack_challenge_record
+from shape_captcha_lib.stores.json_file_store import AsyncJsonFileStore, SyncJsonFileStore
+from shape_captcha_lib.stores.log_store import AsyncLogStore, SyncLogStore
+from shape_captcha_lib.stores.redis_store import AsyncRedisStore, SyncRedisStore
+from shape_captcha_lib.stores.shared_memory_store import AsyncSharedMemoryStore, SyncSharedMemoryStore
+from shape_captcha_lib.stores.sqlite_store import AsyncSqliteStore, SyncSqliteStore
+
+RECORD = {"target_shape_type": "circle", "all_drawn_shapes": []}
+
+
+# Контракт хранилища: (модуль, где подменяется time, фабрика) для каждой реализации
+SYNC_STORE_FACTORIES = {
+    "memory": (memory_store, lambda tmp_path: SyncInMemoryStore()),
+    "json": (json_file_store, lambda tmp_path: SyncJsonFileStore(tmp_path)),
+    "log": (log_store, lambda tmp_path: SyncLogStore(tmp_path)),
+    "sqlite": (sqlite_store, lambda tmp_path: SyncSqliteStore(tmp_path / "captcha.sqlite3")),
+    "shared_memory": (shared_memory_store, lambda tmp_path: SyncSharedMemoryStore(
+        tmp_path / "captcha.shm", num_slots=64, num_stripes=4)),
+}
+ASYNC_STORE_FACTORIES = {
+    "memory": (memory_store, lambda tmp_path: AsyncInMemoryStore()),
+    "json": (json_file_store, lambda tmp_path: AsyncJsonFileStore(tmp_path)),
+    "log": (log_store, lambda tmp_path: AsyncLogStore(tmp_path)),
+    "sqlite": (sqlite_store, lambda tmp_path: AsyncSqliteStore(tmp_path / "captcha.sqlite3")),
+    "shared_memory": (shared_memory_store, lambda tmp_path: AsyncSharedMemoryStore(
+        tmp_path / "captcha.shm", num_slots=64, num_stripes=4)),
+}
+
+
+@pytest.fixture(params=list(SYNC_STORE_FACTORIES))
+def sync_store(request, tmp_path, clock, monkeypatch):
+    module, factory = SYNC_STORE_FACTORIES[request.param]
+    monkeypatch.setattr(module, "time", clock)
+    store = factory(tmp_path)
+    yield store
+    store.close()
+
+
+@pytest_asyncio.fixture(params=list(ASYNC_STORE_FACTORIES))
+async def async_store(request, tmp_path, clock, monkeypatch):
+    module, factory = ASYNC_STORE_FACTORIES[request.param]
+    monkeypatch.setattr(module, "time", clock)
+    store = factory(tmp_path)
+    yield store
+    await store.close()
+
+
+def test_store_round_trip_and_single_consume(sync_store):
+    sync_store.store_challenge("abc", RECORD, 60)
+    sync_store.store_challenge("def", {"seed": 1}, 60)
+    assert sync_store.retrieve_challenge("abc") == RECORD
+    assert sync_store.retrieve_challenge("abc") == RECORD # retrieve не удаляет запись
+    assert sync_store.consume_challenge("abc") == RECORD
+    assert sync_store.consume_challenge("abc") is None
+    assert sync_store.retrieve_challenge("abc") is None
+    assert sync_store.consume_challenge("missing") is None
+    sync_store.delete_challenge("def")
+    sync_store.delete_challenge("missing")
+    assert sync_store.retrieve_challenge("def") is None
+
+
+def test_store_overwrites_existing_challenge(sync_store):
+    sync_store.store_challenge("abc", {"seed": 1}, 60)
+    sync_store.store_challenge("abc", {"seed": 2}, 60)
+    assert sync_store.consume_challenge("abc") == {"seed": 2}
+    assert sync_store.consume_challenge("abc") is None
+
+
+def test_store_expired_record_is_not_returned(sync_store, clock):
+    sync_store.store_challenge("abc", RECORD, 10)
+    sync_store.store_challenge("def", RECORD, 10)
+    clock.now += 9
+    assert sync_store.retrieve_challenge("abc") == RECORD
+    clock.now += 1
+    assert sync_store.retrieve_challenge("abc") is None
+    assert sync_store.consume_challenge("def") is None
+    sync_store.store_challenge("old", RECORD, -1)
+    assert sync_store.consume_challenge("old") is None
+
+
+def test_store_consume_is_won_by_a_single_thread(sync_store):
+    sync_store.store_challenge("abc", RECORD, 60)
+    barrier = threading.Barrier(8)
+    results = []
+
+    def consume():
+        barrier.wait()
+        results.append(sync_store.consume_challenge("abc"))
+
+    threads = [threading.Thread(target=consume) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert [result for result in results if result is not None] == [RECORD]
+
+
+@pytest.mark.asyncio
+async def test_async_store_round_trip_and_single_consume(async_store, clock):
+    await async_store.store_challenge("abc", RECORD, 60)
+    await async_store.store_challenge("def", RECORD, 60)
+    assert await async_store.retrieve_challenge("abc") == RECORD
+    results = await asyncio.gather(*(async_store.consume_challenge("abc") for _ in range(16)))
+    assert [result for result in results if result is not None] == [RECORD]
+    assert await async_store.retrieve_challenge("abc") is None
+    await async_store.delete_challenge("def")
+    assert await async_store.retrieve_challenge("def") is None
+    await async_store.store_challenge("old", RECORD, 10)
+    clock.now += 10
+    assert await async_store.consume_challenge("old") is None
+
+
+def _files_under(path):
+    return sorted(os.path.relpath(os.path.join(root, name), path) for root, _, names in os.walk(path) for name in names)
+
+
+def test_json_consume_leaves_only_expiry_links_behind(tmp_path):
+    store = SyncJsonFileStore(tmp_path)
+    store.store_challenge("abc", RECORD, 60)
+    broken_path = store._get_file_path("broken")
+    broken_path.parent.mkdir(parents=True, exist_ok=True)
+    broken_path.write_text("{not json", encoding="utf-8")
+    assert store.consume_challenge("abc") == RECORD
+    assert store.consume_challenge("broken") is None
+    # Файлов вызовов не осталось, только жесткая ссылка в корзине сроков до ее истечения
+    assert [name.split(os.sep)[0] for name in _files_under(tmp_path)] == ["expiry"]
+
+
+def test_json_store_shards_ids_into_hashed_subdirectories(tmp_path):
+    store = SyncJsonFileStore(tmp_path)
+    for i in range(50):
+        store.store_challenge(f"id{i}", RECORD, 60)
+    challenge_files = [name for name in _files_under(tmp_path) if not name.startswith("expiry")]
+    assert len(challenge_files) == 50
+    assert all(len(name.split(os.sep)) == 3 and len(name.split(os.sep)[0]) == 2 for name in challenge_files)
+    assert len({name.split(os.sep)[0] for name in challenge_files}) > 10
+    assert store.retrieve_challenge("id7") == RECORD
+
+
+def test_json_store_sweeps_expired_buckets_without_reading_files(tmp_path, monkeypatch, clock):
+    monkeypatch.setattr(json_file_store, "time", clock)
+    store = SyncJsonFileStore(tmp_path, expiry_bucket_seconds=10)
+    store.store_challenge("short", RECORD, 5)
+    store.store_challenge("overwritten", RECORD, 5)
+    store.store_challenge("overwritten", {"fresh": True}, 300) # Старая ссылка не должна удалить новый файл
+    store.store_challenge("long", RECORD, 300)
+
+    def fail_decode(raw):
+        raise AssertionError("sweeper must not read challenge files")
+
+    monkeypatch.setattr(json_file_store, "_decode_file_content", fail_decode)
+    clock.now += 20
+    store.store_challenge("trigger", RECORD, 300) # Очистка при записи: не чаще раза в корзину
+    assert not store._get_file_path("short").exists()
+    assert store._get_file_path("overwritten").exists()
+    assert store._get_file_path("long").exists()
+    assert sorted(os.listdir(tmp_path / "expiry")) == ["10310", "10330"] # Корзина 10010 удалена целиком
+
+
+def _write_legacy_flat_file(store_path, challenge_id, data):
+    # Файл в плоской раскладке, записанный версией до шардирования
+    content = json_file_store._encode_file_content(
+        json_file_store.get_challenge_codec("json"), data, json_file_store.time.monotonic() + 60
+    )
+    (store_path / f"{challenge_id}.json").write_bytes(content)
+
+
+def test_json_store_reads_legacy_flat_files(tmp_path):
+    _write_legacy_flat_file(tmp_path, "old1", RECORD)
+    _write_legacy_flat_file(tmp_path, "old2", RECORD)
+    store = SyncJsonFileStore(tmp_path)
+    assert store.retrieve_challenge("old1") == RECORD
+    assert store.consume_challenge("old1") == RECORD
+    assert store.consume_challenge("old1") is None
+    store.delete_challenge("old2")
+    assert not (tmp_path / "old2.json").exists()
+
+    _write_legacy_flat_file(tmp_path, "old3", RECORD)
+    assert SyncJsonFileStore(tmp_path, legacy_flat_layout=False).retrieve_challenge("old3") is None
+
+
+@pytest.mark.asyncio
+async def test_async_json_store_reads_legacy_flat_files(tmp_path):
+    _write_legacy_flat_file(tmp_path, "old1", RECORD)
+    store = AsyncJsonFileStore(tmp_path)
+    assert await store.retrieve_challenge("old1") == RECORD
+    assert await store.consume_challenge("old1") == RECORD
+    assert await store.retrieve_challenge("old1") is None
+    await store.close()
+
+
+def test_json_store_sweeper_thread_removes_expired_files(tmp_path):
+    store = SyncJsonFileStore(tmp_path, expiry_bucket_seconds=1, sweep_interval_seconds=0.01)
+    try:
+        store.store_challenge("expired", RECORD, -2)
+        file_path = store._get_file_path("expired")
+        for _ in range(200):
+            if not file_path.exists():
+                break
+            threading.Event().wait(0.01)
+        assert not file_path.exists()
+    finally:
+        store.close()
+    assert store._sweeper is None
+
+
+@pytest.mark.asyncio
+async def test_async_json_store_sweeper_task_removes_expired_files(tmp_path):
+    store = AsyncJsonFileStore(tmp_path, expiry_bucket_seconds=1, sweep_interval_seconds=0.01)
+    await store.store_challenge("expired", RECORD, -2)
+    await store.store_challenge("live", RECORD, 60)
+    file_path = store._get_file_path("expired")
+    for _ in range(200):
+        if not file_path.exists():
+            break
+        await asyncio.sleep(0.01)
+    assert not file_path.exists()
+    assert await store.retrieve_challenge("live") == RECORD
+    await store.close()
+    assert store._sweeper_task is None
+
+
+def test_json_store_rejects_invalid_sweep_settings(tmp_path):
+    with pytest.raises(ValueError):
+        SyncJsonFileStore(tmp_path, expiry_bucket_seconds=0)
+    with pytest.raises(ValueError):
+        AsyncJsonFileStore(tmp_path, sweep_interval_seconds=0)
+
+
+def test_default_consume_uses_retrieve_and_delete():
+    class MinimalStore(AbstractSyncCaptchaStore):
+        def __init__(self):
+            self.data = {}
+
+        def store_challenge(self, challenge_id, data, ttl_seconds):
+            self.data[challenge_id] = data
+
+        def retrieve_challenge(self, challenge_id):
+            return self.data.get(challenge_id)
+
+        def delete_challenge(self, challenge_id):
+            self.data.pop(challenge_id, None)
+
+    store = MinimalStore()
+    store.store_challenge("abc", RECORD, 60)
+    assert store.consume_challenge("abc") == RECORD
+    assert store.data == {}
+
+
+def test_sync_redis_consume_uses_getdel():
+    client = mock.MagicMock(spec=redis.Redis)
+    client.getdel.return_value = json.dumps(RECORD)
+    store = SyncRedisStore(client)
+    assert store.consume_challenge("abc") == RECORD
+    client.getdel.assert_called_once_with("captcha_challenge:abc")
+    client.get.assert_not_called()
+    client.delete.assert_not_called()
+
+
+def test_sync_redis_consume_falls_back_to_lua_without_getdel():
+    client = mock.MagicMock(spec=redis.Redis)
+    client.getdel.side_effect = redis.ResponseError("unknown command 'GETDEL'")
+    script = mock.MagicMock(return_value=json.dumps(RECORD).encode())
+    client.register_script.return_value = script
+    store = SyncRedisStore(client)
+
+    assert store.consume_challenge("abc") == RECORD
+    assert store.consume_challenge("def") == RECORD
+    client.getdel.assert_called_once() # После первой ошибки GETDEL больше не пробуем
+    client.register_script.assert_called_once()
+    script.assert_called_with(keys=["captcha_challenge:def"])
+
+
+@pytest.mark.asyncio
+async def test_async_redis_consume_uses_getdel_and_lua_fallback():
+    client = mock.MagicMock(spec=redis_async.Redis)
+    client.getdel = mock.AsyncMock(return_value=json.dumps(RECORD))
+    store = AsyncRedisStore(client)
+    assert await store.consume_challenge("abc") == RECORD
+    client.getdel.assert_awaited_once_with("captcha_challenge:abc")
+
+    client.getdel = mock.AsyncMock(side_effect=redis.ResponseError("ERR unknown command 'getdel'"))
+    client.register_script.return_value = mock.AsyncMock(return_value=None)
+    assert await store.consume_challenge("missing") is None
+    client.register_script.return_value.assert_awaited_once_with(keys=["captcha_challenge:missing"])
+
+
+def test_memory_store_expiry_heap_removes_only_expired_records():
+    store = SyncInMemoryStore(num_shards=1)
+    store.store_challenge("expired", RECORD, -1)
+    store.store_challenge("replaced", RECORD, -1)
+    store.store_challenge("replaced", {"fresh": True}, 60) # Старый элемент кучи не должен удалить новую запись
+    store.store_challenge("live", RECORD, 60)
+    shard = store._shards[0]
+    assert set(shard.store) == {"replaced", "live"}
+    assert store.retrieve_challenge("replaced") == {"fresh": True}
+    assert len(shard.expiry_heap) == 2
+
+
+def test_memory_store_sweeper_thread_removes_expired_records():
+    store = SyncInMemoryStore(sweep_interval_seconds=0.01)
+    try:
+        store.store_challenge("expired", RECORD, 0)
+        store.store_challenge("live", RECORD, 60)
+        for _ in range(200):
+            if len(store) == 1:
+                break
+            threading.Event().wait(0.01)
+        assert len(store) == 1
+        assert store.retrieve_challenge("live") == RECORD
+    finally:
+        store.close()
+    assert store._sweeper is None
+
+
+@pytest.mark.asyncio
+async def test_async_memory_store_sweeper_task_removes_expired_records():
+    store = AsyncInMemoryStore(sweep_interval_seconds=0.01)
+    await store.store_challenge("expired", RECORD, 0)
+    await store.store_challenge("live", RECORD, 60)
+    assert "expired" in store._store # Очистка при записи отключена, работает только задача
+    for _ in range(200):
+        if "expired" not in store._store:
+            break
+        await asyncio.sleep(0.01)
+    assert set(store._store) == {"live"}
+    await store.close()
+    assert store._sweeper_task is None
+
+
+def test_memory_store_rejects_non_positive_sweep_interval():
+    with pytest.raises(ValueError):
+        SyncInMemoryStore(sweep_interval_seconds=0)
+    with pytest.raises(ValueError):
+        AsyncInMemoryStore(sweep_interval_seconds=-1)
+
+
+def test_sharded_memory_store_spreads_records_across_shards():
+    store = SyncInMemoryStore(num_shards=8)
+    for i in range(200):
+        store.store_challenge(f"id{i}", {"i": i}, 60)
+    assert len(store) == 200
+    assert sum(1 for shard in store._shards if shard.store) > 1
+    assert all(store.retrieve_challenge(f"id{i}") == {"i": i} for i in range(200))
+
+
+def test_memory_store_capacity_evicts_oldest_records():
+    store = SyncInMemoryStore(num_shards=1, max_entries=3)
+    for challenge_id in ("a", "b", "c", "d"):
+        store.store_challenge(challenge_id, RECORD, 60)
+    assert store.retrieve_challenge("a") is None
+    assert [store.retrieve_challenge(key) for key in ("b", "c", "d")] == [RECORD] * 3
+
+    store.store_challenge("b", RECORD, 60) # Перезапись делает запись самой новой
+    store.store_challenge("e", RECORD, 60)
+    assert store.retrieve_challenge("c") is None
+    assert store.retrieve_challenge("b") == RECORD
+
+
+def test_memory_store_heap_stays_bounded_under_flood():
+    store = SyncInMemoryStore(num_shards=2, max_entries=100)
+    for i in range(10_000):
+        store.store_challenge(f"flood{i}", RECORD, 300)
+    assert len(store) == 100
+    assert all(len(shard.expiry_heap) <= 2 * len(shard.store) + 64 + 1 for shard in store._shards)
+
+
+def test_memory_store_concurrent_consume_returns_record_once():
+    store = SyncInMemoryStore(num_shards=4)
+    for i in range(50):
+        store.store_challenge(f"id{i}", {"i": i}, 60)
+    barrier = threading.Barrier(8)
+    results = []
+    results_lock = threading.Lock()
+
+    def consume_all():
+        barrier.wait()
+        consumed = [store.consume_challenge(f"id{i}") for i in range(50)]
+        with results_lock:
+            results.extend(item for item in consumed if item is not None)
+
+    threads = [threading.Thread(target=consume_all) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert sorted(item["i"] for item in results) == list(range(50))
+    assert len(store) == 0
+
+
+def test_memory_store_rejects_invalid_shard_settings():
+    with pytest.raises(ValueError):
+        SyncInMemoryStore(num_shards=0)
+    with pytest.raises(ValueError):
+        SyncInMemoryStore(max_entries=0)
+
+
+def test_compact_record_round_trip_preserves_verification(logic_core, find_click_on_target):
+    _, drawn_shapes, target_type = logic_core.render_challenge(seed=5)
+    record = logic_core.build_stored_challenge(target_type, drawn_shapes)
+    store = SyncInMemoryStore(compact_records=True)
+    store.store_challenge("abc", record, 60)
+    assert isinstance(store._get_shard("abc").store["abc"][0], bytes)
+
+    restored = store.consume_challenge("abc")
+    assert restored["target_shape_type"] == target_type
+    for original, compact in zip(drawn_shapes, restored["all_drawn_shapes"]):
+        assert compact == {
+            "shape_type": original["shape_type"],
+            "bbox_upscaled": original["bbox_upscaled"],
+            "hit_test": original["hit_test"],
+        }
+    click_x, click_y = find_click_on_target(logic_core, target_type, drawn_shapes)
+    for x, y in [(click_x, click_y), (0, 0), (logic_core.image_width // 2, logic_core.image_height // 2)]:
+        assert logic_core.verify_solution(x, y, target_type, restored["all_drawn_shapes"]) == \
+            logic_core.verify_solution(x, y, target_type, drawn_shapes)
+
+
+@pytest.mark.parametrize("record", [
+    {"target_shape_type": "circle", "seed": 1},
+    {"target_shape_type": "circle", "all_drawn_shapes": [{"shape_type": "circle", "bbox_upscaled": [0, 0, 1, 1]}]},
+    {"target_shape_type": "circle", "all_drawn_shapes": [
+        {"shape_type": "circle", "bbox_upscaled": [0, 0, 1, 1], "hit_test": [["circle", 1.5, 2, 3]]}]},
+    {"target_shape_type": "circle", "all_drawn_shapes": [
+        {"shape_type": "circle", "bbox_upscaled": [0, 0, 1, 1], "hit_test": [["circle", 40000, 2, 3]]}]},
+], ids=["seed", "no-hit-test", "float", "out-of-int16"])
+def test_compact_memory_store_keeps_unpackable_records_as_is(record):
+    assert pack_challenge_record(record) is None
+    store = SyncInMemoryStore(compact_records=True)
+    store.store_challenge("abc", record, 60)
+    assert store.retrieve_challenge("abc") is record
+
+
+def test_unpack_rejects_truncated_record():
+    packed = pack_challenge_record({"target_shape_type": "circle", "all_drawn_shapes": [
+        {"shape_type": "circle", "bbox_upscaled": [0, 0, 10, 10], "hit_test": [["circle", 5, 5, 5]]}]})
+    assert unpack_challenge_record(packed)["all_drawn_shapes"][0]["hit_test"] == [["circle", 5, 5, 5]]
+    with pytest.raises(ValueError):
+        unpack_challenge_record(packed[:-1])
+
+
+@pytest.mark.asyncio
+async def test_async_memory_store_compact_records(logic_core):
+    _, drawn_shapes, target_type = logic_core.render_challenge(seed=6)
+    store = AsyncInMemoryStore(compact_records=True)
+    await store.store_challenge("abc", logic_core.build_stored_challenge(target_type, drawn_shapes), 60)
+    assert isinstance(store._store["abc"][0], bytes)
+    restored = await store.retrieve_challenge("abc")
+    assert [shape["hit_test"] for shape in restored["all_drawn_shapes"]] == [shape["hit_test"] for shape in drawn_shapes]
+
+
+@pytest.mark.asyncio
+async def test_async_json_store_locks_only_the_challenge_stripe(tmp_path):
+    store = AsyncJsonFileStore(tmp_path, lock_stripes=8)
+    busy_id = "busy"
+    other_id = next(f"id{i}" for i in range(100) if store._get_lock(f"id{i}") is not store._get_lock(busy_id))
+    async with store._get_lock(busy_id):
+        # Операции с другим id не ждут чужую блокировку
+        await asyncio.wait_for(store.store_challenge(other_id, RECORD, 60), timeout=5)
+        assert await asyncio.wait_for(store.consume_challenge(other_id), timeout=5) == RECORD
+        blocked = asyncio.ensure_future(store.store_challenge(busy_id, RECORD, 60))
+        await asyncio.sleep(0.05)
+        assert not blocked.done()
+    await blocked
+    assert await store.retrieve_challenge(busy_id) == RECORD
+    await store.close()
+
+
+@pytest.mark.asyncio
+async def test_async_json_store_decodes_off_the_event_loop(tmp_path, monkeypatch):
+    decode_threads = []
+    original_decode = json_file_store._decode_file_content
+
+    def recording_decode(raw):
+        decode_threads.append(threading.current_thread().name)
+        return original_decode(raw)
+
+    monkeypatch.setattr(json_file_store, "_decode_file_content", recording_decode)
+    store = AsyncJsonFileStore(tmp_path)
+    await store.store_challenge("abc", RECORD, 60)
+    assert await store.retrieve_challenge("abc") == RECORD
+    assert await store.consume_challenge("abc") == RECORD
+    assert len(decode_threads) == 2
+    assert all(name.startswith("AsyncJsonFileStore-io") for name in decode_threads)
+    await store.close()
+    assert store._executor._shutdown